@@ -0,0 +1,12 @@
+"""Endpoint benchmarks against the in-memory DynamoDB backend.
+
+Usage:
+    python -m benchmarks run [--rows N] [--seed N] [--iterations N] [--latency-ms MS] [--output PATH]
+    python -m benchmarks compare BASE.json NEW.json [--threshold 0.10]
+
+Run from the ``function`` directory. See ``benchmarks.runner``.
+"""
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'ih_search_service'))
@@ -0,0 +1,1257 @@
+"""In-process DynamoDB stand-in for benchmarks and offline tests.
+
+``MemoryDynamoDB`` answers the low-level API calls PynamoDB makes
+(``Connection._make_api_call``) from Python dictionaries, so the models,
+their indexes, pagination and expressions run unchanged without a
+DynamoDB Local. ``install()`` points every PynamoDB connection at it;
+with ``DYNAMODB_BACKEND=memory`` that happens when ``model`` is imported.
+The tests install it from ``tests/conftest.py`` and the benchmarks from
+``benchmarks.runner``. It lives here rather than in ``ih_search_service``
+so it stays out of the Lambda bundle.
+
+Supported: CreateTable / DescribeTable / UpdateTable (GSI create and
+delete) / DeleteTable / ListTables, GetItem, PutItem, UpdateItem,
+DeleteItem (condition expressions, ``ReturnValues``), Query on the table
+or a GSI (key conditions ``=``, ``<``, ``<=``, ``>``, ``>=``, ``BETWEEN``,
+``begins_with``; filters; ``ScanIndexForward``), Scan (filters,
+``Segment``/``TotalSegments``, ``IndexName``), ``Limit``,
+``ExclusiveStartKey``/``LastEvaluatedKey``, the 1 MB page cap,
+``Select=COUNT``, projection expressions, BatchGetItem and BatchWriteItem
+(100 keys / 25 writes per call, as enforced by DynamoDB).
+
+Items are kept in the wire format. Each table and GSI keeps, per hash
+key, a sorted list of ``(range value, sequence, primary key)``, so a query
+is two binary searches plus a walk over the matching run. Scans walk
+insertion order. ``load()`` skips the per-item inserts and sorts every
+list once at the end: a million Metrics rows with their five GSIs load in
+about ten seconds.
+
+Consumed capacity follows DynamoDB's rounding (4 KB read units, halved
+for eventually consistent reads; 1 KB write units) and is reported when
+asked for, so ``ReadBudget`` charges what it would against AWS. For
+realistic measurements each call can be delayed (``latency`` +
+uniform ``jitter``, in seconds, slept outside the table lock so concurrent
+callers overlap) and throttled: a random ``throttle_rate`` and/or
+per-table read/write capacity token buckets (units per second, 300 s of
+burst) raise ``ProvisionedThroughputExceededException``. Throttled calls
+are retried with exponential backoff like botocore's DynamoDB policy;
+``stats`` counts calls, throttles, capacity units and items read per
+operation.
+
+    backend = install(MemoryDynamoDB(latency=0.004, throttle_rate=0.01))
+    create_tables(Influencer, Metrics)
+    backend.load_models(Metrics, rows)
+
+``UpdateTimeToLive`` is accepted so models with a ``TTLAttribute`` can be
+created, but items never expire. Not supported: transactions, LSIs and
+streams.
+"""
+import copy
+import math
+import os
+import random
+import re
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from decimal import Decimal
+from operator import itemgetter
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from botocore.exceptions import ClientError
+
+DYNAMODB_BACKEND = os.environ.get('DYNAMODB_BACKEND', '').lower()
+PAGE_MAX_BYTES = 1024 * 1024
+BATCH_GET_MAX_KEYS = 100
+BATCH_WRITE_MAX_ITEMS = 25
+BURST_SECONDS = 300
+RETRY_BASE_SECONDS = 0.05
+
+_range_of = itemgetter(0)
+_sequence_of = itemgetter(1)
+
+
+def _error(operation_name: str, code: str, message: str) -> ClientError:
+    return ClientError({'Error': {'Code': code, 'Message': message},
+                        'ResponseMetadata': {'HTTPStatusCode': 400}}, operation_name)
+
+
+class _Failure(Exception):
+    def __init__(self, code: str, message: str):
+        super().__init__(message)
+        self.code = code
+
+
+def _validation(message: str) -> _Failure:
+    return _Failure('ValidationException', message)
+
+
+# ----------------------------------------------------------------------------- values
+
+def _number(text: str):
+    # Integers stay exact; everything else compares as float
+    return int(text) if text.isdigit() or (text[:1] == '-' and text[1:].isdigit()) else float(text)
+
+
+def _scalar(value: Optional[Dict[str, Any]]):
+    """Orderable form of an S/N/B wire value as ``(type, value)``, else None."""
+    if not value:
+        return None
+    if 'S' in value:
+        return 'S', value['S']
+    if 'N' in value:
+        return 'N', _number(value['N'])
+    if 'B' in value:
+        return 'B', value['B']
+    return None
+
+
+def _key_value(value: Dict[str, Any]):
+    scalar = _scalar(value)
+    if scalar is None:
+        raise _validation('Key attributes must be of type S, N or B')
+    return scalar[1]
+
+
+def _decoder(kind: Optional[str]) -> Callable[[Dict[str, Any]], Any]:
+    """Key value reader for an attribute declared as ``kind`` ('S', 'N', 'B' or unknown)."""
+    if kind == 'N':
+        return lambda value: _number(value['N'])
+    if kind in ('S', 'B'):
+        return itemgetter(kind)
+    return _key_value
+
+
+def _canonical(value: Optional[Dict[str, Any]]):
+    """Hashable form of any wire value for equality."""
+    if value is None:
+        return None
+    (kind, inner), = value.items()
+    if kind == 'N':
+        return kind, _number(inner)
+    if kind in ('SS', 'BS'):
+        return kind, frozenset(inner)
+    if kind == 'NS':
+        return kind, frozenset(_number(n) for n in inner)
+    if kind == 'L':
+        return kind, tuple(_canonical(v) for v in inner)
+    if kind == 'M':
+        return kind, frozenset((k, _canonical(v)) for k, v in inner.items())
+    return kind, inner
+
+
+def _size_of(value: Dict[str, Any]) -> int:
+    (kind, inner), = value.items()
+    if kind == 'S':
+        return len(inner.encode('utf-8'))
+    if kind == 'N':
+        return len(inner) // 2 + 1
+    if kind == 'B':
+        return len(inner)
+    if kind in ('BOOL', 'NULL'):
+        return 1
+    if kind == 'SS':
+        return sum(len(s.encode('utf-8')) for s in inner)
+    if kind == 'NS':
+        return sum(len(n) // 2 + 1 for n in inner)
+    if kind == 'BS':
+        return sum(len(b) for b in inner)
+    if kind == 'L':
+        return 3 + sum(1 + _size_of(v) for v in inner)
+    return 3 + sum(1 + len(k.encode('utf-8')) + _size_of(v) for k, v in inner.items())
+
+
+def item_size(item: Dict[str, Dict[str, Any]]) -> int:
+    """Approximate stored size of an item in bytes, by DynamoDB's rules."""
+    return sum(len(name.encode('utf-8')) + _size_of(value) for name, value in item.items())
+
+
+def _read_units(size: int, consistent: bool) -> float:
+    units = max(1, math.ceil(size / 4096))
+    return float(units) if consistent else units / 2
+
+
+def _write_units(size: int) -> float:
+    return float(max(1, math.ceil(size / 1024)))
+
+
+# ----------------------------------------------------------------------------- expressions
+
+_TOKEN = re.compile(r'\s*(?:([#:]?[A-Za-z_][\w]*|[#:]\w+)|(\[\d+\])|(<>|<=|>=|[=<>(),.+-]))')
+_COMPARATORS = {
+    '=': lambda a, b: a == b,
+    '<>': lambda a, b: a != b,
+    '<': lambda a, b: a < b,
+    '<=': lambda a, b: a <= b,
+    '>': lambda a, b: a > b,
+    '>=': lambda a, b: a >= b,
+}
+_CONDITION_FUNCTIONS = ('attribute_exists', 'attribute_not_exists', 'attribute_type', 'begins_with', 'contains')
+
+
+def _tokenize(text: str) -> List[str]:
+    tokens, pos, text = [], 0, text.rstrip()
+    while pos < len(text):
+        match = _TOKEN.match(text, pos)
+        if not match or match.end() == pos:
+            raise _validation(f"Invalid expression near: {text[pos:pos + 20]!r}")
+        tokens.append(match.group(match.lastindex))
+        pos = match.end()
+    return tokens
+
+
+class _Parser:
+    """Recursive descent over DynamoDB expression syntax into tuple ASTs.
+
+    Operands: ``('path', [name | index, ...])``, ``('value', wire value)``,
+    ``('size', path)``, ``('+'|'-', a, b)``, ``('if_not_exists', path, v)``,
+    ``('list_append', a, b)``. Conditions: ``('or'|'and', a, b)``,
+    ``('not', c)``, ``('cmp', op, a, b)``, ``('between', a, low, high)``,
+    ``('in', a, [values])``, ``('func', name, [args])``.
+    """
+
+    def __init__(self, text: str, names: Optional[Dict[str, str]], values: Optional[Dict[str, Any]]):
+        self.tokens = _tokenize(text)
+        self.pos = 0
+        self.names = names or {}
+        self.values = values or {}
+
+    def peek(self, offset: int = 0) -> Optional[str]:
+        i = self.pos + offset
+        return self.tokens[i] if i < len(self.tokens) else None
+
+    def take(self) -> str:
+        token = self.peek()
+        if token is None:
+            raise _validation('Unexpected end of expression')
+        self.pos += 1
+        return token
+
+    def accept(self, word: str) -> bool:
+        token = self.peek()
+        if token is not None and token.upper() == word:
+            self.pos += 1
+            return True
+        return False
+
+    def expect(self, word: str) -> None:
+        if not self.accept(word):
+            raise _validation(f"Expected {word!r} in expression, got {self.peek()!r}")
+
+    def done(self) -> None:
+        if self.peek() is not None:
+            raise _validation(f"Unexpected token {self.peek()!r} in expression")
+
+    # conditions
+    def condition(self):
+        node = self.conjunction()
+        while self.accept('OR'):
+            node = ('or', node, self.conjunction())
+        return node
+
+    def conjunction(self):
+        node = self.negation()
+        while self.accept('AND'):
+            node = ('and', node, self.negation())
+        return node
+
+    def negation(self):
+        if self.accept('NOT'):
+            return 'not', self.negation()
+        return self.predicate()
+
+    def predicate(self):
+        if self.accept('('):
+            node = self.condition()
+            self.expect(')')
+            return node
+        token = self.peek()
+        if token and token.lower() in _CONDITION_FUNCTIONS and self.peek(1) == '(':
+            self.take()
+            return 'func', token.lower(), self.arguments()
+        left = self.operand()
+        op = self.take()
+        if op in _COMPARATORS:
+            return 'cmp', op, left, self.operand()
+        if op.upper() == 'BETWEEN':
+            low = self.operand()
+            self.expect('AND')
+            return 'between', left, low, self.operand()
+        if op.upper() == 'IN':
+            return 'in', left, self.arguments()
+        raise _validation(f"Unexpected token {op!r} in condition")
+
+    def arguments(self) -> List[Any]:
+        self.expect('(')
+        args = [self.operand()]
+        while self.accept(','):
+            args.append(self.operand())
+        self.expect(')')
+        return args
+
+    # operands
+    def operand(self):
+        token = self.peek()
+        if token is not None and token.startswith(':'):
+            self.take()
+            if token not in self.values:
+                raise _validation(f"Value {token} is not defined in ExpressionAttributeValues")
+            return 'value', self.values[token]
+        lowered = (token or '').lower()
+        if lowered in ('size', 'if_not_exists', 'list_append') and self.peek(1) == '(':
+            self.take()
+            args = self.arguments()
+            if lowered == 'size':
+                return 'size', args[0]
+            return (lowered, *args)
+        return self.path()
+
+    def path(self):
+        segments = [self.name()]
+        while True:
+            token = self.peek()
+            if token == '.':
+                self.take()
+                segments.append(self.name())
+            elif token is not None and token.startswith('['):
+                self.take()
+                segments.append(int(token[1:-1]))
+            else:
+                return 'path', segments
+
+    def name(self) -> str:
+        token = self.take()
+        if token.startswith('#'):
+            if token not in self.names:
+                raise _validation(f"Name {token} is not defined in ExpressionAttributeNames")
+            return self.names[token]
+        if not re.match(r'[A-Za-z_]\w*$', token):
+            raise _validation(f"Invalid attribute name {token!r}")
+        return token
+
+    # update expressions
+    def update(self) -> List[Tuple[str, Any, Any]]:
+        actions = []
+        while self.peek() is not None:
+            clause = self.take().upper()
+            if clause not in ('SET', 'REMOVE', 'ADD', 'DELETE'):
+                raise _validation(f"Unknown update clause {clause!r}")
+            while True:
+                path = self.path()
+                if clause == 'SET':
+                    self.expect('=')
+                    value = self.operand()
+                    if self.peek() in ('+', '-'):
+                        value = (self.take(), value, self.operand())
+                    actions.append((clause, path, value))
+                elif clause == 'REMOVE':
+                    actions.append((clause, path, None))
+                else:
+                    actions.append((clause, path, self.operand()))
+                if not self.accept(','):
+                    break
+        return actions
+
+
+def _resolve(item: Optional[Dict[str, Any]], segments: List[Any]) -> Optional[Dict[str, Any]]:
+    if item is None:
+        return None
+    value = item.get(segments[0])
+    for segment in segments[1:]:
+        if value is None:
+            return None
+        if isinstance(segment, int):
+            items = value.get('L')
+            value = items[segment] if items is not None and segment < len(items) else None
+        else:
+            value = (value.get('M') or {}).get(segment) if 'M' in value else None
+    return value
+
+
+def _evaluate(node, item) -> Optional[Dict[str, Any]]:
+    kind = node[0]
+    if kind == 'value':
+        return node[1]
+    if kind == 'path':
+        return _resolve(item, node[1])
+    if kind == 'size':
+        value = _evaluate(node[1], item)
+        if value is None:
+            return None
+        (inner_kind, inner), = value.items()
+        if inner_kind in ('N', 'BOOL', 'NULL'):
+            return None
+        return {'N': str(len(inner))}
+    if kind in ('+', '-'):
+        left, right = _evaluate(node[1], item), _evaluate(node[2], item)
+        if not left or not right or 'N' not in left or 'N' not in right:
+            raise _validation('Arithmetic operands must be numbers that exist')
+        result = Decimal(left['N']) + Decimal(right['N']) if kind == '+' else Decimal(left['N']) - Decimal(right['N'])
+        return {'N': _format_decimal(result)}
+    if kind == 'if_not_exists':
+        value = _evaluate(node[1], item)
+        return value if value is not None else _evaluate(node[2], item)
+    if kind == 'list_append':
+        left, right = _evaluate(node[1], item), _evaluate(node[2], item)
+        if not left or not right or 'L' not in left or 'L' not in right:
+            raise _validation('list_append operands must be lists')
+        return {'L': left['L'] + right['L']}
+    raise _validation(f"Unsupported operand {kind!r}")
+
+
+def _format_decimal(value: Decimal) -> str:
+    text = format(value.normalize(), 'f')
+    return text if text != '-0' else '0'
+
+
+def _compare(op: str, left, right) -> bool:
+    if left is None or right is None:
+        return op == '<>' and (left is None) != (right is None)
+    if op in ('=', '<>'):
+        return _COMPARATORS[op](_canonical(left), _canonical(right))
+    a, b = _scalar(left), _scalar(right)
+    return a is not None and b is not None and a[0] == b[0] and _COMPARATORS[op](a[1], b[1])
+
+
+def _function(name: str, args, item) -> bool:
+    if name == 'attribute_exists':
+        return _evaluate(args[0], item) is not None
+    if name == 'attribute_not_exists':
+        return _evaluate(args[0], item) is None
+    value = _evaluate(args[0], item)
+    operand = _evaluate(args[1], item)
+    if value is None or operand is None:
+        return False
+    if name == 'attribute_type':
+        return next(iter(value)) == operand.get('S')
+    if name == 'begins_with':
+        a, b = _scalar(value), _scalar(operand)
+        return a is not None and b is not None and a[0] == b[0] != 'N' and a[1].startswith(b[1])
+    # contains
+    (kind, inner), = value.items()
+    if kind == 'S':
+        return 'S' in operand and operand['S'] in inner
+    if kind in ('SS', 'NS', 'BS'):
+        member = _canonical(operand)
+        return member is not None and any(_canonical({kind[0]: v}) == member for v in inner)
+    if kind == 'L':
+        member = _canonical(operand)
+        return any(_canonical(v) == member for v in inner)
+    return False
+
+
+def _compile(node) -> Callable[[Dict[str, Any]], bool]:
+    kind = node[0]
+    if kind == 'or':
+        left, right = _compile(node[1]), _compile(node[2])
+        return lambda item: left(item) or right(item)
+    if kind == 'and':
+        left, right = _compile(node[1]), _compile(node[2])
+        return lambda item: left(item) and right(item)
+    if kind == 'not':
+        inner = _compile(node[1])
+        return lambda item: not inner(item)
+    if kind == 'cmp':
+        _, op, a, b = node
+        return lambda item: _compare(op, _evaluate(a, item), _evaluate(b, item))
+    if kind == 'between':
+        _, a, low, high = node
+        return lambda item: (_compare('>=', _evaluate(a, item), _evaluate(low, item))
+                             and _compare('<=', _evaluate(a, item), _evaluate(high, item)))
+    if kind == 'in':
+        _, a, options = node
+        return lambda item: any(_compare('=', _evaluate(a, item), _evaluate(o, item)) for o in options)
+    _, name, args = node
+    return lambda item: _function(name, args, item)
+
+
+def _condition(kwargs: Dict[str, Any], key: str) -> Optional[Callable[[Dict[str, Any]], bool]]:
+    text = kwargs.get(key)
+    if not text:
+        return None
+    parser = _Parser(text, kwargs.get('ExpressionAttributeNames'), kwargs.get('ExpressionAttributeValues'))
+    node = parser.condition()
+    parser.done()
+    return _compile(node)
+
+
+def _projection(text: Optional[str], names: Optional[Dict[str, str]]) -> Optional[List[List[Any]]]:
+    if not text:
+        return None
+    parser = _Parser(text, names, None)
+    paths = [parser.path()[1]]
+    while parser.accept(','):
+        paths.append(parser.path()[1])
+    parser.done()
+    return paths
+
+
+def _project(item: Dict[str, Any], paths: Optional[List[List[Any]]]) -> Dict[str, Any]:
+    if paths is None:
+        return dict(item)
+    out: Dict[str, Any] = {}
+    for segments in paths:
+        if segments[0] not in item:
+            continue
+        if len(segments) == 1 or any(isinstance(s, int) for s in segments):
+            out[segments[0]] = item[segments[0]]
+            continue
+        value = _resolve(item, segments)
+        if value is None:
+            continue
+        target = out.setdefault(segments[0], {'M': {}})['M']
+        for segment in segments[1:-1]:
+            target = target.setdefault(segment, {'M': {}})['M']
+        target[segments[-1]] = value
+    return out
+
+
+# ----------------------------------------------------------------------------- updates
+
+def _assign(item: Dict[str, Any], segments: List[Any], value: Dict[str, Any]) -> None:
+    if len(segments) == 1:
+        item[segments[0]] = value
+        return
+    parent = _resolve(item, segments[:-1])
+    last = segments[-1]
+    if isinstance(last, int):
+        if not parent or 'L' not in parent:
+            raise _validation('The document path provided in the update expression is invalid for update')
+        if last < len(parent['L']):
+            parent['L'][last] = value
+        else:
+            parent['L'].append(value)
+    else:
+        if not parent or 'M' not in parent:
+            raise _validation('The document path provided in the update expression is invalid for update')
+        parent['M'][last] = value
+
+
+def _remove(item: Dict[str, Any], segments: List[Any]) -> None:
+    if len(segments) == 1:
+        item.pop(segments[0], None)
+        return
+    parent = _resolve(item, segments[:-1])
+    last = segments[-1]
+    if isinstance(last, int) and parent and 'L' in parent and last < len(parent['L']):
+        del parent['L'][last]
+    elif not isinstance(last, int) and parent and 'M' in parent:
+        parent['M'].pop(last, None)
+
+
+def _apply_update(item: Dict[str, Any], actions, key_names: Iterable[str]) -> set:
+    """Apply parsed update ``actions`` to ``item`` in place; returns the top-level names touched."""
+    original = copy.deepcopy(item)
+    touched = set()
+    for clause, path, operand in actions:
+        segments = path[1]
+        if segments[0] in key_names:
+            raise _validation(f"Cannot update attribute {segments[0]}. This attribute is part of the key")
+        touched.add(segments[0])
+        if clause == 'REMOVE':
+            _remove(item, segments)
+            continue
+        # Right-hand sides see the item as it was before the update
+        value = _evaluate(operand, original)
+        if value is None:
+            raise _validation('The provided expression refers to an attribute that does not exist in the item')
+        if clause == 'SET':
+            _assign(item, segments, copy.deepcopy(value))
+            continue
+        current = _resolve(item, segments)
+        (kind, inner), = value.items()
+        if clause == 'ADD':
+            if current is None:
+                _assign(item, segments, copy.deepcopy(value))
+            elif kind == 'N' and 'N' in current:
+                _assign(item, segments, {'N': _format_decimal(Decimal(current['N']) + Decimal(inner))})
+            elif kind in current and kind in ('SS', 'NS', 'BS'):
+                _assign(item, segments, {kind: current[kind] + [v for v in inner if v not in current[kind]]})
+            else:
+                raise _validation('An operand in the update expression has an incorrect data type')
+        else:  # DELETE
+            if current is None:
+                continue
+            if kind not in current:
+                raise _validation('An operand in the update expression has an incorrect data type')
+            remaining = [v for v in current[kind] if v not in inner]
+            if remaining:
+                _assign(item, segments, {kind: remaining})
+            else:
+                _remove(item, segments)
+    return touched
+
+
+# ----------------------------------------------------------------------------- storage
+
+class _Partitions:
+    """Per hash key, ``(range value, sequence, primary key)`` entries in sorted order.
+
+    ``sequence`` is the item's permanent scan position; it orders items with
+    equal range values, so lists can be sorted with two stable key sorts
+    instead of comparing tuples.
+    """
+
+    def __init__(self, hash_name: str, range_name: Optional[str], types: Dict[str, str],
+                 sequence: Dict[Tuple[Any, Any], int]):
+        self.hash_name = hash_name
+        self.range_name = range_name
+        self.hash_value = _decoder(types.get(hash_name))
+        self.range_value = _decoder(types.get(range_name)) if range_name else None
+        self.sequence = sequence
+        self.partitions: Dict[Any, List[Tuple[Any, int, Tuple[Any, Any]]]] = defaultdict(list)
+
+    def entry(self, item: Dict[str, Any], pk) -> Optional[Tuple[Any, Tuple[Any, int, Tuple[Any, Any]]]]:
+        """``(hash value, entry)`` of an item, or None when it is not in this index."""
+        hash_value = item.get(self.hash_name)
+        range_value = item.get(self.range_name) if self.range_name else 0
+        if hash_value is None or range_value is None:
+            return None
+        try:
+            return self.hash_value(hash_value), (self.range_value(range_value) if self.range_name else 0,
+                                                 self.sequence[pk], pk)
+        except KeyError:
+            raise _validation('Type mismatch for an index key attribute')
+
+    def add(self, item, pk) -> None:
+        found = self.entry(item, pk)
+        if found is not None:
+            partition = self.partitions[found[0]]
+            partition.insert(bisect_right(partition, found[1]), found[1])
+
+    def discard(self, item, pk) -> None:
+        found = self.entry(item, pk)
+        if found is None:
+            return
+        hash_value, entry = found
+        partition = self.partitions.get(hash_value)
+        if partition:
+            i = bisect_left(partition, entry)
+            if i < len(partition) and partition[i] == entry:
+                del partition[i]
+            if not partition:
+                del self.partitions[hash_value]
+
+    def rebuild(self, items: Dict[Tuple[Any, Any], Dict[str, Any]]) -> None:
+        # The hot loop of bulk loads, so entry() is inlined
+        partitions = self.partitions
+        partitions.clear()
+        hash_name, range_name, hash_value, range_value, sequence = (
+            self.hash_name, self.range_name, self.hash_value, self.range_value, self.sequence)
+        try:
+            for pk, item in items.items():
+                h = item.get(hash_name)
+                if h is None:
+                    continue
+                if range_name is None:
+                    partitions[hash_value(h)].append((0, sequence[pk], pk))
+                    continue
+                r = item.get(range_name)
+                if r is not None:
+                    partitions[hash_value(h)].append((range_value(r), sequence[pk], pk))
+        except KeyError:
+            raise _validation('Type mismatch for an index key attribute')
+        for partition in partitions.values():
+            if len(partition) > 1:
+                # Items re-added after a delete are out of sequence order; then order on range, stably
+                partition.sort(key=_sequence_of)
+                partition.sort(key=_range_of)
+
+
+class _Index(_Partitions):
+    def __init__(self, description: Dict[str, Any], table: '_Table'):
+        schema = {k['KeyType']: k['AttributeName'] for k in description['KeySchema']}
+        super().__init__(schema['HASH'], schema.get('RANGE'), table.types(), table.position)
+        self.name = description['IndexName']
+        self.description = description
+        projection = description.get('Projection', {'ProjectionType': 'ALL'})
+        self.projection_type = projection.get('ProjectionType', 'ALL')
+        self.projected = (set(table.key_names) | {self.hash_name} | ({self.range_name} - {None})
+                          | set(projection.get('NonKeyAttributes', [])))
+
+    def project(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        if self.projection_type == 'ALL':
+            return item
+        return {name: value for name, value in item.items() if name in self.projected}
+
+
+class _Bucket:
+    """Token bucket of capacity units refilled at ``rate`` per second."""
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.tokens = rate * BURST_SECONDS
+        self.updated = time.monotonic()
+
+    def available(self) -> bool:
+        now = time.monotonic()
+        self.tokens = min(self.rate * BURST_SECONDS, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return self.tokens > 0
+
+    def charge(self, units: float) -> None:
+        self.tokens -= units
+
+
+class _Table:
+    def __init__(self, description: Dict[str, Any], read_capacity: Optional[float],
+                 write_capacity: Optional[float]):
+        self.name = description['TableName']
+        schema = {k['KeyType']: k['AttributeName'] for k in description['KeySchema']}
+        self.hash_name = schema['HASH']
+        self.range_name = schema.get('RANGE')
+        self.key_names = [n for n in (self.hash_name, self.range_name) if n]
+        self.description = description
+        self.items: Dict[Tuple[Any, Any], Dict[str, Any]] = {}
+        self.sizes: Dict[Tuple[Any, Any], int] = {}
+        # Scan order: positions never move; deleted keys are skipped while walking
+        self.order: List[Tuple[Any, Any]] = []
+        self.position: Dict[Tuple[Any, Any], int] = {}
+        types = self.types()
+        self.hash_value = _decoder(types.get(self.hash_name))
+        self.range_value = _decoder(types.get(self.range_name)) if self.range_name else None
+        # Without a range key a query is a dictionary lookup, so there is nothing to sort
+        self.primary = _Partitions(self.hash_name, self.range_name, types, self.position) if self.range_name else None
+        self.indexes: Dict[str, _Index] = {}
+        self.read_bucket = _Bucket(read_capacity) if read_capacity else None
+        self.write_bucket = _Bucket(write_capacity) if write_capacity else None
+        for index in description.get('GlobalSecondaryIndexes', []):
+            self.indexes[index['IndexName']] = _Index(index, self)
+
+    def types(self) -> Dict[str, str]:
+        return {d['AttributeName']: d['AttributeType'] for d in self.description['AttributeDefinitions']}
+
+    def key_lists(self) -> List[_Partitions]:
+        return [keys for keys in (self.primary, *self.indexes.values()) if keys is not None]
+
+    def key_of(self, item: Dict[str, Any]) -> Tuple[Any, Any]:
+        try:
+            hash_value = self.hash_value(item[self.hash_name])
+            range_value = self.range_value(item[self.range_name]) if self.range_name else None
+        except KeyError:
+            raise _validation('The provided key element does not match the schema')
+        return hash_value, range_value
+
+    def size(self, pk) -> int:
+        size = self.sizes.get(pk)
+        if size is None:
+            size = self.sizes[pk] = item_size(self.items[pk])
+        return size
+
+    def key_attributes(self, item: Dict[str, Any], index: Optional[_Index] = None) -> Dict[str, Any]:
+        names = list(self.key_names)
+        if index is not None:
+            names += [n for n in (index.hash_name, index.range_name) if n]
+        return {name: item[name] for name in names if name in item}
+
+    def store(self, item: Dict[str, Any]) -> Tuple[Tuple[Any, Any], Optional[Dict[str, Any]]]:
+        """Set the item without touching the key lists (see ``reindex``)."""
+        pk = self.key_of(item)
+        old = self.items.get(pk)
+        if old is None and pk not in self.position:
+            self.position[pk] = len(self.order)
+            self.order.append(pk)
+        self.items[pk] = item
+        self.sizes.pop(pk, None)
+        return pk, old
+
+    def put(self, item: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        pk, old = self.store(item)
+        for keys in self.key_lists():
+            if old is not None:
+                keys.discard(old, pk)
+            keys.add(item, pk)
+        return old
+
+    def reindex(self) -> None:
+        for keys in self.key_lists():
+            keys.rebuild(self.items)
+
+    def delete(self, pk) -> Optional[Dict[str, Any]]:
+        old = self.items.pop(pk, None)
+        if old is not None:
+            for keys in self.key_lists():
+                keys.discard(old, pk)
+            self.sizes.pop(pk, None)
+        return old
+
+    def add_index(self, description: Dict[str, Any]) -> None:
+        index = _Index(description, self)
+        index.rebuild(self.items)
+        self.indexes[index.name] = index
+
+    def describe(self) -> Dict[str, Any]:
+        description = dict(self.description, TableStatus='ACTIVE', ItemCount=len(self.items))
+        indexes = [dict(i.description, IndexStatus='ACTIVE', ItemCount=sum(map(len, i.partitions.values())))
+                   for i in self.indexes.values()]
+        if indexes:
+            description['GlobalSecondaryIndexes'] = indexes
+        else:
+            description.pop('GlobalSecondaryIndexes', None)
+        return description
+
+
+# ----------------------------------------------------------------------------- backend
+
+class MemoryDynamoDB:
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, throttle_rate: float = 0.0,
+                 read_capacity: Optional[float] = None, write_capacity: Optional[float] = None,
+                 max_attempts: int = 3, seed: Optional[int] = None):
+        """
+        :param latency: seconds added to every call (each attempt).
+        :param jitter: extra uniform random delay of up to this many seconds.
+        :param throttle_rate: fraction of calls rejected as throttled.
+        :param read_capacity: per-table read units per second (None: unlimited).
+        :param write_capacity: per-table write units per second (None: unlimited).
+        :param max_attempts: attempts per call before a throttle error is raised.
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.throttle_rate = throttle_rate
+        self.read_capacity = read_capacity
+        self.write_capacity = write_capacity
+        self.max_attempts = max_attempts
+        self.tables: Dict[str, _Table] = {}
+        self.stats: Dict[str, Dict[str, float]] = defaultdict(
+            lambda: {'calls': 0, 'throttled': 0, 'units': 0.0, 'items': 0})
+        self._lock = threading.RLock()
+        self._random = random.Random(seed)
+        self.client = SimpleNamespace(_make_api_call=self.call, meta=SimpleNamespace(endpoint_url='memory://'))
+
+    @classmethod
+    def from_env(cls) -> 'MemoryDynamoDB':
+        def number(name, default=None):
+            value = os.environ.get(name)
+            return float(value) if value else default
+        return cls(latency=number('MEMORY_DYNAMODB_LATENCY_MS', 0.0) / 1000,
+                   jitter=number('MEMORY_DYNAMODB_JITTER_MS', 0.0) / 1000,
+                   throttle_rate=number('MEMORY_DYNAMODB_THROTTLE_RATE', 0.0),
+                   read_capacity=number('MEMORY_DYNAMODB_READ_CAPACITY'),
+                   write_capacity=number('MEMORY_DYNAMODB_WRITE_CAPACITY'),
+                   seed=int(number('MEMORY_DYNAMODB_SEED', 0)) or None)
+
+    # -- bulk loading
+    def load(self, table_name: str, items: Iterable[Dict[str, Dict[str, Any]]]) -> int:
+        """Bulk insert wire-format items, bypassing capacity, latency and throttling."""
+        with self._lock:
+            table = self._table('Load', table_name)
+            count = 0
+            for item in items:
+                table.store(item)
+                count += 1
+            table.reindex()
+            return count
+
+    def load_models(self, model, instances: Iterable[Any]) -> int:
+        """Bulk insert PynamoDB model instances into ``model``'s table."""
+        return self.load(model.Meta.table_name, (instance.serialize() for instance in instances))
+
+    def reset(self) -> None:
+        with self._lock:
+            self.tables.clear()
+            self.stats.clear()
+
+    # -- dispatch
+    def call(self, operation_name: str, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        handler = getattr(self, f"_op_{operation_name}", None)
+        if handler is None:
+            raise _error(operation_name, 'UnknownOperationException',
+                         f"{operation_name} is not supported by the in-memory backend")
+        for attempt in range(self.max_attempts):
+            delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0.0)
+            if delay:
+                time.sleep(delay)
+            try:
+                with self._lock:
+                    stats = self.stats[operation_name]
+                    stats['calls'] += 1
+                    if self._throttled(operation_name, kwargs):
+                        stats['throttled'] += 1
+                        raise _Failure('ProvisionedThroughputExceededException',
+                                       'The level of configured provisioned throughput for the table was exceeded.')
+                    response, units = handler(kwargs)
+                    stats['units'] += sum(units.values())
+                    stats['items'] += _items_read(response)
+                    self._charge(operation_name, units)
+            except _Failure as failure:
+                if failure.code == 'ProvisionedThroughputExceededException' and attempt + 1 < self.max_attempts:
+                    time.sleep(self._random.uniform(0, RETRY_BASE_SECONDS * 2 ** attempt))
+                    continue
+                raise _error(operation_name, failure.code, str(failure)) from None
+            return self._with_capacity(kwargs, response, units)
+        raise AssertionError('unreachable')
+
+    def _throttled(self, operation_name: str, kwargs: Dict[str, Any]) -> bool:
+        if operation_name in ('CreateTable', 'DescribeTable', 'UpdateTable', 'DeleteTable', 'ListTables',
+                              'UpdateTimeToLive'):
+            return False
+        if self.throttle_rate and self._random.random() < self.throttle_rate:
+            return True
+        writes = operation_name in ('PutItem', 'UpdateItem', 'DeleteItem', 'BatchWriteItem')
+        for name in self._table_names(kwargs):
+            table = self.tables.get(name)
+            bucket = table and (table.write_bucket if writes else table.read_bucket)
+            if bucket and not bucket.available():
+                return True
+        return False
+
+    def _charge(self, operation_name: str, units: Dict[str, float]) -> None:
+        writes = operation_name in ('PutItem', 'UpdateItem', 'DeleteItem', 'BatchWriteItem')
+        for name, used in units.items():
+            table = self.tables.get(name)
+            bucket = table and (table.write_bucket if writes else table.read_bucket)
+            if bucket:
+                bucket.charge(used)
+
+    @staticmethod
+    def _table_names(kwargs: Dict[str, Any]) -> List[str]:
+        if 'RequestItems' in kwargs:
+            return list(kwargs['RequestItems'])
+        return [kwargs['TableName']] if 'TableName' in kwargs else []
+
+    @staticmethod
+    def _with_capacity(kwargs, response, units):
+        mode = kwargs.get('ReturnConsumedCapacity', 'NONE')
+        if mode != 'NONE' and units:
+            capacity = [{'TableName': name, 'CapacityUnits': used} for name, used in units.items()]
+            response['ConsumedCapacity'] = capacity if 'RequestItems' in kwargs else capacity[0]
+        return response
+
+    def _table(self, operation_name: str, name: str) -> _Table:
+        table = self.tables.get(name)
+        if table is None:
+            raise _Failure('ResourceNotFoundException', f"Requested resource not found: Table: {name} not found")
+        return table
+
+    # -- tables
+    def _op_CreateTable(self, kwargs):
+        name = kwargs['TableName']
+        if name in self.tables:
+            raise _Failure('ResourceInUseException', f"Table already exists: {name}")
+        fields = ('TableName', 'KeySchema', 'AttributeDefinitions', 'GlobalSecondaryIndexes', 'BillingMode')
+        description = {key: kwargs[key] for key in fields if key in kwargs}
+        description['BillingModeSummary'] = {'BillingMode': kwargs.get('BillingMode', 'PROVISIONED')}
+        description['TableArn'] = f"arn:aws:dynamodb:memory:000000000000:table/{name}"
+        self.tables[name] = _Table(description, self.read_capacity, self.write_capacity)
+        return {'TableDescription': self.tables[name].describe()}, {}
+
+    def _op_DescribeTable(self, kwargs):
+        return {'Table': self._table('DescribeTable', kwargs['TableName']).describe()}, {}
+
+    def _op_DeleteTable(self, kwargs):
+        table = self._table('DeleteTable', kwargs['TableName'])
+        del self.tables[table.name]
+        return {'TableDescription': dict(table.describe(), TableStatus='DELETING')}, {}
+
+    def _op_ListTables(self, kwargs):
+        return {'TableNames': sorted(self.tables)}, {}
+
+    def _op_UpdateTimeToLive(self, kwargs):
+        self._table('UpdateTimeToLive', kwargs['TableName'])
+        return {'TimeToLiveSpecification': kwargs['TimeToLiveSpecification']}, {}
+
+    def _op_UpdateTable(self, kwargs):
+        table = self._table('UpdateTable', kwargs['TableName'])
+        definitions = {d['AttributeName']: d for d in table.description['AttributeDefinitions']}
+        definitions.update({d['AttributeName']: d for d in kwargs.get('AttributeDefinitions', [])})
+        table.description['AttributeDefinitions'] = list(definitions.values())
+        for update in kwargs.get('GlobalSecondaryIndexUpdates', []):
+            if 'Create' in update:
+                if update['Create']['IndexName'] in table.indexes:
+                    raise _validation(f"Index {update['Create']['IndexName']} already exists")
+                table.add_index(update['Create'])
+            elif 'Delete' in update:
+                table.indexes.pop(update['Delete']['IndexName'], None)
+        return {'TableDescription': table.describe()}, {}
+
+    # -- items
+    def _op_GetItem(self, kwargs):
+        table = self._table('GetItem', kwargs['TableName'])
+        pk = table.key_of(kwargs['Key'])
+        units = _read_units(table.size(pk) if pk in table.items else 0, kwargs.get('ConsistentRead', False))
+        response = {}
+        if pk in table.items:
+            paths = _projection(kwargs.get('ProjectionExpression'), kwargs.get('ExpressionAttributeNames'))
+            response['Item'] = _project(table.items[pk], paths)
+        return response, {table.name: units}
+
+    def _check(self, kwargs, old):
+        condition = _condition(kwargs, 'ConditionExpression')
+        if condition is not None and not condition(old or {}):
+            raise _Failure('ConditionalCheckFailedException', 'The conditional request failed')
+
+    @staticmethod
+    def _returned(kwargs, old, new, touched=None):
+        mode = kwargs.get('ReturnValues', 'NONE')
+        if mode == 'ALL_OLD' and old:
+            return {'Attributes': dict(old)}
+        if mode == 'ALL_NEW' and new:
+            return {'Attributes': dict(new)}
+        if mode in ('UPDATED_OLD', 'UPDATED_NEW'):
+            source = old if mode == 'UPDATED_OLD' else new
+            attributes = {k: v for k, v in (source or {}).items() if k in (touched or ())}
+            return {'Attributes': attributes} if attributes else {}
+        return {}
+
+    def _op_PutItem(self, kwargs):
+        table = self._table('PutItem', kwargs['TableName'])
+        item = kwargs['Item']
+        pk = table.key_of(item)
+        old = table.items.get(pk)
+        self._check(kwargs, old)
+        units = _write_units(max(item_size(item), table.size(pk) if old else 0))
+        table.put(item)
+        return self._returned(kwargs, old, None), {table.name: units}
+
+    def _op_DeleteItem(self, kwargs):
+        table = self._table('DeleteItem', kwargs['TableName'])
+        pk = table.key_of(kwargs['Key'])
+        old = table.items.get(pk)
+        self._check(kwargs, old)
+        units = _write_units(table.size(pk) if old else 0)
+        table.delete(pk)
+        return self._returned(kwargs, old, None), {table.name: units}
+
+    def _op_UpdateItem(self, kwargs):
+        table = self._table('UpdateItem', kwargs['TableName'])
+        key = kwargs['Key']
+        pk = table.key_of(key)
+        old = table.items.get(pk)
+        self._check(kwargs, old)
+        item = copy.deepcopy(old) if old is not None else dict(key)
+        touched = set()
+        if kwargs.get('UpdateExpression'):
+            parser = _Parser(kwargs['UpdateExpression'], kwargs.get('ExpressionAttributeNames'),
+                             kwargs.get('ExpressionAttributeValues'))
+            touched = _apply_update(item, parser.update(), table.key_names)
+        units = _write_units(max(item_size(item), table.size(pk) if old else 0))
+        table.put(item)
+        return self._returned(kwargs, old, item, touched), {table.name: units}
+
+    def _op_BatchGetItem(self, kwargs):
+        request = kwargs['RequestItems']
+        if sum(len(r['Keys']) for r in request.values()) > BATCH_GET_MAX_KEYS:
+            raise _validation(f"Too many items requested for the BatchGetItem call (max {BATCH_GET_MAX_KEYS})")
+        responses, units = {}, {}
+        for name, spec in request.items():
+            table = self._table('BatchGetItem', name)
+            paths = _projection(spec.get('ProjectionExpression'), spec.get('ExpressionAttributeNames'))
+            found = responses[name] = []
+            used = 0.0
+            for key in spec['Keys']:
+                pk = table.key_of(key)
+                item = table.items.get(pk)
+                used += _read_units(table.size(pk) if item is not None else 0, spec.get('ConsistentRead', False))
+                if item is not None:
+                    found.append(_project(item, paths))
+            units[name] = used
+        return {'Responses': responses, 'UnprocessedKeys': {}}, units
+
+    def _op_BatchWriteItem(self, kwargs):
+        request = kwargs['RequestItems']
+        if sum(len(r) for r in request.values()) > BATCH_WRITE_MAX_ITEMS:
+            raise _validation(f"Too many items requested for the BatchWriteItem call (max {BATCH_WRITE_MAX_ITEMS})")
+        units = {}
+        for name, writes in request.items():
+            table = self._table('BatchWriteItem', name)
+            used = 0.0
+            for write in writes:
+                if 'PutRequest' in write:
+                    item = write['PutRequest']['Item']
+                    used += _write_units(item_size(item))
+                    table.put(item)
+                else:
+                    pk = table.key_of(write['DeleteRequest']['Key'])
+                    used += _write_units(table.size(pk) if pk in table.items else 0)
+                    table.delete(pk)
+            units[name] = used
+        return {'UnprocessedItems': {}}, units
+
+    # -- reads
+    def _page(self, kwargs, table: _Table, index: Optional[_Index], pks: Iterable[Tuple[Any, Any]]):
+        """Evaluate ``pks`` in order with Limit, the 1 MB cap, the filter and the projection."""
+        limit = kwargs.get('Limit')
+        matches = _condition(kwargs, 'FilterExpression')
+        paths = _projection(kwargs.get('ProjectionExpression'), kwargs.get('ExpressionAttributeNames'))
+        count_only = kwargs.get('Select') == 'COUNT'
+        items, scanned, size, last, previous = [], 0, 0, None, None
+        for pk in pks:
+            item = table.items.get(pk)
+            if item is None:
+                continue
+            if (limit is not None and scanned >= limit) or size >= PAGE_MAX_BYTES:
+                last = table.key_attributes(previous, index)
+                break
+            scanned += 1
+            size += table.size(pk)
+            previous = item
+            visible = index.project(item) if index is not None else item
+            if matches is None or matches(visible):
+                if count_only:
+                    items.append(None)
+                else:
+                    items.append(_project(visible, paths))
+        response = {'Count': len(items), 'ScannedCount': scanned}
+        if not count_only:
+            response['Items'] = items
+        if last is not None:
+            response['LastEvaluatedKey'] = last
+        units = _read_units(size, kwargs.get('ConsistentRead', False)) if scanned else 0.5
+        return response, {table.name: units}
+
+    def _source(self, operation_name, kwargs) -> Tuple[_Table, Optional[_Index]]:
+        table = self._table(operation_name, kwargs['TableName'])
+        name = kwargs.get('IndexName')
+        if name is None:
+            return table, None
+        if name not in table.indexes:
+            raise _validation(f"The table does not have the specified index: {name}")
+        return table, table.indexes[name]
+
+    def _op_Query(self, kwargs):
+        table, index = self._source('Query', kwargs)
+        keys = index or table.primary or table
+        parser = _Parser(kwargs['KeyConditionExpression'], kwargs.get('ExpressionAttributeNames'),
+                         kwargs.get('ExpressionAttributeValues'))
+        node = parser.condition()
+        parser.done()
+        hash_value, range_term = _key_condition(node, keys.hash_name, keys.range_name)
+        if keys is table:
+            entries = [(0, (hash_value, None))] if (hash_value, None) in table.items else []
+        else:
+            entries = keys.partitions.get(hash_value, [])
+        lo, hi = _range_bounds(entries, range_term)
+        forward = kwargs.get('ScanIndexForward', True)
+        start = kwargs.get('ExclusiveStartKey')
+        if start:
+            pk = table.key_of(start)
+            position = (keys.range_value(start[keys.range_name]) if keys.range_name else 0,
+                        table.position.get(pk, len(table.order)), pk)
+            if forward:
+                lo = max(lo, bisect_right(entries, position))
+            else:
+                hi = min(hi, bisect_left(entries, position))
+        positions = range(lo, hi) if forward else range(hi - 1, lo - 1, -1)
+        return self._page(kwargs, table, index, (entries[i][2] for i in positions))
+
+    def _op_Scan(self, kwargs):
+        table, index = self._source('Scan', kwargs)
+        total = kwargs.get('TotalSegments')
+        begin, end = 0, len(table.order)
+        if total:
+            segment = kwargs['Segment']
+            begin, end = len(table.order) * segment // total, len(table.order) * (segment + 1) // total
+        start = kwargs.get('ExclusiveStartKey')
+        if start:
+            begin = max(begin, table.position.get(table.key_of(start), begin - 1) + 1)
+        pks = (table.order[i] for i in range(begin, end))
+        if index is not None:
+            pks = (pk for pk in pks if pk in table.items and index.entry(table.items[pk], pk) is not None)
+        return self._page(kwargs, table, index, pks)
+
+
+def _items_read(response: Dict[str, Any]) -> int:
+    """Items a read evaluated (before filters), as DynamoDB bills them."""
+    if 'ScannedCount' in response:
+        return response['ScannedCount']
+    if 'Responses' in response:
+        return sum(len(items) for items in response['Responses'].values())
+    return 1 if 'Item' in response else 0
+
+
+def _key_condition(node, hash_name: str, range_name: Optional[str]):
+    terms, pending = [], [node]
+    while pending:
+        term = pending.pop()
+        if term[0] == 'and':
+            pending.extend(term[1:])
+        else:
+            terms.append(term)
+    hash_value, range_term = None, None
+    for term in terms:
+        if term[0] == 'cmp' and term[1] == '=' and term[2] == ('path', [hash_name]) and term[3][0] == 'value':
+            hash_value = _key_value(term[3][1])
+        elif range_name and term[0] == 'cmp' and term[2] == ('path', [range_name]) and term[3][0] == 'value':
+            range_term = term
+        elif range_name and term[0] == 'between' and term[1] == ('path', [range_name]):
+            range_term = term
+        elif range_name and term[0] == 'func' and term[1] == 'begins_with' and term[2][0] == ('path', [range_name]):
+            range_term = term
+        else:
+            raise _validation('Query key condition not supported')
+    if hash_value is None:
+        raise _validation('Query condition missed key schema element')
+    return hash_value, range_term
+
+
+def _range_bounds(entries, term) -> Tuple[int, int]:
+    if term is None:
+        return 0, len(entries)
+    if term[0] == 'between':
+        low, high = _key_value(term[2][1]), _key_value(term[3][1])
+        return bisect_left(entries, low, key=_range_of), bisect_right(entries, high, key=_range_of)
+    if term[0] == 'func':
+        prefix = _key_value(term[2][1][1])
+        lo = bisect_left(entries, prefix, key=_range_of)
+        hi = lo
+        while hi < len(entries) and entries[hi][0].startswith(prefix):
+            hi += 1
+        return lo, hi
+    op, value = term[1], _key_value(term[3][1])
+    if op == '=':
+        return bisect_left(entries, value, key=_range_of), bisect_right(entries, value, key=_range_of)
+    if op == '<':
+        return 0, bisect_left(entries, value, key=_range_of)
+    if op == '<=':
+        return 0, bisect_right(entries, value, key=_range_of)
+    if op == '>':
+        return bisect_right(entries, value, key=_range_of), len(entries)
+    if op == '>=':
+        return bisect_left(entries, value, key=_range_of), len(entries)
+    raise _validation(f"Unsupported key condition operator {op}")
+
+
+# ----------------------------------------------------------------------------- wiring
+
+_installed: Optional[MemoryDynamoDB] = None
+_original_client = None
+
+
+def install(backend: Optional[MemoryDynamoDB] = None) -> MemoryDynamoDB:
+    """Route every PynamoDB connection to ``backend`` (a new one from the environment by default)."""
+    global _installed, _original_client
+    from pynamodb.connection.base import Connection
+    backend = backend or MemoryDynamoDB.from_env()
+    if _original_client is None:
+        _original_client = Connection.__dict__['client']
+    Connection.client = property(lambda connection: _installed.client)
+    _installed = backend
+    return backend
+
+
+def uninstall() -> None:
+    global _installed, _original_client
+    from pynamodb.connection.base import Connection
+    if _original_client is not None:
+        Connection.client = _original_client
+    _installed, _original_client = None, None
+
+
+def installed() -> Optional[MemoryDynamoDB]:
+    return _installed
+
+
+def install_from_env() -> Optional[MemoryDynamoDB]:
+    """Install a backend when ``DYNAMODB_BACKEND=memory``."""
+    if DYNAMODB_BACKEND == 'memory' and _installed is None:
+        return install()
+    return _installed
+
+
+def create_tables(*models) -> None:
+    """Create the tables (and GSIs) of ``models`` that do not exist yet."""
+    for model in models:
+        if not model.exists():
+            model.create_table(read_capacity_units=5, write_capacity_units=5, wait=True)
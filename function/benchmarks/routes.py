@@ -0,0 +1,138 @@
+"""One benchmark case per route of the influencer_metrics and posts blueprints.
+
+Each case builds a request from the dataset with a ``random.Random``.
+Ids, names and handles are drawn by popularity: influencer ids are
+ranked by followers, and rank ``r`` is picked with probability ~1/r, so
+a few popular influencers get most of the lookups, as in production.
+Filter values come from the same Zipf-ranked vocabularies the generator
+uses. DELETE takes ids from a reserved half of the posts, so a deleted
+post is never looked up again.
+"""
+import random
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Sequence
+
+from enums.category import Category
+from enums.gender import Gender
+from enums.platform import Platform
+
+from benchmarks.datagen import LOCATIONS, Dataset
+
+BATCH_SIZE = 25
+PAGE_LIMIT = 20
+
+
+@dataclass
+class Case:
+    method: str
+    # URL rule as registered, e.g. '/posts/<string:post_id>'
+    rule: str
+    # rnd -> keyword arguments for FlaskClient.open (path, query_string, json)
+    build: Callable[[random.Random], Dict[str, Any]]
+
+    @property
+    def name(self) -> str:
+        return f"{self.method} {self.rule}"
+
+
+def popular(rnd: random.Random, ranked: Sequence[Any]) -> Any:
+    """An element of ``ranked`` (most popular first), rank r with probability ~1/r."""
+    return ranked[min(len(ranked), int(len(ranked) ** rnd.random())) - 1]
+
+
+def build_cases(dataset: Dataset) -> List[Case]:
+    ids, names, handles = dataset.influencer_ids, dataset.names, dataset.platform_handles
+    half = max(1, len(dataset.post_ids) // 2)
+    post_ids, post_urls = dataset.post_ids[:half], dataset.post_urls[:half]
+    deletable = iter(reversed(dataset.post_ids[half:]))
+    platforms = [p.value for p in Platform]
+
+    def handle(rnd):
+        platform, name = popular(rnd, handles)
+        return {'platform': platform, 'handle': name}
+
+    def delete_post(rnd):
+        return {'path': f"/posts/{next(deletable, 'missing-post')}"}
+
+    def create_post(rnd):
+        platform = rnd.choice(platforms)
+        return {'path': '/posts', 'json': {
+            'influencer_id': popular(rnd, ids), 'platform': platform, 'title': 'Benchmark post',
+            'url': f"https://{platform.lower()}.com/p/bench{rnd.getrandbits(48):x}", 'likes': rnd.randrange(10_000)}}
+
+    def metric_range(rnd):
+        low = int(1_000 * 10 ** rnd.uniform(0, 3))
+        return {'followers': {'min': low, 'max': low * 4}, 'engagement_rate': {'min': round(rnd.uniform(0.5, 4), 1)}}
+
+    return [
+        Case('GET', '/searchById', lambda rnd: {
+            'path': '/searchById', 'query_string': {'influencer_id': popular(rnd, ids)}}),
+        Case('POST', '/influencers/batch', lambda rnd: {
+            'path': '/influencers/batch', 'json': {'ids': [popular(rnd, ids) for _ in range(BATCH_SIZE)]}}),
+        Case('GET', '/searchByHandle', lambda rnd: {'path': '/searchByHandle', 'query_string': handle(rnd)}),
+        Case('POST', '/searchByHandle/batch', lambda rnd: {
+            'path': '/searchByHandle/batch', 'json': {'handles': [handle(rnd) for _ in range(BATCH_SIZE)]}}),
+        Case('GET', '/autocomplete', lambda rnd: {
+            'path': '/autocomplete', 'query_string': {'q': popular(rnd, names)[:rnd.randint(2, 4)]}}),
+        Case('GET', '/searchByName', lambda rnd: {
+            'path': '/searchByName', 'query_string': {'name': popular(rnd, names), 'limit': PAGE_LIMIT}}),
+        Case('GET', '/searchByLocation', lambda rnd: {
+            'path': '/searchByLocation', 'query_string': {'location': rnd.choice(LOCATIONS), 'limit': PAGE_LIMIT}}),
+        Case('GET', '/searchByFilters', lambda rnd: {
+            'path': '/searchByFilters', 'query_string': {'name': popular(rnd, names),
+                                                         'location': rnd.choice(LOCATIONS)}}),
+        Case('GET', '/searchByPlatform', lambda rnd: {
+            'path': '/searchByPlatform', 'query_string': {'platform': rnd.choice(platforms), 'limit': PAGE_LIMIT}}),
+        Case('GET', '/searchByCategory', lambda rnd: {
+            'path': '/searchByCategory', 'query_string': {
+                'category': rnd.choice(list(Category)).name, 'limit': PAGE_LIMIT}}),
+        Case('GET', '/searchByGender', lambda rnd: {
+            'path': '/searchByGender', 'query_string': {'gender': rnd.choice(list(Gender)).name,
+                                                        'limit': PAGE_LIMIT}}),
+        Case('POST', '/search_by_metrics', lambda rnd: {
+            'path': '/search_by_metrics', 'query_string': {'limit': PAGE_LIMIT},
+            'json': {'platform': rnd.choice(platforms), 'metrics_ranges': metric_range(rnd)}}),
+        Case('GET', '/searchByEngagementRate', lambda rnd: {
+            'path': '/searchByEngagementRate', 'query_string': {
+                'platform': rnd.choice(platforms), 'min_engagement_rate': round(rnd.uniform(8, 12), 1),
+                'max_engagement_rate': 12.5}}),
+        Case('GET', '/searchByFollowersCount', lambda rnd: {
+            'path': '/searchByFollowersCount', 'query_string': {
+                'platform': rnd.choice(platforms), 'min_followers': int(10 ** rnd.uniform(6, 7))}}),
+        Case('GET', '/facets', lambda rnd: {
+            'path': '/facets', 'query_string': {'category': rnd.choice(list(Category)).name,
+                                                'platform': rnd.choice(platforms)}}),
+        Case('GET', '/searchInfluencers', lambda rnd: {
+            'path': '/searchInfluencers', 'query_string': {
+                'location': rnd.choice(LOCATIONS), 'platform': rnd.choice(platforms),
+                'min_followers': int(10 ** rnd.uniform(3.5, 5)), 'limit': PAGE_LIMIT}}),
+        Case('POST', '/posts', create_post),
+        Case('GET', '/posts/<string:post_id>', lambda rnd: {'path': f"/posts/{popular(rnd, post_ids)}"}),
+        Case('POST', '/posts/batch-get', lambda rnd: {
+            'path': '/posts/batch-get', 'json': {'post_ids': [popular(rnd, post_ids) for _ in range(BATCH_SIZE)]}}),
+        Case('GET', '/posts', lambda rnd: {'path': '/posts', 'query_string': {'limit': PAGE_LIMIT}}),
+        Case('PUT', '/posts/<string:post_id>', lambda rnd: {
+            'path': f"/posts/{popular(rnd, post_ids)}", 'json': {'likes': rnd.randrange(100_000)}}),
+        Case('DELETE', '/posts/<string:post_id>', delete_post),
+        Case('GET', '/posts/search/influencer', lambda rnd: {
+            'path': '/posts/search/influencer', 'query_string': {'influencer_id': popular(rnd, ids),
+                                                                 'limit': PAGE_LIMIT}}),
+        Case('GET', '/posts/search/url', lambda rnd: {
+            'path': '/posts/search/url', 'query_string': {'url': popular(rnd, post_urls)}}),
+        Case('GET', '/posts/search/platform', lambda rnd: {
+            'path': '/posts/search/platform', 'query_string': {'platform': rnd.choice(platforms),
+                                                               'limit': PAGE_LIMIT}}),
+    ]
+
+
+def uncovered(app, cases: Sequence[Case], blueprints: Sequence[str] = ('influencer_metrics', 'posts')) -> List[str]:
+    """Routes of ``blueprints`` on ``app`` without a case, as 'METHOD /rule'."""
+    covered = {case.name for case in cases}
+    missing = []
+    for rule in app.url_map.iter_rules():
+        if rule.endpoint.split('.')[0] not in blueprints:
+            continue
+        for method in sorted(rule.methods - {'HEAD', 'OPTIONS'}):
+            if f"{method} {rule.rule}" not in covered:
+                missing.append(f"{method} {rule.rule}")
+    return missing
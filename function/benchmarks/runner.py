@@ -0,0 +1,247 @@
+"""Run the route benchmarks and compare two runs.
+
+``run`` generates a dataset (``benchmarks.datagen``), loads it into a
+``MemoryDynamoDB`` installed for the whole process, and drives every
+case of ``benchmarks.routes`` through Flask's test client. Per route it
+records:
+
+- latency percentiles (p50/p90/p99, mean, max) in milliseconds;
+- DynamoDB calls, items read (before filters) and capacity units per
+  request, from the backend's ``stats``;
+- peak Python allocations per request (``tracemalloc``), in a separate
+  shorter pass so tracing does not inflate the timings;
+- response status counts.
+
+Results are written as JSON. ``compare`` reads two result files and
+flags a metric as a regression when the new value exceeds the baseline
+by more than ``threshold`` (relative) and by more than the metric's
+noise floor (absolute), or when a route starts returning 5xx.
+
+With ``latency_ms`` every DynamoDB call also sleeps, which makes routes
+that issue many sequential calls stand out the way they do in AWS.
+"""
+import argparse
+import json
+import math
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Sequence
+
+from benchmarks.datagen import generate
+from benchmarks.routes import build_cases, uncovered
+
+DEFAULT_OUTPUT = 'benchmark-results.json'
+DEFAULT_THRESHOLD = 0.10
+# Metric -> smallest absolute increase that can count as a regression
+NOISE_FLOORS = {
+    'p50_ms': 0.2,
+    'p90_ms': 0.5,
+    'p99_ms': 1.0,
+    'dynamodb_calls': 0.5,
+    'items_read': 1.0,
+    'capacity_units': 0.5,
+    'alloc_peak_kb': 16.0,
+}
+
+
+def percentile(ordered: Sequence[float], q: float) -> float:
+    """Nearest-rank percentile of an ascending sequence (0 when empty)."""
+    if not ordered:
+        return 0.0
+    return ordered[max(0, min(len(ordered), math.ceil(q * len(ordered))) - 1)]
+
+
+def _totals(backend) -> Dict[str, float]:
+    stats = list(backend.stats.values())
+    return {key: sum(s[key] for s in stats) for key in ('calls', 'items', 'units')}
+
+
+def _measure(client, backend, case, rnd: random.Random, iterations: int, warmup: int,
+             alloc_iterations: int) -> Dict[str, Any]:
+    for _ in range(warmup):
+        client.open(method=case.method, **case.build(rnd))
+
+    statuses: Counter = Counter()
+    latencies: List[float] = []
+    before = _totals(backend)
+    for _ in range(iterations):
+        request = case.build(rnd)
+        start = time.perf_counter()
+        response = client.open(method=case.method, **request)
+        latencies.append((time.perf_counter() - start) * 1000)
+        statuses[response.status_code] += 1
+    after = _totals(backend)
+
+    peaks = []
+    tracemalloc.start()
+    try:
+        for _ in range(alloc_iterations):
+            request = case.build(rnd)
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+            client.open(method=case.method, **request)
+            peaks.append(tracemalloc.get_traced_memory()[1] - baseline)
+    finally:
+        tracemalloc.stop()
+
+    latencies.sort()
+    per_request = max(1, iterations)
+    return {
+        'requests': iterations,
+        'status': {str(code): count for code, count in sorted(statuses.items())},
+        'errors': sum(count for code, count in statuses.items() if code >= 500),
+        'p50_ms': round(percentile(latencies, 0.50), 3),
+        'p90_ms': round(percentile(latencies, 0.90), 3),
+        'p99_ms': round(percentile(latencies, 0.99), 3),
+        'mean_ms': round(sum(latencies) / per_request, 3),
+        'max_ms': round(latencies[-1] if latencies else 0.0, 3),
+        'dynamodb_calls': round((after['calls'] - before['calls']) / per_request, 2),
+        'items_read': round((after['items'] - before['items']) / per_request, 2),
+        'capacity_units': round((after['units'] - before['units']) / per_request, 2),
+        'alloc_peak_kb': round(sum(peaks) / len(peaks) / 1024, 1) if peaks else None,
+    }
+
+
+def run(rows: int = 10_000, seed: int = 1, iterations: int = 200, warmup: int = 20, alloc_iterations: int = 20,
+        latency_ms: float = 0.0, routes: Optional[Sequence[str]] = None) -> Dict[str, Any]:
+    """Benchmark every route (or those whose name contains one of ``routes``) on a fresh dataset."""
+    from app import app
+    from model.handle import InfluencerHandle
+    from model.index_changelog import IndexChangeLog
+    from model.influencer import Influencer, clear_indexes
+    from model.metrics import Metrics
+    from model.posts import Post
+    from benchmarks.memory_dynamodb import MemoryDynamoDB, create_tables, install, uninstall
+
+    started = time.perf_counter()
+    dataset = generate(rows=rows, seed=seed)
+    generated = time.perf_counter()
+    backend = install(MemoryDynamoDB(latency=latency_ms / 1000, seed=seed))
+    try:
+        create_tables(Influencer, Metrics, Post, InfluencerHandle, IndexChangeLog)
+        counts = dataset.load(backend)
+        loaded = time.perf_counter()
+        # In-process indexes are built from the tables on first use
+        clear_indexes()
+
+        cases = build_cases(dataset)
+        missing = uncovered(app, cases)
+        if missing:
+            raise RuntimeError(f"Routes without a benchmark case: {', '.join(missing)}")
+        if routes:
+            cases = [case for case in cases if any(r in case.name for r in routes)]
+        results = {}
+        app.testing = True
+        with app.test_client() as client:
+            for number, case in enumerate(cases):
+                results[case.name] = _measure(client, backend, case, random.Random(seed * 1000 + number),
+                                              iterations, warmup, alloc_iterations)
+    finally:
+        uninstall()
+    return {
+        'meta': {
+            'rows': rows,
+            'seed': seed,
+            'tables': counts,
+            'iterations': iterations,
+            'warmup': warmup,
+            'alloc_iterations': alloc_iterations,
+            'latency_ms': latency_ms,
+            'python': platform.python_version(),
+            'generate_seconds': round(generated - started, 2),
+            'load_seconds': round(loaded - generated, 2),
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+        },
+        'routes': results,
+    }
+
+
+def compare(base: Dict[str, Any], new: Dict[str, Any], threshold: float = DEFAULT_THRESHOLD) -> List[Dict[str, Any]]:
+    """One row per (route, metric) present in both runs; ``regression`` marks the flagged ones."""
+    rows = []
+    for route, new_stats in new['routes'].items():
+        base_stats = base['routes'].get(route)
+        if base_stats is None:
+            continue
+        if new_stats['errors'] > base_stats['errors']:
+            rows.append({'route': route, 'metric': 'errors', 'base': base_stats['errors'],
+                         'new': new_stats['errors'], 'change': None, 'regression': True})
+        for metric, floor in NOISE_FLOORS.items():
+            old, value = base_stats.get(metric), new_stats.get(metric)
+            if old is None or value is None:
+                continue
+            change = (value - old) / old if old else (math.inf if value > old else 0.0)
+            rows.append({'route': route, 'metric': metric, 'base': old, 'new': value, 'change': change,
+                         'regression': change > threshold and value - old > floor})
+    return rows
+
+
+def _print_run(result: Dict[str, Any], out=sys.stdout) -> None:
+    meta = result['meta']
+    print(f"rows={meta['rows']} tables={meta['tables']} latency_ms={meta['latency_ms']} "
+          f"generate={meta['generate_seconds']}s load={meta['load_seconds']}s", file=out)
+    print(f"{'route':<38} {'p50':>8} {'p90':>8} {'p99':>8} {'calls':>6} {'items':>8} {'units':>7} "
+          f"{'allocKB':>8}  status", file=out)
+    for route, s in result['routes'].items():
+        print(f"{route:<38} {s['p50_ms']:>8.2f} {s['p90_ms']:>8.2f} {s['p99_ms']:>8.2f} {s['dynamodb_calls']:>6.1f} "
+              f"{s['items_read']:>8.1f} {s['capacity_units']:>7.1f} {s['alloc_peak_kb'] or 0:>8.1f}  "
+              f"{s['status']}", file=out)
+
+
+def _print_comparison(rows: List[Dict[str, Any]], out=sys.stdout) -> None:
+    for row in rows:
+        if row['metric'] == 'errors':
+            change = 'new 5xx'
+        else:
+            change = f"{row['change']:+.1%}" if math.isfinite(row['change']) else 'new'
+        flag = 'REGRESSION' if row['regression'] else ''
+        print(f"{row['route']:<38} {row['metric']:<15} {row['base']:>10} {row['new']:>10} {change:>9}  {flag}",
+              file=out)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+    run_parser = commands.add_parser('run', help='benchmark every route and write a result file')
+    run_parser.add_argument('--rows', type=int, default=10_000, help='dataset rows (10k to 1M)')
+    run_parser.add_argument('--seed', type=int, default=1)
+    run_parser.add_argument('--iterations', type=int, default=200, help='timed requests per route')
+    run_parser.add_argument('--warmup', type=int, default=20, help='untimed requests per route first')
+    run_parser.add_argument('--alloc-iterations', type=int, default=20, help='traced requests per route')
+    run_parser.add_argument('--latency-ms', type=float, default=0.0, help='simulated DynamoDB latency per call')
+    run_parser.add_argument('--routes', help='comma-separated substrings selecting routes, e.g. "posts,facets"')
+    run_parser.add_argument('--output', default=DEFAULT_OUTPUT, help='result file (JSON)')
+    compare_parser = commands.add_parser('compare', help='flag regressions of NEW against BASE')
+    compare_parser.add_argument('base')
+    compare_parser.add_argument('new')
+    compare_parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                                help='relative increase that counts as a regression')
+    compare_parser.add_argument('--all', action='store_true', help='print every metric, not just regressions')
+    args = parser.parse_args(argv)
+
+    if args.command == 'run':
+        result = run(rows=args.rows, seed=args.seed, iterations=args.iterations, warmup=args.warmup,
+                     alloc_iterations=args.alloc_iterations, latency_ms=args.latency_ms,
+                     routes=[r for r in (args.routes or '').split(',') if r])
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2)
+        _print_run(result)
+        print(f"Wrote {args.output}")
+        return 0
+
+    with open(args.base) as f:
+        base = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+    rows = compare(base, new, args.threshold)
+    regressions = [row for row in rows if row['regression']]
+    _print_comparison(rows if args.all else regressions)
+    print(f"{len(regressions)} regression(s) over {len({row['route'] for row in rows})} routes "
+          f"(threshold {args.threshold:.0%})")
+    return 1 if regressions else 0
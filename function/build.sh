@@ -12,7 +12,7 @@ python3 -m pip install -r tests/requirements.txt
 coverage run -m pytest
 coverage report -m --fail-under=60
 coverage html
-flake8 ih_search_service/* tests/* --exclude requirements.txt --max-line-length 120
+flake8 ih_search_service/* tests/* benchmarks/* --exclude requirements.txt --max-line-length 120
 
 Echo "Bundling into .zip archive"
 mkdir -p build
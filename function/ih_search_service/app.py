@@ -10,10 +10,26 @@ from flask_cors import CORS
 # Register controllers (blueprints)
 from controllers.influencer_metrics_controller import bp as influencer_metrics_bp
 from controllers.posts_controller import bp as posts_bp
+from model import DYNAMODB_BACKEND
+from utils.change_stream import change_stream
+from utils.response_encoding import SearchJSONProvider, compress_response
+from utils import service_metrics, slow_queries
+from utils.tracing import end_request_trace, finish_request_trace, install as install_tracing, start_request_trace
 
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 app = Flask(__name__)
+app.json = SearchJSONProvider(app)
+# after_request hooks run in reverse order: the trace finishes after compression
+install_tracing()
+service_metrics.install()
+app.before_request(service_metrics.start_request_metrics)
+app.before_request(start_request_trace)
+app.after_request(service_metrics.record_response_status)
+app.after_request(finish_request_trace)
+app.after_request(compress_response)
+app.teardown_request(end_request_trace)
+app.teardown_request(service_metrics.finish_request_metrics)
 logging.basicConfig(level=logging.INFO)
 
 post_schema = PostSchema()
@@ -37,6 +53,26 @@ def serialize_posts(posts):
 app.register_blueprint(influencer_metrics_bp)
 app.register_blueprint(posts_bp)
 
+if 'AWS_LAMBDA_FUNCTION_NAME' not in os.environ:
+    # Prometheus scrape endpoint for the local server; Lambda flushes EMF log lines instead
+    app.add_url_rule('/metrics', 'metrics', service_metrics.metrics_response)
+    app.add_url_rule('/debug/slow-queries', 'slow_queries', slow_queries.debug_response)
+
+if 'AWS_LAMBDA_FUNCTION_NAME' in os.environ and os.environ.get('WARM_INDEXES', '1') != '0':
+    # Build the in-memory indexes during init rather than in the first requests
+    from model.influencer import warm_indexes
+    warm_indexes()
+
+if DYNAMODB_BACKEND == 'memory':
+    # The in-memory DynamoDB starts empty
+    from benchmarks.memory_dynamodb import create_tables
+    from model.handle import InfluencerHandle
+    from model.index_changelog import IndexChangeLog
+    from model.influencer import Influencer
+    from model.metrics import Metrics
+    from model.posts import Post
+    create_tables(Influencer, Metrics, Post, InfluencerHandle, IndexChangeLog)
+
 
 def handler(event, context):
     # import awsgi lazily so tests can import this module without requiring awsgi to be installed
@@ -45,7 +81,16 @@ def handler(event, context):
     except Exception:
         # If awsgi isn't available, raise — handler is only used in AWS runtime.
         raise
-    return awsgi.response(app, event, context)
+    try:
+        return awsgi.response(app, event, context)
+    finally:
+        service_metrics.flush_if_due()
+        slow_queries.log_summary_if_due()
+
+
+def stream_handler(event, context):
+    # DynamoDB Streams trigger of IHSearchStreamConsumer (template.yaml), with ReportBatchItemFailures
+    return change_stream.process(event)
 
 
 if __name__ == '__main__':
@@ -1,14 +1,40 @@
 from flask import Blueprint, request, jsonify, make_response
 import logging
+from model.handle import InfluencerHandle, handle_key, normalize_handle
 from model.influencer import Influencer
+from model.posts import Post
+from schema.posts import serialize_post
 
 from enums.platform import Platform
 from model.metrics import Metrics, MetricsEngagementRateIndex, MetricsFollowersIndex
 from utils.format_utils import format_number_short
 from utils.pagination import paginate_list, encode_token, decode_token
+from utils.fanout import FanoutError, fan_out
+from utils.read_budget import ReadBudget
+from utils.single_flight import coalesced
+from utils.streaming import ndjson_response, wants_stream
+from utils.tracing import span
 
 bp = Blueprint('influencer_metrics', __name__)
 
+# Upper bound on ids accepted by POST /influencers/batch
+MAX_BATCH_IDS = 5000
+# Upper bound on handles accepted by POST /searchByHandle/batch
+MAX_BATCH_HANDLES = 5000
+
+# Influencer ids per metrics-hydration task in search_influencers
+METRICS_HYDRATION_CHUNK = 10
+# Latest posts attached to each search_influencers result (opt-in with ?recent_posts=N, capped);
+# each one costs a GSI query per result
+RECENT_POSTS_DEFAULT = 0
+RECENT_POSTS_MAX = 10
+# Influencers hydrated per fan-out round when /searchInfluencers streams NDJSON
+# or serves a large page under a read budget
+SEARCH_HYDRATION_BATCH = 100
+# Suggestions returned by /autocomplete (?limit=N, capped)
+AUTOCOMPLETE_DEFAULT = 10
+AUTOCOMPLETE_MAX = 50
+
 
 def _paginate_response(result_iterable):
     """Helper to paginate an iterable result using request args limit/next_token.
@@ -23,7 +49,8 @@ def _paginate_response(result_iterable):
     # If model returned a (iterable, last_key) tuple, prefer server-side cursor
     if isinstance(result_iterable, tuple) and len(result_iterable) == 2:
         iterable, last_key = result_iterable
-        items = [r for r in iterable]
+        with span('results'):
+            items = [r for r in iterable]
         token = encode_token({'type': 'last_key', 'key': last_key}) if last_key else None
         return items, token
 
@@ -35,6 +62,113 @@ def _paginate_response(result_iterable):
     return page_items, out_token
 
 
+def _to_dicts(items):
+    with span('serialize'):
+        return [item.to_dict() for item in items]
+
+
+def _page_offset():
+    """Offset of the current page under in-memory (offset token) pagination."""
+    next_token = request.args.get('next_token', type=str)
+    decoded = decode_token(next_token) if next_token else None
+    return int(decoded.get('offset', 0)) if isinstance(decoded, dict) and decoded.get('type') == 'offset' else 0
+
+
+def _mark_partial(body, result):
+    """Flag a read that stopped on its budget; next_token resumes at the exact position."""
+    if getattr(result, 'partial', False):
+        body['partial'] = True
+        body['read_budget'] = result.budget.to_dict()
+    return body
+
+
+def _parse_categories(category):
+    """Map a comma-separated category string to enum values; raises KeyError on an invalid one."""
+    from enums.category import Category
+    values = []
+    for c in (c.strip().upper() for c in category.split(',')):
+        if c:
+            enum_val = Category[c]
+            values.append(getattr(enum_val, 'value', enum_val))
+    return values
+
+
+def _metric_id_queries(platform_enum, min_foll, max_foll, min_eng_rate, max_eng_rate):
+    """Build one metrics-GSI query per supplied range; each returns the matching influencer ids."""
+    queries = {}
+    if min_foll is not None or max_foll is not None:
+        def followers():
+            metric_hits = Metrics.query_platform_index(
+                'total_followers', platform_enum,
+                MetricsFollowersIndex.total_followers.between(
+                    0 if min_foll is None else min_foll,
+                    10**12 if max_foll is None else max_foll)
+            )
+            return {m.influencer_id for m in metric_hits}
+        queries['followers'] = followers
+    if min_eng_rate is not None or max_eng_rate is not None:
+        def engagement_rate():
+            metric_hits = Metrics.query_platform_index(
+                'engagement_rate', platform_enum,
+                MetricsEngagementRateIndex.engagement_rate.between(
+                    0.0 if min_eng_rate is None else min_eng_rate,
+                    100.0 if max_eng_rate is None else max_eng_rate)
+            )
+            return {m.influencer_id for m in metric_hits}
+        queries['engagement rate'] = engagement_rate
+    return queries
+
+
+def _intersect_metric_ids(index, mask, platform_enum, min_foll, max_foll, min_eng_rate, max_eng_rate):
+    """AND the metrics-GSI id sets into ``mask``, running the GSI queries concurrently.
+
+    As soon as one result leaves the intersection empty the other queries are
+    cancelled. Raises FanoutError naming the failed query.
+    """
+    masks = {}
+
+    def empties(name, ids):
+        masks[name] = index.mask_for_keys(ids)
+        return not (mask & masks[name])
+
+    fan_out(_metric_id_queries(platform_enum, min_foll, max_foll, min_eng_rate, max_eng_rate),
+            short_circuit=empties)
+    for source_mask in masks.values():
+        mask &= source_mask
+    return mask
+
+
+def _metrics_for_influencers(influencer_ids):
+    """Load the metrics of each influencer through the influencer_id GSI."""
+    metrics = []
+    for influencer_id in influencer_ids:
+        metrics.extend(Metrics.influencer_id_idx.query(influencer_id))
+    return metrics
+
+
+def _bitmap_filter_mask(index, name_q=None, location_q=None, gender_q=None, platform_q=None, categories=None):
+    """Evaluate the search_influencers attribute filters against the bitmap index.
+
+    Gender and platform match case-insensitively, name as a case-insensitive
+    substring and location hierarchically (a region matches its cities).
+    """
+    filters = {}
+    if location_q:
+        filters['location'] = Influencer.resolve_locations(location_q)
+    if gender_q:
+        filters['gender'] = [v for v in index.values('gender') if v.lower() == gender_q.lower()]
+    if platform_q:
+        filters['platform'] = [v for v in index.values('platform') if v.lower() == platform_q.lower()]
+    if categories:
+        filters['category'] = categories
+    with span('bitmap', filters=len(filters) + bool(name_q)):
+        mask = index.match(filters)
+        if name_q and mask:
+            needle = name_q.lower()
+            mask = index.filter_column(mask, 'name', lambda name: needle in (name or ''))
+    return mask
+
+
 @bp.route('/searchById', methods=['GET'])
 def search_by_id():
     influencer_id = request.args.get('influencer_id')
@@ -43,7 +177,7 @@ def search_by_id():
     try:
         result = Influencer.search_by_id(influencer_id)
         items, out_token = _paginate_response(result)
-        influencers = [influencer.to_dict() for influencer in items]
+        influencers = _to_dicts(items)
         body = {'success': True, 'data': influencers}
         if out_token:
             body['next_token'] = out_token
@@ -53,7 +187,112 @@ def search_by_id():
         return make_response(jsonify({'error': 'Failed to search by ID'}), 500)
 
 
+@bp.route('/influencers/batch', methods=['POST'])
+def get_influencers_batch():
+    """Look up many influencers by id; results follow the (de-duplicated) request order."""
+    data = request.get_json(silent=True) or {}
+    ids = data.get('ids')
+    if not isinstance(ids, list) or not ids or not all(isinstance(i, str) and i for i in ids):
+        return make_response(jsonify({'success': False, 'error': 'ids must be a non-empty list of strings'}), 400)
+    if len(ids) > MAX_BATCH_IDS:
+        return make_response(jsonify({'success': False,
+                                      'error': f'At most {MAX_BATCH_IDS} ids per request'}), 400)
+    try:
+        ordered = list(dict.fromkeys(ids))
+        found = Influencer.get_by_ids(ordered, consistent_read=bool(data.get('consistent_read', False)))
+        body = {
+            'success': True,
+            'data': _to_dicts(found[i] for i in ordered if i in found),
+            'missing': [i for i in ordered if i not in found],
+        }
+        return make_response(jsonify(body), 200)
+    except Exception as e:
+        logging.error(f"Error in batch influencer lookup: {str(e)}")
+        return make_response(jsonify({'success': False, 'error': 'Failed to look up influencers'}), 500)
+
+
+@bp.route('/searchByHandle', methods=['GET'])
+def search_by_handle():
+    """Exact handle lookup (leading '@' and case ignored), on one platform or all of them."""
+    handle = request.args.get('handle', type=str)
+    platform = request.args.get('platform', type=str)
+    if not normalize_handle(handle):
+        return make_response(jsonify({'success': False, 'error': 'No handle parameter provided'}), 400)
+    platform_enum = None
+    if platform:
+        try:
+            platform_enum = Platform[platform.upper()]
+        except KeyError:
+            return make_response(jsonify({'success': False, 'error': f'Invalid platform: {platform}'}), 400)
+    try:
+        matches = Influencer.search_by_handle(handle, platform_enum)
+        data = [{**inf.to_dict(), 'matched_platform': p.value} for p, inf in matches]
+        return make_response(jsonify({'success': True, 'data': data}), 200)
+    except Exception as e:
+        logging.error(f"Error searching by handle: {str(e)}")
+        return make_response(jsonify({'success': False, 'error': 'Failed to search by handle'}), 500)
+
+
+@bp.route('/searchByHandle/batch', methods=['POST'])
+def search_by_handle_batch():
+    """
+    Resolve many {"platform", "handle"} pairs to influencer ids; results follow the
+    request order, with influencer_id null for unknown handles. Use /influencers/batch
+    to load the influencers.
+    """
+    data = request.get_json(silent=True) or {}
+    handles = data.get('handles')
+    if (not isinstance(handles, list) or not handles
+            or not all(isinstance(h, dict) and isinstance(h.get('platform'), str)
+                       and isinstance(h.get('handle'), str) and normalize_handle(h['handle']) for h in handles)):
+        return make_response(jsonify({'success': False,
+                                      'error': 'handles must be a non-empty list of {platform, handle}'}), 400)
+    if len(handles) > MAX_BATCH_HANDLES:
+        return make_response(jsonify({'success': False,
+                                      'error': f'At most {MAX_BATCH_HANDLES} handles per request'}), 400)
+    pairs = []
+    for h in handles:
+        try:
+            pairs.append((Platform[h['platform'].upper()], h['handle']))
+        except KeyError:
+            return make_response(jsonify({'success': False, 'error': f"Invalid platform: {h['platform']}"}), 400)
+    try:
+        owners = InfluencerHandle.resolve(pairs)
+        results = []
+        for platform, handle in pairs:
+            owner = owners.get(handle_key(platform, handle))
+            results.append({'platform': platform.value, 'handle': handle,
+                            'influencer_id': owner.influencer_id if owner else None})
+        resolved = sum(1 for r in results if r['influencer_id'])
+        return make_response(jsonify({'success': True, 'data': results, 'resolved': resolved,
+                                      'not_found': len(results) - resolved}), 200)
+    except Exception as e:
+        logging.error(f"Error in batch handle lookup: {str(e)}")
+        return make_response(jsonify({'success': False, 'error': 'Failed to look up handles'}), 500)
+
+
+@bp.route('/autocomplete', methods=['GET'])
+def autocomplete():
+    """Typeahead: names and handles starting with ?q=, most followed first, served from memory."""
+    prefix = request.args.get('q', type=str)
+    if not prefix or not prefix.strip():
+        return make_response(jsonify({'success': False, 'error': 'No q parameter provided'}), 400)
+    limit = request.args.get('limit', default=AUTOCOMPLETE_DEFAULT, type=int)
+    limit = max(1, min(limit, AUTOCOMPLETE_MAX))
+    try:
+        # Never build in the request: while the index warms up there are no suggestions yet
+        index = Influencer.autocomplete_index(wait=False)
+        if not index.loaded:
+            return jsonify({'success': True, 'data': [], 'warming': True})
+        suggestions = index.complete(prefix, limit)
+    except Exception as e:
+        logging.error(f"Error loading autocomplete index: {str(e)}")
+        return make_response(jsonify({'success': False, 'error': 'Failed to load suggestions'}), 500)
+    return jsonify({'success': True, 'data': suggestions})
+
+
 @bp.route('/searchByName', methods=['GET'])
+@coalesced
 def search_by_name():
     name = request.args.get('name')
     if not name:
@@ -71,13 +310,14 @@ def search_by_name():
             except Exception:
                 return make_response(jsonify({'success': False, 'error': 'Invalid next_token'}), 400)
 
-        result = Influencer.search_by_name(name, limit=limit, exclusive_start_key=exclusive_start_key)
+        result = Influencer.search_by_name(name, limit=limit, exclusive_start_key=exclusive_start_key,
+                                           budget=ReadBudget.from_request())
         items, out_token = _paginate_response(result)
-        influencers = [influencer.to_dict() for influencer in items]
+        influencers = _to_dicts(items)
         body = {'success': True, 'data': influencers}
         if out_token:
             body['next_token'] = out_token
-        return make_response(jsonify(body), 200)
+        return make_response(jsonify(_mark_partial(body, result)), 200)
     except Exception as e:
         logging.error(f"Error searching by name: {str(e)}")
         return make_response(jsonify({'success': False, 'error': 'Failed to search by name'}), 500)
@@ -101,7 +341,7 @@ def search_by_location():
                 return make_response(jsonify({'success': False, 'error': 'Invalid next_token'}), 400)
         result = Influencer.search_by_location(location, limit=limit, exclusive_start_key=exclusive_start_key)
         items, out_token = _paginate_response(result)
-        influencers = [influencer.to_dict() for influencer in items]
+        influencers = _to_dicts(items)
         body = {'success': True, 'data': influencers}
         if out_token:
             body['next_token'] = out_token
@@ -116,21 +356,22 @@ def search_by_filters():
     influencer_id = request.args.get('influencer_id')
     name = request.args.get('name')
     location = request.args.get('location')
+    if not (influencer_id or name or location):
+        return make_response(jsonify({'success': False,
+                                      'error': 'Provide at least one of influencer_id, name or location'}), 400)
     try:
-        limit = request.args.get('limit', type=int)
         next_token = request.args.get('next_token', type=str)
-        exclusive_start_key = None
         if next_token:
             try:
-                decoded = decode_token(next_token)
-                if isinstance(decoded, dict) and decoded.get('type') == 'last_key':
-                    exclusive_start_key = decoded.get('key')
+                decode_token(next_token)
             except Exception:
                 return make_response(jsonify({'success': False, 'error': 'Invalid next_token'}), 400)
 
-        result = Influencer.search_by_filters(influencer_id, name, location)
-        items, out_token = _paginate_response(result)
-        influencers = [influencer.to_dict() for influencer in items]
+        # Intersect id sets first; only the requested page is fetched
+        ids = Influencer.search_by_filters(influencer_id, name, location)
+        page_ids, out_token = _paginate_response(ids)
+        found = Influencer.get_by_ids(page_ids)
+        influencers = _to_dicts(found[i] for i in page_ids if i in found)
         body = {'success': True, 'data': influencers}
         if out_token:
             body['next_token'] = out_token
@@ -141,6 +382,7 @@ def search_by_filters():
 
 
 @bp.route('/searchByPlatform', methods=['GET'])
+@coalesced
 def search_by_platform():
     platform = request.args.get('platform')
     if not platform:
@@ -157,15 +399,16 @@ def search_by_platform():
                     exclusive_start_key = decoded.get('key')
             except Exception:
                 return make_response(jsonify({'success': False, 'error': 'Invalid next_token'}), 400)
-        result = Influencer.search_by_platform(platform_enum, limit=limit, exclusive_start_key=exclusive_start_key)
+        result = Influencer.search_by_platform(platform_enum, limit=limit, exclusive_start_key=exclusive_start_key,
+                                               budget=ReadBudget.from_request())
         if result is None:
             result = []
         items, out_token = _paginate_response(result)
-        influencers = [influencer.to_dict() for influencer in items]
+        influencers = _to_dicts(items)
         body = {'success': True, 'data': influencers}
         if out_token:
             body['next_token'] = out_token
-        return make_response(jsonify(body), 200)
+        return make_response(jsonify(_mark_partial(body, result)), 200)
     except KeyError:
         return make_response(jsonify({'success': False, 'error': f"Invalid platform: {platform}"}), 400)
     except Exception as e:
@@ -174,6 +417,7 @@ def search_by_platform():
 
 
 @bp.route('/searchByCategory', methods=['GET'])
+@coalesced
 def search_by_category():
     category = request.args.get('category')
     if not category:
@@ -204,15 +448,16 @@ def search_by_category():
             except Exception:
                 return make_response(jsonify({'success': False, 'error': 'Invalid next_token'}), 400)
 
-        result = Influencer.search_by_category(valid_values, limit=limit, exclusive_start_key=exclusive_start_key)
+        result = Influencer.search_by_category(valid_values, limit=limit, exclusive_start_key=exclusive_start_key,
+                                               budget=ReadBudget.from_request())
         if result is None:
             result = []
         items, out_token = _paginate_response(result)
-        influencers = [influencer.to_dict() for influencer in items]
+        influencers = _to_dicts(items)
         body = {'success': True, 'data': influencers}
         if out_token:
             body['next_token'] = out_token
-        return make_response(jsonify(body), 200)
+        return make_response(jsonify(_mark_partial(body, result)), 200)
     except KeyError:
         return make_response(jsonify({'success': False, 'error': f"Invalid category: {category}"}), 400)
     except Exception as e:
@@ -242,7 +487,7 @@ def search_by_gender():
         if result is None:
             result = []
         items, out_token = _paginate_response(result)
-        influencers = [influencer.to_dict() for influencer in items]
+        influencers = _to_dicts(items)
         body = {'success': True, 'data': influencers}
         if out_token:
             body['next_token'] = out_token
@@ -271,13 +516,17 @@ def search_by_metrics():
             except Exception:
                 return make_response(jsonify({'success': False, 'error': 'Invalid next_token'}), 400)
 
-        results = Influencer.search_by_metrics(metrics_ranges, platform)
+        results = Influencer.search_by_metrics(metrics_ranges, platform, limit=limit,
+                                               exclusive_start_key=exclusive_start_key,
+                                               budget=ReadBudget.from_request())
         items, out_token = _paginate_response(results)
-        results_dict = [influencer.to_dict() for influencer in items]
+        results_dict = _to_dicts(items)
         body = {"success": True, "data": results_dict}
         if out_token:
             body['next_token'] = out_token
-        return jsonify(body), 200
+        return jsonify(_mark_partial(body, results)), 200
+    except ValueError as e:
+        return make_response(jsonify({'success': False, 'error': str(e)}), 400)
     except Exception as e:
         logging.error(f"Error searching by metrics: {str(e)}")
         return make_response(jsonify({'success': False, 'error': 'Failed to search by metrics'}), 500)
@@ -297,7 +546,7 @@ def search_by_engagement_rate():
     try:
         result = Metrics.search_by_engagement_rate(min_engagement_rate, max_engagement_rate, platform_enum)
         items, out_token = _paginate_response(result)
-        metrics = [m.to_dict() for m in items]
+        metrics = _to_dicts(items)
         body = {'success': True, 'data': metrics}
         if out_token:
             body['next_token'] = out_token
@@ -321,7 +570,7 @@ def search_by_followers_count():
     try:
         result = Metrics.search_by_followers_count(min_followers, max_followers, platform_enum)
         items, out_token = _paginate_response(result)
-        metrics = [m.to_dict() for m in items]
+        metrics = _to_dicts(items)
         body = {'success': True, 'data': metrics}
         if out_token:
             body['next_token'] = out_token
@@ -331,7 +580,174 @@ def search_by_followers_count():
         return make_response(jsonify({'success': False, 'error': 'Failed to search by followers count'}), 500)
 
 
+@bp.route('/facets', methods=['GET'])
+@coalesced
+def facets():
+    """Per-value counts for category, gender, platform and location under the search_influencers filters."""
+    try:
+        name_q = request.args.get("name", type=str)
+        location_q = request.args.get("location", type=str)
+        gender_q = request.args.get("gender", type=str)
+        platform_q = request.args.get("platform", type=str)
+        category_q = request.args.get("category", type=str)
+        min_foll = request.args.get("min_followers", type=int)
+        max_foll = request.args.get("max_followers", type=int)
+        min_eng_rate = request.args.get("min_engagement_rate", type=float)
+        max_eng_rate = request.args.get("max_engagement_rate", type=float)
+
+        try:
+            categories = _parse_categories(category_q) if category_q else None
+        except KeyError:
+            return make_response(jsonify({'success': False, 'error': f"Invalid category: {category_q}"}), 400)
+
+        index = Influencer.bitmap_index()
+        mask = _bitmap_filter_mask(index, name_q, location_q, gender_q, platform_q, categories)
+
+        if mask and platform_q and any(v is not None for v in (min_foll, max_foll, min_eng_rate, max_eng_rate)):
+            try:
+                platform_enum = Platform[platform_q.upper()]
+            except KeyError:
+                platform_enum = None
+            if platform_enum is None:
+                mask = 0
+            else:
+                mask = _intersect_metric_ids(index, mask, platform_enum, min_foll, max_foll,
+                                             min_eng_rate, max_eng_rate)
+
+        body = {'success': True, 'data': {'total': index.count(mask), 'facets': index.facet_counts(mask)}}
+        return make_response(jsonify(body), 200)
+    except Exception as e:
+        logging.error(f"Error computing facets: {str(e)}")
+        return make_response(jsonify({'success': False, 'error': 'Failed to compute facets'}), 500)
+
+
+def _platform_icon(platform_name: str) -> str:
+    return {
+        "instagram": "/instagram.svg",
+        "tiktok": "/tiktok.svg",
+    }.get(platform_name.lower(), "generic")
+
+
+def _socials(inf, metrics_list):
+    socials = []
+    platform_metrics = {m.get("platform"): m for m in metrics_list or []}
+
+    for p in getattr(inf, "platforms", []):
+        platform_name = getattr(p.platform, "value", getattr(p, "platform", str(p)))
+        handle = getattr(p, "influencer_handle", "") or ""
+        metric = platform_metrics.get(platform_name, {})
+
+        socials.append({
+            "icon": _platform_icon(platform_name),
+            "platform": platform_name,
+            "handle": handle,
+            "value": handle,
+            "engagement": f"{metric.get('engagement_rate', 0.0)}%",
+            "followers": format_number_short(metric.get("total_followers", 0)) if metric else "",
+            "likes": format_number_short(metric.get("total_likes", 0)) if metric else "",
+            "posts": metric.get("total_posts", 0) if metric else 0,
+        })
+    return socials
+
+
+def _summarize_metrics(data_list):
+    totals = {
+        "total_followers": 0,
+        "total_likes": 0,
+        "total_posts": 0,
+        "total_comments": 0,
+        "total_shares": 0,
+        "total_views": 0,
+    }
+
+    platforms = set()
+    max_engagement = 0.0
+
+    for rec in data_list or []:
+        for key in totals:
+            totals[key] += rec.get(key, 0)
+        if platform := rec.get("platform"):
+            platforms.add(platform)
+        max_engagement = max(max_engagement, rec.get("engagement_rate", 0.0))
+
+    totals["engagement_rate"] = max_engagement
+    totals["platforms"] = sorted(platforms)
+    return totals
+
+
+def _serialize_search_result(inf, influencer_metrics, recent_posts):
+    """Serialize influencer data with aggregated metrics and socials."""
+    combined = _summarize_metrics(influencer_metrics)
+
+    platforms = getattr(inf, "platforms", [])
+    default_platform = platforms[0] if platforms else None
+
+    category_attr = getattr(inf, "category", [])
+    categories = [category_attr] if isinstance(category_attr, str) else list(category_attr or [])
+
+    return {
+        "id": inf.influencer_id,
+        "name": inf.name,
+        "avatar": getattr(default_platform, "profile_img_url", ""),
+        "bio": getattr(default_platform, "influencer_bio", ""),
+        "engagement": f"{combined.get('engagement_rate', 0.0)}%",
+        "reach": format_number_short(combined.get("total_followers", 0)),
+        "totalFollowers": format_number_short(combined.get("total_followers", 0)),
+        "totalLikes": format_number_short(combined.get("total_likes", 0)),
+        "posts": combined.get("total_posts", 0),
+        "categories": categories,
+        "platforms": combined.get("platforms", []),
+        "socials": _socials(inf, influencer_metrics),
+        "tag": categories[0] if categories else "",
+        "gender": getattr(getattr(inf, "gender", None), "value", None),
+        "recentPosts": recent_posts,
+        "conversions": combined.get("conversions", 0),
+        "progress": combined.get("progress", 0),
+    }
+
+
+def _hydrate_search_results(page_ids, recent_posts_n):
+    """Load and serialize the influencers of ``page_ids`` (in order) with their metrics and
+    latest posts; all lookups are fanned out concurrently. Raises FanoutError."""
+    def load_metrics(chunk):
+        try:
+            return _metrics_for_influencers(chunk)
+        except Exception as e:
+            logging.error(f"Error loading metrics for influencers: {e}")
+            return []
+
+    calls = {}
+    if page_ids:
+        calls['influencers'] = lambda: list(Influencer.batch_get(page_ids))
+        for start in range(0, len(page_ids), METRICS_HYDRATION_CHUNK):
+            chunk = page_ids[start:start + METRICS_HYDRATION_CHUNK]
+            calls[f'metrics[{start}]'] = lambda chunk=chunk: load_metrics(chunk)
+        if recent_posts_n:
+            # Bounded "last N posts" per influencer from influencer_post_created_at_index
+            for influencer_id in page_ids:
+                calls[f'posts[{influencer_id}]'] = (
+                    lambda influencer_id=influencer_id: Post.get_recent_posts(
+                        influencer_id, limit=recent_posts_n)[0])
+    with span('hydrate', influencers=len(page_ids)):
+        hydrated = fan_out(calls)
+
+    with span('serialize'):
+        loaded = {inf.influencer_id: inf for inf in hydrated.get('influencers', [])}
+        metrics_map = {}
+        recent_posts_map = {}
+        for name, results in hydrated.items():
+            if name.startswith('metrics'):
+                for m in results:
+                    metrics_map.setdefault(m.influencer_id, []).append(m.to_dict())
+            elif name.startswith('posts'):
+                for post in results:
+                    recent_posts_map.setdefault(post.influencer_id, []).append(serialize_post(post))
+        return [_serialize_search_result(loaded[i], metrics_map.get(i, []), recent_posts_map.get(i, []))
+                for i in page_ids if i in loaded]
+
+
 @bp.route('/searchInfluencers', methods=['GET'])
+@coalesced
 def search_influencers():
     try:
         name_q = request.args.get("name", type=str)
@@ -343,7 +759,9 @@ def search_influencers():
         min_eng_rate = request.args.get("min_engagement_rate", type=float)
         max_eng_rate = request.args.get("max_engagement_rate", type=float)
 
-        influencer_ids = None
+        category_q = request.args.get("category", type=str)
+        recent_posts_n = request.args.get("recent_posts", default=RECENT_POSTS_DEFAULT, type=int)
+        recent_posts_n = max(0, min(recent_posts_n, RECENT_POSTS_MAX))
 
         # If a platform is provided but invalid, return empty results early
         if platform_q:
@@ -353,195 +771,64 @@ def search_influencers():
             except Exception:
                 return make_response(jsonify({"success": True, "data": []}), 200)
 
-        if platform_q and ((min_foll is not None or max_foll is not None)
-                           or (min_eng_rate is not None or max_eng_rate is not None)):
-            from enums.platform import Platform
-            try:
-                platform_enum = Platform[platform_q.upper()]
-            except KeyError:
-                # Treat invalid platform as no matches (return empty list with 200)
-                return make_response(jsonify({"success": True, "data": []}), 200)
-
-            ids_sets = []
-
-            if min_foll is not None or max_foll is not None:
-                if min_foll is None:
-                    min_foll = 0
-                if max_foll is None:
-                    max_foll = 10**12
-                try:
-                    metric_hits = Metrics.platform_followers_idx.query(
-                        platform_enum,
-                        MetricsFollowersIndex.total_followers.between(
-                            min_foll, max_foll)
-                    )
-                    ids_sets.append({m.influencer_id for m in metric_hits})
-                except Exception as e:
-                    logging.error(f"Error querying metrics for followers: {e}")
-                    return make_response(jsonify({'success': False,
-                                                  'error': 'Failed to query metrics for followers'}), 500)
-
-            if min_eng_rate is not None or max_eng_rate is not None:
-                if min_eng_rate is None:
-                    min_eng_rate = 0.0
-                if max_eng_rate is None:
-                    max_eng_rate = 100.0
-                try:
-                    metric_hits = Metrics.platform_engagement_rate_idx.query(
-                        platform_enum,
-                        MetricsEngagementRateIndex.engagement_rate.between(
-                            min_eng_rate, max_eng_rate)
-                    )
-                    ids_sets.append({m.influencer_id for m in metric_hits})
-                except Exception as e:
-                    logging.error(
-                        f"Error querying metrics for engagement rate: {e}")
-                    return make_response(jsonify({'success': False,
-                                                  'error': 'Failed to query metrics for engagement rate'}), 500)
-
-            if ids_sets:
-                influencer_ids = set.intersection(
-                    *ids_sets) if len(ids_sets) > 1 else ids_sets[0]
-            else:
-                influencer_ids = None
-
-            if influencer_ids is not None and not influencer_ids:
-                return make_response(jsonify({"success": True, "data": []}), 200)
+        try:
+            categories = _parse_categories(category_q) if category_q else None
+        except KeyError:
+            return make_response(jsonify({'success': False, 'error': f"Invalid category: {category_q}"}), 400)
 
-        influencers = []
+        # Equality filters are answered by intersecting per-value bitmaps;
+        # only the ids that survive are ever loaded from DynamoDB.
         try:
-            if influencer_ids is not None:
-                for inf in Influencer.batch_get(list(influencer_ids)):
-                    influencers.append(inf)
-            else:
-                influencers = list(Influencer.scan())
+            index = Influencer.bitmap_index()
         except Exception as e:
             logging.error(f"Error loading influencers: {e}")
             return make_response(jsonify({'success': False,
                                           'error': 'Failed to load influencers'}), 500)
+        mask = _bitmap_filter_mask(index, name_q, location_q, gender_q, platform_q, categories)
 
-        def matches(inf):
-            if name_q and name_q.lower() not in (inf.name or "").lower():
-                return False
-            if location_q and (inf.location or "") != location_q:
-                return False
-            if gender_q:
-                gender_val = getattr(inf.gender, "value", None)
-                if not gender_val or gender_val.lower() != gender_q.lower():
-                    return False
-            if platform_q:
-                if not any(
-                    getattr(p, "platform", None) and getattr(
-                        p.platform, "value", "").lower() == platform_q.lower()
-                    for p in getattr(inf, "platforms", [])
-                ):
-                    return False
-            return True
-
-        filtered = [inf for inf in influencers if matches(inf)]
-
-        # Apply pagination to filtered influencers
-        items, out_token = _paginate_response(filtered)
-        filtered = items
-
-        influencer_ids_list = [inf.influencer_id for inf in filtered]
-        metrics_map = {}
-        if influencer_ids_list:
+        if mask and platform_q and ((min_foll is not None or max_foll is not None)
+                                    or (min_eng_rate is not None or max_eng_rate is not None)):
+            from enums.platform import Platform
+            platform_enum = Platform[platform_q.upper()]
             try:
-                metrics1 = []
-                for influencer_id in influencer_ids_list:
-                    metrics1.extend(Metrics.scan(Metrics.influencer_id == influencer_id))
-                for m in metrics1:
-                    metrics_map.setdefault(m.influencer_id, []).append(m.to_dict())
-            except Exception as e:
-                logging.error(f"Error loading metrics for influencers: {e}")
-
-            def serialize(inf):
-                """Serialize influencer data with aggregated metrics and socials."""
-
-                def get_platform_icon(platform_name: str) -> str:
-                    return {
-                        "instagram": "/instagram.svg",
-                        "tiktok": "/tiktok.svg",
-                    }.get(platform_name.lower(), "generic")
-
-                def get_socials(inf, metrics_list):
-                    socials = []
-                    platform_metrics = {m.get("platform"): m for m in metrics_list or []}
-
-                    for p in getattr(inf, "platforms", []):
-                        platform_name = getattr(p.platform, "value", getattr(p, "platform", str(p)))
-                        handle = getattr(p, "influencer_handle", "") or ""
-                        metric = platform_metrics.get(platform_name, {})
-
-                        socials.append({
-                            "icon": get_platform_icon(platform_name),
-                            "platform": platform_name,
-                            "handle": handle,
-                            "value": handle,
-                            "engagement": f"{metric.get('engagement_rate', 0.0)}%",
-                            "followers": format_number_short(metric.get("total_followers", 0)) if metric else "",
-                            "likes": format_number_short(metric.get("total_likes", 0)) if metric else "",
-                            "posts": metric.get("total_posts", 0) if metric else 0,
-                        })
-                    return socials
-
-                def summarize_metrics_data(data_list):
-                    totals = {
-                        "total_followers": 0,
-                        "total_likes": 0,
-                        "total_posts": 0,
-                        "total_comments": 0,
-                        "total_shares": 0,
-                        "total_views": 0,
-                    }
-
-                    platforms = set()
-                    max_engagement = 0.0
-
-                    for rec in data_list or []:
-                        for key in totals:
-                            totals[key] += rec.get(key, 0)
-                        if platform := rec.get("platform"):
-                            platforms.add(platform)
-                        max_engagement = max(max_engagement, rec.get("engagement_rate", 0.0))
-
-                    totals["engagement_rate"] = max_engagement
-                    totals["platforms"] = sorted(platforms)
-                    return totals
-
-                # --- Compute ---
-                influencer_metrics = metrics_map.get(inf.influencer_id, [])
-                combined = summarize_metrics_data(influencer_metrics)
-
-                platforms = getattr(inf, "platforms", [])
-                default_platform = platforms[0] if platforms else None
-
-                category_attr = getattr(inf, "category", [])
-                categories = [category_attr] if isinstance(category_attr, str) else list(category_attr or [])
-
-                # --- Final Output ---
-                return {
-                    "id": inf.influencer_id,
-                    "name": inf.name,
-                    "avatar": getattr(default_platform, "profile_img_url", ""),
-                    "bio": getattr(default_platform, "influencer_bio", ""),
-                    "engagement": f"{combined.get('engagement_rate', 0.0)}%",
-                    "reach": format_number_short(combined.get("total_followers", 0)),
-                    "totalFollowers": format_number_short(combined.get("total_followers", 0)),
-                    "totalLikes": format_number_short(combined.get("total_likes", 0)),
-                    "posts": combined.get("total_posts", 0),
-                    "categories": categories,
-                    "platforms": combined.get("platforms", []),
-                    "socials": get_socials(inf, influencer_metrics),
-                    "tag": categories[0] if categories else "",
-                    "gender": getattr(getattr(inf, "gender", None), "value", None),
-                    "recentPosts": getattr(inf, "recent_posts", []),
-                    "conversions": combined.get("conversions", 0),
-                    "progress": combined.get("progress", 0),
-                }
-
-        body = {"success": True, "data": [serialize(inf) for inf in filtered]}
+                mask = _intersect_metric_ids(index, mask, platform_enum, min_foll, max_foll,
+                                             min_eng_rate, max_eng_rate)
+            except FanoutError as e:
+                logging.error(f"Error querying metrics for {e.source}: {e.cause}")
+                return make_response(jsonify({'success': False,
+                                              'error': f'Failed to query metrics for {e.source}'}), 500)
+
+        # Paginate over the matching ids, then hydrate only the requested page
+        page_ids, out_token = _paginate_response(index.keys(mask))
+
+        if wants_stream():
+            # Possibly unbounded: hydrate and write one chunk at a time
+            return ndjson_response(
+                (row for start in range(0, len(page_ids), SEARCH_HYDRATION_BATCH)
+                 for row in _hydrate_search_results(page_ids[start:start + SEARCH_HYDRATION_BATCH],
+                                                    recent_posts_n)),
+                lambda: {'next_token': out_token}, 'Failed to load influencers')
+        # Large (e.g. unfiltered, unlimited) pages are hydrated in batches under
+        # a read budget; if it runs out, the rest is left to an offset token.
+        budget = ReadBudget.from_request()
+        data = []
+        hydrated = 0
+        try:
+            while hydrated < len(page_ids) and not (hydrated and budget.exhausted_by):
+                batch = page_ids[hydrated:hydrated + SEARCH_HYDRATION_BATCH]
+                data.extend(_hydrate_search_results(batch, recent_posts_n))
+                budget.charge(scanned=len(batch))
+                hydrated += len(batch)
+        except FanoutError as e:
+            logging.error(f"Error loading influencers ({e.source}): {e.cause}")
+            return make_response(jsonify({'success': False,
+                                          'error': 'Failed to load influencers'}), 500)
+
+        body = {"success": True, "data": data}
+        if hydrated < len(page_ids):
+            body['partial'] = True
+            body['read_budget'] = budget.to_dict()
+            out_token = encode_token({'type': 'offset', 'offset': _page_offset() + hydrated})
         if out_token:
             body['next_token'] = out_token
         return make_response(jsonify(body), 200)
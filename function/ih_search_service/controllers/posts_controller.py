@@ -1,15 +1,21 @@
+from datetime import datetime, timezone
 from flask import Blueprint, request, jsonify, make_response
+import logging
 from enums.platform import Platform
-from schema.posts import PostSchema
+from schema.posts import PostSchema, post_schema, serialize_post
 from model.posts import Post
-from model.unicode_enum_attribute import UnicodeEnumAttribute
-from utils.pagination import paginate_list
+from utils.pagination import paginate_list, encode_token, decode_token
+from utils.single_flight import coalesced
+from utils.streaming import ndjson_response, wants_stream
+from utils.tracing import span
 
 bp = Blueprint('posts', __name__)
 
-post_schema = PostSchema()
 posts_schema = PostSchema(many=True)
 
+# Upper bound on ids accepted by POST /posts/batch-get
+MAX_BATCH_POST_IDS = 1000
+
 
 def _paginate_response(result_iterable):
     limit = request.args.get('limit', type=int)
@@ -18,10 +24,10 @@ def _paginate_response(result_iterable):
     # Support DB-backed return of (iterable, last_key)
     if isinstance(result_iterable, tuple) and len(result_iterable) == 2:
         iterable, last_key = result_iterable
-        items = [r for r in iterable]
+        with span('results'):
+            items = [r for r in iterable]
         token = None
         if last_key:
-            from ..utils.pagination import encode_token
             token = encode_token({'type': 'last_key', 'key': last_key})
         return items, token
 
@@ -32,15 +38,43 @@ def _paginate_response(result_iterable):
     return page_items, out_token
 
 
-def serialize_post(post):
-    data = post_schema.dump(post)
-    if 'platform' in data and isinstance(post.platform, Platform):
-        data['platform'] = UnicodeEnumAttribute(Platform).serialize(post.platform)
-    return data
+def serialize_posts(posts):
+    with span('serialize'):
+        return [serialize_post(post) for post in posts]
 
 
-def serialize_posts(posts):
-    return [serialize_post(post) for post in posts]
+def _stream_posts(result):
+    """NDJSON-stream a model result (``(iterator, last_key)`` or a plain iterable) page by page."""
+    iterable = result[0] if isinstance(result, tuple) else result
+
+    def trailer():
+        # Read after exhaustion: the cursor is only final once the iterator stops
+        last_key = getattr(iterable, 'last_evaluated_key', None)
+        return {'next_token': encode_token({'type': 'last_key', 'key': last_key}) if last_key else None}
+
+    return ndjson_response((serialize_post(post) for post in iterable), trailer, 'Failed to stream posts')
+
+
+def _parse_projection(attributes):
+    """Validate a projection (list or comma-separated string of Post attributes).
+    Returns (attributes_or_None, error_or_None)."""
+    if attributes is None:
+        return None, None
+    if isinstance(attributes, str):
+        attributes = [a.strip() for a in attributes.split(',') if a.strip()]
+    if not isinstance(attributes, list) or not all(isinstance(a, str) for a in attributes):
+        return None, 'attributes must be a list of attribute names'
+    unknown = sorted(set(attributes) - set(Post.get_attributes()))
+    if unknown:
+        return None, f"Unknown attributes: {', '.join(unknown)}"
+    return list(dict.fromkeys(['post_id', *attributes])), None
+
+
+def serialize_projected_post(post, attributes):
+    data = serialize_post(post)
+    if attributes is None:
+        return data
+    return {k: v for k, v in data.items() if k in attributes}
 
 
 @bp.route('/posts', methods=['POST'])
@@ -77,10 +111,42 @@ def create_post():
 
 @bp.route('/posts/<string:post_id>', methods=['GET'])
 def get_post(post_id):
-    post = Post.get_post_by_id(post_id)
+    attributes, error = _parse_projection(request.args.get('attributes'))
+    if error:
+        return make_response(jsonify({'success': False, 'error': error}), 400)
+    consistent_read = request.args.get('consistent_read', '').lower() in ('1', 'true')
+    post = Post.get_post_by_id(post_id, consistent_read=consistent_read, attributes_to_get=attributes)
     if not post:
         return make_response(jsonify({'success': False, 'error': 'Post not found'}), 404)
-    return make_response(jsonify({'success': True, 'data': serialize_post(post)}), 200)
+    return make_response(jsonify({'success': True, 'data': serialize_projected_post(post, attributes)}), 200)
+
+
+@bp.route('/posts/batch-get', methods=['POST'])
+def batch_get_posts():
+    """Fetch many posts in one call; results follow the (de-duplicated) request order."""
+    data = request.get_json(silent=True) or {}
+    post_ids = data.get('post_ids')
+    if not isinstance(post_ids, list) or not post_ids or not all(isinstance(i, str) and i for i in post_ids):
+        return make_response(jsonify({'success': False, 'error': 'post_ids must be a non-empty list of strings'}), 400)
+    if len(post_ids) > MAX_BATCH_POST_IDS:
+        return make_response(jsonify({'success': False,
+                                      'error': f'At most {MAX_BATCH_POST_IDS} post_ids per request'}), 400)
+    attributes, error = _parse_projection(data.get('attributes'))
+    if error:
+        return make_response(jsonify({'success': False, 'error': error}), 400)
+    try:
+        ordered = list(dict.fromkeys(post_ids))
+        found = Post.get_posts_by_ids(ordered, consistent_read=bool(data.get('consistent_read', False)),
+                                      attributes_to_get=attributes)
+    except Exception as e:
+        logging.error(f"Error in batch post lookup: {e}")
+        return make_response(jsonify({'success': False, 'error': 'Failed to get posts'}), 500)
+    body = {
+        'success': True,
+        'data': [serialize_projected_post(found[i], attributes) for i in ordered if i in found],
+        'missing': [i for i in ordered if i not in found],
+    }
+    return make_response(jsonify(body), 200)
 
 
 @bp.route('/posts', methods=['GET'])
@@ -90,13 +156,14 @@ def get_all_posts():
     exclusive_start_key = None
     if next_token:
         try:
-            from ..utils.pagination import decode_token
             decoded = decode_token(next_token)
             if isinstance(decoded, dict) and decoded.get('type') == 'last_key':
                 exclusive_start_key = decoded.get('key')
         except Exception:
             return make_response(jsonify({'success': False, 'error': 'Invalid next_token'}), 400)
     posts = Post.get_all_posts(limit=limit, exclusive_start_key=exclusive_start_key)
+    if wants_stream():
+        return _stream_posts(posts)
     items, out_token = _paginate_response(posts)
     body = {'success': True, 'data': serialize_posts(items)}
     if out_token:
@@ -106,10 +173,11 @@ def get_all_posts():
 
 @bp.route('/posts/<string:post_id>', methods=['PUT'])
 def update_post(post_id):
-    post = Post.get_post_by_id(post_id)
+    post = Post.get_post_by_id(post_id, consistent_read=True)
     if not post:
         return make_response(jsonify({'success': False, 'error': 'Post not found'}), 404)
     data = request.get_json()
+    previous_contribution = post.metrics_contribution()
     # update supported fields including string formatted metric fields and post metadata
     for field in ['title', 'url', 'description', 
                   'likes', 'likes_str', 'comments', 
@@ -124,7 +192,7 @@ def update_post(post_id):
                     return make_response(jsonify({'success': False, 'error': f'Invalid platform: {data[field]}'}), 400)
             else:
                 setattr(post, field, data[field])
-    post.update_post()
+    post.update_post(previous_contribution)
     return make_response(jsonify({'success': True, 'data': serialize_post(post)}), 200)
 
 
@@ -136,6 +204,15 @@ def delete_post(post_id):
     return make_response(jsonify({'success': True, 'message': 'Post deleted successfully'}), 200)
 
 
+def _parse_datetime_arg(name):
+    """Parse an ISO-8601 query arg into an aware UTC datetime; raises ValueError if malformed."""
+    value = request.args.get(name)
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value)
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
 @bp.route('/posts/search/influencer', methods=['GET'])
 def search_posts_by_influencer():
     influencer_id = request.args.get('influencer_id')
@@ -146,14 +223,26 @@ def search_posts_by_influencer():
     exclusive_start_key = None
     if next_token:
         try:
-            from ..utils.pagination import decode_token
             decoded = decode_token(next_token)
             if isinstance(decoded, dict) and decoded.get('type') == 'last_key':
                 exclusive_start_key = decoded.get('key')
         except Exception:
             return make_response(jsonify({'success': False, 'error': 'Invalid next_token'}), 400)
-    posts = Post.get_posts_by_influencer_id(influencer_id, limit=limit, exclusive_start_key=exclusive_start_key)
-    print(posts)
+
+    order = request.args.get('order')
+    if order is not None or request.args.get('since') or request.args.get('until'):
+        # Time-ordered mode served by influencer_post_created_at_index
+        if order not in (None, 'asc', 'desc'):
+            return make_response(jsonify({'success': False, 'error': f'Invalid order: {order}'}), 400)
+        try:
+            since = _parse_datetime_arg('since')
+            until = _parse_datetime_arg('until')
+        except ValueError:
+            return make_response(jsonify({'success': False, 'error': 'since/until must be ISO-8601 datetimes'}), 400)
+        posts = Post.get_recent_posts(influencer_id, since=since, until=until, descending=order != 'asc',
+                                      limit=limit, exclusive_start_key=exclusive_start_key)
+    else:
+        posts = Post.get_posts_by_influencer_id(influencer_id, limit=limit, exclusive_start_key=exclusive_start_key)
     items, out_token = _paginate_response(posts)
     body = {'success': True, 'data': serialize_posts(items)}
     if out_token:
@@ -171,7 +260,6 @@ def search_posts_by_url():
     exclusive_start_key = None
     if next_token:
         try:
-            from ..utils.pagination import decode_token
             decoded = decode_token(next_token)
             if isinstance(decoded, dict) and decoded.get('type') == 'last_key':
                 exclusive_start_key = decoded.get('key')
@@ -186,6 +274,7 @@ def search_posts_by_url():
 
 
 @bp.route('/posts/search/platform', methods=['GET'])
+@coalesced
 def search_posts_by_platform():
     platform = request.args.get('platform')
     if not platform:
@@ -199,13 +288,14 @@ def search_posts_by_platform():
     exclusive_start_key = None
     if next_token:
         try:
-            from ..utils.pagination import decode_token
             decoded = decode_token(next_token)
             if isinstance(decoded, dict) and decoded.get('type') == 'last_key':
                 exclusive_start_key = decoded.get('key')
         except Exception:
             return make_response(jsonify({'success': False, 'error': 'Invalid next_token'}), 400)
     posts = Post.get_posts_by_platform(platform_enum, limit=limit, exclusive_start_key=exclusive_start_key)
+    if wants_stream():
+        return _stream_posts(posts)
     items, out_token = _paginate_response(posts)
     body = {'success': True, 'data': serialize_posts(items)}
     if out_token:
@@ -0,0 +1,130 @@
+"""Bulk maintenance jobs, run outside the request path.
+
+Usage:
+    python jobs.py create-tables
+    python jobs.py backfill-post-created-at [--segments N]
+    python jobs.py reconcile-metrics [--segments N]
+    python jobs.py build-search-artifact [--output PATH]
+    python jobs.py backfill-handles [--segments N]
+    python jobs.py migrate-platform-shards [--segments N] [--create-indexes]
+"""
+import argparse
+import logging
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _parallel_segments(fn, segments):
+    """Run fn(segment, total_segments) for every scan segment in parallel; returns the results."""
+    with ThreadPoolExecutor(max_workers=segments) as pool:
+        return list(pool.map(lambda segment: fn(segment, segments), range(segments)))
+
+
+def create_tables(args):
+    """Create the tables this service owns that do not exist yet (waits until ACTIVE)."""
+    from model.handle import InfluencerHandle
+    from model.index_changelog import IndexChangeLog
+    for model in (IndexChangeLog, InfluencerHandle):
+        if not model.exists():
+            # On-demand: both are written on every influencer change, the log is also polled by every sandbox
+            model.create_table(billing_mode='PAY_PER_REQUEST', wait=True)
+            logging.info(f"Created {model.Meta.table_name}")
+
+
+def backfill_post_created_at(args):
+    from model.posts import Post
+    counts = _parallel_segments(
+        lambda segment, total: Post.backfill_post_created_at(segment=segment, total_segments=total),
+        args.segments)
+    logging.info(f"Backfilled post_created_at on {sum(counts)} posts")
+
+
+def reconcile_metrics(args):
+    """Recompute post-derived Metrics totals from PostTable (parallel scan) and fix drift."""
+    from model.metrics import Metrics
+    from model.posts import Post
+    totals = {}
+    for partial in _parallel_segments(
+            lambda segment, total: Post.aggregate_metrics(segment=segment, total_segments=total), args.segments):
+        for key, values in partial.items():
+            bucket = totals.setdefault(key, {})
+            for attr, value in values.items():
+                bucket[attr] = bucket.get(attr, 0) + value
+    fixed = Metrics.reconcile(totals, segments=args.segments)
+    logging.info(f"Reconciled {fixed} metrics items from {len(totals)} influencer/platform pairs")
+
+
+def build_search_artifact(args):
+    """Export InfluencerTable and MetricsTable into the memory-mapped search artifact."""
+    from model.influencer import Influencer
+    from model.metrics import Metrics
+    from model.search_artifact import SEARCH_ARTIFACT_PATH, build_search_artifact as build
+    output = args.output or SEARCH_ARTIFACT_PATH
+    counts = build(output, Influencer.scan(), Metrics.scan())
+    logging.info(f"Wrote search artifact {output}: {counts}")
+
+
+def backfill_handles(args):
+    """Create InfluencerHandleTable if needed and write the lookup items for every influencer (parallel scan)."""
+    from model.handle import InfluencerHandle
+    from model.influencer import Influencer
+    create_tables(args)
+    counts = _parallel_segments(
+        lambda segment, total: InfluencerHandle.backfill(Influencer.scan(segment=segment, total_segments=total)),
+        args.segments)
+    logging.info(f"Backfilled {sum(counts)} handle lookup items")
+
+
+def migrate_platform_shards(args):
+    """
+    Move MetricsTable and PostTable onto the write-sharded platform indexes:
+    optionally create the GSIs (waiting until ACTIVE), then backfill
+    platform_shard. Enable reads with PLATFORM_INDEX_SHARDED=1 afterwards.
+    """
+    from model.metrics import Metrics
+    from model.posts import Post
+    from utils.sharding import PLATFORM_INDEX_SHARDS, backfill_shard_keys, create_index
+    sharded_indexes = {
+        Metrics: [Metrics.platform_shard_followers_idx, Metrics.platform_shard_engagement_rate_idx],
+        Post: [Post.post_platform_shard_index],
+    }
+    for model, indexes in sharded_indexes.items():
+        if args.create_indexes:
+            # DynamoDB builds one new GSI per table at a time
+            for index in indexes:
+                if create_index(model, index):
+                    logging.info(f"Created {index.Meta.index_name} on {model.Meta.table_name}")
+        counts = _parallel_segments(
+            lambda segment, total, model=model: backfill_shard_keys(model, segment=segment, total_segments=total),
+            args.segments)
+        logging.info(f"Backfilled platform_shard ({PLATFORM_INDEX_SHARDS} shards) on "
+                     f"{sum(counts)} {model.Meta.table_name} items")
+
+
+JOBS = {
+    'create-tables': create_tables,
+    'backfill-post-created-at': backfill_post_created_at,
+    'reconcile-metrics': reconcile_metrics,
+    'build-search-artifact': build_search_artifact,
+    'backfill-handles': backfill_handles,
+    'migrate-platform-shards': migrate_platform_shards,
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('job', choices=sorted(JOBS))
+    parser.add_argument('--segments', type=int, default=4, help='parallel scan segments')
+    parser.add_argument('--output', help='artifact path (build-search-artifact)')
+    parser.add_argument('--create-indexes', action='store_true',
+                        help='create missing sharded GSIs first (migrate-platform-shards)')
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+    JOBS[args.job](args)
+
+
+if __name__ == '__main__':
+    main()
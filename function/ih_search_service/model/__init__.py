@@ -0,0 +1,11 @@
+import os
+
+DYNAMODB_BACKEND = os.environ.get('DYNAMODB_BACKEND', '').lower()
+
+if DYNAMODB_BACKEND == 'memory':
+    # Serve every model from the in-process stand-in. It ships with the
+    # benchmarks (function/benchmarks), not in the Lambda bundle.
+    import sys
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+    from benchmarks.memory_dynamodb import install_from_env
+    install_from_env()
@@ -0,0 +1,104 @@
+import os
+from datetime import datetime, timezone
+
+from pynamodb.attributes import UnicodeAttribute, UTCDateTimeAttribute
+from pynamodb.exceptions import DeleteError
+from pynamodb.models import Model
+
+from enums.platform import Platform
+from model.unicode_enum_attribute import UnicodeEnumAttribute
+from utils.batch_get import batch_get_by_keys
+
+REGION_KEY = 'AWS_REGION'
+DEFAULT_REGION = 'us-west-2'
+TABLE_NAME = 'InfluencerHandleTable'
+LOCAL_DYNAMODB_ENDPOINT = 'http://localhost:8000'
+
+
+def normalize_handle(handle):
+    """'  @Some.One ' -> 'some.one'"""
+    return (handle or '').strip().lstrip('@').casefold()
+
+
+def handle_key(platform, handle):
+    """Lookup key for (platform, handle), e.g. 'TIKTOK#some.one'."""
+    platform = getattr(platform, 'value', platform)
+    return f"{str(platform).upper()}#{normalize_handle(handle)}"
+
+
+def handles_of(influencer):
+    """{handle_key: (Platform, handle)} for the handles in an influencer's platforms list."""
+    out = {}
+    for p in getattr(influencer, 'platforms', None) or []:
+        if getattr(p, 'platform', None) and normalize_handle(getattr(p, 'influencer_handle', None)):
+            out[handle_key(p.platform, p.influencer_handle)] = (p.platform, p.influencer_handle)
+    return out
+
+
+class InfluencerHandle(Model):
+    """
+    Lookup item mapping a normalized (platform, handle) to its influencer.
+    Handles otherwise live only inside InfluencerTable's nested platforms list.
+    """
+    class Meta:
+        table_name = TABLE_NAME
+        region = os.environ.get(REGION_KEY, DEFAULT_REGION)
+        # if 'DYNAMODB_LOCAL' in os.environ:
+        host = LOCAL_DYNAMODB_ENDPOINT
+
+    handle_key = UnicodeAttribute(hash_key=True)
+    influencer_id = UnicodeAttribute()
+    platform = UnicodeEnumAttribute(Platform)
+    # Handle as stored on the influencer
+    handle = UnicodeAttribute()
+    updated_at = UTCDateTimeAttribute(default=datetime.now(timezone.utc))
+
+    def to_dict(self):
+        return {
+            "platform": self.platform.value,
+            "handle": self.handle,
+            "influencer_id": self.influencer_id,
+        }
+
+    @staticmethod
+    def sync(influencer_id, old_handles, new_handles):
+        """
+        Bring the lookup items of one influencer from ``old_handles`` to ``new_handles``
+        (both as returned by handles_of). Added handles are written in one batch; handles
+        that went away are deleted only while they still point at this influencer, so a
+        handle that moved to another influencer is left alone.
+        """
+        now = datetime.now(timezone.utc)
+        with InfluencerHandle.batch_write() as batch:
+            for key, (platform, handle) in new_handles.items():
+                if key in old_handles:
+                    continue
+                batch.save(InfluencerHandle(handle_key=key, influencer_id=influencer_id, platform=platform,
+                                            handle=handle, updated_at=now))
+        for key in set(old_handles) - set(new_handles):
+            try:
+                InfluencerHandle(handle_key=key).delete(InfluencerHandle.influencer_id == influencer_id)
+            except DeleteError as e:
+                if getattr(e, 'cause_response_code', None) != 'ConditionalCheckFailedException':
+                    raise
+
+    @staticmethod
+    def resolve(pairs):
+        """
+        Resolve many (platform, handle) pairs with chunked, concurrent BatchGetItem.
+        :return: dict of handle_key -> InfluencerHandle; unknown handles are absent.
+        """
+        return batch_get_by_keys(InfluencerHandle, [handle_key(p, h) for p, h in pairs])
+
+    @staticmethod
+    def backfill(influencers):
+        """Bulk job: write the lookup items for every handle of ``influencers``. Returns the count."""
+        count = 0
+        now = datetime.now(timezone.utc)
+        with InfluencerHandle.batch_write() as batch:
+            for inf in influencers:
+                for key, (platform, handle) in handles_of(inf).items():
+                    batch.save(InfluencerHandle(handle_key=key, influencer_id=inf.influencer_id,
+                                                platform=platform, handle=handle, updated_at=now))
+                    count += 1
+        return count
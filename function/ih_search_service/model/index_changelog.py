@@ -0,0 +1,157 @@
+"""Shared log of influencer changes that keeps the in-process indexes fresh.
+
+Each sandbox holds its own in-memory indexes (the facet bitmap index, the
+typeahead), built once from a scan or the search artifact. Writes made by
+another sandbox, a job or another service never reach that memory, so
+every write that changes indexed data appends the influencer id here:
+
+    stream (hash)      'influencers'
+    change_id (range)  '<epoch ns, 20 digits>#<random hex>', in time order
+    influencer_id      the influencer to re-read
+    expires_at         DynamoDB TTL, INDEX_CHANGELOG_RETENTION_SECONDS on
+
+``Influencer.save/update/delete`` append directly; ``app.stream_handler``
+appends for the writes DynamoDB Streams reports from everyone else.
+
+A ``ChangeLogCursor`` per index polls the log before the index answers,
+at most every ``INDEX_REFRESH_SECONDS``, and hands the ids changed since
+its last poll to a callback that re-reads them from the tables with
+consistent reads, so the tables stay the source of truth and an index is
+at most about ``INDEX_REFRESH_SECONDS`` behind. Each poll re-reads the
+last ``INDEX_CHANGELOG_SKEW_SECONDS`` of the log to cover clock skew
+between writers and writes still in flight; entries already applied are
+skipped. A cursor further behind than the retention cannot catch up and
+the index is rebuilt instead.
+"""
+import logging
+import math
+import os
+import threading
+import time
+import uuid
+from datetime import timedelta
+from typing import Callable, Dict, Iterable, List, Optional
+
+from pynamodb.attributes import TTLAttribute, UnicodeAttribute
+from pynamodb.models import Model
+
+REGION_KEY = 'AWS_REGION'
+DEFAULT_REGION = 'us-west-2'
+TABLE_NAME = 'IndexChangeLogTable'
+LOCAL_DYNAMODB_ENDPOINT = 'http://localhost:8000'
+
+INFLUENCERS_STREAM = 'influencers'
+INDEX_REFRESH_SECONDS = float(os.environ.get('INDEX_REFRESH_SECONDS', '5'))
+INDEX_CHANGELOG_SKEW_SECONDS = float(os.environ.get('INDEX_CHANGELOG_SKEW_SECONDS', '30'))
+INDEX_CHANGELOG_RETENTION_SECONDS = int(os.environ.get('INDEX_CHANGELOG_RETENTION_SECONDS', str(24 * 3600)))
+
+_NS = 1_000_000_000
+
+
+def change_id(at_ns: int, suffix: str = '') -> str:
+    """Range key of an entry written at ``at_ns``; ``change_id(t)`` sorts before every entry of ``t``."""
+    return f"{at_ns:020d}#{suffix}"
+
+
+def _entry_ns(entry_id: str) -> int:
+    return int(entry_id.split('#', 1)[0])
+
+
+class IndexChangeLog(Model):
+    """One changed influencer, in write order within its stream."""
+    class Meta:
+        table_name = TABLE_NAME
+        region = os.environ.get(REGION_KEY, DEFAULT_REGION)
+        # if 'DYNAMODB_LOCAL' in os.environ:
+        host = LOCAL_DYNAMODB_ENDPOINT
+
+    stream = UnicodeAttribute(hash_key=True)
+    change_id = UnicodeAttribute(range_key=True)
+    influencer_id = UnicodeAttribute()
+    expires_at = TTLAttribute()
+
+
+def record_changes(influencer_ids: Iterable[str], stream: str = INFLUENCERS_STREAM) -> int:
+    """Append one entry per distinct id; returns the count."""
+    ids = list(dict.fromkeys(i for i in influencer_ids if i))
+    now = time.time_ns()
+    retention = timedelta(seconds=INDEX_CHANGELOG_RETENTION_SECONDS)
+    with IndexChangeLog.batch_write() as batch:
+        for influencer_id in ids:
+            batch.save(IndexChangeLog(stream=stream, change_id=change_id(now, uuid.uuid4().hex),
+                                      influencer_id=influencer_id, expires_at=retention))
+    return len(ids)
+
+
+def record_change(influencer_id: str) -> None:
+    """Write-path hook: log the change, never failing the write it follows."""
+    try:
+        record_changes([influencer_id])
+    except Exception as e:
+        logging.error(f"Error recording index change of {influencer_id}: {e}")
+
+
+class ChangeLogCursor:
+    """Position of one in-memory index in the change log."""
+
+    def __init__(self, stream: str = INFLUENCERS_STREAM):
+        self.stream = stream
+        self._lock = threading.Lock()
+        self._position: Optional[int] = None
+        self._seen: Dict[str, int] = {}
+        self._polled = -math.inf
+
+    @property
+    def started(self) -> bool:
+        return self._position is not None
+
+    def start(self, at_ns: Optional[int] = None) -> None:
+        """Track changes made from ``at_ns`` (epoch ns, default now), e.g. the start of a build."""
+        with self._lock:
+            self._position = time.time_ns() if at_ns is None else at_ns
+            self._seen = {}
+            self._polled = time.monotonic()
+
+    def stop(self) -> None:
+        with self._lock:
+            self._position = None
+            self._seen = {}
+
+    def catch_up(self, apply: Callable[[List[str]], None], force: bool = False) -> bool:
+        """Pass the ids changed since the last poll to ``apply`` when a poll is due.
+
+        The position only moves once ``apply`` returns, so a failed read is
+        retried on the next poll. With ``force`` the poll always runs and
+        waits for one in progress.
+        :return: False when the cursor is further behind than the retention
+            (the caller rebuilds), else True.
+        :raises: errors from the log query or from ``apply``.
+        """
+        if self._position is None or not (force or time.monotonic() - self._polled >= INDEX_REFRESH_SECONDS):
+            return True
+        if not self._lock.acquire(blocking=force):
+            # Another request is polling; answer from the index as it is
+            return True
+        try:
+            if self._position is None:
+                return True
+            # Failed polls are retried on the same schedule, not on every request
+            self._polled = time.monotonic()
+            now = time.time_ns()
+            if now - self._position > INDEX_CHANGELOG_RETENTION_SECONDS * _NS:
+                return False
+            since = self._position - int(INDEX_CHANGELOG_SKEW_SECONDS * _NS)
+            entries = {}
+            for entry in IndexChangeLog.query(self.stream, IndexChangeLog.change_id > change_id(since),
+                                              consistent_read=True):
+                if entry.change_id not in self._seen:
+                    entries[entry.change_id] = entry.influencer_id
+            if entries:
+                apply(list(dict.fromkeys(entries.values())))
+            self._seen.update((entry_id, _entry_ns(entry_id)) for entry_id in entries)
+            horizon = now - int(INDEX_CHANGELOG_SKEW_SECONDS * _NS)
+            self._seen = {entry_id: at for entry_id, at in self._seen.items() if at >= horizon}
+            self._position = now
+            return True
+        finally:
+            self._lock.release()
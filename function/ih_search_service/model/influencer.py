@@ -1,6 +1,8 @@
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
 import logging
 import os
+import threading
 
 from pynamodb.models import Model
 from pynamodb.attributes import (UnicodeAttribute,
@@ -11,7 +13,17 @@ from model.unicode_enum_attribute import UnicodeEnumAttribute
 from enums.category import Category
 from enums.gender import Gender
 from enums.platform import Platform
+from model.handle import InfluencerHandle, handles_of
+from model.index_changelog import ChangeLogCursor, record_change, record_changes
 from model.influencer_platform import InfluencerPlatform
+from model.metrics import Metrics, parse_metric_ranges
+from utils.batch_get import batch_get_by_keys
+from utils.bitmap_index import BitmapIndex
+from utils.change_stream import change_stream
+from utils.fanout import fan_out
+from utils.location_trie import LocationTrie
+from utils.prefix_index import PrefixIndex
+from utils.read_budget import ScanResult, budgeted_scan
 
 from pynamodb.indexes import AllProjection, GlobalSecondaryIndex
 
@@ -85,6 +97,182 @@ class InfluencerPlatformIndex(GlobalSecondaryIndex):
     platform = UnicodeEnumAttribute(Platform, hash_key=True)
 
 
+def _enum_value(value):
+    return getattr(value, 'value', value)
+
+
+# Facets maintained as bitmaps over the influencer ordinal space. Values are
+# the stored (enum) strings so counts can be returned as-is.
+INFLUENCER_FACETS = {
+    'category': lambda inf: [_enum_value(inf.category)] if getattr(inf, 'category', None) else [],
+    'gender': lambda inf: [_enum_value(inf.gender)] if getattr(inf, 'gender', None) else [],
+    'platform': lambda inf: [_enum_value(p.platform) for p in getattr(inf, 'platforms', None) or []
+                             if getattr(p, 'platform', None)],
+    'location': lambda inf: [inf.location] if getattr(inf, 'location', None) else [],
+}
+
+
+def new_influencer_bitmap_index():
+    return BitmapIndex(
+        key_fn=lambda inf: inf.influencer_id,
+        facets=INFLUENCER_FACETS,
+        columns={'name': lambda inf: (getattr(inf, 'name', None) or '').lower()},
+    )
+
+
+influencer_bitmap_index = new_influencer_bitmap_index()
+
+
+# Position of the bitmap index in the shared change log (model.index_changelog)
+bitmap_index_changes = ChangeLogCursor()
+
+# Hierarchical lookup over the distinct locations in the bitmap index,
+# synced (by difference) when a location appears in or leaves the index.
+influencer_location_trie = LocationTrie()
+
+# Typeahead over influencer names and platform handles, ranked by followers
+influencer_autocomplete = PrefixIndex()
+
+# Position of the typeahead in the change log; follower changes are logged there too
+autocomplete_changes = ChangeLogCursor()
+
+LOCATION_QUERY_WORKERS = 8
+# DynamoDB accepts at most 100 operands in an IN condition
+FILTER_IN_MAX_VALUES = 100
+
+
+def _autocomplete_entry(inf):
+    """(influencer_id, name, [(platform, handle), ...]) for the typeahead index."""
+    return (inf.influencer_id, getattr(inf, 'name', None),
+            [(_enum_value(p.platform), p.influencer_handle) for p in getattr(inf, 'platforms', None) or []
+             if getattr(p, 'platform', None) and getattr(p, 'influencer_handle', None)])
+
+
+def _index_upsert(inf):
+    """Apply a write to whichever in-memory indexes are loaded."""
+    if influencer_bitmap_index.loaded:
+        influencer_bitmap_index.upsert(inf)
+    if influencer_autocomplete.loaded:
+        influencer_autocomplete.upsert(*_autocomplete_entry(inf))
+
+
+def _index_remove(influencer_id):
+    influencer_bitmap_index.remove(influencer_id)
+    if influencer_autocomplete.loaded:
+        influencer_autocomplete.remove(influencer_id)
+
+
+def clear_indexes():
+    """Drop the in-memory indexes; they are rebuilt on next use."""
+    bitmap_index_changes.stop()
+    autocomplete_changes.stop()
+    influencer_bitmap_index.clear()
+    influencer_autocomplete.clear()
+
+
+def warm_indexes():
+    """
+    Build the in-memory indexes on a background thread (Lambda init), so the
+    first requests do not pay for the scans.
+    """
+    def build():
+        try:
+            Influencer.bitmap_index()
+        except Exception as e:
+            logging.error(f"Error warming the bitmap index: {e}")
+    influencer_autocomplete.load_in_background(_load_autocomplete)
+    threading.Thread(target=build, name='bitmap-index-build', daemon=True).start()
+
+
+def _refresh(index, cursor, apply):
+    """
+    Apply the changes other writers logged since the last poll. False when the
+    index is too far behind to catch up; it is then cleared for a rebuild.
+    """
+    try:
+        if cursor.catch_up(apply):
+            return True
+    except Exception as e:
+        # Keep answering from the index; the next poll retries
+        logging.error(f"Error refreshing index from the change log: {e}")
+        return True
+    logging.warning("Index is behind the change log retention; rebuilding it")
+    cursor.stop()
+    index.clear()
+    return False
+
+
+def _apply_bitmap_changes(influencer_ids):
+    found = Influencer.get_by_ids(influencer_ids, consistent_read=True)
+    for influencer_id in influencer_ids:
+        if influencer_id in found:
+            influencer_bitmap_index.upsert(found[influencer_id])
+        else:
+            influencer_bitmap_index.remove(influencer_id)
+
+
+def _followers_by_influencer(influencer_ids):
+    """{influencer_id: {platform: followers}} from the influencer_id index, one query per id."""
+    def followers_of(influencer_id):
+        return {_enum_value(m.platform): int(m.total_followers or 0)
+                for m in Metrics.influencer_id_idx.query(influencer_id)}
+    return fan_out({i: (lambda i=i: followers_of(i)) for i in influencer_ids})
+
+
+def _apply_autocomplete_changes(influencer_ids):
+    found = Influencer.get_by_ids(influencer_ids, consistent_read=True)
+    followers = _followers_by_influencer([i for i in influencer_ids if i in found])
+    influencer_autocomplete.apply_changes(
+        upserts=[(*_autocomplete_entry(found[i]), followers.get(i, {})) for i in influencer_ids if i in found],
+        removals=[i for i in influencer_ids if i not in found])
+
+
+def _scan_for_bitmap_index():
+    # Writes landing while the scan runs are picked up from the change log
+    bitmap_index_changes.start()
+    return Influencer.scan()
+
+
+def _seed_bitmap_index(index):
+    from model.search_artifact import search_artifact, seed_bitmap_index
+    if not seed_bitmap_index(index):
+        return False
+    # Apply everything written since the build started before the index answers
+    bitmap_index_changes.start(search_artifact().built_at * 1_000_000_000)
+    try:
+        if bitmap_index_changes.catch_up(_apply_bitmap_changes, force=True):
+            return True
+        logging.warning("Search artifact is older than the change log retention; building the index by scan")
+    except Exception as e:
+        logging.error(f"Error applying the change log to the search artifact; building the index by scan: {e}")
+    bitmap_index_changes.stop()
+    return False
+
+
+def _stored_handles(influencer_id):
+    """
+    Handles of the stored item, read before a write replaces it so renamed
+    and removed handles are deleted too. {} when there is none or the read
+    fails; the change stream, which sees both images, repairs the latter.
+    """
+    try:
+        stored = Influencer.get(influencer_id, consistent_read=True, attributes_to_get=['platforms'])
+    except Influencer.DoesNotExist:
+        return {}
+    except Exception as e:
+        logging.error(f"Error reading the handles of {influencer_id}: {e}")
+        return {}
+    return handles_of(stored)
+
+
+def _sync_handles(influencer_id, old_handles, new_handles):
+    """Write-through to the handle lookup table; the change stream repairs anything missed here."""
+    try:
+        InfluencerHandle.sync(influencer_id, old_handles, new_handles)
+    except Exception as e:
+        logging.error(f"Error syncing handles of {influencer_id}: {e}")
+
+
 class Influencer(Model):
     class Meta:
         table_name = TABLE_NAME
@@ -109,6 +297,73 @@ class Influencer(Model):
     influencer_platform_index = InfluencerPlatformIndex()
     influencer_category_index = InfluencerCategoryIndex()
 
+    def save(self, *args, **kwargs):
+        previous = _stored_handles(self.influencer_id)
+        result = super().save(*args, **kwargs)
+        _index_upsert(self)
+        record_change(self.influencer_id)
+        _sync_handles(self.influencer_id, previous, handles_of(self))
+        return result
+
+    def update(self, *args, **kwargs):
+        previous = _stored_handles(self.influencer_id)
+        # update() refreshes self from the new image (ALL_NEW)
+        result = super().update(*args, **kwargs)
+        _index_upsert(self)
+        record_change(self.influencer_id)
+        _sync_handles(self.influencer_id, previous, handles_of(self))
+        return result
+
+    def delete(self, *args, **kwargs):
+        previous = _stored_handles(self.influencer_id)
+        result = super().delete(*args, **kwargs)
+        _index_remove(self.influencer_id)
+        record_change(self.influencer_id)
+        _sync_handles(self.influencer_id, previous, {})
+        return result
+
+    @staticmethod
+    def bitmap_index():
+        """
+        Return the facet bitmap index. On first use it is seeded from the
+        offline-built search artifact when one is available, otherwise built
+        with a full scan. Writes from other writers are applied from the
+        change log (at most INDEX_REFRESH_SECONDS apart) before it answers.
+        """
+        index = influencer_bitmap_index.ensure_loaded(_scan_for_bitmap_index, seed=_seed_bitmap_index)
+        if not _refresh(index, bitmap_index_changes, _apply_bitmap_changes):
+            index = influencer_bitmap_index.ensure_loaded(_scan_for_bitmap_index, seed=_seed_bitmap_index)
+        return index
+
+    @staticmethod
+    def autocomplete_index(wait=True):
+        """
+        Return the typeahead index over names and handles, built on first use
+        from one scan of InfluencerTable and of the MetricsTable follower counts.
+        Influencer and follower changes are applied from the change log (at
+        most INDEX_REFRESH_SECONDS apart) before it answers. With wait=False
+        a missing index is built on a background thread and returned unloaded.
+        """
+        if not wait:
+            if not influencer_autocomplete.loaded:
+                influencer_autocomplete.load_in_background(_load_autocomplete)
+                return influencer_autocomplete
+            if not _refresh(influencer_autocomplete, autocomplete_changes, _apply_autocomplete_changes):
+                influencer_autocomplete.load_in_background(_load_autocomplete)
+            return influencer_autocomplete
+        index = influencer_autocomplete.ensure_loaded(_load_autocomplete)
+        if not _refresh(index, autocomplete_changes, _apply_autocomplete_changes):
+            index = influencer_autocomplete.ensure_loaded(_load_autocomplete)
+        return index
+
+    @staticmethod
+    def rebuild_bitmap_index():
+        """
+        Bulk job: rebuild the facet bitmap index from a full table scan.
+        """
+        influencer_bitmap_index.rebuild(_scan_for_bitmap_index())
+        return influencer_bitmap_index
+
     def to_dict(self):
         return {
             "influencer_id": self.influencer_id,
@@ -122,47 +377,139 @@ class Influencer(Model):
         }
 
     @staticmethod
-    def search_by_id(influencer_id):
+    def search_by_id(influencer_id, consistent_read=False):
         """
-        Search for an influencer by their ID.
+        Search for an influencer by their ID with a direct primary-key GetItem.
         """
         try:
-            iterator = Influencer.influencer_id_index.query(influencer_id)
-            last_key = getattr(iterator, 'last_evaluated_key', None)
-            return iterator, last_key
+            return [Influencer.get(influencer_id, consistent_read=consistent_read)], None
+        except Influencer.DoesNotExist:
+            return [], None
         except Exception as e:
             logging.error(f"Error searching by ID: {e}")
             return [], None
 
     @staticmethod
-    def search_by_name(name, limit=None, exclusive_start_key=None):
+    def get_by_ids(influencer_ids, consistent_read=False):
+        """
+        Fetch many influencers by primary key (chunked, concurrent BatchGetItem).
+        :return: dict of influencer_id -> Influencer; unknown ids are absent.
+        """
+        return batch_get_by_keys(Influencer, influencer_ids, consistent_read=consistent_read)
+
+    @staticmethod
+    def search_by_name(name, limit=None, exclusive_start_key=None, budget=None):
         """
-        Search for influencers by their name.
+        Search for influencers by their name (filtered scan under a read budget;
+        DynamoDB page sizes adapt to the observed selectivity of name filters).
+        :return: ScanResult (items, last_key); ``partial`` is set if the budget ran out.
         """
         try:
-            filter_condition = Influencer.name.contains(name)
-            # PynamoDB scan supports limit and exclusive_start_key
-            iterator = Influencer.scan(filter_condition, limit=limit or None, exclusive_start_key=exclusive_start_key)
-            last_key = getattr(iterator, 'last_evaluated_key', None)
-            return iterator, last_key
+            return budgeted_scan(Influencer, Influencer.name.contains(name), limit=limit or None,
+                                 exclusive_start_key=exclusive_start_key, budget=budget,
+                                 shape='influencer:name')
         except Exception as e:
             logging.error(f"Error searching by name: {e}")
             return None
 
+    @staticmethod
+    def search_by_handle(handle, platform=None):
+        """
+        Find the influencers owning ``handle`` (leading '@' and case ignored) through
+        the handle lookup table; without a platform every platform is checked.
+        :return: list of (Platform, Influencer) pairs.
+        """
+        platforms = [platform] if platform is not None else list(Platform)
+        owners = InfluencerHandle.resolve([(p, handle) for p in platforms])
+        found = Influencer.get_by_ids([h.influencer_id for h in owners.values()])
+        return [(h.platform, found[h.influencer_id]) for h in owners.values() if h.influencer_id in found]
+
+    @staticmethod
+    def resolve_locations(location):
+        """
+        Resolve a location query to every stored location it contains,
+        e.g. "California" -> ["Los Angeles, California", "San Diego, California"].
+        """
+        index = Influencer.bitmap_index()
+        trie = influencer_location_trie.sync(index.values('location'), index.values_version('location'))
+        return trie.resolve(location)
+
     @staticmethod
     def search_by_location(location, limit=None, exclusive_start_key=None):
         """
-        Search for influencers by their location.
+        Search for influencers by their location, including contained locations
+        when the bitmap index is loaded (a cold sandbox queries the location GSI
+        for the literal location instead of building the index first).
+        A single location uses the location GSI with DB pagination; several are
+        queried concurrently and returned as one list.
         """
         try:
-            iterator = Influencer.influencer_location_index.query(location, 
-                        limit=limit or None, exclusive_start_key=exclusive_start_key)
-            last_key = getattr(iterator, 'last_evaluated_key', None)
-            return iterator, last_key
+            locations = None
+            if influencer_bitmap_index.loaded:
+                locations = Influencer.resolve_locations(location)
+            locations = locations or [location]
+            if len(locations) == 1:
+                iterator = Influencer.influencer_location_index.query(
+                    locations[0], limit=limit or None, last_evaluated_key=exclusive_start_key)
+                # The cursor is only final once the page has been read
+                items = list(iterator)
+                return items, getattr(iterator, 'last_evaluated_key', None)
+
+            def query_location(loc):
+                return list(Influencer.influencer_location_index.query(loc))
+
+            with ThreadPoolExecutor(max_workers=min(LOCATION_QUERY_WORKERS, len(locations))) as pool:
+                results = list(pool.map(query_location, locations))
+            return [inf for hits in results for inf in hits]
         except Exception as e:
             logging.error(f"Error searching by location: {e}")
             return None
 
+    @staticmethod
+    def _query_ids(index, hash_key, candidates=None):
+        """Influencer ids under ``hash_key`` in a GSI, narrowed server-side to small candidate sets."""
+        condition = None
+        if candidates is not None and len(candidates) <= FILTER_IN_MAX_VALUES:
+            condition = Influencer.influencer_id.is_in(*candidates)
+        return [inf.influencer_id for inf in index.query(hash_key, filter_condition=condition,
+                                                         attributes_to_get=['influencer_id'])]
+
+    @staticmethod
+    def search_by_filters(influencer_id=None, name=None, location=None):
+        """
+        Ids of the influencers matching every given filter, by index intersection:
+        the id is a direct key, the name an exact match on the name GSI and the
+        location a match on the location GSI. When the bitmap index is already
+        loaded, location is resolved in memory instead, including contained
+        locations. Sets are resolved smallest/cheapest first (id, in-memory
+        location, name, location GSI); each later lookup is narrowed to the
+        surviving ids and an empty intersection stops early.
+        :return: list of matching ids, not hydrated; ids that do not exist
+            (e.g. an unknown influencer_id) drop out when the page is fetched.
+        """
+        ids = [influencer_id] if influencer_id else None
+
+        def intersect(found):
+            if ids is None:
+                return list(dict.fromkeys(found))
+            found = set(found)
+            return [i for i in ids if i in found]
+
+        index = Influencer.bitmap_index() if influencer_bitmap_index.loaded else None
+        if location and index is not None:
+            mask = index.match({'location': Influencer.resolve_locations(location) or [location]},
+                               base=None if ids is None else index.mask_for_keys(ids))
+            ids = intersect(index.keys(mask))
+            if not ids:
+                return []
+        if name:
+            ids = intersect(Influencer._query_ids(Influencer.influencer_name_index, name, ids))
+            if not ids:
+                return []
+        if location and index is None:
+            ids = intersect(Influencer._query_ids(Influencer.influencer_location_index, location, ids))
+        return ids or []
+
     @staticmethod
     def search_by_gender(gender, limit=None, exclusive_start_key=None):
         """
@@ -177,7 +524,7 @@ class Influencer(Model):
             iterator = Influencer.influencer_gender_index.query(
                 gender,
                 limit=limit or None,
-                exclusive_start_key=exclusive_start_key,
+                last_evaluated_key=exclusive_start_key,
             )
             last_key = getattr(iterator, 'last_evaluated_key', None)
             return iterator, last_key
@@ -186,7 +533,7 @@ class Influencer(Model):
             return None
 
     @staticmethod
-    def search_by_category(category_values, limit=None, exclusive_start_key=None):
+    def search_by_category(category_values, limit=None, exclusive_start_key=None, budget=None):
         """
         Search influencers by category values (list of strings or single string).
         Returns influencers that have any of the provided category values.
@@ -200,30 +547,92 @@ class Influencer(Model):
             else:
                 values = list(category_values)
 
-            # For category we still need to scan and filter in-memory; support limit via simple slicing
-            all_influencers = list(Influencer.scan())
-            filtered = [inf for inf in all_influencers if any(c in (inf.category or []) for c in values)]
-            return filtered, None
+            categories = [Category(v) for v in values]
+            return budgeted_scan(Influencer, Influencer.category.is_in(*categories), limit=limit or None,
+                                 exclusive_start_key=exclusive_start_key, budget=budget,
+                                 shape=f"influencer:category:{','.join(sorted(values))}")
         except Exception as e:
             logging.error(f"Error searching by category: {e}")
             return None
 
     @staticmethod
-    def search_by_platform(platform, limit=None, exclusive_start_key=None):
+    def search_by_platform(platform, limit=None, exclusive_start_key=None, budget=None):
         """
         Search for influencers by their platform.
         :param platform: The platform to filter by (e.g., Platform.INSTAGRAM).
-        :return: A list of influencers matching the platform.
+        :return: ScanResult (items, last_key) of influencers with the platform.
         """
         try:
             if not isinstance(platform, Platform):
                 raise ValueError(
                     "Invalid platform value. Must be an instance of Platform enum.")
-            # Platforms are stored in a list attribute; fall back to scanning
-            iterator = Influencer.scan(limit=limit or None, exclusive_start_key=exclusive_start_key)
-            # Controller will filter and inspect iterator.last_evaluated_key
-            last_key = getattr(iterator, 'last_evaluated_key', None)
-            return iterator, last_key
+            # Platforms are stored in a list of maps, which a filter expression
+            # cannot match on one field; filter each scanned page in memory
+            return budgeted_scan(
+                Influencer, limit=limit or None, exclusive_start_key=exclusive_start_key, budget=budget,
+                predicate=lambda inf: any(p.platform == platform for p in inf.platforms or []),
+                shape=f'influencer:platform:{platform.value}')
         except Exception as e:
             logging.error(f"Error searching by platform: {e}")
             return None
+
+    @staticmethod
+    def search_by_metrics(metrics_ranges, platform=None, limit=None, exclusive_start_key=None, budget=None):
+        """
+        Search influencers by ranges over their metrics, e.g.
+        {'followers': {'min': 10000}, 'engagement_rate': {'min': 2, 'max': 8}}.
+        Ranges apply to one platform's Metrics item at a time; without ``platform``
+        an influencer matches when any of its platforms does. Matches are joined
+        back to influencers with batched reads, in metrics order.
+        :raises ValueError: on unknown metrics, malformed bounds or an invalid platform.
+        :return: ScanResult (items, last_key) of influencers.
+        """
+        ranges = parse_metric_ranges(metrics_ranges)
+        if platform is not None and not isinstance(platform, Platform):
+            try:
+                platform = Platform(str(platform).upper())
+            except ValueError:
+                raise ValueError("Invalid platform value. Must be a valid Platform enum string.")
+        result = Metrics.search_by_ranges(ranges, platform, limit=limit, exclusive_start_key=exclusive_start_key,
+                                          budget=budget)
+        ids = list(dict.fromkeys(m.influencer_id for m in result.items))
+        found = Influencer.get_by_ids(ids)
+        return ScanResult([found[i] for i in ids if i in found], result.last_key, result.partial,
+                          result.budget, result.round_trips)
+
+
+def _load_autocomplete():
+    # Writes landing while the scans run are picked up from the change log
+    autocomplete_changes.start()
+    followers = {}
+    for m in Metrics.scan(attributes_to_get=['influencer_id', 'platform', 'total_followers']):
+        followers.setdefault(m.influencer_id, {})[_enum_value(m.platform)] = int(m.total_followers or 0)
+    return [_autocomplete_entry(inf) for inf in Influencer.scan()], followers
+
+
+def log_influencer_change(record):
+    """
+    Change-stream handler: log InfluencerTable writes from any writer in the
+    index change log (model.index_changelog), from which every sandbox
+    refreshes its in-memory indexes.
+    """
+    if record.event_name == 'MODIFY' and record.old_image == record.new_image:
+        return
+    record_changes([record.keys['influencer_id']['S']])
+
+
+def apply_handle_change(record):
+    """
+    Change-stream handler: move the handle lookup items from the handles of
+    the old image to those of the new one (removals included).
+    """
+    old = handles_of(Influencer.from_raw_data(record.old_image)) if record.old_image else {}
+    new = {}
+    if record.event_name != 'REMOVE' and record.new_image:
+        new = handles_of(Influencer.from_raw_data(record.new_image))
+    if old.keys() != new.keys():
+        InfluencerHandle.sync(record.keys['influencer_id']['S'], old, new)
+
+
+change_stream.register(TABLE_NAME, log_influencer_change)
+change_stream.register(TABLE_NAME, apply_handle_change)
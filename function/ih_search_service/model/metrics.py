@@ -7,15 +7,111 @@ from pynamodb.attributes import (UnicodeAttribute,
                                  NumberAttribute)
 from pynamodb.models import Model
 from pynamodb.indexes import GlobalSecondaryIndex, AllProjection
+from pynamodb.exceptions import PutError, UpdateError
 
+from model.index_changelog import record_changes
 from model.unicode_enum_attribute import UnicodeEnumAttribute
 from enums.platform import Platform
+from utils.change_stream import change_stream
+from utils.fanout import fan_out
+from utils.format_utils import format_number_short
+from utils.range_filter import RangeFilter
+from utils.read_budget import ScanResult, budgeted_scan
+from utils.sharding import PLATFORM_INDEX_SHARDED, item_shard_key, scatter_gather
 
 REGION_KEY = 'AWS_REGION'
 DEFAULT_REGION = 'us-west-2'
 TABLE_NAME = 'MetricsTable'
 LOCAL_DYNAMODB_ENDPOINT = 'http://localhost:8000'
 
+# Metrics counters derived from Post records; each has a matching *_str field
+POST_DERIVED_TOTALS = ('total_likes', 'total_comments', 'total_shares', 'total_views', 'total_posts')
+APPLY_DELTA_MAX_ATTEMPTS = 5
+RECONCILE_SEGMENTS = 4
+# A reconcile segment scans a whole slice of MetricsTable
+RECONCILE_SEGMENT_TIMEOUT_SECONDS = float(os.environ.get('RECONCILE_SEGMENT_TIMEOUT_SECONDS', '3600'))
+
+# Metric names accepted in metrics_ranges -> Metrics attribute
+METRIC_RANGE_ATTRIBUTES = {
+    'followers': 'total_followers',
+    'engagement_rate': 'engagement_rate',
+    'likes': 'total_likes',
+    'comments': 'total_comments',
+    'shares': 'total_shares',
+    'views': 'total_views',
+    'posts': 'total_posts',
+}
+# Metrics attributes that are the range key of a (platform, attribute) GSI, in tie-break order
+METRIC_RANGE_INDEXES = {
+    'total_followers': 'platform_followers_idx',
+    'engagement_rate': 'platform_engagement_rate_idx',
+}
+# Their write-sharded variants (hash key platform_shard, see utils.sharding)
+METRIC_SHARDED_INDEXES = {
+    'total_followers': 'platform_shard_followers_idx',
+    'engagement_rate': 'platform_shard_engagement_rate_idx',
+}
+
+
+def metrics_key(influencer_id, platform):
+    """Primary key of the Metrics item this service creates for (influencer_id, platform)."""
+    return f"{influencer_id}#{getattr(platform, 'value', platform)}"
+
+
+def _condition_failed(error):
+    return getattr(error, 'cause_response_code', None) == 'ConditionalCheckFailedException'
+
+
+def _bound(name, value):
+    if value is not None and (isinstance(value, bool) or not isinstance(value, (int, float))):
+        raise ValueError(f"Bounds for '{name}' must be numbers")
+    return value
+
+
+def parse_metric_ranges(metrics_ranges):
+    """
+    Validate request ranges, e.g. {'followers': {'min': 1000}, 'engagement_rate': [2.5, 8]},
+    into a RangeFilter over Metrics attributes. Attribute names ('total_likes') are accepted too.
+    :raises ValueError: on unknown metrics or malformed bounds.
+    """
+    if not isinstance(metrics_ranges, dict) or not metrics_ranges:
+        raise ValueError("metrics_ranges must be a non-empty object")
+    ranges = {}
+    for name, bounds in metrics_ranges.items():
+        attr = METRIC_RANGE_ATTRIBUTES.get(name, name)
+        if attr not in METRIC_RANGE_ATTRIBUTES.values():
+            raise ValueError(f"Unknown metric '{name}'")
+        if attr in ranges:
+            raise ValueError(f"Metric '{name}' is given more than once")
+        if isinstance(bounds, dict):
+            low, high = bounds.get('min'), bounds.get('max')
+        elif isinstance(bounds, (list, tuple)) and len(bounds) == 2:
+            low, high = bounds
+        else:
+            raise ValueError(f"Range for '{name}' must be {{'min': .., 'max': ..}} or [min, max]")
+        ranges[attr] = (_bound(name, low), _bound(name, high))
+    return RangeFilter(ranges)
+
+
+def _choose_driver(ranges, platform, exclusive_start_key=None):
+    """The ranged attribute whose GSI should drive the query, or None to scan."""
+    candidates = [attr for attr in METRIC_RANGE_INDEXES if attr in ranges]
+    if platform is None or not candidates:
+        return None
+    if exclusive_start_key:
+        # Resume on the path that produced the key: index keys carry the range
+        # attribute, shard cursors name their index
+        sharded = exclusive_start_key.get('index')
+        return next((attr for attr in candidates if attr in exclusive_start_key
+                     or sharded == getattr(Metrics, METRIC_SHARDED_INDEXES[attr]).Meta.index_name), None)
+    if len(candidates) > 1:
+        from model.search_artifact import metrics_range_counts
+        counts = metrics_range_counts(ranges, platform, candidates)
+        if counts:
+            return min(candidates, key=counts.get)
+    # Without statistics, a closed range is assumed to be narrower than a half-open one
+    return min(candidates, key=lambda attr: not ranges.is_closed(attr))
+
 
 class MetricsInfluencerIdIndex(GlobalSecondaryIndex):
     """
@@ -56,6 +152,35 @@ class MetricsEngagementRateIndex(GlobalSecondaryIndex):
     engagement_rate = NumberAttribute(range_key=True)
 
 
+class MetricsShardedFollowersIndex(GlobalSecondaryIndex):
+    """
+    Write-sharded MetricsFollowersIndex: hashed on platform_shard ('<PLATFORM>#<n>')
+    so writes and range queries spread over PLATFORM_INDEX_SHARDS partitions.
+    """
+    class Meta:
+        index_name = "platform_shard_followers_index"
+        read_capacity_units = 5
+        write_capacity_units = 5
+        projection = AllProjection()
+
+    platform_shard = UnicodeAttribute(hash_key=True)
+    total_followers = NumberAttribute(range_key=True)
+
+
+class MetricsShardedEngagementRateIndex(GlobalSecondaryIndex):
+    """
+    Write-sharded MetricsEngagementRateIndex (see MetricsShardedFollowersIndex).
+    """
+    class Meta:
+        index_name = "platform_shard_engagement_rate_index"
+        read_capacity_units = 5
+        write_capacity_units = 5
+        projection = AllProjection()
+
+    platform_shard = UnicodeAttribute(hash_key=True)
+    engagement_rate = NumberAttribute(range_key=True)
+
+
 class Metrics(Model):
 
     class Meta:
@@ -83,10 +208,19 @@ class Metrics(Model):
     total_posts_str = UnicodeAttribute(null=True, default='')
     created_at = UTCDateTimeAttribute(default=datetime.now(timezone.utc))
     updated_at = UTCDateTimeAttribute(default=datetime.now(timezone.utc))
+    # '<PLATFORM>#<shard>', maintained on every write (hash key of the sharded indexes)
+    platform_shard = UnicodeAttribute(null=True)
 
     influencer_id_idx = MetricsInfluencerIdIndex()
     platform_followers_idx = MetricsFollowersIndex()
     platform_engagement_rate_idx = MetricsEngagementRateIndex()
+    platform_shard_followers_idx = MetricsShardedFollowersIndex()
+    platform_shard_engagement_rate_idx = MetricsShardedEngagementRateIndex()
+
+    def serialize(self, *args, **kwargs):
+        # Every write path (save, batch writes, transactions) serializes the item first
+        self.platform_shard = item_shard_key(self)
+        return super().serialize(*args, **kwargs)
 
     def to_dict(self):
         return {
@@ -110,6 +244,23 @@ class Metrics(Model):
             "updated_at": self.updated_at.isoformat() if self.updated_at else 'N/A',
         }
 
+    @staticmethod
+    def query_platform_index(attr, platform, range_key_condition=None, filter_condition=None, limit=None,
+                             last_evaluated_key=None):
+        """
+        Query the (platform, ``attr``) GSI for 'total_followers' or 'engagement_rate'.
+        With PLATFORM_INDEX_SHARDED on, the write-sharded variant is read with a
+        concurrent scatter-gather that merges the shards in ``attr`` order.
+        :return: iterable of Metrics with ``last_evaluated_key`` (a shard cursor when sharded).
+        """
+        if PLATFORM_INDEX_SHARDED:
+            return scatter_gather(Metrics, getattr(Metrics, METRIC_SHARDED_INDEXES[attr]), platform,
+                                  range_key_condition, filter_condition, limit=limit,
+                                  exclusive_start_key=last_evaluated_key)
+        return getattr(Metrics, METRIC_RANGE_INDEXES[attr]).query(
+            platform, range_key_condition, filter_condition=filter_condition, limit=limit,
+            last_evaluated_key=last_evaluated_key)
+
     @staticmethod
     def search_by_influencer_id(influencer_id, platform=None):
         """
@@ -172,10 +323,7 @@ class Metrics(Model):
                 else:
                     range_condition = MetricsFollowersIndex.total_followers >= min_followers
                 # Query the index with platform as hash key and range condition
-                query = Metrics.platform_followers_idx.query(
-                    platform,
-                    range_condition
-                )
+                query = Metrics.query_platform_index('total_followers', platform, range_condition)
                 return list(query)
             else:
                 # Scan all and filter in Python
@@ -214,10 +362,7 @@ class Metrics(Model):
                     range_condition = MetricsEngagementRateIndex.engagement_rate >= min_engagement_rate
 
                 # Query the index with platform as hash key and the composed range condition
-                query = Metrics.platform_engagement_rate_idx.query(
-                    platform,
-                    range_condition
-                )
+                query = Metrics.query_platform_index('engagement_rate', platform, range_condition)
                 return list(query)
             else:
                 # Scan all and filter in Python
@@ -231,3 +376,160 @@ class Metrics(Model):
         except Exception as e:
             logging.error(f"Error searching by engagement rate: {e}")
             return None
+
+    @staticmethod
+    def search_by_ranges(ranges, platform=None, limit=None, exclusive_start_key=None, budget=None):
+        """
+        Metrics items inside every range of ``ranges`` (a RangeFilter, see parse_metric_ranges).
+        With a platform and a range on an indexed counter, the most selective such range is the
+        key condition of a (platform, counter) GSI query and the other ranges its filter
+        expression. Otherwise one budgeted scan filters on all ranges and the platform.
+        :return: ScanResult (items, last_key).
+        """
+        residual = ranges.predicate()
+        driver = _choose_driver(ranges, platform, exclusive_start_key)
+        if driver is not None:
+            index = getattr(Metrics, METRIC_RANGE_INDEXES[driver])
+            iterator = Metrics.query_platform_index(
+                driver, platform, ranges.key_condition(getattr(type(index), driver), driver),
+                filter_condition=ranges.condition(Metrics, exclude=[driver]),
+                limit=limit or None, last_evaluated_key=exclusive_start_key)
+            items = [m for m in iterator if residual(m)]
+            return ScanResult(items, getattr(iterator, 'last_evaluated_key', None))
+        condition = ranges.condition(Metrics)
+        if platform is not None:
+            condition = condition & (Metrics.platform == platform)
+        return budgeted_scan(Metrics, condition, limit=limit or None, exclusive_start_key=exclusive_start_key,
+                             budget=budget, predicate=residual,
+                             shape=f"metrics:ranges:{','.join(sorted(ranges.ranges))}")
+
+    @staticmethod
+    def get_for_influencer_platform(influencer_id, platform):
+        """
+        Return the Metrics item for (influencer_id, platform), read consistently, or None.
+        Items keyed by ``metrics_key`` are read directly; older items with other
+        ids are found through the (eventually consistent) influencer_id GSI.
+        """
+        try:
+            return Metrics.get(metrics_key(influencer_id, platform), consistent_read=True)
+        except Metrics.DoesNotExist:
+            pass
+        hits = list(Metrics.influencer_id_idx.query(
+            influencer_id, MetricsInfluencerIdIndex.platform == platform, limit=1))
+        if not hits:
+            return None
+        try:
+            return Metrics.get(hits[0].id, consistent_read=True)
+        except Metrics.DoesNotExist:
+            return None
+
+    @staticmethod
+    def apply_post_delta(influencer_id, platform, deltas):
+        """
+        Apply post-derived counter deltas (e.g. {'total_likes': 5, 'total_posts': 1})
+        to the Metrics item for (influencer_id, platform).
+
+        Counters change through one unconditional UpdateItem of atomic ADD actions
+        (an attribute missing on the item counts as 0). The matching *_str fields
+        are then SET from the counters it returned (ALL_NEW), conditioned on the
+        counters still holding those values: when that fails another writer has
+        added since, and its own follow-up write sets the strings.
+        When no Metrics item exists yet, one is created under ``metrics_key``,
+        conditioned on that key being free: of concurrent first writers one
+        creates the item and the others retry as updates of it.
+        """
+        deltas = {k: v for k, v in deltas.items() if v}
+        if not deltas:
+            return None
+        for _ in range(APPLY_DELTA_MAX_ATTEMPTS):
+            now = datetime.now(timezone.utc)
+            metrics = Metrics.get_for_influencer_platform(influencer_id, platform)
+            if metrics is None:
+                metrics = Metrics(id=metrics_key(influencer_id, platform), influencer_id=influencer_id,
+                                  platform=platform, created_at=now, updated_at=now)
+                for attr, delta in deltas.items():
+                    setattr(metrics, attr, max(delta, 0))
+                    setattr(metrics, f'{attr}_str', format_number_short(max(delta, 0)))
+                try:
+                    metrics.save(Metrics.id.does_not_exist())
+                    return metrics
+                except PutError as e:
+                    if not _condition_failed(e):
+                        raise
+                    continue
+            # update() refreshes metrics from the new image
+            metrics.update(actions=[Metrics.updated_at.set(now),
+                                    *(getattr(Metrics, attr).add(delta) for attr, delta in deltas.items())])
+            strings, condition = [], None
+            for attr in deltas:
+                value = getattr(metrics, attr) or 0
+                strings.append(getattr(Metrics, f'{attr}_str').set(format_number_short(value)))
+                guard = getattr(Metrics, attr) == value
+                condition = guard if condition is None else condition & guard
+            try:
+                metrics.update(actions=strings, condition=condition)
+            except UpdateError as e:
+                if not _condition_failed(e):
+                    raise
+            return metrics
+        raise RuntimeError(f"Too many concurrent updates to metrics for {influencer_id}/{platform}")
+
+    @staticmethod
+    def reconcile(post_totals, segments=RECONCILE_SEGMENTS):
+        """
+        Fix drift in the post-derived counters, scanning MetricsTable in
+        ``segments`` parallel segments (utils.fanout).
+        :param post_totals: {(influencer_id, platform value): {total_*: value}} recomputed from PostTable.
+        :return: number of Metrics items corrected.
+        """
+        def reconcile_segment(segment):
+            fixed = 0
+            seen = set()
+            for metrics in Metrics.scan(segment=segment, total_segments=segments):
+                key = (metrics.influencer_id, metrics.platform.value)
+                seen.add(key)
+                expected = post_totals.get(key, {})
+                actions = []
+                for attr in POST_DERIVED_TOTALS:
+                    value = expected.get(attr, 0)
+                    if (getattr(metrics, attr) or 0) != value:
+                        actions.append(getattr(Metrics, attr).set(value))
+                        actions.append(getattr(Metrics, f'{attr}_str').set(format_number_short(value)))
+                if actions:
+                    actions.append(Metrics.updated_at.set(datetime.now(timezone.utc)))
+                    metrics.update(actions=actions)
+                    fixed += 1
+            return fixed, seen
+
+        results = fan_out({f'segment-{n}': (lambda n=n: reconcile_segment(n)) for n in range(segments)},
+                          timeout=RECONCILE_SEGMENT_TIMEOUT_SECONDS)
+        fixed = sum(count for count, _ in results.values())
+        seen = set().union(*(keys for _, keys in results.values()))
+        # Influencer/platform pairs that have posts but no Metrics item yet
+        for (influencer_id, platform), totals in post_totals.items():
+            if (influencer_id, platform) not in seen:
+                Metrics.apply_post_delta(influencer_id, Platform(platform), totals)
+                fixed += 1
+        return fixed
+
+
+def _followers_of(image):
+    if not image:
+        return None
+    item = Metrics.from_raw_data(image)
+    return item.influencer_id, item.platform, item.total_followers
+
+
+def log_followers_change(record):
+    """
+    Change-stream handler: follower counts rank the typeahead, so log the
+    influencer of every Metrics write that changes them in the index change
+    log (model.index_changelog).
+    """
+    old = _followers_of(record.old_image)
+    new = _followers_of(record.new_image) if record.event_name != 'REMOVE' else None
+    if old != new:
+        record_changes(item[0] for item in (old, new) if item)
+
+
+change_stream.register(TABLE_NAME, log_followers_change)
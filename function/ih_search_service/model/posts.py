@@ -9,6 +9,9 @@ from pynamodb.attributes import (UnicodeAttribute,
                                  NumberAttribute)
 from model.unicode_enum_attribute import UnicodeEnumAttribute
 from enums.platform import Platform
+from model.metrics import Metrics
+from utils.batch_get import batch_get_by_keys
+from utils.sharding import PLATFORM_INDEX_SHARDED, item_shard_key, scatter_gather
 
 from pynamodb.exceptions import PutError
 from pynamodb.indexes import AllProjection, GlobalSecondaryIndex
@@ -30,6 +33,21 @@ class InfluencerIdIndex(GlobalSecondaryIndex):
     influencer_id = UnicodeAttribute(hash_key=True)
 
 
+class InfluencerPostCreatedAtIndex(GlobalSecondaryIndex):
+    """
+    Global Secondary Index for an influencer's posts ordered by original post time.
+    Sparse: posts without post_created_at are not indexed (see backfill_post_created_at).
+    """
+    class Meta:
+        index_name = "influencer_post_created_at_index"
+        read_capacity_units = 5
+        write_capacity_units = 5
+        projection = AllProjection()
+
+    influencer_id = UnicodeAttribute(hash_key=True)
+    post_created_at = UTCDateTimeAttribute(range_key=True)
+
+
 class PostIdIndex(GlobalSecondaryIndex):
     class Meta:
         index_name = "post_id_index"
@@ -60,6 +78,20 @@ class PostPlatformIndex(GlobalSecondaryIndex):
     platform = UnicodeEnumAttribute(Platform, hash_key=True)
 
 
+class PostShardedPlatformIndex(GlobalSecondaryIndex):
+    """
+    Write-sharded PostPlatformIndex: hashed on platform_shard ('<PLATFORM>#<n>',
+    see utils.sharding) so platform writes spread over many partitions.
+    """
+    class Meta:
+        index_name = "post_platform_shard_index"
+        read_capacity_units = 5
+        write_capacity_units = 5
+        projection = AllProjection()
+
+    platform_shard = UnicodeAttribute(hash_key=True)
+
+
 class Post(Model):
     class Meta:
         table_name = TABLE_NAME
@@ -87,11 +119,49 @@ class Post(Model):
     views = NumberAttribute(null=True)
     views_str = UnicodeAttribute(null=True)
     description = UnicodeAttribute(null=True)
+    # '<PLATFORM>#<shard>', maintained on every write (hash key of post_platform_shard_index)
+    platform_shard = UnicodeAttribute(null=True)
 
     post_id_index = PostIdIndex()
     influencer_id_index = InfluencerIdIndex()
+    influencer_post_created_at_index = InfluencerPostCreatedAtIndex()
     post_url_index = PostUrlIndex()
     post_platform_index = PostPlatformIndex()
+    post_platform_shard_index = PostShardedPlatformIndex()
+
+    def serialize(self, *args, **kwargs):
+        # Every write path (save, batch writes, transactions) serializes the item first
+        self.platform_shard = item_shard_key(self)
+        return super().serialize(*args, **kwargs)
+
+    def metrics_contribution(self):
+        """This post's share of its Metrics item: ((influencer_id, platform), {total_*: value})."""
+        return (self.influencer_id, self.platform), {
+            'total_likes': self.likes or 0,
+            'total_comments': self.comments or 0,
+            'total_shares': self.shares or 0,
+            'total_views': self.views or 0,
+            'total_posts': 1,
+        }
+
+    @staticmethod
+    def _apply_metrics_deltas(removed=None, added=None):
+        """Move a post's contribution between Metrics items (or within one).
+        Failures are logged, not raised: the post write already happened and
+        the reconciliation job repairs any drift."""
+        deltas = {}
+        for contribution, sign in ((removed, -1), (added, 1)):
+            if contribution is None:
+                continue
+            key, values = contribution
+            bucket = deltas.setdefault(key, {})
+            for attr, value in values.items():
+                bucket[attr] = bucket.get(attr, 0) + sign * value
+        for (influencer_id, platform), values in deltas.items():
+            try:
+                Metrics.apply_post_delta(influencer_id, platform, values)
+            except Exception as e:
+                logging.error(f"Error applying post metrics delta for {influencer_id}/{platform}: {e}")
 
     def save_post(self):
         """Save a new post with a unique ID and current timestamps."""
@@ -101,21 +171,63 @@ class Post(Model):
             now = datetime.now(timezone.utc)
             self.created_at = now
             self.updated_at = now
+            # Keep every post in the (sparse) recent-posts index
+            if not getattr(self, 'post_created_at', None):
+                self.post_created_at = now
             self.save()
         except PutError as e:
             logging.error(f"Error saving post: {e}")
             raise
+        self._apply_metrics_deltas(added=self.metrics_contribution())
+
+    def update_post(self, previous_contribution):
+        """Save changes to an existing post.
+        :param previous_contribution: metrics_contribution() of the stored post, taken
+            before the changes; the difference is moved onto the Metrics totals."""
+        self.updated_at = datetime.now(timezone.utc)
+        self.save()
+        self._apply_metrics_deltas(removed=previous_contribution, added=self.metrics_contribution())
 
     @classmethod
-    def get_post_by_id(cls, post_id):
-        """Get a single post by its ID using the post_id_index."""
+    def delete_post_by_id(cls, post_id):
+        """Delete a post and remove its contribution from Metrics.
+        Returns the deleted post, or None if it does not exist."""
+        post = cls.get_post_by_id(post_id, consistent_read=True)
+        if post is None:
+            return None
+        post.delete()
+        cls._apply_metrics_deltas(removed=post.metrics_contribution())
+        return post
+
+    @classmethod
+    def aggregate_metrics(cls, segment=None, total_segments=None):
+        """Sum post-derived Metrics counters per (influencer_id, platform value) over one scan segment."""
+        totals = {}
+        for post in cls.scan(segment=segment, total_segments=total_segments):
+            (influencer_id, platform), values = post.metrics_contribution()
+            bucket = totals.setdefault((influencer_id, getattr(platform, 'value', platform)), {})
+            for attr, value in values.items():
+                bucket[attr] = bucket.get(attr, 0) + value
+        return totals
+
+    @classmethod
+    def get_post_by_id(cls, post_id, consistent_read=False, attributes_to_get=None):
+        """Get a single post by its ID with a direct primary-key GetItem."""
         try:
-            result = list(cls.post_id_index.query(post_id))
-            return result[0] if result else None
+            return cls.get(post_id, consistent_read=consistent_read, attributes_to_get=attributes_to_get)
+        except cls.DoesNotExist:
+            return None
         except Exception as e:
             logging.error(f"Error retrieving post with ID {post_id}: {e}")
             return None
 
+    @classmethod
+    def get_posts_by_ids(cls, post_ids, consistent_read=False, attributes_to_get=None):
+        """Fetch many posts by ID (chunked, concurrent BatchGetItem).
+        Returns a dict of post_id -> Post; unknown IDs are absent."""
+        return batch_get_by_keys(cls, post_ids, consistent_read=consistent_read,
+                                 attributes_to_get=attributes_to_get)
+
     @classmethod
     def get_posts_by_influencer_id(cls, influencer_id, limit=None, exclusive_start_key=None):
         """Get all posts for a given influencer ID. Supports optional DB pagination."""
@@ -134,6 +246,44 @@ class Post(Model):
             logging.error(f"Error retrieving posts for influencer ID {influencer_id}: {e}")
             return []
 
+    @classmethod
+    def get_recent_posts(cls, influencer_id, since=None, until=None, descending=True,
+                         limit=None, exclusive_start_key=None):
+        """Get an influencer's posts ordered by post_created_at, optionally bounded
+        by since/until (inclusive datetimes). Newest first unless descending=False.
+        Returns (posts, last_key) where last_key resumes right after the last post returned."""
+        try:
+            range_condition = None
+            if since is not None and until is not None:
+                range_condition = InfluencerPostCreatedAtIndex.post_created_at.between(since, until)
+            elif since is not None:
+                range_condition = InfluencerPostCreatedAtIndex.post_created_at >= since
+            elif until is not None:
+                range_condition = InfluencerPostCreatedAtIndex.post_created_at <= until
+            iterator = cls.influencer_post_created_at_index.query(
+                influencer_id,
+                range_condition,
+                scan_index_forward=not descending,
+                limit=limit or None,
+                last_evaluated_key=exclusive_start_key,
+            )
+            posts = list(iterator)
+            return posts, iterator.last_evaluated_key
+        except Exception as e:
+            logging.error(f"Error retrieving recent posts for influencer ID {influencer_id}: {e}")
+            return [], None
+
+    @classmethod
+    def backfill_post_created_at(cls, segment=None, total_segments=None):
+        """Bulk job: copy created_at into post_created_at for posts missing it so that
+        they appear in influencer_post_created_at_index. Returns the number updated."""
+        updated = 0
+        for post in cls.scan(cls.post_created_at.does_not_exist(),
+                             segment=segment, total_segments=total_segments):
+            post.update(actions=[cls.post_created_at.set(post.created_at or datetime.now(timezone.utc))])
+            updated += 1
+        return updated
+
     @classmethod
     def get_posts_by_url(cls, url, limit=None, exclusive_start_key=None):
         """Get all posts for a given URL. Supports optional DB pagination."""
@@ -153,8 +303,13 @@ class Post(Model):
     @classmethod
     def get_posts_by_platform(cls, platform, limit=None, exclusive_start_key=None):
         """Get all posts for a given platform. 
-        Supports optional DB pagination."""
+        Supports optional DB pagination; with PLATFORM_INDEX_SHARDED on, the
+        write-sharded index is read shard by shard."""
         try:
+            if PLATFORM_INDEX_SHARDED:
+                page = scatter_gather(cls, cls.post_platform_shard_index, platform, limit=limit or None,
+                                      exclusive_start_key=exclusive_start_key)
+                return page, page.last_evaluated_key
             iterator = cls.query(
                 platform,
                 index_name='post_platform_index',
@@ -0,0 +1,174 @@
+"""Offline-built search index artifact for InfluencerTable and MetricsTable.
+
+``build_search_artifact`` (run by ``jobs.py build-search-artifact``) exports
+the tables into one ``utils.index_artifact`` file:
+
+    ids                        influencer ids; position = ordinal
+    ids.sorted                 ordinals in id order (u32), to look ids up
+    col.name                   lowercased names (bitmap index name column)
+    facet.<facet>.values/.bits facet values and their bitmaps (posting lists)
+    handles, handles.owner,    platform handles, owning ordinal (u32) and
+    handles.platform           Platform position (u8)
+    metrics.owner/.platform    one row per Metrics item: owning ordinal and
+    metrics.<column>           Platform position, then int64/float64 columns
+    metrics.<column>.sorted    each column sorted within Platform blocks, and
+    metrics.platform.ends      where each Platform's block ends (u32)
+
+At cold start ``seed_bitmap_index`` restores the facet bitmap index from the
+mapped file instead of scanning InfluencerTable: ids and names are read from
+the mapping when used, only the facet bitmaps are decoded. The artifact
+records when the build started reading, and the index applies the change
+log (``model.index_changelog``) from then on before it first answers.
+Artifacts older than ``SEARCH_ARTIFACT_MAX_AGE_SECONDS`` (never more than
+the change log retention) are ignored and the index is built by scan as
+before. ``metrics_range_counts`` counts how many rows a range matches with
+two ``bisect`` calls on the sorted columns, which the metrics search uses
+to pick the most selective range to drive its index query.
+"""
+import logging
+from bisect import bisect_left, bisect_right
+import os
+import threading
+import time
+from typing import Any, Dict, Iterable, Optional, Sequence
+
+from enums.platform import Platform
+from model.index_changelog import INDEX_CHANGELOG_RETENTION_SECONDS, INDEX_CHANGELOG_SKEW_SECONDS
+from model.influencer import INFLUENCER_FACETS, new_influencer_bitmap_index
+from utils.bitmap_index import BitmapIndex
+from utils.index_artifact import ArtifactError, ArtifactWriter, IndexArtifact, open_artifact
+from utils.range_filter import RangeFilter
+
+SEARCH_ARTIFACT_PATH = os.environ.get('SEARCH_ARTIFACT_PATH', '/opt/ih_search/search_index.bin')
+# Past the change log retention the changes since the build can no longer be applied
+SEARCH_ARTIFACT_MAX_AGE_SECONDS = min(int(os.environ.get('SEARCH_ARTIFACT_MAX_AGE_SECONDS', str(6 * 3600))),
+                                      INDEX_CHANGELOG_RETENTION_SECONDS - INDEX_CHANGELOG_SKEW_SECONDS)
+
+PLATFORMS = list(Platform)
+
+# Metrics attribute -> artifact column (section name) and array type code
+METRICS_COLUMNS = {
+    'total_followers': ('metrics.followers', 'q'),
+    'engagement_rate': ('metrics.engagement', 'd'),
+    'total_likes': ('metrics.likes', 'q'),
+    'total_comments': ('metrics.comments', 'q'),
+    'total_shares': ('metrics.shares', 'q'),
+    'total_views': ('metrics.views', 'q'),
+    'total_posts': ('metrics.posts', 'q'),
+}
+
+_artifact: Optional[IndexArtifact] = None
+_artifact_lock = threading.Lock()
+
+
+def build_search_artifact(path: str, influencers: Iterable[Any], metrics: Iterable[Any]) -> Dict[str, int]:
+    """Export influencers and their metrics to ``path``; returns row counts."""
+    # Before the (lazy) scans are read: readers apply the changes logged from here on
+    started = time.time()
+    index = new_influencer_bitmap_index()
+    handles = []
+    influencers = list(influencers)
+    index.rebuild(influencers)
+    keys, bitmaps, columns = index.snapshot()
+    ordinals = {key: o for o, key in enumerate(keys)}
+    for inf in influencers:
+        for p in getattr(inf, 'platforms', None) or []:
+            if getattr(p, 'influencer_handle', None) and getattr(p, 'platform', None):
+                handles.append((p.influencer_handle, ordinals[inf.influencer_id], PLATFORMS.index(p.platform)))
+
+    writer = ArtifactWriter()
+    writer.add_strings('ids', keys)
+    writer.add_array('ids.sorted', 'I', sorted(range(len(keys)), key=keys.__getitem__))
+    writer.add_strings('col.name', columns['name'])
+    for facet, by_value in bitmaps.items():
+        values = sorted(by_value)
+        writer.add_strings(f'facet.{facet}.values', values)
+        writer.add_blobs(f'facet.{facet}.bits',
+                         (by_value[v].to_bytes((by_value[v].bit_length() + 7) // 8, 'little') for v in values))
+    writer.add_strings('handles', (h for h, _, _ in handles))
+    writer.add_array('handles.owner', 'I', (o for _, o, _ in handles))
+    writer.add_array('handles.platform', 'B', (p for _, _, p in handles))
+
+    rows = [m for m in metrics if m.influencer_id in ordinals and m.platform is not None]
+    writer.add_array('metrics.owner', 'I', (ordinals[m.influencer_id] for m in rows))
+    writer.add_array('metrics.platform', 'B', (PLATFORMS.index(m.platform) for m in rows))
+    positions = [PLATFORMS.index(m.platform) for m in rows]
+    writer.add_array('metrics.platform.ends', 'I',
+                     (sum(1 for p in positions if p <= n) for n in range(len(PLATFORMS))))
+    for attr, (section, typecode) in METRICS_COLUMNS.items():
+        cast = float if typecode == 'd' else int
+        values = [cast(getattr(m, attr, 0) or 0) for m in rows]
+        writer.add_array(section, typecode, values)
+        writer.add_array(f'{section}.sorted', typecode, (v for _, v in sorted(zip(positions, values))))
+    writer.write(path, built_at=started)
+    return {'influencers': len(keys), 'handles': len(handles), 'metrics': len(rows)}
+
+
+def search_artifact(path: Optional[str] = None) -> Optional[IndexArtifact]:
+    """The mapped artifact (opened and validated once per process), or None if unusable."""
+    global _artifact
+    path = path or SEARCH_ARTIFACT_PATH
+    if _artifact is not None and _artifact.path == path:
+        return _artifact
+    with _artifact_lock:
+        if _artifact is None or _artifact.path != path:
+            try:
+                artifact = open_artifact(path)
+            except ArtifactError as e:
+                logging.error(f"Ignoring search artifact: {e}")
+                return None
+            if artifact is not None and time.time() - artifact.built_at > SEARCH_ARTIFACT_MAX_AGE_SECONDS:
+                logging.warning(f"Ignoring stale search artifact {path} built at {artifact.built_at}")
+                artifact.close()
+                return None
+            _artifact = artifact
+        return _artifact
+
+
+def seed_bitmap_index(index: BitmapIndex, path: Optional[str] = None) -> bool:
+    """Restore ``index`` from the artifact, reading ids and names in place; False when there is none to use."""
+    artifact = search_artifact(path)
+    if artifact is None:
+        return False
+    try:
+        bitmaps = {}
+        for facet in INFLUENCER_FACETS:
+            values = artifact.strings(f'facet.{facet}.values')
+            bits = artifact.strings(f'facet.{facet}.bits')
+            bitmaps[facet] = {values[i]: int.from_bytes(bits.raw(i), 'little') for i in range(len(values))}
+        ids = artifact.strings('ids')
+        by_id = artifact.array('ids.sorted')
+
+        def lookup(key):
+            i = bisect_left(by_id, key, key=ids.__getitem__)
+            return by_id[i] if i < len(by_id) and ids[by_id[i]] == key else None
+
+        index.restore(ids, bitmaps, {'name': artifact.strings('col.name')}, lookup=lookup)
+    except ArtifactError as e:
+        logging.error(f"Ignoring search artifact: {e}")
+        return False
+    logging.info(f"Seeded influencer bitmap index with {len(index)} influencers from {artifact.path}")
+    return True
+
+
+def metrics_range_counts(ranges: RangeFilter, platform: Platform, names: Sequence[str],
+                         path: Optional[str] = None) -> Optional[Dict[str, int]]:
+    """Rows on ``platform`` matching each range in ``names`` on its own, or None without an artifact."""
+    artifact = search_artifact(path)
+    if artifact is None:
+        return None
+    try:
+        position = PLATFORMS.index(platform)
+        ends = artifact.array('metrics.platform.ends')
+        start, end = (ends[position - 1] if position else 0), ends[position]
+        counts = {}
+        for name in names:
+            column = artifact.array(f'{METRICS_COLUMNS[name][0]}.sorted')
+            low, high = ranges.ranges[name]
+            lo = start if low is None else bisect_left(column, low, start, end)
+            hi = end if high is None else bisect_right(column, high, start, end)
+            counts[name] = max(0, hi - lo)
+    except ArtifactError as e:
+        logging.error(f"Ignoring search artifact: {e}")
+        return None
+    return counts
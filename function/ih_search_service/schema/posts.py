@@ -1,5 +1,6 @@
 from marshmallow import Schema, fields
 from enums.platform import Platform
+from model.unicode_enum_attribute import UnicodeEnumAttribute
 
 
 class PostSchema(Schema):
@@ -21,3 +22,13 @@ class PostSchema(Schema):
     views = fields.Int(allow_none=True)
     views_str = fields.Str(allow_none=True)
     description = fields.Str(allow_none=True)
+
+
+post_schema = PostSchema()
+
+
+def serialize_post(post):
+    data = post_schema.dump(post)
+    if 'platform' in data and isinstance(post.platform, Platform):
+        data['platform'] = UnicodeEnumAttribute(Platform).serialize(post.platform)
+    return data
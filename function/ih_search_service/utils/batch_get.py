@@ -0,0 +1,126 @@
+"""Chunked, concurrent BatchGetItem for hash-key models.
+
+Keys are de-duplicated and split into chunks of 100 (the BatchGetItem
+limit). The chunks are fetched concurrently through ``utils.fanout``.
+``UnprocessedKeys`` returned by DynamoDB are retried with capped
+exponential backoff and full jitter. If keys are still unprocessed when
+the retries run out, ``UnprocessedKeysError`` is raised instead of
+silently dropping them.
+
+Requests go through a public ``TableConnection`` per model, built from
+the model's ``Meta`` and key schema, rather than ``Model.batch_get``,
+which retries unprocessed keys in a tight loop with no backoff.
+"""
+import random
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+from pynamodb.connection import TableConnection
+from pynamodb.connection.base import MetaTable
+
+from utils.fanout import fan_out
+from utils.tracing import span
+
+BATCH_GET_CHUNK = 100
+BATCH_GET_MAX_RETRIES = 8
+BATCH_GET_BACKOFF_BASE_SECONDS = 0.05
+BATCH_GET_BACKOFF_CAP_SECONDS = 2.0
+
+_connections: Dict[type, TableConnection] = {}
+_connections_lock = threading.Lock()
+
+
+class UnprocessedKeysError(Exception):
+    """BatchGetItem kept returning UnprocessedKeys after all retries."""
+
+    def __init__(self, keys: List[Any]):
+        super().__init__(f"{len(keys)} keys still unprocessed after {BATCH_GET_MAX_RETRIES} retries")
+        self.keys = keys
+
+
+def _backoff(attempt: int) -> float:
+    return random.uniform(0, min(BATCH_GET_BACKOFF_CAP_SECONDS, BATCH_GET_BACKOFF_BASE_SECONDS * 2 ** attempt))
+
+
+def _hash_attribute(model):
+    """``(python_name, attribute)`` of ``model``'s hash key."""
+    return next((name, attr) for name, attr in model.get_attributes().items() if attr.is_hash_key)
+
+
+def _table_connection(model) -> TableConnection:
+    """A ``TableConnection`` for ``model``'s table, created once per model."""
+    with _connections_lock:
+        connection = _connections.get(model)
+        if connection is None:
+            meta = model.Meta
+            _, hash_attr = _hash_attribute(model)
+            # The key schema is all BatchGetItem needs, so no DescribeTable round trip
+            meta_table = MetaTable({
+                'TableName': meta.table_name,
+                'KeySchema': [{'AttributeName': hash_attr.attr_name, 'KeyType': 'HASH'}],
+                'AttributeDefinitions': [{'AttributeName': hash_attr.attr_name,
+                                          'AttributeType': hash_attr.attr_type}],
+            })
+            connection = _connections[model] = TableConnection(
+                meta.table_name,
+                region=meta.region,
+                host=meta.host,
+                connect_timeout_seconds=meta.connect_timeout_seconds,
+                read_timeout_seconds=meta.read_timeout_seconds,
+                max_retry_attempts=meta.max_retry_attempts,
+                max_pool_connections=meta.max_pool_connections,
+                extra_headers=meta.extra_headers,
+                aws_access_key_id=meta.aws_access_key_id,
+                aws_secret_access_key=meta.aws_secret_access_key,
+                aws_session_token=meta.aws_session_token,
+                meta_table=meta_table)
+        return connection
+
+
+def _get_chunk(model, keys: Sequence[Any], consistent_read: Optional[bool],
+               attributes_to_get: Optional[Sequence[str]]) -> List[Any]:
+    _, hash_attr = _hash_attribute(model)
+    table_name = model.Meta.table_name
+    connection = _table_connection(model)
+    pending = [{hash_attr.attr_name: {hash_attr.attr_type: hash_attr.serialize(k)}} for k in keys]
+    items: List[Any] = []
+    attempt = 0
+    while pending:
+        response = connection.batch_get_item(
+            pending, consistent_read=consistent_read, attributes_to_get=attributes_to_get)
+        page = response.get('Responses', {}).get(table_name, [])
+        with span('models', items=len(page)):
+            items.extend(model.from_raw_data(raw) for raw in page)
+        pending = response.get('UnprocessedKeys', {}).get(table_name, {}).get('Keys', [])
+        if pending:
+            if attempt >= BATCH_GET_MAX_RETRIES:
+                raise UnprocessedKeysError(pending)
+            time.sleep(_backoff(attempt))
+            attempt += 1
+    return items
+
+
+def batch_get_by_keys(model, keys: Iterable[Any], consistent_read: Optional[bool] = None,
+                      attributes_to_get: Optional[Sequence[str]] = None) -> Dict[Any, Any]:
+    """Fetch ``keys`` and return ``{hash_key: item}``; keys that do not exist are absent.
+
+    :param attributes_to_get: optional projection; the hash key is always included
+        so results can be matched back to their keys.
+    """
+    unique = list(dict.fromkeys(keys))
+    if not unique:
+        return {}
+    hash_name, hash_attr = _hash_attribute(model)
+    if attributes_to_get is not None and hash_attr.attr_name not in attributes_to_get:
+        attributes_to_get = [hash_attr.attr_name, *attributes_to_get]
+    chunks = [unique[i:i + BATCH_GET_CHUNK] for i in range(0, len(unique), BATCH_GET_CHUNK)]
+    pages = fan_out({
+        f'batch_get[{n}]': (lambda chunk=chunk: _get_chunk(model, chunk, consistent_read, attributes_to_get))
+        for n, chunk in enumerate(chunks)
+    })
+    found = {}
+    for items in pages.values():
+        for item in items:
+            found[getattr(item, hash_name)] = item
+    return found
@@ -0,0 +1,419 @@
+"""Bitmap indexes over a dense ordinal space.
+
+Every indexed object (e.g. an influencer) is assigned a small integer
+ordinal. For each facet value we keep a bitset with one bit per ordinal,
+stored as a Python ``int`` so that intersections (``&``), unions (``|``)
+and popcounts (``int.bit_count``) run in C over machine words instead of
+per-object Python loops.
+
+Freed ordinals are recycled so the space stays dense and the bitsets stay
+compact (one bit per live object, no per-value id lists).
+
+``restore`` can serve keys and columns straight from read-only sequences
+(e.g. the string tables of a memory-mapped artifact) with a ``lookup``
+for key -> ordinal; only the entries changed afterwards are held in
+memory.
+
+Example:
+    index = BitmapIndex(key_fn=lambda o: o.id,
+                        facets={'color': lambda o: [o.color]})
+    index.rebuild(objects)
+    mask = index.match({'color': ['red']})
+    index.facet_counts(mask)   # {'color': {'red': 3}}
+    index.keys(mask)           # ['id1', 'id2', 'id3']
+"""
+import itertools
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+
+from utils.tracing import span
+
+# Positions of the set bits for every possible byte value; used to walk a
+# bitmap one byte at a time when materializing ordinals.
+_BYTE_BITS = tuple(tuple(b for b in range(8) if byte >> b & 1) for byte in range(256))
+
+
+def bitmap_from_ordinals(ordinals: Iterable[int]) -> int:
+    """Build a bitmap from ordinals without quadratic big-int shifting."""
+    buf = bytearray()
+    for o in ordinals:
+        pos = o >> 3
+        if pos >= len(buf):
+            buf.extend(b'\x00' * (pos - len(buf) + 1))
+        buf[pos] |= 1 << (o & 7)
+    return int.from_bytes(buf, 'little')
+
+
+def iter_ordinals(mask: int) -> Iterable[int]:
+    """Yield the ordinals whose bit is set in ``mask`` in ascending order."""
+    if not mask:
+        return
+    raw = mask.to_bytes((mask.bit_length() + 7) // 8, 'little')
+    for pos, byte in enumerate(raw):
+        if byte:
+            base = pos << 3
+            for bit in _BYTE_BITS[byte]:
+                yield base + bit
+
+
+class _Overlay:
+    """List over a read-only base sequence (or ``length`` Nones) that stores only edits and appends."""
+
+    def __init__(self, base: Optional[Sequence[Any]], length: Optional[int] = None):
+        self._base = base
+        self._n = len(base) if length is None else length
+        self._edits: Dict[int, Any] = {}
+        self._tail: List[Any] = []
+
+    def __len__(self) -> int:
+        return self._n + len(self._tail)
+
+    def __getitem__(self, o: int) -> Any:
+        if o >= self._n:
+            return self._tail[o - self._n]
+        if o in self._edits:
+            return self._edits[o]
+        return None if self._base is None else self._base[o]
+
+    def __setitem__(self, o: int, value: Any) -> None:
+        if o >= self._n:
+            self._tail[o - self._n] = value
+        else:
+            self._edits[o] = value
+
+    def __iter__(self):
+        return (self[o] for o in range(len(self)))
+
+    def append(self, value: Any) -> None:
+        self._tail.append(value)
+
+
+class _Ordinals:
+    """Key -> ordinal over a base ``lookup``; only keys changed since the restore are stored."""
+
+    def __init__(self, lookup: Callable[[str], Optional[int]], keys: _Overlay):
+        self._lookup = lookup
+        self._keys = keys
+        self._changed: Dict[str, Optional[int]] = {}
+
+    def get(self, key: str, default: Optional[int] = None) -> Optional[int]:
+        if key in self._changed:
+            o = self._changed[key]
+        else:
+            o = self._lookup(key)
+            # The base slot may since have been freed or reused by another key
+            if o is not None and self._keys[o] != key:
+                o = None
+        return default if o is None else o
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key) is not None
+
+    def __getitem__(self, key: str) -> int:
+        o = self.get(key)
+        if o is None:
+            raise KeyError(key)
+        return o
+
+    def __setitem__(self, key: str, o: int) -> None:
+        self._changed[key] = o
+
+    def pop(self, key: str, default: Optional[int] = None) -> Optional[int]:
+        o = self.get(key)
+        if o is None:
+            return default
+        self._changed[key] = None
+        return o
+
+
+class BitmapIndex:
+    """Per-value bitsets for a set of facets, kept current with upsert/remove.
+
+    :param key_fn: returns the unique key (id) of an object.
+    :param facets: facet name -> function returning the facet values of an object.
+    :param columns: optional name -> function returning a scalar stored per
+        ordinal, for predicates that are not equality lookups (e.g. substring).
+    """
+
+    def __init__(self, key_fn: Callable[[Any], str],
+                 facets: Dict[str, Callable[[Any], Iterable[str]]],
+                 columns: Optional[Dict[str, Callable[[Any], Any]]] = None):
+        self._key_fn = key_fn
+        self._facet_fns = dict(facets)
+        self._column_fns = dict(columns or {})
+        self._lock = threading.RLock()
+        self._build_lock = threading.Lock()
+        self.loaded = False
+        self.version = 0
+        # Per facet: moves only when its set of distinct values changes
+        self._value_changes = itertools.count(1)
+        self._values_versions: Dict[str, int] = {}
+        self._reset()
+
+    def _reset(self):
+        self._ordinals: Dict[str, int] = {}
+        self._keys: List[Optional[str]] = []
+        self._rows: List[Optional[Dict[str, tuple]]] = []
+        self._columns: Dict[str, List[Any]] = {name: [] for name in self._column_fns}
+        self._free: List[int] = []
+        self._live = 0
+        self._bitmaps: Dict[str, Dict[str, int]] = {name: {} for name in self._facet_fns}
+        self._values_changed(*self._facet_fns)
+
+    def _values_changed(self, *facets: str) -> None:
+        change = next(self._value_changes)
+        for name in facets:
+            self._values_versions[name] = change
+
+    def _extract(self, obj) -> Dict[str, tuple]:
+        row = {}
+        for name, fn in self._facet_fns.items():
+            row[name] = tuple(v for v in dict.fromkeys(fn(obj) or ()) if v is not None)
+        return row
+
+    # -- writes -------------------------------------------------------------
+
+    def rebuild(self, objects: Iterable[Any]) -> None:
+        """Replace the index contents with ``objects`` (bulk job)."""
+        keys: List[str] = []
+        rows: List[Dict[str, tuple]] = []
+        columns: Dict[str, List[Any]] = {name: [] for name in self._column_fns}
+        postings: Dict[str, Dict[str, List[int]]] = {name: {} for name in self._facet_fns}
+        ordinals: Dict[str, int] = {}
+        for obj in objects:
+            key = self._key_fn(obj)
+            row = self._extract(obj)
+            if key in ordinals:
+                o = ordinals[key]
+                rows[o] = row
+                for name, fn in self._column_fns.items():
+                    columns[name][o] = fn(obj)
+                continue
+            o = len(keys)
+            ordinals[key] = o
+            keys.append(key)
+            rows.append(row)
+            for name, fn in self._column_fns.items():
+                columns[name].append(fn(obj))
+        for o, row in enumerate(rows):
+            for name, values in row.items():
+                for v in values:
+                    postings[name].setdefault(v, []).append(o)
+        bitmaps = {
+            name: {v: bitmap_from_ordinals(ords) for v, ords in by_value.items()}
+            for name, by_value in postings.items()
+        }
+        with self._lock:
+            self._ordinals = ordinals
+            self._keys = keys
+            self._rows = rows
+            self._columns = columns
+            self._free = []
+            self._live = (1 << len(keys)) - 1
+            self._bitmaps = bitmaps
+            self._values_changed(*self._facet_fns)
+            self.loaded = True
+            self.version += 1
+
+    def restore(self, keys: Sequence[str], bitmaps: Dict[str, Dict[str, int]],
+                columns: Optional[Dict[str, Sequence[Any]]] = None,
+                lookup: Optional[Callable[[str], Optional[int]]] = None) -> None:
+        """Replace the index contents with a prebuilt snapshot (see ``snapshot``).
+
+        Ordinal ``i`` is ``keys[i]``. ``keys`` and ``columns`` are read in
+        place, not copied, and must not change afterwards. ``lookup(key)``
+        returns the ordinal of a key in ``keys`` (or None); without it a
+        key -> ordinal dict is built. Per-object facet rows are not stored
+        in snapshots; they are recovered from the bitmaps when an object is
+        first updated or removed.
+        """
+        n = len(keys)
+        columns = columns or {}
+        with self._lock:
+            self._keys = _Overlay(keys)
+            if lookup is None:
+                self._ordinals = {key: o for o, key in enumerate(keys)}
+            else:
+                self._ordinals = _Ordinals(lookup, self._keys)
+            self._rows = _Overlay(None, n)
+            self._columns = {name: _Overlay(columns.get(name), n) for name in self._column_fns}
+            self._free = []
+            self._live = (1 << n) - 1
+            self._bitmaps = {name: dict(bitmaps.get(name, {})) for name in self._facet_fns}
+            self._values_changed(*self._facet_fns)
+            self.loaded = True
+            self.version += 1
+
+    def snapshot(self):
+        """Compacted ``(keys, bitmaps, columns)``, the inverse of ``restore``."""
+        with self._lock:
+            live = list(iter_ordinals(self._live))
+            if len(live) == len(self._keys):
+                return (list(self._keys),
+                        {name: dict(by_value) for name, by_value in self._bitmaps.items()},
+                        {name: list(col) for name, col in self._columns.items()})
+            # Free slots exist: renumber live ordinals densely
+            postings = {name: {v: [] for v in by_value} for name, by_value in self._bitmaps.items()}
+            for new, old in enumerate(live):
+                for name, values in self._row(old).items():
+                    for v in values:
+                        postings[name][v].append(new)
+            return ([self._keys[o] for o in live],
+                    {name: {v: bitmap_from_ordinals(ords) for v, ords in by_value.items()}
+                     for name, by_value in postings.items()},
+                    {name: [col[o] for o in live] for name, col in self._columns.items()})
+
+    def ensure_loaded(self, loader: Callable[[], Iterable[Any]],
+                      seed: Optional[Callable[['BitmapIndex'], bool]] = None) -> 'BitmapIndex':
+        """Build the index from ``loader()`` once; concurrent callers wait for it.
+
+        :param seed: optional ``seed(index)`` tried first; returning True means
+            it restored the index (e.g. from a snapshot) and ``loader`` is skipped.
+        """
+        if not self.loaded:
+            with self._build_lock:
+                if not self.loaded:
+                    with span('index_build', index='bitmap'):
+                        if not (seed is not None and seed(self)):
+                            self.rebuild(loader())
+        return self
+
+    def clear(self) -> None:
+        with self._lock:
+            self._reset()
+            self.loaded = False
+            self.version += 1
+
+    def upsert(self, obj: Any) -> None:
+        """Insert or update a single object, adjusting only the bits it touches."""
+        key = self._key_fn(obj)
+        row = self._extract(obj)
+        with self._lock:
+            o = self._ordinals.get(key)
+            if o is None:
+                o = self._free.pop() if self._free else len(self._keys)
+                if o == len(self._keys):
+                    self._keys.append(key)
+                    self._rows.append(None)
+                    for col in self._columns.values():
+                        col.append(None)
+                self._keys[o] = key
+                self._ordinals[key] = o
+                self._live |= 1 << o
+            else:
+                self._clear_bits(o)
+            bit = 1 << o
+            for name, values in row.items():
+                bitmaps = self._bitmaps[name]
+                for v in values:
+                    if v not in bitmaps:
+                        self._values_changed(name)
+                    bitmaps[v] = bitmaps.get(v, 0) | bit
+            self._rows[o] = row
+            for name, fn in self._column_fns.items():
+                self._columns[name][o] = fn(obj)
+            self.version += 1
+
+    def remove(self, key: str) -> None:
+        with self._lock:
+            o = self._ordinals.pop(key, None)
+            if o is None:
+                return
+            self._clear_bits(o)
+            self._live &= ~(1 << o)
+            self._keys[o] = None
+            self._rows[o] = None
+            for col in self._columns.values():
+                col[o] = None
+            self._free.append(o)
+            self.version += 1
+
+    def _row(self, o: int) -> Dict[str, tuple]:
+        row = self._rows[o]
+        if row is None:
+            # Restored from a snapshot: recover the values holding this ordinal
+            row = {name: tuple(v for v, bitmap in by_value.items() if bitmap >> o & 1)
+                   for name, by_value in self._bitmaps.items()}
+        return row
+
+    def _clear_bits(self, o: int) -> None:
+        row = self._row(o)
+        clear = ~(1 << o)
+        for name, values in row.items():
+            bitmaps = self._bitmaps[name]
+            for v in values:
+                remaining = bitmaps.get(v, 0) & clear
+                if remaining:
+                    bitmaps[v] = remaining
+                elif bitmaps.pop(v, None) is not None:
+                    self._values_changed(name)
+
+    # -- reads --------------------------------------------------------------
+
+    def __len__(self) -> int:
+        return self._live.bit_count()
+
+    def all(self) -> int:
+        """Bitmap of every live object."""
+        return self._live
+
+    def values(self, facet: str) -> List[str]:
+        """Distinct values currently present for ``facet``."""
+        with self._lock:
+            return list(self._bitmaps[facet])
+
+    def values_version(self, facet: str) -> int:
+        """Changes whenever a value of ``facet`` appears or disappears, not on other writes."""
+        return self._values_versions[facet]
+
+    def mask(self, facet: str, values: Iterable[str]) -> int:
+        """Union of the bitmaps of ``values`` within one facet."""
+        bitmaps = self._bitmaps[facet]
+        out = 0
+        for v in values:
+            out |= bitmaps.get(v, 0)
+        return out
+
+    def match(self, filters: Dict[str, Iterable[str]], base: Optional[int] = None) -> int:
+        """AND across facets of the OR of the requested values within each facet."""
+        with self._lock:
+            out = self._live if base is None else base & self._live
+            for facet, values in filters.items():
+                if not out:
+                    break
+                out &= self.mask(facet, values)
+            return out
+
+    def mask_for_keys(self, keys: Iterable[str]) -> int:
+        """Bitmap of the given keys; unknown keys are ignored."""
+        ordinals = self._ordinals
+        return bitmap_from_ordinals(ordinals[k] for k in keys if k in ordinals)
+
+    def filter_column(self, mask: int, column: str, predicate: Callable[[Any], bool]) -> int:
+        """Keep only the ordinals of ``mask`` whose stored column value passes ``predicate``."""
+        with self._lock:
+            col = self._columns[column]
+            return bitmap_from_ordinals(o for o in iter_ordinals(mask) if predicate(col[o]))
+
+    def keys(self, mask: int) -> List[str]:
+        """Materialize the keys of ``mask`` in ordinal order."""
+        with self._lock:
+            keys = self._keys
+            return [keys[o] for o in iter_ordinals(mask & self._live)]
+
+    @staticmethod
+    def count(mask: int) -> int:
+        return mask.bit_count()
+
+    def facet_counts(self, mask: int, facets: Optional[Iterable[str]] = None) -> Dict[str, Dict[str, int]]:
+        """Per-value counts of ``mask`` for each facet; zero counts are omitted."""
+        with self._lock:
+            out: Dict[str, Dict[str, int]] = {}
+            for facet in (facets or self._bitmaps):
+                counts = {}
+                for value, bitmap in self._bitmaps[facet].items():
+                    n = (bitmap & mask).bit_count()
+                    if n:
+                        counts[value] = n
+                out[facet] = dict(sorted(counts.items(), key=lambda kv: (-kv[1], kv[0])))
+            return out
@@ -0,0 +1,178 @@
+"""Change-data-capture consumer for derived in-process structures.
+
+Consumes DynamoDB Streams-shaped events (``{'Records': [...]}`` with
+INSERT / MODIFY / REMOVE records carrying ``Keys``, ``OldImage`` and
+``NewImage``). Each record goes to the handlers registered for its table,
+which keep derived data in DynamoDB in step with writes from any writer
+(the handle lookup items, the index change log that serving sandboxes
+refresh their in-memory indexes from). ``app.stream_handler`` runs on its
+own Lambda function; its memory is never used to answer requests.
+
+- Idempotent: the checkpoint records the highest applied sequence number
+  per item (DynamoDB orders stream records per item, not across shards).
+  It is bounded to the most recently changed ``STREAM_CHECKPOINT_MAX_KEYS``
+  items and persisted after every batch. Redelivered or out-of-date
+  records are skipped. The checkpoint lives in the sandbox's /tmp, so a
+  redelivery to another sandbox runs the handlers again; they only make
+  writes that are safe to repeat, so it is an optimization, not the
+  source of truth.
+- Failures: the batch stops at the first record whose handler raises. That
+  record is reported in ``batchItemFailures`` (Lambda
+  ReportBatchItemFailures), so it and everything after it is redelivered.
+
+``LocalStreamSource`` builds the same record shape from model instances,
+so the consumer can be driven offline and in tests.
+"""
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+STREAM_CHECKPOINT_PATH = os.environ.get('STREAM_CHECKPOINT_PATH', '/tmp/ih_search_stream_checkpoint.json')
+STREAM_CHECKPOINT_MAX_KEYS = int(os.environ.get('STREAM_CHECKPOINT_MAX_KEYS', '100000'))
+
+
+class ChangeRecord:
+    """One stream record, normalized."""
+    __slots__ = ('table', 'event_name', 'keys', 'old_image', 'new_image', 'sequence_number')
+
+    def __init__(self, table, event_name, keys, old_image, new_image, sequence_number):
+        self.table = table
+        self.event_name = event_name
+        self.keys = keys
+        self.old_image = old_image
+        self.new_image = new_image
+        self.sequence_number = sequence_number
+
+    @property
+    def item_key(self) -> str:
+        return f"{self.table}|{json.dumps(self.keys, sort_keys=True)}"
+
+    @classmethod
+    def parse(cls, raw: Dict[str, Any]) -> 'ChangeRecord':
+        # arn:aws:dynamodb:<region>:<account>:table/<TableName>/stream/<label>
+        parts = raw.get('eventSourceARN', '').split('/')
+        table = parts[1] if len(parts) > 1 and parts[0].endswith(':table') else raw.get('tableName')
+        data = raw.get('dynamodb', {})
+        return cls(
+            table=table,
+            event_name=raw.get('eventName'),
+            keys=data.get('Keys', {}),
+            old_image=data.get('OldImage'),
+            new_image=data.get('NewImage'),
+            sequence_number=int(data.get('SequenceNumber', 0)),
+        )
+
+
+class FileCheckpointStore:
+    """Persists {item key: last applied sequence number} as JSON, oldest first."""
+
+    def __init__(self, path: str = STREAM_CHECKPOINT_PATH):
+        self.path = path
+
+    def load(self) -> Dict[str, int]:
+        try:
+            with open(self.path) as f:
+                return OrderedDict((k, int(v)) for k, v in json.load(f).items())
+        except (OSError, ValueError):
+            return OrderedDict()
+
+    def save(self, checkpoints: Dict[str, int]) -> None:
+        tmp = f"{self.path}.tmp"
+        with open(tmp, 'w') as f:
+            json.dump({k: str(v) for k, v in checkpoints.items()}, f)
+        os.replace(tmp, self.path)
+
+
+class ChangeStreamConsumer:
+    def __init__(self, checkpoint_store=None):
+        self._handlers: Dict[str, List[Callable[[ChangeRecord], None]]] = {}
+        self._store = checkpoint_store or FileCheckpointStore()
+        self._checkpoints: Optional[Dict[str, int]] = None
+        self._lock = threading.Lock()
+
+    def register(self, table: str, handler: Callable[[ChangeRecord], None]) -> None:
+        """Register ``handler(record)`` for changes to ``table``."""
+        self._handlers.setdefault(table, []).append(handler)
+
+    def set_checkpoint_store(self, store) -> None:
+        with self._lock:
+            self._store = store
+            self._checkpoints = None
+
+    def checkpoints(self) -> Dict[str, int]:
+        if self._checkpoints is None:
+            self._checkpoints = self._store.load()
+        return self._checkpoints
+
+    def process(self, event: Dict[str, Any]) -> Dict[str, Any]:
+        """Apply a batch of stream records; returns a partial-batch failure response."""
+        failures = []
+        applied = skipped = 0
+        with self._lock:
+            checkpoints = self.checkpoints()
+            for raw in event.get('Records', []):
+                record = ChangeRecord.parse(raw)
+                item_key = record.item_key
+                if record.sequence_number <= checkpoints.get(item_key, -1):
+                    skipped += 1
+                    continue
+                try:
+                    for handler in self._handlers.get(record.table, []):
+                        handler(record)
+                except Exception as e:
+                    logging.error(f"Error applying {record.event_name} on {record.table} "
+                                  f"(sequence {record.sequence_number}): {e}")
+                    failures.append({'itemIdentifier': str(record.sequence_number)})
+                    break
+                checkpoints.pop(item_key, None)
+                checkpoints[item_key] = record.sequence_number
+                while len(checkpoints) > STREAM_CHECKPOINT_MAX_KEYS:
+                    checkpoints.pop(next(iter(checkpoints)))
+                applied += 1
+            if applied:
+                try:
+                    self._store.save(checkpoints)
+                except OSError as e:
+                    logging.error(f"Error persisting stream checkpoint: {e}")
+        logging.info(f"Change stream batch: {applied} applied, {skipped} skipped, {len(failures)} failed")
+        return {'batchItemFailures': failures}
+
+
+class LocalStreamSource:
+    """Offline stand-in for a DynamoDB stream: records model changes, then drains them as an event."""
+
+    def __init__(self):
+        self._records: List[Dict[str, Any]] = []
+        self._sequence = 0
+        self._lock = threading.Lock()
+
+    def emit(self, event_name: str, old=None, new=None) -> None:
+        """Record a change of a PynamoDB model instance (INSERT: new, MODIFY: both, REMOVE: old)."""
+        model = new if new is not None else old
+        table = model.Meta.table_name
+        image = (new if new is not None else old).serialize()
+        hash_name = model._hash_key_attribute().attr_name
+        with self._lock:
+            self._sequence += 1
+            data = {'Keys': {hash_name: image[hash_name]}, 'SequenceNumber': str(self._sequence)}
+            if old is not None:
+                data['OldImage'] = old.serialize()
+            if new is not None:
+                data['NewImage'] = new.serialize()
+            self._records.append({
+                'eventName': event_name,
+                'eventSource': 'aws:dynamodb',
+                'eventSourceARN': f'arn:aws:dynamodb:local:000000000000:table/{table}/stream/local',
+                'dynamodb': data,
+            })
+
+    def drain(self) -> Dict[str, Any]:
+        with self._lock:
+            records, self._records = self._records, []
+        return {'Records': records}
+
+
+change_stream = ChangeStreamConsumer()
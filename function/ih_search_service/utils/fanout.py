@@ -0,0 +1,115 @@
+"""Concurrent fan-out of independent blocking calls (e.g. DynamoDB requests).
+
+PynamoDB is synchronous, so each call is bridged onto an asyncio event loop
+through a shared thread pool. The loop runs the calls concurrently, making
+request latency roughly that of the slowest call rather than their sum.
+
+    results = fan_out({
+        'followers': lambda: query_followers(...),
+        'engagement': lambda: query_engagement(...),
+    }, short_circuit=lambda name, ids: not ids)
+
+- Every call gets its own timeout (``FANOUT_TIMEOUT_SECONDS``, default 30s).
+- ``short_circuit(name, result)`` returning True cancels the calls still
+  pending (e.g. an intersection input came back empty); their names are
+  absent from the returned dict.
+- The first failure cancels the remaining calls and is raised as a
+  ``FanoutError`` naming the source that failed.
+
+Calls run on pool threads, so they must not touch the Flask request
+context; bind any request values before fanning out. Each call runs in
+a copy of the caller's context variables (e.g. its ``utils.tracing``
+trace). A fan-out started from inside a fanned-out call runs its calls
+inline. Cancelling a call that already started abandons its result; it
+cannot interrupt the blocking request itself.
+"""
+import asyncio
+import contextvars
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+FANOUT_TIMEOUT_SECONDS = float(os.environ.get('FANOUT_TIMEOUT_SECONDS', '30'))
+FANOUT_WORKERS = int(os.environ.get('FANOUT_WORKERS', '16'))
+
+_executor = ThreadPoolExecutor(max_workers=FANOUT_WORKERS, thread_name_prefix='fanout')
+# Set in the context each fanned-out call runs in
+_nested: contextvars.ContextVar[bool] = contextvars.ContextVar('fanout_nested', default=False)
+
+
+class FanoutError(Exception):
+    """A fanned-out call failed; ``source`` names it and ``cause`` is the original error."""
+
+    def __init__(self, source: str, cause: BaseException):
+        super().__init__(f"{source}: {cause!r}")
+        self.source = source
+        self.cause = cause
+
+
+class FanoutTimeout(FanoutError):
+    """A fanned-out call exceeded its timeout."""
+
+
+def _call_context() -> contextvars.Context:
+    context = contextvars.copy_context()
+    context.run(_nested.set, True)
+    return context
+
+
+async def _run(calls: Dict[str, Callable[[], Any]], timeout: float,
+               short_circuit: Optional[Callable[[str, Any], bool]]) -> Dict[str, Any]:
+    loop = asyncio.get_running_loop()
+    # Each call runs in a copy of the caller's context (e.g. its request trace)
+    tasks = {
+        asyncio.ensure_future(asyncio.wait_for(
+            loop.run_in_executor(_executor, functools.partial(_call_context().run, fn)), timeout)): name
+        for name, fn in calls.items()
+    }
+    pending = set(tasks)
+    results: Dict[str, Any] = {}
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                name = tasks[task]
+                try:
+                    result = task.result()
+                except asyncio.TimeoutError as e:
+                    raise FanoutTimeout(name, e) from e
+                except Exception as e:
+                    raise FanoutError(name, e) from e
+                results[name] = result
+                if short_circuit is not None and short_circuit(name, result):
+                    return results
+        return results
+    finally:
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+
+
+def _run_inline(calls: Dict[str, Callable[[], Any]],
+                short_circuit: Optional[Callable[[str, Any], bool]]) -> Dict[str, Any]:
+    results: Dict[str, Any] = {}
+    for name, fn in calls.items():
+        try:
+            results[name] = fn()
+        except Exception as e:
+            raise FanoutError(name, e) from e
+        if short_circuit is not None and short_circuit(name, results[name]):
+            break
+    return results
+
+
+def fan_out(calls: Dict[str, Callable[[], Any]], timeout: Optional[float] = None,
+            short_circuit: Optional[Callable[[str, Any], bool]] = None) -> Dict[str, Any]:
+    """Run ``calls`` concurrently and return their results keyed by name."""
+    if not calls:
+        return {}
+    if _nested.get():
+        # Nested fan-out from inside a fanned-out call: run inline so pool
+        # workers never block waiting on tasks queued behind them.
+        return _run_inline(calls, short_circuit)
+    return asyncio.run(_run(calls, FANOUT_TIMEOUT_SECONDS if timeout is None else timeout, short_circuit))
@@ -0,0 +1,236 @@
+"""Versioned binary artifact of named, fixed-layout sections, opened with mmap.
+
+Layout (all integers little-endian, sections 8-byte aligned):
+
+    header     magic 'IHSX', format version (u16), section count (u16),
+               payload length (u64), directory CRC32 (u32), build time (u64)
+    directory  per section: name (32 bytes, NUL padded), type code (1 byte),
+               offset from payload start (u64), length in bytes (u64),
+               section CRC32 (u32)
+    payload    the section bytes
+
+Typed sections (``array``) are exposed as ``memoryview`` casts over the
+mapping, so opening an artifact does no parsing and allocates nothing per
+element. Opening checks the directory only; each section is checked
+against its CRC the first time it is read, so sections a process never
+uses are never paged in. Read-only shared mappings also let worker
+processes share the same page cache pages. String tables are two sections: ``<name>.off`` (u64
+end offsets) and ``<name>.dat`` (UTF-8 bytes); strings are decoded on access.
+
+    writer = ArtifactWriter()
+    writer.add_array('metrics.followers', 'q', followers)
+    writer.add_strings('ids', ids)
+    writer.write(path)
+
+    artifact = IndexArtifact.open(path)
+    artifact.array('metrics.followers')[i]
+    artifact.strings('ids')[i]
+"""
+import mmap
+import os
+import struct
+import sys
+import time
+import zlib
+from array import array
+from typing import Dict, Iterable, List, Optional, Tuple
+
+ARTIFACT_MAGIC = b'IHSX'
+ARTIFACT_FORMAT_VERSION = 2
+
+_HEADER = struct.Struct('<4sHHQIQ')
+_NAME_BYTES = 32
+_ENTRY = struct.Struct(f'<{_NAME_BYTES}scQQI')
+_ALIGN = 8
+# Raw byte sections; every other type code is an ``array``/``memoryview`` format
+_BYTES = 'x'
+
+
+class ArtifactError(Exception):
+    """The artifact is missing, truncated, corrupt or of an unsupported version."""
+
+
+def _pad(n: int) -> int:
+    return -n % _ALIGN
+
+
+class ArtifactWriter:
+    def __init__(self):
+        self._sections: List[Tuple[str, str, bytes]] = []
+
+    def add_bytes(self, name: str, data: bytes) -> None:
+        self._add(name, _BYTES, bytes(data))
+
+    def add_array(self, name: str, typecode: str, values: Iterable) -> None:
+        data = array(typecode, values)
+        if sys.byteorder != 'little':
+            data.byteswap()
+        self._add(name, typecode, data.tobytes())
+
+    def add_strings(self, name: str, strings: Iterable[str]) -> None:
+        blob = bytearray()
+        ends = []
+        for s in strings:
+            blob += (s or '').encode('utf-8')
+            ends.append(len(blob))
+        self.add_array(f'{name}.off', 'Q', ends)
+        self.add_bytes(f'{name}.dat', blob)
+
+    def add_blobs(self, name: str, blobs: Iterable[bytes]) -> None:
+        """Variable-length byte strings, laid out like a string table."""
+        data = bytearray()
+        ends = []
+        for b in blobs:
+            data += b
+            ends.append(len(data))
+        self.add_array(f'{name}.off', 'Q', ends)
+        self.add_bytes(f'{name}.dat', data)
+
+    def _add(self, name: str, typecode: str, data: bytes) -> None:
+        if len(name.encode('utf-8')) > _NAME_BYTES:
+            raise ValueError(f"Section name too long: {name}")
+        self._sections.append((name, typecode, data))
+
+    def write(self, path: str, built_at: Optional[float] = None) -> None:
+        """Write the artifact atomically (temp file + rename).
+
+        :param built_at: when the data was read (epoch seconds, default now);
+            readers apply the changes made since then.
+        """
+        entries = []
+        payload = bytearray()
+        for name, typecode, data in self._sections:
+            entries.append(_ENTRY.pack(name.encode('utf-8'), typecode.encode('ascii'), len(payload), len(data),
+                                       zlib.crc32(data)))
+            payload += data
+            payload += b'\x00' * _pad(len(payload))
+        directory = b''.join(entries)
+        body = directory + b'\x00' * _pad(_HEADER.size + len(directory)) + payload
+        header = _HEADER.pack(ARTIFACT_MAGIC, ARTIFACT_FORMAT_VERSION, len(entries), len(body),
+                              zlib.crc32(directory), int(time.time() if built_at is None else built_at))
+        tmp = f'{path}.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(header)
+            f.write(body)
+        os.replace(tmp, path)
+
+
+class StringTable:
+    """Lazily decoded view of a string table section pair."""
+
+    def __init__(self, ends: memoryview, data: memoryview):
+        self._ends = ends
+        self._data = data
+
+    def __len__(self) -> int:
+        return len(self._ends)
+
+    def __getitem__(self, i: int) -> str:
+        if i < 0:
+            i += len(self._ends)
+        start = self._ends[i - 1] if i else 0
+        return str(self._data[start:self._ends[i]], 'utf-8')
+
+    def raw(self, i: int) -> memoryview:
+        start = self._ends[i - 1] if i else 0
+        return self._data[start:self._ends[i]]
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+
+class IndexArtifact:
+    """A validated, read-only mapping of an artifact file."""
+
+    def __init__(self, path: str, mapping: mmap.mmap, sections: Dict[str, Tuple[str, int, int, int]],
+                 built_at: int, verify_checksum: bool = True):
+        self.path = path
+        self.built_at = built_at
+        self._mmap = mapping
+        self._view = memoryview(mapping)
+        self._sections = sections
+        # Sections whose CRC still has to be checked on first read
+        self._unverified = set(sections) if verify_checksum else set()
+
+    @classmethod
+    def open(cls, path: str, verify_checksum: bool = True) -> 'IndexArtifact':
+        if sys.byteorder != 'little':
+            raise ArtifactError("Artifacts are little-endian; big-endian hosts are not supported")
+        try:
+            with open(path, 'rb') as f:
+                mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError) as e:
+            raise ArtifactError(f"Cannot map {path}: {e}") from e
+        try:
+            if len(mapping) < _HEADER.size:
+                raise ArtifactError(f"{path}: truncated header")
+            magic, version, count, length, checksum, built_at = _HEADER.unpack_from(mapping, 0)
+            if magic != ARTIFACT_MAGIC:
+                raise ArtifactError(f"{path}: not an index artifact")
+            if version != ARTIFACT_FORMAT_VERSION:
+                raise ArtifactError(f"{path}: format version {version}, expected {ARTIFACT_FORMAT_VERSION}")
+            if len(mapping) != _HEADER.size + length:
+                raise ArtifactError(f"{path}: truncated payload")
+            directory_end = _HEADER.size + count * _ENTRY.size
+            if zlib.crc32(memoryview(mapping)[_HEADER.size:directory_end]) != checksum:
+                raise ArtifactError(f"{path}: directory checksum mismatch")
+            payload_start = directory_end + _pad(directory_end)
+            sections = {}
+            for n in range(count):
+                raw_name, typecode, offset, size, crc = _ENTRY.unpack_from(mapping, _HEADER.size + n * _ENTRY.size)
+                start = payload_start + offset
+                if start + size > len(mapping):
+                    raise ArtifactError(f"{path}: section out of bounds")
+                sections[raw_name.rstrip(b'\x00').decode('utf-8')] = (typecode.decode('ascii'), start, size, crc)
+        except (ArtifactError, struct.error, UnicodeDecodeError) as e:
+            mapping.close()
+            if isinstance(e, ArtifactError):
+                raise
+            raise ArtifactError(f"{path}: corrupt directory: {e}") from e
+        return cls(path, mapping, sections, built_at, verify_checksum)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._sections
+
+    def section_names(self) -> List[str]:
+        return list(self._sections)
+
+    def bytes(self, name: str) -> memoryview:
+        _, start, size = self._section(name)
+        return self._view[start:start + size]
+
+    def array(self, name: str) -> memoryview:
+        """Zero-copy typed view of an array section."""
+        typecode, start, size = self._section(name)
+        if typecode == _BYTES:
+            raise ArtifactError(f"Section {name} is raw bytes, not an array")
+        return self._view[start:start + size].cast(typecode)
+
+    def strings(self, name: str) -> StringTable:
+        return StringTable(self.array(f'{name}.off'), self.bytes(f'{name}.dat'))
+
+    def _section(self, name: str) -> Tuple[str, int, int]:
+        try:
+            typecode, start, size, crc = self._sections[name]
+        except KeyError:
+            raise ArtifactError(f"{self.path}: no section {name}") from None
+        if name in self._unverified:
+            if zlib.crc32(self._view[start:start + size]) != crc:
+                raise ArtifactError(f"{self.path}: checksum mismatch in section {name}")
+            self._unverified.discard(name)
+        return typecode, start, size
+
+    def close(self) -> None:
+        # Views still handed out keep the mapping alive until they are dropped.
+        try:
+            self._view.release()
+            self._mmap.close()
+        except BufferError:
+            pass
+
+
+def open_artifact(path: Optional[str], verify_checksum: bool = True) -> Optional[IndexArtifact]:
+    """Open ``path`` if it exists; ``None`` when there is no artifact to use."""
+    if not path or not os.path.exists(path):
+        return None
+    return IndexArtifact.open(path, verify_checksum=verify_checksum)
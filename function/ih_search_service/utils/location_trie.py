@@ -0,0 +1,100 @@
+"""Hierarchical location lookup.
+
+Free-form locations such as ``"Los Angeles, California, USA"`` are
+normalized into tokens ordered from the broadest level to the narrowest
+(``('usa', 'california', 'los angeles')``) and inserted into a prefix trie.
+Every suffix of the token path is inserted as well, so a query naming any
+contiguous part of the hierarchy ("California", "Los Angeles, California",
+"California, USA") resolves to all stored locations it contains.
+
+Each trie node keeps the set of original location strings in its subtree,
+so resolving a query is a walk of at most ``len(tokens)`` nodes. ``sync``
+applies the difference to a new set of locations in place, inserting the
+new ones and pruning the ones nothing uses any more.
+"""
+import threading
+from typing import Dict, Iterable, List, Set, Tuple
+
+
+def normalize_location(location: str) -> Tuple[str, ...]:
+    """Split a location on commas, collapse whitespace, casefold, broadest level first."""
+    parts = (' '.join(part.split()).casefold() for part in (location or '').split(','))
+    return tuple(reversed([p for p in parts if p]))
+
+
+class _Node:
+    __slots__ = ('children', 'locations')
+
+    def __init__(self):
+        self.children: Dict[str, '_Node'] = {}
+        self.locations: Set[str] = set()
+
+
+class LocationTrie:
+    def __init__(self):
+        self._root = _Node()
+        self._locations: Set[str] = set()
+        self._lock = threading.Lock()
+        self.version = None
+
+    def insert(self, location: str) -> None:
+        with self._lock:
+            self._insert(location)
+
+    def remove(self, location: str) -> None:
+        with self._lock:
+            self._remove(location)
+
+    def _insert(self, location: str) -> None:
+        tokens = normalize_location(location)
+        for start in range(len(tokens)):
+            node = self._root
+            for token in tokens[start:]:
+                node = node.children.setdefault(token, _Node())
+                node.locations.add(location)
+        self._locations.add(location)
+
+    def _remove(self, location: str) -> None:
+        if location not in self._locations:
+            return
+        tokens = normalize_location(location)
+        for start in range(len(tokens)):
+            path = [self._root]
+            for token in tokens[start:]:
+                node = path[-1].children.get(token)
+                if node is None:
+                    break
+                node.locations.discard(location)
+                path.append(node)
+            # Drop the nodes no stored location passes through any more
+            for depth in range(len(path) - 1, 0, -1):
+                if path[depth].locations:
+                    break
+                del path[depth - 1].children[tokens[start + depth - 1]]
+        self._locations.discard(location)
+
+    def resolve(self, query: str) -> List[str]:
+        """All stored locations contained in ``query``, sorted for stable output."""
+        tokens = normalize_location(query)
+        if not tokens:
+            return []
+        with self._lock:
+            node = self._root
+            for token in tokens:
+                node = node.children.get(token)
+                if node is None:
+                    return []
+            return sorted(node.locations)
+
+    def sync(self, locations: Iterable[str], version) -> 'LocationTrie':
+        """Bring the trie to ``locations`` unless already synced for ``version``, changing only the difference."""
+        if self.version != version:
+            with self._lock:
+                if self.version != version:
+                    current = set(locations)
+                    for location in self._locations - current:
+                        self._remove(location)
+                    for location in current - self._locations:
+                        self._insert(location)
+                    self.version = version
+        return self
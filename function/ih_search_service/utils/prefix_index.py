@@ -0,0 +1,256 @@
+"""Typeahead over short strings: a sorted term array with binary search.
+
+Every suggestion (an influencer name or a platform handle) is stored under
+one or more normalized terms: the casefolded text, and for names every
+word start as well, so ``"smi"`` finds ``"Alice Smith"``. Handles drop a
+leading ``@``. Terms live in one sorted list, so the entries for a prefix
+are the contiguous run found with two ``bisect`` calls:
+
+    lo = bisect_left(terms, prefix); hi = bisect_left(terms, prefix + '\\uffff')
+
+Prefixes of up to ``TOP_PREFIX_CHARS`` characters match most of the index,
+so their best ``TOP_SUGGESTIONS`` are kept ranked and a lookup never walks
+their run. The top ``limit`` suggestions of other prefixes are kept in an
+LRU cache per prefix. A warm lookup is a dictionary hit, a cold one
+``O(log n + run length)``, and neither reads DynamoDB.
+
+Readers take no lock: the sorted arrays and the short-prefix rankings are
+an immutable snapshot that writes copy, change and swap in. A write drops
+the cached results of the prefixes of the terms it changed and nothing
+else. ``load_in_background`` builds the index on a daemon thread so
+callers never wait on the build.
+"""
+import heapq
+import logging
+import os
+import threading
+from bisect import bisect_left
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from utils.tracing import span
+
+AUTOCOMPLETE_CACHE_SIZE = int(os.environ.get('AUTOCOMPLETE_CACHE_SIZE', '4096'))
+# Prefixes this short keep a ranked top list instead of walking their run
+TOP_PREFIX_CHARS = int(os.environ.get('AUTOCOMPLETE_TOP_PREFIX_CHARS', '2'))
+TOP_SUGGESTIONS = int(os.environ.get('AUTOCOMPLETE_TOP_SUGGESTIONS', '50'))
+
+# (term, kind, value, key, platform, followers); sorted on term
+Entry = Tuple[str, str, str, str, Optional[str], int]
+
+
+def normalize_term(text: str) -> str:
+    return ' '.join((text or '').split()).casefold().lstrip('@')
+
+
+def _name_terms(name: str) -> List[str]:
+    words = normalize_term(name).split(' ')
+    return [' '.join(words[i:]) for i in range(len(words)) if words[i]]
+
+
+def _rank(entry: Entry):
+    return -entry[5], entry[0], entry[3]
+
+
+def _best(entries: Iterable[Entry], limit: int) -> List[Entry]:
+    """Top ``limit`` entries by followers; a name matching on several of its words is listed once."""
+    best: Dict[Tuple[str, str, Optional[str]], Entry] = {}
+    for entry in entries:
+        best.setdefault((entry[1], entry[3], entry[4]), entry)
+    return heapq.nsmallest(limit, best.values(), key=_rank)
+
+
+class _Snapshot:
+    """Immutable contents: entries sorted on term, their terms, and the short-prefix top lists."""
+    __slots__ = ('entries', 'terms', 'top')
+
+    def __init__(self, entries: List[Entry], terms: List[str], top: Dict[str, List[Entry]]):
+        self.entries = entries
+        self.terms = terms
+        self.top = top
+
+    def run(self, prefix: str) -> List[Entry]:
+        lo = bisect_left(self.terms, prefix)
+        hi = bisect_left(self.terms, prefix + '\uffff', lo)
+        return self.entries[lo:hi]
+
+
+class PrefixIndex:
+    def __init__(self, cache_size: int = AUTOCOMPLETE_CACHE_SIZE):
+        self.cache_size = cache_size
+        # Serializes writers; readers use the current snapshot
+        self._lock = threading.Lock()
+        self._cache_lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        # Result cache counters (utils.service_metrics)
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self._reset()
+
+    def _reset(self):
+        self._snapshot = _Snapshot([], [], {})
+        self._by_key: Dict[str, List[Entry]] = {}
+        self._followers: Dict[str, Dict[Optional[str], int]] = {}
+        self._cache: 'OrderedDict[str, Dict[int, List[Dict[str, Any]]]]' = OrderedDict()
+        # Bumped by every write; results computed across a write are not cached
+        self._generation = 0
+        self.loaded = False
+
+    def _suggestions(self, key: str, name: Optional[str], handles: Iterable[Tuple[str, str]]) -> List[Entry]:
+        followers = self._followers.get(key, {})
+        total = sum(followers.values())
+        entries = [(term, 'name', name, key, None, total) for term in _name_terms(name or '')]
+        for platform, handle in handles:
+            if handle:
+                entries.append((normalize_term(handle), 'handle', handle, key, platform, followers.get(platform, 0)))
+        return [e for e in entries if e[0]]
+
+    def rebuild(self, suggestions: Iterable[Tuple[str, Optional[str], Iterable[Tuple[str, str]]]],
+                followers: Dict[str, Dict[Optional[str], int]]) -> None:
+        """Replace the contents.
+
+        :param suggestions: ``(key, name, [(platform, handle), ...])`` per influencer.
+        :param followers: ``{key: {platform: followers}}`` used for ranking.
+        """
+        fresh = PrefixIndex(self.cache_size)
+        fresh._followers = {key: dict(by_platform) for key, by_platform in followers.items()}
+        entries: List[Entry] = []
+        by_prefix: Dict[str, List[Entry]] = {}
+        for key, name, handles in suggestions:
+            suggestions_of_key = fresh._suggestions(key, name, handles)
+            fresh._by_key[key] = suggestions_of_key
+            entries.extend(suggestions_of_key)
+            for entry in suggestions_of_key:
+                for n in range(1, min(TOP_PREFIX_CHARS, len(entry[0])) + 1):
+                    by_prefix.setdefault(entry[0][:n], []).append(entry)
+        entries.sort()
+        snapshot = _Snapshot(entries, [e[0] for e in entries],
+                             {prefix: _best(run, TOP_SUGGESTIONS) for prefix, run in by_prefix.items()})
+        with self._lock:
+            self._by_key = fresh._by_key
+            self._followers = fresh._followers
+            with self._cache_lock:
+                self._snapshot = snapshot
+                self._cache.clear()
+                self._generation += 1
+            self.loaded = True
+
+    def ensure_loaded(self, loader: Callable[[], Tuple[Iterable[Any], Dict[str, Dict[Optional[str], int]]]]
+                      ) -> 'PrefixIndex':
+        """Build from ``loader()`` -> ``(suggestions, followers)`` once; concurrent callers wait for it."""
+        if not self.loaded:
+            with self._build_lock:
+                if not self.loaded:
+                    with span('index_build', index='prefix'):
+                        self.rebuild(*loader())
+        return self
+
+    def load_in_background(self, loader: Callable[[], Tuple[Iterable[Any], Dict[str, Dict[Optional[str], int]]]]
+                           ) -> bool:
+        """Start ``ensure_loaded(loader)`` on a daemon thread; False when loaded or a build is running."""
+        if self.loaded or self._build_lock.locked():
+            return False
+
+        def build():
+            try:
+                self.ensure_loaded(loader)
+            except Exception as e:
+                logging.error(f"Error building prefix index: {e}")
+
+        threading.Thread(target=build, name='prefix-index-build', daemon=True).start()
+        return True
+
+    def clear(self) -> None:
+        with self._lock, self._cache_lock:
+            self._reset()
+
+    def apply_changes(self, upserts: Iterable[Tuple[str, Optional[str], Iterable[Tuple[str, str]],
+                                                 Optional[Dict[Optional[str], int]]]] = (),
+                      removals: Iterable[str] = ()) -> None:
+        """Upsert and remove several influencers with one copy of the arrays.
+
+        :param upserts: ``(key, name, handles, followers)``; see ``upsert``.
+        """
+        with self._lock:
+            snapshot = self._snapshot
+            entries, terms = list(snapshot.entries), list(snapshot.terms)
+            changed: Set[str] = set()
+
+            def drop(key):
+                for entry in self._by_key.pop(key, []):
+                    changed.add(entry[0])
+                    i = bisect_left(entries, entry)
+                    if i < len(entries) and entries[i] == entry:
+                        del entries[i]
+                        del terms[i]
+
+            for key in removals:
+                drop(key)
+                self._followers.pop(key, None)
+            for key, name, handles, followers in upserts:
+                if followers is not None:
+                    self._followers[key] = dict(followers)
+                drop(key)
+                added = self._suggestions(key, name, handles)
+                self._by_key[key] = added
+                for entry in added:
+                    changed.add(entry[0])
+                    i = bisect_left(entries, entry)
+                    entries.insert(i, entry)
+                    terms.insert(i, entry[0])
+            if not changed:
+                return
+            prefixes = {term[:n] for term in changed for n in range(1, len(term) + 1)}
+            fresh = _Snapshot(entries, terms, dict(snapshot.top))
+            for prefix in prefixes:
+                if len(prefix) <= TOP_PREFIX_CHARS:
+                    top = _best(fresh.run(prefix), TOP_SUGGESTIONS)
+                    if top:
+                        fresh.top[prefix] = top
+                    else:
+                        fresh.top.pop(prefix, None)
+            with self._cache_lock:
+                self._snapshot = fresh
+                self._generation += 1
+                for prefix in prefixes:
+                    self._cache.pop(prefix, None)
+
+    def upsert(self, key: str, name: Optional[str], handles: Iterable[Tuple[str, str]],
+               followers: Optional[Dict[Optional[str], int]] = None) -> None:
+        """Insert or replace one influencer's suggestions.
+
+        :param followers: ``{platform: followers}`` replacing the counts it is
+            ranked by; when omitted the current counts are kept.
+        """
+        self.apply_changes(upserts=[(key, name, handles, followers)])
+
+    def remove(self, key: str) -> None:
+        self.apply_changes(removals=[key])
+
+    def complete(self, prefix: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """Top ``limit`` suggestions starting with ``prefix``, most followed first."""
+        prefix = normalize_term(prefix)
+        if not prefix or limit <= 0:
+            return []
+        with self._cache_lock:
+            hit = self._cache.get(prefix, {}).get(limit)
+            if hit is not None:
+                self.cache_hits += 1
+                self._cache.move_to_end(prefix)
+                return hit
+            self.cache_misses += 1
+            generation = self._generation
+            snapshot = self._snapshot
+        if len(prefix) <= TOP_PREFIX_CHARS and limit <= TOP_SUGGESTIONS:
+            best = snapshot.top.get(prefix, [])[:limit]
+        else:
+            best = _best(snapshot.run(prefix), limit)
+        out = [{'value': value, 'type': kind, 'influencer_id': key, 'platform': platform, 'followers': followers}
+               for _, kind, value, key, platform, followers in best]
+        with self._cache_lock:
+            if generation == self._generation:
+                self._cache.setdefault(prefix, {})[limit] = out
+                self._cache.move_to_end(prefix)
+                if len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return out
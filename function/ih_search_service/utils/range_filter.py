@@ -0,0 +1,94 @@
+"""Conjunctions of inclusive numeric ranges, compiled for DynamoDB and for columns.
+
+A ``RangeFilter`` holds ``{attribute: (low, high)}``; a ``None`` bound is
+open. The same ranges compile to:
+
+- ``key_condition`` - the range-key condition of an index query,
+- ``condition`` - one filter expression (``between`` / ``>=`` / ``<=``
+  terms joined with AND) for the ranges the key condition does not cover,
+- ``predicate`` - the residual check on decoded items,
+- ``mask`` - a column-at-a-time evaluation over parallel arrays (e.g. the
+  search artifact's metrics columns): each range narrows the surviving
+  row positions before the next column is read.
+
+    ranges = RangeFilter({'total_followers': (1000, None), 'engagement_rate': (2.5, 8)})
+    Metrics.scan(ranges.condition(Metrics))
+"""
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+Bounds = Tuple[Optional[float], Optional[float]]
+
+
+def _term(attribute, low, high):
+    if low is not None and high is not None:
+        return attribute.between(low, high)
+    if low is not None:
+        return attribute >= low
+    return attribute <= high
+
+
+class RangeFilter:
+    def __init__(self, ranges: Mapping[str, Bounds]):
+        for name, (low, high) in ranges.items():
+            if low is None and high is None:
+                raise ValueError(f"Range for '{name}' needs a min or a max")
+            if low is not None and high is not None and low > high:
+                raise ValueError(f"Range for '{name}' has min greater than max")
+        self.ranges: Dict[str, Bounds] = dict(ranges)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.ranges
+
+    def __len__(self) -> int:
+        return len(self.ranges)
+
+    def is_closed(self, name: str) -> bool:
+        low, high = self.ranges[name]
+        return low is not None and high is not None
+
+    def key_condition(self, attribute, name: str):
+        """Range-key condition on ``attribute`` (an index attribute) for the range on ``name``."""
+        return _term(attribute, *self.ranges[name])
+
+    def condition(self, model, exclude: Iterable[str] = ()):
+        """One filter expression over ``model`` for every range not in ``exclude``, or None."""
+        exclude = set(exclude)
+        condition = None
+        for name, (low, high) in self.ranges.items():
+            if name in exclude:
+                continue
+            term = _term(getattr(model, name), low, high)
+            condition = term if condition is None else condition & term
+        return condition
+
+    def predicate(self, exclude: Iterable[str] = ()) -> Callable[[Any], bool]:
+        exclude = set(exclude)
+        checks = [(name, low, high) for name, (low, high) in self.ranges.items() if name not in exclude]
+
+        def matches(item) -> bool:
+            for name, low, high in checks:
+                value = getattr(item, name, None)
+                if value is None or (low is not None and value < low) or (high is not None and value > high):
+                    return False
+            return True
+        return matches
+
+    def mask(self, columns: Mapping[str, Sequence[float]], rows: Optional[Iterable[int]] = None,
+             only: Optional[Iterable[str]] = None) -> List[int]:
+        """Positions of the rows matching every range (or just those in ``only``)."""
+        names = list(only) if only is not None else list(self.ranges)
+        if rows is None:
+            rows = range(len(columns[names[0]])) if names else []
+        rows = list(rows)
+        for name in names:
+            if not rows:
+                break
+            column = columns[name]
+            low, high = self.ranges[name]
+            if low is None:
+                rows = [r for r in rows if column[r] <= high]
+            elif high is None:
+                rows = [r for r in rows if column[r] >= low]
+            else:
+                rows = [r for r in rows if low <= column[r] <= high]
+        return rows
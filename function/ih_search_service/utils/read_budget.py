@@ -0,0 +1,171 @@
+"""Per-request read budgets and budgeted, resumable DynamoDB scans.
+
+A ``ReadBudget`` caps three things for one request: items scanned
+(``ScannedCount``), consumed read capacity units, and wall time. Scans
+check it between pages. When it runs out, they stop and return what
+matched so far, a ``last_key`` that resumes exactly where they stopped,
+and ``partial=True``. Latency then depends on the budget rather than on
+how selective the filter is.
+
+    result = budgeted_scan(Influencer, Influencer.name.contains('ann'), limit=20,
+                           exclusive_start_key=key, budget=ReadBudget.from_request())
+    result.items, result.last_key, result.partial
+
+Defaults come from ``READ_BUDGET_MAX_SCANNED``, ``READ_BUDGET_MAX_RCU`` and
+``READ_BUDGET_MAX_SECONDS``. ``READ_BUDGET_MAX_SECONDS`` should stay well
+below the Lambda timeout (180s in template.yaml). A request may lower the
+limits with ``?max_scanned=`` / ``?max_seconds=`` but never raise them.
+"""
+import os
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from pynamodb.constants import CAPACITY_UNITS, CONSUMED_CAPACITY, ITEMS, LAST_EVALUATED_KEY, SCANNED_COUNT, TOTAL
+
+from utils.selectivity import scan_selectivity
+from utils.tracing import span
+
+READ_BUDGET_MAX_SCANNED = int(os.environ.get('READ_BUDGET_MAX_SCANNED', '20000'))
+READ_BUDGET_MAX_RCU = float(os.environ.get('READ_BUDGET_MAX_RCU', '1000'))
+READ_BUDGET_MAX_SECONDS = float(os.environ.get('READ_BUDGET_MAX_SECONDS', '20'))
+
+
+class ReadBudget:
+    def __init__(self, max_scanned: int = READ_BUDGET_MAX_SCANNED, max_capacity: float = READ_BUDGET_MAX_RCU,
+                 max_seconds: float = READ_BUDGET_MAX_SECONDS, clock: Callable[[], float] = time.monotonic):
+        self.max_scanned = max_scanned
+        self.max_capacity = max_capacity
+        self.max_seconds = max_seconds
+        self._clock = clock
+        self._started = clock()
+        self.scanned = 0
+        self.capacity = 0.0
+
+    @classmethod
+    def from_request(cls) -> 'ReadBudget':
+        """Service defaults, optionally tightened by ``?max_scanned=`` / ``?max_seconds=``."""
+        from flask import has_request_context, request
+        max_scanned, max_seconds = READ_BUDGET_MAX_SCANNED, READ_BUDGET_MAX_SECONDS
+        if has_request_context():
+            asked = request.args.get('max_scanned', type=int)
+            if asked is not None and asked > 0:
+                max_scanned = min(max_scanned, asked)
+            asked = request.args.get('max_seconds', type=float)
+            if asked is not None and asked > 0:
+                max_seconds = min(max_seconds, asked)
+        return cls(max_scanned=max_scanned, max_seconds=max_seconds)
+
+    def charge(self, scanned: int = 0, capacity: float = 0.0) -> None:
+        self.scanned += scanned
+        self.capacity += capacity
+
+    @property
+    def elapsed(self) -> float:
+        return self._clock() - self._started
+
+    @property
+    def exhausted_by(self) -> Optional[str]:
+        """Which limit ran out ('scanned', 'capacity' or 'time'), or None."""
+        if self.scanned >= self.max_scanned:
+            return 'scanned'
+        if self.capacity >= self.max_capacity:
+            return 'capacity'
+        if self.elapsed >= self.max_seconds:
+            return 'time'
+        return None
+
+    def remaining_scanned(self) -> int:
+        return max(0, self.max_scanned - self.scanned)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'scanned': self.scanned,
+            'consumed_capacity': round(self.capacity, 2),
+            'elapsed_ms': int(self.elapsed * 1000),
+            'exhausted_by': self.exhausted_by,
+        }
+
+
+class ScanResult(tuple):
+    """``(items, last_key)`` - the shape model search methods return - plus how the read ended."""
+
+    def __new__(cls, items: List[Any], last_key: Optional[Dict[str, Any]], partial: bool = False,
+                budget: Optional[ReadBudget] = None, round_trips: int = 0):
+        result = super().__new__(cls, (items, last_key))
+        result.partial = partial
+        result.budget = budget
+        result.round_trips = round_trips
+        return result
+
+    @property
+    def items(self) -> List[Any]:
+        return self[0]
+
+    @property
+    def last_key(self) -> Optional[Dict[str, Any]]:
+        return self[1]
+
+
+def _item_key(model, raw_item: Dict[str, Any], index_name: Optional[str]) -> Dict[str, Any]:
+    """The exclusive start key that resumes right after ``raw_item``."""
+    names = [model._hash_key_attribute().attr_name]
+    range_attr = model._range_key_attribute()
+    if range_attr is not None:
+        names.append(range_attr.attr_name)
+    if index_name:
+        index = model._indexes[index_name]
+        names.extend(a.attr_name for a in index.Meta.attributes.values() if a.is_hash_key or a.is_range_key)
+    return {name: raw_item[name] for name in dict.fromkeys(names) if name in raw_item}
+
+
+def budgeted_scan(model, filter_condition=None, limit: Optional[int] = None,
+                  exclusive_start_key: Optional[Dict[str, Any]] = None, budget: Optional[ReadBudget] = None,
+                  predicate: Optional[Callable[[Any], bool]] = None, page_size: Optional[int] = None,
+                  index_name: Optional[str] = None, shape: Optional[str] = None) -> ScanResult:
+    """Scan ``model`` page by page until ``limit`` matches, the end of the table, or the budget.
+
+    :param filter_condition: server-side filter (applied by DynamoDB after it reads a page).
+    :param predicate: extra in-memory filter on decoded items, for conditions
+        DynamoDB cannot express (e.g. membership in a list of maps).
+    :param page_size: fixed DynamoDB ``Limit`` per round trip (items evaluated, not matched).
+    :param shape: query shape for adaptive page sizing (``utils.selectivity``);
+        used when ``limit`` is set and ``page_size`` is not.
+    """
+    budget = budget or ReadBudget()
+    connection = model._get_connection()
+    items: List[Any] = []
+    key = exclusive_start_key
+    round_trips = 0
+    while True:
+        request_limit = page_size
+        if request_limit is None and shape and limit is not None:
+            request_limit = scan_selectivity.page_size(shape, limit - len(items))
+        # Never ask DynamoDB to evaluate more items than the budget has left
+        remaining = max(1, budget.remaining_scanned())
+        request_limit = min(request_limit, remaining) if request_limit else remaining
+        page = connection.scan(filter_condition=filter_condition, limit=request_limit,
+                               exclusive_start_key=key, index_name=index_name,
+                               return_consumed_capacity=TOTAL)
+        round_trips += 1
+        scanned = page.get(SCANNED_COUNT, 0)
+        budget.charge(scanned, page.get(CONSUMED_CAPACITY, {}).get(CAPACITY_UNITS, 0))
+        raw_items = page.get(ITEMS, [])
+        key = page.get(LAST_EVALUATED_KEY)
+        with span('models', items=len(raw_items)):
+            decoded = [model.from_raw_data(raw) for raw in raw_items]
+        with span('matches', items=len(decoded)):
+            matches = [(n, raw, item) for n, (raw, item) in enumerate(zip(raw_items, decoded), 1)
+                       if predicate is None or predicate(item)]
+        if shape:
+            scan_selectivity.observe(shape, len(matches), scanned)
+        for n, raw, item in matches:
+            items.append(item)
+            if limit is not None and len(items) >= limit:
+                if n == len(raw_items):
+                    return ScanResult(items, key, False, budget, round_trips)
+                # Stop mid-page: resume right after the last returned item
+                return ScanResult(items, _item_key(model, raw, index_name), False, budget, round_trips)
+        if key is None:
+            return ScanResult(items, None, False, budget, round_trips)
+        if budget.exhausted_by:
+            return ScanResult(items, key, True, budget, round_trips)
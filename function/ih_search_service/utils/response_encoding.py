@@ -0,0 +1,171 @@
+"""Negotiated response encodings: columnar JSON, MessagePack and compression.
+
+Representation (applied by ``SearchJSONProvider`` to everything returned
+through ``jsonify``):
+
+- ``?format=columnar`` rewrites a ``data`` list of row objects into one
+  array per field: ``{"fields": [...], "data": {"id": [...], ...}}``.
+  Rows missing a field get ``null``. Nested values such as ``socials``
+  stay as they are, one entry per row.
+- ``Accept: application/msgpack`` returns MessagePack instead of JSON when
+  the optional ``msgpack`` package is installed; otherwise JSON is sent.
+
+Content coding (``compress_response``, an ``after_request`` hook):
+
+- ``Accept-Encoding`` is negotiated by q-value between ``br`` (optional
+  ``brotli`` package) and ``gzip``. Ties go to brotli.
+- Buffered bodies below ``COMPRESS_MIN_BYTES`` are sent as they are.
+- Streamed bodies (e.g. NDJSON) are compressed chunk by chunk with a sync
+  flush, so each chunk is still delivered as soon as it is produced.
+
+Requests served through ``app.handler`` on Lambda always get plain JSON:
+aws-wsgi hands API Gateway the body as text, which binary (compressed or
+MessagePack) bodies are not, and API Gateway compresses responses itself
+(``MinimumCompressionSize`` in template.yaml).
+"""
+import gzip
+import os
+import zlib
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from flask import has_request_context, request
+from flask.json.provider import DefaultJSONProvider
+
+from utils.tracing import span
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+try:
+    import msgpack
+except ImportError:  # optional dependency
+    msgpack = None
+
+COMPRESS_MIN_BYTES = int(os.environ.get('COMPRESS_MIN_BYTES', '1024'))
+COMPRESS_LEVEL_GZIP = int(os.environ.get('COMPRESS_LEVEL_GZIP', '6'))
+COMPRESS_LEVEL_BROTLI = int(os.environ.get('COMPRESS_LEVEL_BROTLI', '5'))
+
+MSGPACK_MIMETYPES = ('application/msgpack', 'application/x-msgpack')
+COMPRESSIBLE_MIMETYPES = {'application/json', 'application/x-ndjson', *MSGPACK_MIMETYPES}
+
+
+def columnar(rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """``[{'a': 1}, {'a': 2, 'b': 3}]`` -> ``{'fields': ['a', 'b'], 'data': {'a': [1, 2], 'b': [None, 3]}}``."""
+    fields = list(dict.fromkeys(key for row in rows for key in row))
+    return {'fields': fields, 'data': {field: [row.get(field) for row in rows] for field in fields}}
+
+
+def _via_lambda() -> bool:
+    # aws-wsgi puts the Lambda event into the WSGI environ
+    return 'awsgi.event' in request.environ
+
+
+def negotiated_format() -> str:
+    """'msgpack' or 'json' for the current request (part of the coalescing key)."""
+    if msgpack is None or _via_lambda():
+        return 'json'
+    accept = request.accept_mimetypes
+    explicit = any(value in MSGPACK_MIMETYPES and quality > 0 for value, quality in accept)
+    best = accept.best_match([*MSGPACK_MIMETYPES, 'application/json'])
+    return 'msgpack' if explicit and best in MSGPACK_MIMETYPES else 'json'
+
+
+class SearchJSONProvider(DefaultJSONProvider):
+    """``jsonify`` provider adding the columnar layout and MessagePack output."""
+
+    def response(self, *args, **kwargs):
+        with span('jsonify'):
+            return self._response(*args, **kwargs)
+
+    def _response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        if (has_request_context() and request.args.get('format') == 'columnar' and isinstance(obj, dict)
+                and isinstance(obj.get('data'), list) and all(isinstance(r, dict) for r in obj['data'])):
+            obj = {**obj, 'format': 'columnar', **columnar(obj['data'])}
+        if has_request_context() and negotiated_format() == 'msgpack':
+            return self._app.response_class(msgpack.packb(obj, default=self.default, use_bin_type=True),
+                                            mimetype=MSGPACK_MIMETYPES[0])
+        return super().response(obj)
+
+
+def _choose_encoding(header: Optional[str]) -> Optional[str]:
+    if not header:
+        return None
+    weights = {}
+    for part in header.split(','):
+        coding, _, params = part.strip().partition(';')
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        weights[coding.strip().lower()] = quality
+    candidates = (['br'] if brotli is not None else []) + ['gzip']
+    wildcard = weights.get('*', 0.0)
+    best, best_q = None, 0.0
+    for coding in candidates:
+        quality = weights.get(coding, wildcard)
+        if quality > best_q:
+            best, best_q = coding, quality
+    return best
+
+
+def _compress(data: bytes, encoding: str) -> bytes:
+    if encoding == 'br':
+        return brotli.compress(data, quality=COMPRESS_LEVEL_BROTLI)
+    return gzip.compress(data, compresslevel=COMPRESS_LEVEL_GZIP)
+
+
+def _compress_stream(chunks: Iterable[Any], encoding: str) -> Iterator[bytes]:
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=COMPRESS_LEVEL_BROTLI)
+        process, flush, finish = compressor.process, compressor.flush, compressor.finish
+    else:
+        compressor = zlib.compressobj(COMPRESS_LEVEL_GZIP, zlib.DEFLATED, 31)  # 31: gzip container
+
+        def process(data):
+            return compressor.compress(data)
+
+        def flush():
+            return compressor.flush(zlib.Z_SYNC_FLUSH)
+
+        def finish():
+            return compressor.flush(zlib.Z_FINISH)
+    try:
+        for chunk in chunks:
+            out = process(chunk.encode('utf-8') if isinstance(chunk, str) else chunk) + flush()
+            if out:
+                yield out
+        yield finish()
+    finally:
+        close = getattr(chunks, 'close', None)
+        if close is not None:
+            close()
+
+
+def compress_response(response):
+    """``after_request`` hook: apply the negotiated content coding."""
+    if (response.status_code < 200 or response.status_code in (204, 304)
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES
+            or _via_lambda()):
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = _choose_encoding(request.headers.get('Accept-Encoding'))
+    if encoding is None:
+        return response
+    if response.is_streamed:
+        response.response = _compress_stream(response.response, encoding)
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+        if len(data) < COMPRESS_MIN_BYTES:
+            return response
+        with span('compress', encoding=encoding, size=len(data)):
+            response.set_data(_compress(data, encoding))
+    response.headers['Content-Encoding'] = encoding
+    return response
@@ -0,0 +1,62 @@
+"""Observed filter selectivity per query shape, used to size scan pages.
+
+DynamoDB applies ``Limit`` to the items it evaluates, before the filter.
+Asking for the number of results wanted returns mostly empty pages for
+selective filters, and asking for everything reads far more than needed.
+``SelectivityTracker`` keeps, per query shape (e.g. ``influencer:name``),
+decayed counts of items matched and items scanned. It sizes the next page
+so that it is expected to fill the remaining results in one round trip:
+
+    page = wanted / selectivity * SCAN_PAGE_HEADROOM
+
+clamped to ``[wanted, SCAN_PAGE_MAX]``. Each observation first multiplies
+the old counts by ``SELECTIVITY_DECAY``, so the estimate follows the data as
+it changes. A weak prior keeps the estimate defined for a new shape.
+"""
+import math
+import os
+import threading
+from typing import Dict
+
+SCAN_PAGE_MAX = int(os.environ.get('SCAN_PAGE_MAX', '1000'))
+SCAN_PAGE_HEADROOM = float(os.environ.get('SCAN_PAGE_HEADROOM', '1.5'))
+SELECTIVITY_DECAY = float(os.environ.get('SELECTIVITY_DECAY', '0.9'))
+# Prior: as if one match had been seen in every PRIOR_SCANNED items
+SELECTIVITY_PRIOR_SCANNED = 10.0
+
+
+class SelectivityTracker:
+    def __init__(self, decay: float = SELECTIVITY_DECAY):
+        self.decay = decay
+        self._lock = threading.Lock()
+        self._stats: Dict[str, list] = {}
+
+    def observe(self, shape: str, matched: int, scanned: int) -> None:
+        if scanned <= 0:
+            return
+        with self._lock:
+            stats = self._stats.setdefault(shape, [1.0, SELECTIVITY_PRIOR_SCANNED])
+            stats[0] = stats[0] * self.decay + matched
+            stats[1] = stats[1] * self.decay + scanned
+
+    def selectivity(self, shape: str) -> float:
+        with self._lock:
+            matched, scanned = self._stats.get(shape, (1.0, SELECTIVITY_PRIOR_SCANNED))
+        return min(1.0, matched / scanned)
+
+    def page_size(self, shape: str, wanted: int, cap: int = SCAN_PAGE_MAX) -> int:
+        """DynamoDB ``Limit`` expected to yield ``wanted`` matches in one round trip."""
+        selectivity = max(self.selectivity(shape), 1.0 / cap)
+        size = math.ceil(wanted / selectivity * SCAN_PAGE_HEADROOM)
+        return max(1, min(cap, max(wanted, size)))
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {shape: round(matched / scanned, 6) for shape, (matched, scanned) in self._stats.items()}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stats.clear()
+
+
+scan_selectivity = SelectivityTracker()
@@ -0,0 +1,505 @@
+"""In-process service metrics: Prometheus text on ``/metrics``, EMF log lines on Lambda.
+
+Recorded per route (the URL rule, e.g. ``/posts/<string:post_id>``):
+
+- ``http_requests_total{route,method,status}`` and
+  ``http_request_duration_seconds{route,method}`` (histogram);
+- ``http_requests_in_flight``;
+- per DynamoDB call (``install`` wraps ``Connection._make_api_call``):
+  ``dynamodb_calls_total``, ``dynamodb_items_scanned_total``,
+  ``dynamodb_items_returned_total`` and
+  ``dynamodb_consumed_capacity_units_total``, labelled with the route that
+  made the call (``-`` outside requests), operation, table and index;
+- cache hits, misses and hit ratio of request coalescing and the
+  autocomplete result cache (read from their own counters at scrape time).
+
+Updates take no lock: every thread writes its own cells (``_PerThread``)
+and readers merge them. Cells of finished threads are folded into one
+retired cell at the next read, so thread churn (e.g. the threaded dev
+server) does not grow the registry.
+
+On Lambda there is nobody to scrape, so ``flush_if_due`` (called after
+each invocation) prints CloudWatch embedded metric format lines with the
+changes since the previous flush: one line per route that served requests
+(requests, 5xx, latency p50/p99 from the histogram, items scanned and
+returned, capacity) and one per used cache. By default every invocation
+flushes, so nothing is pending when a sandbox is frozen or reclaimed;
+``METRICS_FLUSH_SECONDS`` batches flushes on busy functions instead.
+
+Observers added with ``add_request_observer`` get each finished request
+with its DynamoDB reads (``utils.slow_queries``). ``METRICS=0`` turns
+recording off, observers included.
+"""
+import json
+import logging
+import math
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+METRICS_ENABLED = os.environ.get('METRICS', '1').lower() not in ('0', 'false')
+METRICS_NAMESPACE = os.environ.get('METRICS_NAMESPACE', 'IHSearchService')
+METRICS_FLUSH_SECONDS = float(os.environ.get('METRICS_FLUSH_SECONDS', '0'))
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+NO_ROUTE = '-'
+
+Labels = Tuple[str, ...]
+
+
+class _PerThread:
+    """Per-thread ``{labels: value}`` cells; ``merge(a, b)`` combines two values."""
+
+    def __init__(self, merge: Callable[[Any, Any], Any]):
+        self._merge = merge
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._cells: List[Tuple[threading.Thread, Dict[Labels, Any]]] = []
+        self._retired: Dict[Labels, Any] = {}
+
+    def cell(self) -> Dict[Labels, Any]:
+        try:
+            return self._local.cell
+        except AttributeError:
+            cell = self._local.cell = {}
+            with self._lock:
+                self._cells.append((threading.current_thread(), cell))
+            return cell
+
+    def _fold(self, into: Dict[Labels, Any], cell: Dict[Labels, Any]) -> None:
+        for labels, value in dict(cell).items():
+            into[labels] = self._merge(into[labels], value) if labels in into else _copy(value)
+
+    def snapshot(self) -> Dict[Labels, Any]:
+        with self._lock:
+            live = []
+            for thread, cell in self._cells:
+                if thread.is_alive():
+                    live.append((thread, cell))
+                else:
+                    self._fold(self._retired, cell)
+            self._cells = live
+            out: Dict[Labels, Any] = {}
+            self._fold(out, self._retired)
+            for _, cell in live:
+                self._fold(out, cell)
+        return out
+
+    def clear(self) -> None:
+        with self._lock:
+            for _, cell in self._cells:
+                cell.clear()
+            self._retired.clear()
+
+
+def _copy(value):
+    return list(value) if isinstance(value, list) else value
+
+
+def _add(a, b):
+    return a + b
+
+
+def _add_lists(a: List[float], b: List[float]) -> List[float]:
+    return [x + y for x, y in zip(a, b)]
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._cells = _PerThread(_add)
+
+    def inc(self, labels: Labels = (), amount: float = 1) -> None:
+        cell = self._cells.cell()
+        cell[labels] = cell.get(labels, 0) + amount
+
+    def values(self) -> Dict[Labels, float]:
+        return self._cells.snapshot()
+
+    def samples(self) -> Iterable[Tuple[str, Labels, Sequence[str], float]]:
+        for labels, value in sorted(self.values().items()):
+            yield self.name, labels, self.labelnames, value
+
+    def clear(self) -> None:
+        self._cells.clear()
+
+
+class Gauge(Counter):
+    """Up/down count (``inc`` with a negative amount to decrease)."""
+    kind = 'gauge'
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # Per labels: one count per bucket, one for +Inf, then the sum
+        self._cells = _PerThread(_add_lists)
+
+    def observe(self, labels: Labels, value: float) -> None:
+        cell = self._cells.cell()
+        slot = cell.get(labels)
+        if slot is None:
+            slot = cell[labels] = [0] * (len(self.buckets) + 2)
+        slot[bisect_left(self.buckets, value)] += 1
+        slot[-1] += value
+
+    def values(self) -> Dict[Labels, List[float]]:
+        return self._cells.snapshot()
+
+    def quantile(self, slot: Sequence[float], q: float) -> Optional[float]:
+        """Upper bound of the bucket holding quantile ``q`` (the largest bound for +Inf)."""
+        total = sum(slot[:-1])
+        if not total:
+            return None
+        running = 0
+        for bound, count in zip((*self.buckets, self.buckets[-1]), slot[:-1]):
+            running += count
+            if running >= q * total:
+                return bound
+        return self.buckets[-1]
+
+    def samples(self) -> Iterable[Tuple[str, Labels, Sequence[str], float]]:
+        names = (*self.labelnames, 'le')
+        for labels, slot in sorted(self.values().items()):
+            running = 0
+            for bound, count in zip((*self.buckets, math.inf), slot[:-1]):
+                running += count
+                yield f"{self.name}_bucket", (*labels, '+Inf' if bound == math.inf else f"{bound:g}"), names, running
+            yield f"{self.name}_sum", labels, self.labelnames, slot[-1]
+            yield f"{self.name}_count", labels, self.labelnames, running
+
+    def clear(self) -> None:
+        self._cells.clear()
+
+
+class CallbackGauge:
+    """Values computed at read time by ``collect() -> {labels: value}``."""
+    kind = 'gauge'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str],
+                 collect: Callable[[], Dict[Labels, float]], kind: str = 'gauge'):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.kind = kind
+        self._collect = collect
+
+    def values(self) -> Dict[Labels, float]:
+        return self._collect()
+
+    def samples(self) -> Iterable[Tuple[str, Labels, Sequence[str], float]]:
+        for labels, value in sorted(self.values().items()):
+            yield self.name, labels, self.labelnames, value
+
+    def clear(self) -> None:
+        pass
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _number(value: float) -> str:
+    if value == math.inf:
+        return '+Inf'
+    return repr(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: Dict[str, Any] = {}
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        """Prometheus text exposition format (0.0.4)."""
+        lines = []
+        for metric in self.metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, labelnames, value in metric.samples():
+                pairs = ','.join(f'{k}="{_escape(v)}"' for k, v in zip(labelnames, labels))
+                lines.append(f"{name}{{{pairs}}} {_number(value)}" if pairs else f"{name} {_number(value)}")
+        return '\n'.join(lines) + '\n'
+
+    def clear(self) -> None:
+        for metric in self.metrics.values():
+            metric.clear()
+
+
+def _cache_stats() -> Dict[str, Dict[str, int]]:
+    """``{cache: {'hits', 'misses'}}`` for the caches with their own counters."""
+    from utils.single_flight import single_flight
+    out = {f"coalesce:{route}": stats for route, stats in single_flight.stats().items()}
+    try:
+        from model.influencer import influencer_autocomplete
+        out['autocomplete'] = {'hits': influencer_autocomplete.cache_hits,
+                               'misses': influencer_autocomplete.cache_misses}
+    except ImportError:
+        pass
+    return out
+
+
+def _cache_counts(key: str) -> Dict[Labels, float]:
+    return {(cache,): stats[key] for cache, stats in _cache_stats().items()}
+
+
+def _cache_ratios() -> Dict[Labels, float]:
+    return {(cache,): stats['hits'] / (stats['hits'] + stats['misses'])
+            for cache, stats in _cache_stats().items() if stats['hits'] + stats['misses']}
+
+
+registry = Registry()
+REQUESTS = registry.register(Counter('http_requests_total', 'Requests by route, method and status.',
+                                     ('route', 'method', 'status')))
+LATENCY = registry.register(Histogram('http_request_duration_seconds', 'Request latency in seconds.',
+                                      ('route', 'method')))
+IN_FLIGHT = registry.register(Gauge('http_requests_in_flight', 'Requests being handled.'))
+DDB_LABELS = ('route', 'operation', 'table', 'index')
+DDB_CALLS = registry.register(Counter('dynamodb_calls_total', 'DynamoDB calls (pages).', DDB_LABELS))
+DDB_SCANNED = registry.register(Counter('dynamodb_items_scanned_total',
+                                        'Items DynamoDB evaluated (ScannedCount; items returned for gets).',
+                                        DDB_LABELS))
+DDB_RETURNED = registry.register(Counter('dynamodb_items_returned_total', 'Items DynamoDB returned.',
+                                         DDB_LABELS))
+DDB_CAPACITY = registry.register(Counter('dynamodb_consumed_capacity_units_total',
+                                         'Consumed read and write capacity units.', DDB_LABELS))
+registry.register(CallbackGauge('cache_hits_total', 'Cache hits.', ('cache',),
+                                lambda: _cache_counts('hits'), kind='counter'))
+registry.register(CallbackGauge('cache_misses_total', 'Cache misses.', ('cache',),
+                                lambda: _cache_counts('misses'), kind='counter'))
+registry.register(CallbackGauge('cache_hit_ratio', 'Cache hits / lookups since start.', ('cache',), _cache_ratios))
+
+
+class RequestStats:
+    """One request: route, status, duration and its DynamoDB reads per (operation, table, index)."""
+    __slots__ = ('route', 'method', 'start', 'duration', 'status', 'reads', '_lock')
+
+    def __init__(self, route: str, method: str):
+        self.route = route
+        self.method = method
+        self.start = time.perf_counter()
+        self.duration = 0.0
+        self.status: Optional[int] = None
+        # (operation, table, index) -> [calls, scanned, returned, capacity], in first-use order
+        self.reads: Dict[Tuple[str, str, str], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def add_read(self, key: Tuple[str, str, str], scanned: int, returned: int, capacity: float) -> None:
+        # Fanned-out calls of one request record concurrently
+        with self._lock:
+            totals = self.reads.get(key)
+            if totals is None:
+                totals = self.reads[key] = [0, 0, 0, 0.0]
+            totals[0] += 1
+            totals[1] += scanned
+            totals[2] += returned
+            totals[3] += capacity
+
+
+_request: ContextVar[Optional[RequestStats]] = ContextVar('metrics_request', default=None)
+_observers: List[Callable[[RequestStats], None]] = []
+_installed = False
+
+
+def add_request_observer(observer: Callable[[RequestStats], None]) -> None:
+    """Call ``observer(stats)`` for every finished request, still inside its request context."""
+    _observers.append(observer)
+
+
+def _read_counts(response: Dict[str, Any]) -> Tuple[int, int]:
+    """(scanned, returned) items of one DynamoDB response."""
+    if 'Count' in response:
+        return response.get('ScannedCount', response['Count']), response['Count']
+    if 'Responses' in response:
+        returned = sum(len(items) for items in response['Responses'].values())
+        return returned, returned
+    returned = 1 if response.get('Item') else 0
+    return returned, returned
+
+
+def _capacity(response: Dict[str, Any]) -> float:
+    consumed = response.get('ConsumedCapacity')
+    if isinstance(consumed, dict):
+        return consumed.get('CapacityUnits', 0.0)
+    if isinstance(consumed, list):
+        return sum(c.get('CapacityUnits', 0.0) for c in consumed)
+    return 0.0
+
+
+# Operations that can report their consumed capacity; counted ones always ask for it
+_CAPACITY_OPERATIONS = frozenset(('GetItem', 'BatchGetItem', 'Query', 'Scan', 'TransactGetItems', 'PutItem',
+                                  'UpdateItem', 'DeleteItem', 'BatchWriteItem', 'TransactWriteItems'))
+
+
+def install() -> None:
+    """Wrap PynamoDB's ``Connection._make_api_call`` to count DynamoDB usage (idempotent).
+
+    Calls that do not ask for their consumed capacity get
+    ``ReturnConsumedCapacity='TOTAL'`` added, so the capacity counters
+    cover every call and not just budgeted scans.
+    """
+    global _installed
+    if _installed or not METRICS_ENABLED:
+        return
+    from pynamodb.connection.base import Connection
+    original = Connection._make_api_call
+
+    def _make_api_call(self, operation_name, operation_kwargs):
+        if operation_name in _CAPACITY_OPERATIONS and 'ReturnConsumedCapacity' not in operation_kwargs:
+            operation_kwargs = {**operation_kwargs, 'ReturnConsumedCapacity': 'TOTAL'}
+        response = original(self, operation_name, operation_kwargs)
+        current = _request.get()
+        table = operation_kwargs.get('TableName') or ','.join(operation_kwargs.get('RequestItems', {}))
+        index = operation_kwargs.get('IndexName', '')
+        labels = (current.route if current else NO_ROUTE, operation_name, table, index)
+        scanned, returned = _read_counts(response)
+        capacity = _capacity(response)
+        DDB_CALLS.inc(labels)
+        DDB_SCANNED.inc(labels, scanned)
+        DDB_RETURNED.inc(labels, returned)
+        DDB_CAPACITY.inc(labels, capacity)
+        if current is not None:
+            current.add_read((operation_name, table, index), scanned, returned, capacity)
+        return response
+
+    Connection._make_api_call = _make_api_call
+    _installed = True
+
+
+def start_request_metrics() -> None:
+    """``before_request`` hook."""
+    if not METRICS_ENABLED:
+        return
+    from flask import request
+    rule = request.url_rule.rule if request.url_rule else NO_ROUTE
+    _request.set(RequestStats(rule, request.method))
+    IN_FLIGHT.inc()
+
+
+def record_response_status(response):
+    """``after_request`` hook."""
+    current = _request.get()
+    if current is not None:
+        current.status = response.status_code
+    return response
+
+
+def finish_request_metrics(error=None) -> None:
+    """``teardown_request`` hook; a request that raised counts as a 500."""
+    current = _request.get()
+    if current is None:
+        return
+    _request.set(None)
+    IN_FLIGHT.inc(amount=-1)
+    if current.status is None:
+        current.status = 500
+    current.duration = time.perf_counter() - current.start
+    REQUESTS.inc((current.route, current.method, str(current.status)))
+    LATENCY.observe((current.route, current.method), current.duration)
+    for observer in list(_observers):
+        try:
+            observer(current)
+        except Exception as e:
+            logging.error(f"Request observer failed: {e}")
+
+
+# -- CloudWatch embedded metric format
+_flush_lock = threading.Lock()
+_last_flush = -math.inf
+_flushed: Dict[str, Dict] = {}
+
+
+def _delta(now: Dict[Labels, Any], before: Dict[Labels, Any]) -> Dict[Labels, Any]:
+    out = {}
+    for labels, value in now.items():
+        old = before.get(labels)
+        if isinstance(value, list):
+            out[labels] = [a - b for a, b in zip(value, old)] if old else list(value)
+        else:
+            out[labels] = value - (old or 0)
+    return out
+
+
+def _emf(dimension: str, value: str, metrics: Dict[str, Tuple[float, str]], timestamp: int) -> str:
+    return json.dumps({
+        '_aws': {'Timestamp': timestamp, 'CloudWatchMetrics': [{
+            'Namespace': METRICS_NAMESPACE, 'Dimensions': [[dimension]],
+            'Metrics': [{'Name': name, 'Unit': unit} for name, (_, unit) in metrics.items()],
+        }]},
+        dimension: value,
+        **{name: number for name, (number, _) in metrics.items()},
+    })
+
+
+def emf_lines(now_ms: Optional[int] = None) -> List[str]:
+    """EMF lines for everything recorded since the previous call."""
+    timestamp = now_ms if now_ms is not None else int(time.time() * 1000)
+    current = {name: registry.metrics[name].values() for name in
+               ('http_requests_total', 'http_request_duration_seconds', 'dynamodb_items_scanned_total',
+                'dynamodb_items_returned_total', 'dynamodb_consumed_capacity_units_total')}
+    current['cache'] = {(cache,): [stats['hits'], stats['misses']] for cache, stats in _cache_stats().items()}
+    deltas = {name: _delta(values, _flushed.get(name, {})) for name, values in current.items()}
+    _flushed.update(current)
+
+    routes: Dict[str, Dict[str, float]] = {}
+    for (route, method, status), count in deltas['http_requests_total'].items():
+        totals = routes.setdefault(f"{method} {route}", {'Requests': 0, 'ServerErrors': 0})
+        totals['Requests'] += count
+        if status.startswith('5'):
+            totals['ServerErrors'] += count
+    lines = []
+    for (route, method), slot in deltas['http_request_duration_seconds'].items():
+        key = f"{method} {route}"
+        totals = routes.get(key)
+        if not totals or not totals['Requests']:
+            continue
+        metrics = {'Requests': (totals['Requests'], 'Count'), 'ServerErrors': (totals['ServerErrors'], 'Count'),
+                   'LatencyP50': (LATENCY.quantile(slot, 0.5) * 1000, 'Milliseconds'),
+                   'LatencyP99': (LATENCY.quantile(slot, 0.99) * 1000, 'Milliseconds')}
+        for name, metric in (('ItemsScanned', 'dynamodb_items_scanned_total'),
+                             ('ItemsReturned', 'dynamodb_items_returned_total'),
+                             ('ConsumedCapacity', 'dynamodb_consumed_capacity_units_total')):
+            metrics[name] = (sum(v for labels, v in deltas[metric].items() if labels[0] == route), 'Count')
+        lines.append(_emf('Route', key, metrics, timestamp))
+    for (cache,), (hits, misses) in deltas['cache'].items():
+        if hits + misses:
+            lines.append(_emf('Cache', cache, {'CacheHits': (hits, 'Count'), 'CacheMisses': (misses, 'Count'),
+                                               'CacheHitRatio': (hits / (hits + misses), 'None')}, timestamp))
+    return lines
+
+
+def flush_if_due(out=None) -> int:
+    """Print EMF lines unless the last flush is under ``METRICS_FLUSH_SECONDS`` old; returns the lines written."""
+    global _last_flush
+    if not METRICS_ENABLED or time.monotonic() - _last_flush < METRICS_FLUSH_SECONDS:
+        return 0
+    with _flush_lock:
+        _last_flush = time.monotonic()
+        lines = emf_lines()
+    stream = out or sys.stdout
+    for line in lines:
+        stream.write(line + '\n')
+    stream.flush()
+    return len(lines)
+
+
+def metrics_response():
+    """View for ``GET /metrics``."""
+    from flask import Response
+    return Response(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,234 @@
+"""Write-sharded GSI hash keys and the scatter-gather queries that read them.
+
+``Platform`` has two values, so a GSI hashed on ``platform`` puts every
+write and range query on one or two partitions. Sharded indexes hash on
+``platform_shard`` instead: ``'<PLATFORM>#<n>'`` with ``n = crc32(item key)
+% PLATFORM_INDEX_SHARDS``. Writes spread evenly, and each shard stays
+sorted on the index range key.
+
+``scatter_gather`` queries every shard of a platform concurrently
+(``utils.fanout``) and merges the per-shard results in range-key order
+with ``heapq.merge``. With a ``limit``, each shard returns at most
+``limit`` items, the merge keeps the first ``limit``, and the cursor
+records, per shard, where to resume. With a filter, a shard's page can end
+(at its last evaluated key) well before the others'; the merge takes
+nothing past the earliest such end, and reads on in the shards it emptied
+while the page is not full. The cursor looks like:
+
+    {'index': 'platform_shard_followers_index',
+     'shards': {'INSTAGRAM#0': {...last key...}, 'INSTAGRAM#3': None}}
+
+Indexes without a range key have no order to merge on; with a ``limit``
+their shards are read one after another until the page is full, so a
+page costs about ``limit`` items rather than ``limit`` per shard.
+
+A shard with ``None`` restarts from its beginning. Exhausted shards are
+dropped, and once none are left the cursor is ``None``. The shard count
+is part of the stored keys: after changing ``PLATFORM_INDEX_SHARDS``,
+rerun ``jobs.py migrate-platform-shards``.
+"""
+import heapq
+import os
+import time
+import zlib
+from typing import Any, Callable, Dict, List, Optional
+
+from utils.fanout import fan_out
+from utils.tracing import span
+
+PLATFORM_INDEX_SHARDS = int(os.environ.get('PLATFORM_INDEX_SHARDS', '8'))
+# Read through the sharded indexes (enable once migrate-platform-shards has run)
+PLATFORM_INDEX_SHARDED = os.environ.get('PLATFORM_INDEX_SHARDED', '').lower() in ('1', 'true')
+
+
+def _platform_value(platform) -> str:
+    return getattr(platform, 'value', platform)
+
+
+def shard_key(platform, item_key: str, shards: Optional[int] = None) -> str:
+    """The stable shard of one item, e.g. ``'TIKTOK#5'``."""
+    return f"{_platform_value(platform)}#{zlib.crc32(item_key.encode('utf-8')) % (shards or PLATFORM_INDEX_SHARDS)}"
+
+
+def shard_keys(platform, shards: Optional[int] = None) -> List[str]:
+    return [f"{_platform_value(platform)}#{n}" for n in range(shards or PLATFORM_INDEX_SHARDS)]
+
+
+class MergedPage(list):
+    """Merged items; ``last_evaluated_key`` is the cursor (like a PynamoDB result iterator)."""
+
+    def __init__(self, items, last_evaluated_key=None):
+        super().__init__(items)
+        self.last_evaluated_key = last_evaluated_key
+
+
+def _index_range_attribute(index):
+    return next((a for a in index.Meta.attributes.values() if a.is_range_key), None)
+
+
+def _index_item_key(model, index, item) -> Dict[str, Any]:
+    """The key that resumes an index query right after ``item``."""
+    attrs = [model._hash_key_attribute(), model._range_key_attribute(),
+             *(a for a in index.Meta.attributes.values() if a.is_hash_key or a.is_range_key)]
+    names = [a.attr_name for a in attrs if a is not None]
+    serialized = item.serialize()
+    return {name: serialized[name] for name in dict.fromkeys(names) if name in serialized}
+
+
+def scatter_gather(model, index, platform, range_key_condition=None, filter_condition=None,
+                   limit: Optional[int] = None, exclusive_start_key: Optional[Dict[str, Any]] = None,
+                   scan_index_forward: bool = True, shards: Optional[int] = None,
+                   sort_key: Optional[Callable[[Any], Any]] = None) -> MergedPage:
+    """Query every shard of ``platform`` on ``index`` and merge in range-key order.
+
+    :param exclusive_start_key: the cursor of a previous page (see module docstring).
+    :param sort_key: merge key; defaults to the index range key (shards are
+        concatenated in shard order when the index has none).
+    """
+    index_name = index.Meta.index_name
+    if exclusive_start_key:
+        pending = dict(exclusive_start_key.get('shards', {}))
+    else:
+        pending = {key: None for key in shard_keys(platform, shards)}
+    if not pending:
+        return MergedPage([])
+    range_attr = _index_range_attribute(index)
+    if sort_key is None and range_attr is not None:
+        def sort_key(item, _name=range_attr.attr_name):
+            return getattr(item, model._dynamo_to_python_attr(_name))
+
+    def query_shard(key, start, shard_limit):
+        iterator = index.query(key, range_key_condition, filter_condition=filter_condition, limit=shard_limit,
+                               last_evaluated_key=start, scan_index_forward=scan_index_forward)
+        items = list(iterator)
+        return items, getattr(iterator, 'last_evaluated_key', None)
+
+    items: List[Any] = []
+    cursor = {}
+    if sort_key is None and limit is not None:
+        for key, start in pending.items():
+            if len(items) >= limit:
+                cursor[key] = start
+                continue
+            shard_items, shard_last_key = query_shard(key, start, limit - len(items))
+            items.extend(shard_items)
+            if shard_last_key is not None:
+                cursor[key] = shard_last_key
+        return MergedPage(items, {'index': index_name, 'shards': cursor} if cursor else None)
+
+    # Per shard: where the next query starts, items read but not merged yet,
+    # where the latest query started and the last item taken since
+    resume = dict(pending)
+    buffered: Dict[str, List[Any]] = {key: [] for key in pending}
+    fetched_from = dict(pending)
+    last_taken: Dict[str, Any] = {}
+    exhausted = set()
+
+    def fetch(keys):
+        shard_limit = None if limit is None else limit - len(items)
+        pages = fan_out({key: (lambda key=key: query_shard(key, resume[key], shard_limit)) for key in keys})
+        for key in keys:
+            shard_items, shard_last_key = pages[key]
+            buffered[key] = shard_items
+            fetched_from[key] = resume[key]
+            last_taken.pop(key, None)
+            resume[key] = shard_last_key
+            if shard_last_key is None:
+                exhausted.add(key)
+
+    def read_up_to(last_key):
+        # The merge position a shard's query stopped at (its last evaluated row)
+        return sort_key(model.from_raw_data(last_key))
+
+    fetch(list(pending))
+    while True:
+        streams = [[(item, key) for item in buffered[key]] for key in pending]
+        if sort_key is None:
+            merged = (entry for stream in streams for entry in stream)
+            cutoff = None
+        else:
+            merged = heapq.merge(*streams, key=lambda entry: sort_key(entry[0]), reverse=not scan_index_forward)
+            # A filtered page can stop a shard well before the others; nothing past
+            # the nearest such stop is taken, or that shard's next page would sort before it
+            stops = [read_up_to(resume[key]) for key in pending if key not in exhausted]
+            cutoff = (min(stops) if scan_index_forward else max(stops)) if stops else None
+        taken = {key: 0 for key in pending}
+        with span('merge', shards=len(streams)):
+            for item, key in merged:
+                if limit is not None and len(items) >= limit:
+                    break
+                if cutoff is not None and (sort_key(item) > cutoff if scan_index_forward
+                                           else sort_key(item) < cutoff):
+                    break
+                items.append(item)
+                last_taken[key] = item
+                taken[key] += 1
+        for key in pending:
+            del buffered[key][:taken[key]]
+        if limit is None or len(items) >= limit:
+            break
+        # Page not full: read on in the shards whose buffered items ran out
+        refill = [key for key in pending if key not in exhausted and not buffered[key]]
+        if not refill:
+            break
+        fetch(refill)
+
+    for key in pending:
+        if buffered[key]:
+            # Stopped inside this shard's page: resume right after the last item taken
+            cursor[key] = _index_item_key(model, index, last_taken[key]) if key in last_taken else fetched_from[key]
+        elif key not in exhausted:
+            cursor[key] = resume[key]
+    return MergedPage(items, {'index': index_name, 'shards': cursor} if cursor else None)
+
+
+def item_shard_key(item, shards: Optional[int] = None) -> Optional[str]:
+    """``platform_shard`` value for a model item with a ``platform`` attribute (None without one)."""
+    platform = getattr(item, 'platform', None)
+    if platform is None:
+        return None
+    hash_name = item._dynamo_to_python_attr(item._hash_key_attribute().attr_name)
+    return shard_key(platform, getattr(item, hash_name), shards)
+
+
+def backfill_shard_keys(model, segment: Optional[int] = None, total_segments: Optional[int] = None) -> int:
+    """Migration: set ``platform_shard`` wherever it is missing or from another shard count."""
+    updated = 0
+    for item in model.scan(segment=segment, total_segments=total_segments):
+        expected = item_shard_key(item)
+        if expected is not None and getattr(item, 'platform_shard', None) != expected:
+            item.update(actions=[model.platform_shard.set(expected)])
+            updated += 1
+    return updated
+
+
+def create_index(model, index, poll_seconds: float = 10.0, timeout_seconds: float = 3600.0) -> bool:
+    """Migration: add GSI ``index`` to ``model``'s table unless present, then wait until it is ACTIVE.
+
+    Returns True when the index was created by this call.
+    """
+    connection = model._get_connection().connection
+    table_name = model.Meta.table_name
+    name = index.Meta.index_name
+    description = connection.describe_table(table_name)
+    created = name not in {i['IndexName'] for i in description.get('GlobalSecondaryIndexes', [])}
+    if created:
+        schema = index._get_schema()
+        create = {'IndexName': name, 'KeySchema': schema['key_schema'], 'Projection': schema['projection']}
+        if description.get('BillingModeSummary', {}).get('BillingMode') != 'PAY_PER_REQUEST':
+            create['ProvisionedThroughput'] = {'ReadCapacityUnits': index.Meta.read_capacity_units,
+                                               'WriteCapacityUnits': index.Meta.write_capacity_units}
+        connection.dispatch('UpdateTable', {
+            'TableName': table_name,
+            'AttributeDefinitions': schema['attribute_definitions'],
+            'GlobalSecondaryIndexUpdates': [{'Create': create}],
+        })
+    deadline = time.monotonic() + timeout_seconds
+    while True:
+        indexes = connection.describe_table(table_name).get('GlobalSecondaryIndexes', [])
+        status = next((i.get('IndexStatus') for i in indexes if i['IndexName'] == name), None)
+        if status == 'ACTIVE':
+            return created
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"Index {name} on {table_name} still {status} after {timeout_seconds}s")
+        time.sleep(poll_seconds)
@@ -0,0 +1,123 @@
+"""Request coalescing (single-flight) for identical concurrent requests.
+
+While a request is executing, identical requests (same route, same sorted
+query args - which include the page token) wait for it instead of running
+their own scan and hydration. They then share its serialized response
+bytes, status and headers.
+
+Coalescing is per process and thread-safe, so it applies to the threaded
+Flask dev server as well as to multi-threaded WSGI workers.
+
+Enabled routes come from the ``COALESCE_ROUTES`` environment variable
+(comma-separated rule paths, e.g. ``/searchInfluencers,/searchByPlatform``)
+and can be changed at runtime with ``set_route_enabled``.
+"""
+import os
+import threading
+from functools import wraps
+from typing import Any, Callable, Dict, Hashable
+
+from flask import Response, make_response, request
+
+from utils.response_encoding import negotiated_format
+from utils.streaming import wants_stream
+from utils.tracing import span
+
+DEFAULT_COALESCE_ROUTES = '/searchInfluencers,/searchByPlatform'
+
+enabled_routes = {r.strip() for r in os.environ.get('COALESCE_ROUTES', DEFAULT_COALESCE_ROUTES).split(',')
+                  if r.strip()}
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Runs at most one execution per key at a time; concurrent callers share its result."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    def do(self, key: Hashable, fn: Callable[[], Any], label: str = '') -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            counters = self._stats.setdefault(label, {'hits': 0, 'misses': 0})
+            counters['misses' if leader else 'hits'] += 1
+
+        if not leader:
+            with span('coalesced', label=label):
+                call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Per-label hit (shared) and miss (executed) counts."""
+        with self._lock:
+            return {label: dict(counters) for label, counters in self._stats.items()}
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self._stats.clear()
+
+
+single_flight = SingleFlight()
+
+
+def set_route_enabled(route: str, enabled: bool = True) -> None:
+    if enabled:
+        enabled_routes.add(route)
+    else:
+        enabled_routes.discard(route)
+
+
+def coalesce_key(route: str) -> Hashable:
+    """Normalized query key: route, sorted (multi-valued) args with the page token, and
+    the negotiated representation (JSON vs MessagePack)."""
+    return route, tuple(sorted(request.args.items(multi=True))), negotiated_format()
+
+
+def coalesced(view: Callable) -> Callable:
+    """Decorate a GET view so identical concurrent requests share one execution."""
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        route = request.url_rule.rule if request.url_rule else request.path
+        if request.method != 'GET' or route not in enabled_routes or wants_stream():
+            # Streamed responses are produced lazily and cannot be shared as bytes
+            return view(*args, **kwargs)
+
+        def execute():
+            response = make_response(view(*args, **kwargs))
+            return response.get_data(), response.status_code, list(response.headers.items())
+
+        body, status, headers = single_flight.do(coalesce_key(route), execute, label=route)
+        return Response(body, status=status, headers=headers)
+
+    return wrapper
@@ -0,0 +1,205 @@
+"""Slow-query log: per query-shape aggregates and the slowest recent requests.
+
+Every finished request is fingerprinted by its shape, the route plus the
+names of the filters it supplied with the values stripped:
+
+    GET /searchInfluencers?location&min_followers&platform
+    POST /search_by_metrics {metrics_ranges.followers.max,metrics_ranges.followers.min,platform}
+
+Paging and output parameters (``IGNORED_PARAMS``) are not part of the
+shape. Per fingerprint a rolling aggregate keeps the request count, the
+slow count, p50/p99/max over the last ``DURATION_WINDOW`` durations, and
+the total capacity units and items scanned/returned. At most
+``SLOW_QUERY_FINGERPRINTS`` fingerprints are kept (least recently seen
+dropped first).
+
+A request taking at least ``SLOW_QUERY_MS`` is also kept in a ring of the
+last ``SLOW_QUERY_BUFFER`` slow requests with its plan, the DynamoDB
+reads it made in order (``Query influencers/location-index x3``), and
+logged as a warning (the record goes in ``extra``).
+
+The data is served on ``/debug/slow-queries`` by the local server and,
+on Lambda, ``log_summary_if_due`` (called after each invocation) logs
+the top fingerprints by total capacity every
+``SLOW_QUERY_SUMMARY_SECONDS``. Requests are observed through
+``utils.service_metrics``, so ``METRICS=0`` turns this off too.
+"""
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, List, Optional
+
+from utils import service_metrics
+
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', '500'))
+SLOW_QUERY_BUFFER = int(os.environ.get('SLOW_QUERY_BUFFER', '200'))
+SLOW_QUERY_FINGERPRINTS = int(os.environ.get('SLOW_QUERY_FINGERPRINTS', '500'))
+SLOW_QUERY_SUMMARY_SECONDS = float(os.environ.get('SLOW_QUERY_SUMMARY_SECONDS', '300'))
+DURATION_WINDOW = 256
+SUMMARY_TOP = 10
+IGNORED_PARAMS = frozenset(('next_token', 'limit', 'format', 'stream', 'max_scanned', 'max_seconds'))
+
+_log = logging.getLogger('slow_queries')
+
+
+def _percentile(ordered: List[float], q: float) -> float:
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def _body_keys(value: Any, prefix: str = '') -> List[str]:
+    if isinstance(value, dict):
+        keys = []
+        for key, inner in value.items():
+            keys.extend(_body_keys(inner, f"{prefix}.{key}" if prefix else str(key)))
+        return keys
+    if isinstance(value, list):
+        return [f"{prefix}[]"] if prefix else ['[]']
+    return [prefix] if prefix else []
+
+
+def fingerprint(method: str, route: str, args: Optional[Dict[str, Any]] = None, body: Any = None) -> str:
+    """'METHOD route?arg&names {body.keys}', values stripped and names sorted."""
+    shape = f"{method} {route}"
+    names = sorted({name for name in (args or {}) if name not in IGNORED_PARAMS})
+    if names:
+        shape += '?' + '&'.join(names)
+    keys = sorted({key for key in _body_keys(body) if key.split('.')[0] not in IGNORED_PARAMS})
+    if keys:
+        shape += ' {' + ','.join(keys) + '}'
+    return shape
+
+
+def plan(stats: 'service_metrics.RequestStats') -> List[str]:
+    """DynamoDB reads of a request in first-use order, e.g. 'Query influencers/location-index x3'."""
+    steps = []
+    for (operation, table, index), (calls, _, _, _) in list(stats.reads.items()):
+        target = f"{table}/{index}" if index else table
+        steps.append(f"{operation} {target} x{calls}")
+    return steps
+
+
+class _Shape:
+    __slots__ = ('count', 'slow', 'durations', 'max', 'capacity', 'scanned', 'returned')
+
+    def __init__(self):
+        self.count = 0
+        self.slow = 0
+        self.durations: Deque[float] = deque(maxlen=DURATION_WINDOW)
+        self.max = 0.0
+        self.capacity = 0.0
+        self.scanned = 0
+        self.returned = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        ordered = sorted(self.durations)
+        return {
+            'count': self.count,
+            'slow': self.slow,
+            'p50_ms': round(_percentile(ordered, 0.50) * 1000, 3),
+            'p99_ms': round(_percentile(ordered, 0.99) * 1000, 3),
+            'max_ms': round(self.max * 1000, 3),
+            'total_capacity': round(self.capacity, 2),
+            'items_scanned': self.scanned,
+            'items_returned': self.returned,
+        }
+
+
+_lock = threading.Lock()
+_shapes: 'OrderedDict[str, _Shape]' = OrderedDict()
+_slow: Deque[Dict[str, Any]] = deque(maxlen=SLOW_QUERY_BUFFER)
+_last_summary = time.monotonic()
+
+
+def record(stats: 'service_metrics.RequestStats') -> None:
+    """Request observer: aggregate the request and keep it when slow."""
+    from flask import request
+    body = request.get_json(silent=True) if request.is_json else None
+    shape_key = fingerprint(stats.method, stats.route, request.args, body)
+    totals = list(stats.reads.values())
+    calls = sum(t[0] for t in totals)
+    scanned = sum(t[1] for t in totals)
+    returned = sum(t[2] for t in totals)
+    capacity = sum(t[3] for t in totals)
+    slow = stats.duration * 1000 >= SLOW_QUERY_MS
+
+    with _lock:
+        shape = _shapes.get(shape_key)
+        if shape is None:
+            shape = _shapes[shape_key] = _Shape()
+            if len(_shapes) > SLOW_QUERY_FINGERPRINTS:
+                _shapes.popitem(last=False)
+        else:
+            _shapes.move_to_end(shape_key)
+        shape.count += 1
+        shape.slow += slow
+        shape.durations.append(stats.duration)
+        shape.max = max(shape.max, stats.duration)
+        shape.capacity += capacity
+        shape.scanned += scanned
+        shape.returned += returned
+
+    if not slow:
+        return
+    entry = {
+        'fingerprint': shape_key,
+        'route': stats.route,
+        'status': stats.status,
+        'duration_ms': round(stats.duration * 1000, 3),
+        'plan': plan(stats),
+        'dynamodb_calls': calls,
+        'items_scanned': scanned,
+        'items_returned': returned,
+        'consumed_capacity': round(capacity, 2),
+        'time': time.time(),
+    }
+    _slow.append(entry)
+    _log.warning(f"slow query {shape_key} {entry['duration_ms']}ms {calls} calls {entry['consumed_capacity']} CU",
+                 extra={'slow_query': entry})
+
+
+def snapshot(top: Optional[int] = None) -> Dict[str, Any]:
+    """Aggregates by total capacity (most expensive first) and the slow requests, newest first."""
+    with _lock:
+        shapes = [{'fingerprint': key, **shape.to_dict()} for key, shape in _shapes.items()]
+        slow = list(reversed(_slow))
+    shapes.sort(key=lambda s: (s['total_capacity'], s['p99_ms']), reverse=True)
+    return {
+        'threshold_ms': SLOW_QUERY_MS,
+        'fingerprints': shapes[:top] if top is not None else shapes,
+        'slow': slow,
+    }
+
+
+def log_summary_if_due() -> bool:
+    """Log the top fingerprints when ``SLOW_QUERY_SUMMARY_SECONDS`` have passed; True when logged."""
+    global _last_summary
+    if time.monotonic() - _last_summary < SLOW_QUERY_SUMMARY_SECONDS:
+        return False
+    _last_summary = time.monotonic()
+    summary = snapshot(top=SUMMARY_TOP)
+    if not summary['fingerprints']:
+        return False
+    summary['slow'] = len(summary['slow'])
+    _log.info(f"query shapes: top {len(summary['fingerprints'])} by capacity, {summary['slow']} slow requests",
+              extra={'slow_queries': summary})
+    return True
+
+
+def reset() -> None:
+    with _lock:
+        _shapes.clear()
+        _slow.clear()
+
+
+def debug_response():
+    """View for ``GET /debug/slow-queries`` (``?top=N`` limits the fingerprints)."""
+    from flask import jsonify, request
+    top = request.args.get('top', type=int)
+    return jsonify(snapshot(top=top))
+
+
+service_metrics.add_request_observer(record)
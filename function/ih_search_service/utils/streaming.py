@@ -0,0 +1,64 @@
+"""Opt-in NDJSON streaming for large result sets.
+
+A client asks for streaming with ``Accept: application/x-ndjson`` or
+``?stream=1``. The route then returns a generator-backed response: one
+JSON record per line, written as soon as it is serialized, followed by a
+final line carrying the outcome and continuation token:
+
+    {"id": "1", ...}
+    {"id": "2", ...}
+    {"success": true, "count": 2, "next_token": "..."}
+
+Nothing is buffered, so memory stays flat in the number of records and
+the first bytes go out after the first DB page. The response has no
+Content-Length and WSGI servers send it chunked; the Flask dev server
+streams it as well. An error after the first record has been sent cannot
+change the status code any more, so it is reported on the final line as
+``{"success": false, "error": ...}``.
+"""
+import logging
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from flask import Response, current_app, request, stream_with_context
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+
+
+def wants_stream() -> bool:
+    """True when the current request opted into NDJSON streaming."""
+    if request.args.get('stream', '').lower() in ('1', 'true'):
+        return True
+    accept = request.accept_mimetypes
+    # Only an explicit NDJSON entry counts; wildcards keep the JSON default
+    explicit = any(value == NDJSON_MIMETYPE and quality > 0 for value, quality in accept)
+    return explicit and accept.best_match([NDJSON_MIMETYPE, 'application/json']) == NDJSON_MIMETYPE
+
+
+def ndjson_response(records: Iterable[Dict[str, Any]],
+                    trailer: Optional[Callable[[], Dict[str, Any]]] = None,
+                    error_message: str = 'Unexpected error occurred') -> Response:
+    """Stream ``records`` as NDJSON, then a final status line.
+
+    :param records: lazily produced, already-serialized records.
+    :param trailer: called after the records are exhausted; its dict is
+        merged into the final line (e.g. ``{'next_token': ...}``), so it
+        can read cursors that are only known at the end of iteration.
+    """
+    def generate():
+        dumps = current_app.json.dumps
+        count = 0
+        try:
+            for record in records:
+                yield dumps(record) + '\n'
+                count += 1
+            final = {'success': True, 'count': count}
+            final.update({k: v for k, v in (trailer() if trailer else {}).items() if v is not None})
+        except Exception as e:
+            logging.error(f"Error while streaming {request.path}: {e}")
+            final = {'success': False, 'count': count, 'error': error_message}
+        yield dumps(final) + '\n'
+
+    response = Response(stream_with_context(generate()), mimetype=NDJSON_MIMETYPE)
+    # Ask buffering proxies to pass chunks through as they are produced
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
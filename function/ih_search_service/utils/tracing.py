@@ -0,0 +1,268 @@
+"""Lightweight per-request tracing: DynamoDB calls, pipeline stages and serialization.
+
+With ``TRACING=1`` every request gets a ``Trace``. Spans are timed blocks:
+
+    with span('matches', rows=len(items)):
+        items = [i for i in items if predicate(i)]
+
+- Every DynamoDB call is a ``dynamodb`` span (``install`` wraps
+  ``Connection._make_api_call``) with the operation, table, index, page
+  number (n-th call of that operation on that table/index in the
+  request), items returned and scanned, consumed capacity and the error
+  code of a failed call.
+- Pipeline stages mark themselves: ``results`` (draining a lazy result
+  iterator: DynamoDB pages plus model decoding), ``models`` (decoding raw
+  items), ``matches`` (in-memory filters), ``merge`` (shard merging),
+  ``bitmap``, ``index_build`` (first use of an in-process index),
+  ``hydrate``, ``coalesced`` (waiting on an identical request),
+  ``serialize`` (``to_dict``), ``jsonify`` and ``compress``.
+  Stages may overlap (e.g. ``hydrate`` contains DynamoDB calls) and calls
+  fanned out to pool threads (``utils.fanout``) belong to the request
+  that started them.
+
+A finished trace is reported three ways: a ``Server-Timing`` header
+(durations summed per stage, DynamoDB per operation and table/index, and
+``total``; on Lambda only with ``TRACE_SERVER_TIMING=1``, as it is sent to
+every client), a structured log line for a ``TRACE_LOG_SAMPLE_RATE``
+fraction of requests and for every request slower than
+``TRACE_LOG_SLOW_MS`` (the trace goes in ``extra``, so with
+``LogFormat: JSON`` in template.yaml it lands as a ``trace`` field of the
+JSON log record), and every exporter registered with ``add_exporter``.
+
+Without an active trace ``span`` returns a shared no-op, so disabled
+tracing costs one context variable lookup per span or DynamoDB call.
+Spans opened while a streamed response is being written are not part of
+the trace, which ends when the response headers are sent.
+"""
+import logging
+import os
+import random
+import time
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional
+
+TRACING_ENABLED = os.environ.get('TRACING', '').lower() in ('1', 'true')
+TRACE_LOG_SAMPLE_RATE = float(os.environ.get('TRACE_LOG_SAMPLE_RATE', '0.01'))
+TRACE_LOG_SLOW_MS = float(os.environ.get('TRACE_LOG_SLOW_MS', '1000'))
+# Server-Timing exposes table/index names and capacity to every client: off by default on Lambda
+TRACE_SERVER_TIMING = os.environ.get(
+    'TRACE_SERVER_TIMING', '0' if 'AWS_LAMBDA_FUNCTION_NAME' in os.environ else '1').lower() in ('1', 'true')
+
+_log = logging.getLogger('trace')
+_current: ContextVar[Optional['Trace']] = ContextVar('trace', default=None)
+_exporters: List[Callable[['Trace'], None]] = []
+_installed = False
+
+
+class Span:
+    __slots__ = ('name', 'attrs', 'start', 'duration', '_trace')
+
+    def __init__(self, trace: 'Trace', name: str, attrs: Dict[str, Any]):
+        self._trace = trace
+        self.name = name
+        self.attrs = attrs
+        self.start = 0.0
+        self.duration = 0.0
+
+    def set(self, **attrs) -> None:
+        self.attrs.update(attrs)
+
+    def __enter__(self) -> 'Span':
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.duration = time.perf_counter() - self.start
+        # list.append is atomic, so fanned-out threads can record concurrently
+        self._trace.spans.append(self)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'name': self.name, 'start_ms': round((self.start - self._trace.start) * 1000, 3),
+                'duration_ms': round(self.duration * 1000, 3), **self.attrs}
+
+
+class _NoSpan:
+    __slots__ = ()
+
+    def set(self, **attrs) -> None:
+        pass
+
+    def __enter__(self) -> '_NoSpan':
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        pass
+
+
+NO_SPAN = _NoSpan()
+
+
+class Trace:
+    def __init__(self, route: str):
+        self.route = route
+        self.start = time.perf_counter()
+        self.duration = 0.0
+        self.status: Optional[int] = None
+        self.spans: List[Span] = []
+        self._pages: Dict[tuple, int] = {}
+
+    def finish(self, status: Optional[int] = None) -> 'Trace':
+        self.duration = time.perf_counter() - self.start
+        self.status = status
+        return self
+
+    def next_page(self, key: tuple) -> int:
+        self._pages[key] = page = self._pages.get(key, 0) + 1
+        return page
+
+    def stages(self) -> Dict[str, Dict[str, Any]]:
+        """Spans summed per stage; DynamoDB per 'Operation table[/index]'."""
+        out: Dict[str, Dict[str, Any]] = {}
+        for s in list(self.spans):
+            if s.name == 'dynamodb':
+                target = s.attrs.get('table', '')
+                if s.attrs.get('index'):
+                    target = f"{target}/{s.attrs['index']}"
+                key = f"{s.attrs.get('op')} {target}".strip()
+            else:
+                key = s.name
+            stage = out.setdefault(key, {'name': s.name, 'count': 0, 'duration': 0.0, 'capacity': 0.0})
+            stage['count'] += 1
+            stage['duration'] += s.duration
+            stage['capacity'] += s.attrs.get('capacity', 0.0)
+        return out
+
+    def server_timing(self) -> str:
+        entries = []
+        for key, stage in self.stages().items():
+            if stage['name'] == 'dynamodb':
+                desc = f"{key} x{stage['count']} {stage['capacity']:g} CU"
+                entries.append(f'ddb;dur={stage["duration"] * 1000:.2f};desc="{desc}"')
+            else:
+                entries.append(f"{key};dur={stage['duration'] * 1000:.2f}")
+        entries.append(f"total;dur={self.duration * 1000:.2f}")
+        return ', '.join(entries)
+
+    def to_dict(self) -> Dict[str, Any]:
+        calls = [s for s in self.spans if s.name == 'dynamodb']
+        return {
+            'route': self.route,
+            'status': self.status,
+            'duration_ms': round(self.duration * 1000, 3),
+            'dynamodb_calls': len(calls),
+            'consumed_capacity': round(sum(s.attrs.get('capacity', 0.0) for s in calls), 2),
+            'spans': [s.to_dict() for s in sorted(self.spans, key=lambda s: s.start)],
+        }
+
+
+def current_trace() -> Optional[Trace]:
+    return _current.get()
+
+
+def span(name: str, **attrs):
+    """A timed span of the current trace (a no-op without one)."""
+    trace = _current.get()
+    if trace is None:
+        return NO_SPAN
+    return Span(trace, name, attrs)
+
+
+def add_exporter(exporter: Callable[[Trace], None]) -> None:
+    """Call ``exporter(trace)`` with every finished trace (errors are logged and ignored)."""
+    _exporters.append(exporter)
+
+
+def remove_exporter(exporter: Callable[[Trace], None]) -> None:
+    if exporter in _exporters:
+        _exporters.remove(exporter)
+
+
+def _capacity(response: Dict[str, Any]) -> float:
+    consumed = response.get('ConsumedCapacity')
+    if isinstance(consumed, dict):
+        return consumed.get('CapacityUnits', 0.0)
+    if isinstance(consumed, list):
+        return sum(c.get('CapacityUnits', 0.0) for c in consumed)
+    return 0.0
+
+
+# Reads that can report their consumed capacity; traced ones always ask for it
+_READ_OPERATIONS = frozenset(('GetItem', 'BatchGetItem', 'Query', 'Scan', 'TransactGetItems'))
+
+
+def _dynamodb_span(trace: Trace, operation_name: str, kwargs: Dict[str, Any]) -> Span:
+    table = kwargs.get('TableName') or ','.join(kwargs.get('RequestItems', {}))
+    index = kwargs.get('IndexName')
+    attrs = {'op': operation_name, 'table': table, 'page': trace.next_page((operation_name, table, index))}
+    if index:
+        attrs['index'] = index
+    return Span(trace, 'dynamodb', attrs)
+
+
+def install() -> None:
+    """Wrap PynamoDB's ``Connection._make_api_call`` to record DynamoDB spans (idempotent).
+
+    Traced reads that do not ask for their consumed capacity get
+    ``ReturnConsumedCapacity='TOTAL'`` added, so every span reports it.
+    """
+    global _installed
+    if _installed:
+        return
+    from pynamodb.connection.base import Connection
+    original = Connection._make_api_call
+
+    def _make_api_call(self, operation_name, operation_kwargs):
+        trace = _current.get()
+        if trace is None:
+            return original(self, operation_name, operation_kwargs)
+        if operation_name in _READ_OPERATIONS and 'ReturnConsumedCapacity' not in operation_kwargs:
+            operation_kwargs = {**operation_kwargs, 'ReturnConsumedCapacity': 'TOTAL'}
+        with _dynamodb_span(trace, operation_name, operation_kwargs) as s:
+            try:
+                response = original(self, operation_name, operation_kwargs)
+            except Exception as e:
+                s.set(error=getattr(e, 'response', {}).get('Error', {}).get('Code') or type(e).__name__)
+                raise
+            s.set(capacity=_capacity(response))
+            if 'Count' in response:
+                s.set(items=response['Count'], scanned=response.get('ScannedCount', response['Count']))
+            elif 'Responses' in response:
+                s.set(items=sum(len(items) for items in response['Responses'].values()))
+            return response
+
+    Connection._make_api_call = _make_api_call
+    _installed = True
+
+
+def start_request_trace() -> None:
+    """``before_request`` hook."""
+    if not TRACING_ENABLED:
+        return
+    from flask import request
+    rule = request.url_rule.rule if request.url_rule else request.path
+    _current.set(Trace(f"{request.method} {rule}"))
+
+
+def finish_request_trace(response):
+    """``after_request`` hook: report the trace and add the Server-Timing header."""
+    trace = _current.get()
+    if trace is None:
+        return response
+    trace.finish(response.status_code)
+    if TRACE_SERVER_TIMING:
+        response.headers.add('Server-Timing', trace.server_timing())
+    if trace.duration * 1000 >= TRACE_LOG_SLOW_MS or random.random() < TRACE_LOG_SAMPLE_RATE:
+        record = trace.to_dict()
+        _log.info(f"trace {trace.route} {trace.status} {record['duration_ms']}ms", extra={'trace': record})
+    for exporter in list(_exporters):
+        try:
+            exporter(trace)
+        except Exception as e:
+            logging.error(f"Trace exporter failed: {e}")
+    return response
+
+
+def end_request_trace(_error=None) -> None:
+    """``teardown_request`` hook: drop the trace, also when the view raised."""
+    if _current.get() is not None:
+        _current.set(None)
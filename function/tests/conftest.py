@@ -0,0 +1,23 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.append(os.path.join(os.path.dirname(__file__), '../ih_search_service'))
+
+
+@pytest.fixture
+def memory_db():
+    """The in-memory DynamoDB (``benchmarks.memory_dynamodb``) with every table created."""
+    from benchmarks.memory_dynamodb import MemoryDynamoDB, create_tables, install, uninstall
+    from model.handle import InfluencerHandle
+    from model.index_changelog import IndexChangeLog
+    from model.influencer import Influencer, clear_indexes
+    from model.metrics import Metrics
+    from model.posts import Post
+    backend = install(MemoryDynamoDB(seed=1))
+    create_tables(Influencer, Metrics, Post, InfluencerHandle, IndexChangeLog)
+    yield backend
+    clear_indexes()
+    uninstall()
@@ -1,7 +1,3 @@
-import os
-import sys
-sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-sys.path.append(os.path.join(os.path.dirname(__file__), '../ih_search_service'))
 import pytest
 from datetime import datetime
 from types import SimpleNamespace
@@ -245,3 +241,1574 @@ def test_posts_by_influencer_with_db_cursor(mock_get_posts, client):
     assert response.status_code == 200
     assert response.json['success'] is True
     assert 'next_token' in response.json
+
+
+def make_influencer(influencer_id, name, location='New York', gender='Female', category='FASHION', platforms=()):
+    """An ``Influencer`` for indexes, mocked reads, stream images and the memory backend.
+
+    ``platforms`` holds platform names (handle ``<name>_<platform>``) or
+    ``(platform, handle)`` pairs. ``.serialize()`` gives the stored item.
+    """
+    from enums.category import Category
+    from enums.gender import Gender
+    from enums.platform import Platform
+    from model.influencer import Influencer
+    from model.influencer_platform import InfluencerPlatform
+    entries = []
+    for entry in platforms:
+        platform, handle = entry if isinstance(entry, tuple) else (entry, f"{name}_{Platform(entry).value}".lower())
+        entries.append(InfluencerPlatform(influencer_id=influencer_id, platform=Platform(platform),
+                                          influencer_handle=handle, profile_url='u', profile_img_url='i',
+                                          influencer_bio='b', influencer_email='e'))
+    return Influencer(influencer_id=influencer_id, name=name, location=location, gender=Gender(gender),
+                      category=Category(category), platforms=entries)
+
+
+@pytest.fixture
+def facet_index():
+    from model.influencer import clear_indexes, influencer_bitmap_index
+    clear_indexes()
+    influencer_bitmap_index.rebuild([
+        make_influencer('1', 'Alice', 'Los Angeles, California', 'Female', 'FASHION', ['INSTAGRAM']),
+        make_influencer('2', 'Bob', 'New York', 'Male', 'FITNESS', ['INSTAGRAM', 'TIKTOK']),
+        make_influencer('3', 'Carla', 'New York', 'Female', 'FASHION', ['TIKTOK']),
+    ])
+    yield influencer_bitmap_index
+    clear_indexes()
+
+
+def test_bitmap_index_upsert_and_remove(facet_index):
+    facet_index.upsert(make_influencer('2', 'Bob', 'Austin', 'Male', 'TECH', ['TIKTOK']))
+    assert facet_index.keys(facet_index.match({'location': ['New York']})) == ['3']
+    assert facet_index.count(facet_index.match({'platform': ['TIKTOK']})) == 2
+    facet_index.remove('3')
+    facet_index.upsert(make_influencer('4', 'Dan', 'Austin', 'Male', 'TECH', ['INSTAGRAM']))
+    assert len(facet_index) == 3
+    assert facet_index.keys(facet_index.match({'location': ['Austin']})) == ['2', '4']
+    assert 'New York' not in facet_index.values('location')
+
+
+def test_facets_counts(client, facet_index):
+    response = client.get('/facets?gender=female')
+    assert response.status_code == 200
+    data = response.json['data']
+    assert data['total'] == 2
+    assert data['facets']['category'] == {'FASHION': 2}
+    assert data['facets']['platform'] == {'INSTAGRAM': 1, 'TIKTOK': 1}
+
+
+def test_facets_name_and_platform_filter(client, facet_index):
+    response = client.get('/facets?platform=instagram&name=b')
+    assert response.status_code == 200
+    assert response.json['data']['total'] == 1
+    assert response.json['data']['facets']['gender'] == {'Male': 1}
+
+
+def test_facets_invalid_category(client, facet_index):
+    response = client.get('/facets?category=NOPE')
+    assert response.status_code == 400
+    assert response.json['success'] is False
+
+
+@patch('model.posts.Post.get_recent_posts', return_value=([], None))
+@patch('model.metrics.Metrics.influencer_id_idx')
+@patch('model.influencer.Influencer.batch_get')
+def test_search_influencers_bitmap_filters_hydrate_page_only(mock_batch_get, mock_metrics_idx, mock_recent_posts,
+                                                             client, facet_index):
+    mock_batch_get.side_effect = lambda ids: [
+        make_influencer(i, 'Alice' if i == '1' else 'Carla', 'x', 'Female', 'FASHION', ['TIKTOK']) for i in ids]
+    response = client.get('/searchInfluencers?gender=female&category=fashion&limit=1')
+    assert response.status_code == 200
+    assert [r['id'] for r in response.json['data']] == ['1']
+    assert 'next_token' in response.json
+    mock_batch_get.assert_called_once_with(['1'])
+    # Recent posts are opt-in
+    mock_recent_posts.assert_not_called()
+
+
+@patch('model.posts.Post.get_recent_posts', return_value=([], None))
+@patch('model.metrics.Metrics.influencer_id_idx')
+@patch('model.metrics.Metrics.platform_followers_idx')
+@patch('model.influencer.Influencer.batch_get')
+def test_search_influencers_intersects_metric_ids(mock_batch_get, mock_followers_idx, mock_metrics_idx,
+                                                  mock_recent_posts, client, facet_index):
+    mock_followers_idx.query.return_value = [SimpleNamespace(influencer_id='2'), SimpleNamespace(influencer_id='3')]
+    mock_batch_get.return_value = []
+    response = client.get('/searchInfluencers?platform=INSTAGRAM&min_followers=10')
+    assert response.status_code == 200
+    mock_batch_get.assert_called_once_with(['2'])
+
+
+def test_search_influencers_no_bitmap_match(client, facet_index):
+    response = client.get('/searchInfluencers?location=Nowhere')
+    assert response.status_code == 200
+    assert response.json == {'success': True, 'data': []}
+
+
+def test_location_trie_resolves_hierarchy():
+    from utils.location_trie import LocationTrie
+    trie = LocationTrie()
+    for loc in ['Los Angeles, California, USA', 'San Diego,  california', 'California City', 'Austin, Texas']:
+        trie.insert(loc)
+    assert trie.resolve('California') == ['Los Angeles, California, USA', 'San Diego,  california']
+    assert trie.resolve('los angeles, california') == ['Los Angeles, California, USA']
+    assert trie.resolve('California, USA') == ['Los Angeles, California, USA']
+    assert trie.resolve('Nevada') == []
+
+    # Syncing applies the difference; nodes nothing uses are pruned
+    trie.sync(['San Diego,  california', 'Austin, Texas', 'Reno, Nevada'], version=1)
+    assert trie.resolve('California') == ['San Diego,  california']
+    assert trie.resolve('Nevada') == ['Reno, Nevada']
+    assert trie.resolve('California City') == []
+    assert not {'usa', 'los angeles', 'california city'} & set(trie._root.children)
+
+
+def test_bitmap_index_values_version_moves_only_when_values_change():
+    from model.influencer import new_influencer_bitmap_index
+    index = new_influencer_bitmap_index()
+    index.rebuild([make_influencer('1', 'Ann', 'Austin'), make_influencer('2', 'Bob', 'Austin')])
+    version = index.values_version('location')
+    index.upsert(make_influencer('1', 'Ann B', 'Austin'))
+    index.remove('2')
+    assert index.values_version('location') == version
+    index.upsert(make_influencer('2', 'Bob', 'Denver'))
+    assert index.values_version('location') != version
+    version = index.values_version('location')
+    index.remove('2')
+    assert index.values_version('location') != version
+
+
+@patch('model.influencer.Influencer.influencer_location_index')
+def test_search_by_location_fans_out_contained_locations(mock_location_index, client, facet_index):
+    facet_index.upsert(make_influencer('4', 'Dan', 'San Diego, California', 'Male', 'TECH', ['TIKTOK']))
+    mock_location_index.query.side_effect = lambda loc, **kwargs: [
+        MagicMock(to_dict=lambda loc=loc: {"location": loc})]
+    response = client.get('/searchByLocation?location=california')
+    assert response.status_code == 200
+    assert [r['location'] for r in response.json['data']] == ['Los Angeles, California', 'San Diego, California']
+
+
+@patch('model.posts.Post.get_recent_posts', return_value=([], None))
+@patch('model.metrics.Metrics.influencer_id_idx')
+@patch('model.influencer.Influencer.batch_get', return_value=[])
+def test_search_influencers_location_is_hierarchical(mock_batch_get, mock_metrics_idx, mock_recent_posts,
+                                                     client, facet_index):
+    client.get('/searchInfluencers?location=California')
+    mock_batch_get.assert_called_once_with(['1'])
+
+
+@patch('model.influencer.Influencer.search_by_platform')
+def test_identical_concurrent_requests_are_coalesced(mock_search_by_platform):
+    import threading
+    import time
+    from utils.single_flight import single_flight
+
+    single_flight.reset_stats()
+
+    def slow_search(*args, **kwargs):
+        # Hold the leader until the second request has joined the flight
+        deadline = time.time() + 5
+        while single_flight.stats().get('/searchByPlatform', {}).get('hits', 0) < 1 and time.time() < deadline:
+            time.sleep(0.01)
+        return [MagicMock(to_dict=lambda: {"id": "123"})]
+
+    mock_search_by_platform.side_effect = slow_search
+    app.testing = True
+    responses = []
+
+    def call():
+        with app.test_client() as c:
+            responses.append(c.get('/searchByPlatform?platform=INSTAGRAM'))
+
+    threads = [threading.Thread(target=call) for _ in range(2)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert mock_search_by_platform.call_count == 1
+    assert [r.json for r in responses] == [{'success': True, 'data': [{"id": "123"}]}] * 2
+    assert single_flight.stats()['/searchByPlatform'] == {'hits': 1, 'misses': 1}
+
+
+def test_fan_out_runs_concurrently_and_short_circuits():
+    import threading
+    from utils.fanout import fan_out
+    started = threading.Barrier(2, timeout=5)
+
+    def source(value):
+        started.wait()
+        return value
+
+    assert fan_out({'a': lambda: source(1), 'b': lambda: source(2)}) == {'a': 1, 'b': 2}
+
+    release = threading.Event()
+    results = fan_out({'empty': lambda: set(), 'slow': lambda: release.wait(5)},
+                      short_circuit=lambda name, ids: not ids)
+    release.set()
+    assert results == {'empty': set()}
+
+
+def test_fan_out_reports_failing_source_and_timeouts():
+    import time
+    from utils.fanout import FanoutError, FanoutTimeout, fan_out
+
+    def boom():
+        raise RuntimeError('throttled')
+
+    with pytest.raises(FanoutError) as exc:
+        fan_out({'ok': lambda: 1, 'followers': boom})
+    assert exc.value.source == 'followers'
+    assert isinstance(exc.value.cause, RuntimeError)
+
+    with pytest.raises(FanoutTimeout) as exc:
+        fan_out({'slow': lambda: time.sleep(0.5), 'fast': lambda: 1}, timeout=0.05)
+    assert exc.value.source == 'slow'
+
+
+def test_fan_out_runs_nested_calls_inline():
+    import threading
+    from utils.fanout import fan_out
+
+    def inner():
+        nested = fan_out({'x': lambda: threading.current_thread()})
+        return nested['x'] is threading.current_thread()
+
+    assert fan_out({'a': inner, 'b': inner}) == {'a': True, 'b': True}
+    assert fan_out({'x': lambda: threading.current_thread()})['x'] is not threading.current_thread()
+
+
+@patch('model.metrics.Metrics.platform_engagement_rate_idx')
+@patch('model.metrics.Metrics.platform_followers_idx')
+def test_search_influencers_metric_query_error_names_source(mock_followers_idx, mock_engagement_idx,
+                                                            client, facet_index):
+    mock_followers_idx.query.return_value = [SimpleNamespace(influencer_id='2')]
+    mock_engagement_idx.query.side_effect = RuntimeError('boom')
+    response = client.get('/searchInfluencers?platform=INSTAGRAM&min_followers=1&min_engagement_rate=1')
+    assert response.status_code == 500
+    assert response.json['error'] == 'Failed to query metrics for engagement rate'
+
+
+def _batch_response(table, raw_items, unprocessed=()):
+    response = {'Responses': {table: raw_items}}
+    if unprocessed:
+        response['UnprocessedKeys'] = {table: {'Keys': list(unprocessed)}}
+    return response
+
+
+@patch('utils.batch_get._backoff', return_value=0)
+@patch('pynamodb.connection.TableConnection.batch_get_item')
+def test_influencers_batch_dedupes_chunks_and_retries_unprocessed(mock_batch_get_item, mock_backoff, client):
+    import utils.batch_get as batch_get
+    from model.influencer import Influencer
+    requested = []
+
+    def batch_get_item(keys, consistent_read=None, attributes_to_get=None):
+        ids = [k['influencer_id']['S'] for k in keys]
+        requested.append(ids)
+        if 'id-1' in ids and len(requested) == 1:
+            # First round trip: DynamoDB leaves id-1 unprocessed
+            return _batch_response(Influencer.Meta.table_name,
+                                   [make_influencer(i, i.upper()).serialize() for i in ids if i != 'id-1'],
+                                   [{'influencer_id': {'S': 'id-1'}}])
+        return _batch_response(Influencer.Meta.table_name,
+                               [make_influencer(i, i.upper()).serialize() for i in ids if i != 'missing'])
+
+    mock_batch_get_item.side_effect = batch_get_item
+    with patch.object(batch_get, 'BATCH_GET_CHUNK', 2):
+        response = client.post('/influencers/batch', json={'ids': ['id-1', 'id-2', 'id-1', 'missing']})
+    assert response.status_code == 200
+    assert [r['influencer_id'] for r in response.json['data']] == ['id-1', 'id-2']
+    assert response.json['missing'] == ['missing']
+    assert sorted(map(len, requested)) == [1, 1, 2]
+
+
+def test_influencers_batch_rejects_bad_input(client):
+    assert client.post('/influencers/batch', json={'ids': []}).status_code == 400
+    assert client.post('/influencers/batch', json={'ids': 'abc'}).status_code == 400
+    with patch('controllers.influencer_metrics_controller.MAX_BATCH_IDS', 2):
+        assert client.post('/influencers/batch', json={'ids': ['a', 'b', 'c']}).status_code == 400
+
+
+@patch('model.influencer.Influencer.get')
+def test_search_by_id_uses_direct_key_lookup(mock_get, client):
+    from model.influencer import Influencer
+    mock_get.side_effect = Influencer.DoesNotExist()
+    response = client.get('/searchById?influencer_id=nope')
+    assert response.status_code == 200
+    assert response.json == {'success': True, 'data': []}
+    mock_get.assert_called_once_with('nope', consistent_read=False)
+
+
+def _raw_post(post_id, title):
+    return {'post_id': {'S': post_id}, 'title': {'S': title}, 'platform': {'S': 'TIKTOK'},
+            'influencer_id': {'S': 'i1'}, 'url': {'S': f'https://x/{post_id}'}}
+
+
+@patch('pynamodb.connection.TableConnection.batch_get_item')
+def test_posts_batch_get_projects_and_preserves_order(mock_batch_get_item, client):
+    from model.posts import Post
+    seen = {}
+
+    def batch_get_item(keys, consistent_read=None, attributes_to_get=None):
+        seen['attributes'] = attributes_to_get
+        seen['consistent_read'] = consistent_read
+        ids = [k['post_id']['S'] for k in keys]
+        return _batch_response(Post.Meta.table_name, [_raw_post(i, i.upper()) for i in ids if i != 'gone'])
+
+    mock_batch_get_item.side_effect = batch_get_item
+    response = client.post('/posts/batch-get', json={'post_ids': ['p2', 'p1', 'gone', 'p2'],
+                                                     'attributes': ['title'], 'consistent_read': True})
+    assert response.status_code == 200
+    assert response.json['data'] == [{'post_id': 'p2', 'title': 'P2'}, {'post_id': 'p1', 'title': 'P1'}]
+    assert response.json['missing'] == ['gone']
+    assert seen == {'attributes': ['post_id', 'title'], 'consistent_read': True}
+
+
+def test_posts_batch_get_rejects_unknown_attribute(client):
+    response = client.post('/posts/batch-get', json={'post_ids': ['p1'], 'attributes': ['nope']})
+    assert response.status_code == 400
+    assert response.json['error'] == 'Unknown attributes: nope'
+
+
+@patch('model.posts.Post.get')
+def test_get_post_uses_direct_key_lookup(mock_get, client):
+    from model.posts import Post
+    mock_get.return_value = Post.from_raw_data(_raw_post('p1', 'Hello'))
+    response = client.get('/posts/p1?attributes=title&consistent_read=true')
+    assert response.status_code == 200
+    assert response.json['data'] == {'post_id': 'p1', 'title': 'Hello'}
+    mock_get.assert_called_once_with('p1', consistent_read=True, attributes_to_get=['post_id', 'title'])
+
+    mock_get.side_effect = Post.DoesNotExist()
+    assert client.get('/posts/missing').status_code == 404
+
+
+@patch('model.posts.Post.get_recent_posts')
+@patch('model.metrics.Metrics.influencer_id_idx')
+@patch('model.influencer.Influencer.batch_get')
+def test_search_influencers_hydrates_recent_posts(mock_batch_get, mock_metrics_idx, mock_recent_posts,
+                                                  client, facet_index):
+    from model.posts import Post
+    mock_batch_get.side_effect = lambda ids: [
+        make_influencer(i, 'Bob', 'New York', 'Male', 'FITNESS', ['TIKTOK']) for i in ids]
+    post = Post.from_raw_data(_raw_post('p9', 'Latest'))
+    post.influencer_id = '2'
+    mock_recent_posts.return_value = ([post], None)
+    response = client.get('/searchInfluencers?gender=male&recent_posts=50')
+    assert response.status_code == 200
+    assert [p['post_id'] for p in response.json['data'][0]['recentPosts']] == ['p9']
+    mock_recent_posts.assert_called_once_with('2', limit=10)
+
+
+@patch('model.posts.Post.get_recent_posts')
+def test_posts_by_influencer_time_range_mode(mock_recent_posts, client):
+    from datetime import timezone
+    mock_recent_posts.return_value = ([], {'post_id': {'S': 'p1'}})
+    response = client.get('/posts/search/influencer?influencer_id=i1&since=2024-01-01T00:00:00Z&order=desc&limit=5')
+    assert response.status_code == 200
+    assert 'next_token' in response.json
+    kwargs = mock_recent_posts.call_args.kwargs
+    assert kwargs['since'] == datetime(2024, 1, 1, tzinfo=timezone.utc)
+    assert kwargs['until'] is None and kwargs['descending'] is True and kwargs['limit'] == 5
+
+    assert client.get('/posts/search/influencer?influencer_id=i1&order=sideways').status_code == 400
+    assert client.get('/posts/search/influencer?influencer_id=i1&since=yesterday').status_code == 400
+
+
+def test_apply_post_delta_adds_unconditionally_and_guards_only_the_strings():
+    from botocore.exceptions import ClientError
+    from pynamodb.exceptions import UpdateError
+    from enums.platform import Platform
+    from model.metrics import Metrics
+
+    metrics = Metrics(id='m1', influencer_id='i1', platform=Platform.TIKTOK, total_likes=1500)
+    conflict = UpdateError('conflict', cause=ClientError(
+        {'Error': {'Code': 'ConditionalCheckFailedException', 'Message': ''}}, 'UpdateItem'))
+    with patch.object(Metrics, 'get_for_influencer_platform', return_value=metrics) as mock_get, \
+            patch.object(Metrics, 'update', side_effect=[None, conflict]) as mock_update:
+        # A newer writer moved the counter before the strings were set: that is left to it
+        assert Metrics.apply_post_delta('i1', Platform.TIKTOK, {'total_likes': 500, 'total_views': 0}) is metrics
+    assert mock_get.call_count == 1
+    add, strings = mock_update.call_args_list
+    # updated_at SET plus the ADD for the one non-zero counter, with no condition
+    assert len(add.kwargs['actions']) == 2 and 'condition' not in add.kwargs
+    assert len(strings.kwargs['actions']) == 1 and strings.kwargs['condition'] is not None
+
+
+def test_apply_post_delta_adds_to_items_missing_the_counter(memory_db):
+    from enums.platform import Platform
+    from model.metrics import Metrics
+    legacy = Metrics(id='i1#TIKTOK', influencer_id='i1', platform=Platform.TIKTOK)
+    legacy.save()
+    legacy.update(actions=[Metrics.total_likes.remove()])
+    assert 'total_likes' not in memory_db.tables['MetricsTable'].items[('i1#TIKTOK', None)]
+    Metrics.apply_post_delta('i1', Platform.TIKTOK, {'total_likes': 3})
+    stored = Metrics.get('i1#TIKTOK')
+    assert (stored.total_likes, stored.total_likes_str) == (3, '3')
+
+
+def test_reconcile_scans_segments_in_parallel(memory_db):
+    from enums.platform import Platform
+    from model.metrics import Metrics
+    memory_db.load_models(Metrics, [
+        Metrics(id=f'm{i}', influencer_id=str(i), platform=Platform.TIKTOK, total_likes=i) for i in range(6)])
+    totals = {(str(i), 'TIKTOK'): {'total_likes': 2} for i in range(6)}
+    totals[('new', 'INSTAGRAM')] = {'total_posts': 1}
+    with patch.object(Metrics, 'scan', wraps=Metrics.scan) as mock_scan:
+        assert Metrics.reconcile(totals, segments=3) == 6
+    assert sorted(c.kwargs['segment'] for c in mock_scan.call_args_list) == [0, 1, 2]
+    assert {m.total_likes for m in Metrics.scan() if m.platform == Platform.TIKTOK} == {2}
+
+
+def test_apply_post_delta_first_writes_share_one_metrics_item(memory_db):
+    from concurrent.futures import ThreadPoolExecutor
+    from enums.platform import Platform
+    from model.metrics import Metrics
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(lambda _: Metrics.apply_post_delta('i1', Platform.TIKTOK, {'total_likes': 2, 'total_posts': 1}),
+                      range(8)))
+    (metrics,) = list(Metrics.scan())
+    assert metrics.id == 'i1#TIKTOK'
+    assert (metrics.total_posts, metrics.total_likes, metrics.total_likes_str) == (8, 16, '16')
+
+
+@patch('model.metrics.Metrics.apply_post_delta')
+@patch('model.posts.Post.save')
+@patch('model.posts.Post.get_post_by_id')
+def test_update_post_moves_metrics_contribution(mock_get_post, mock_save, mock_apply, client):
+    from enums.platform import Platform
+    from model.posts import Post
+    post = Post.from_raw_data(_raw_post('p1', 'Hello'))
+    post.likes = 10
+    mock_get_post.return_value = post
+    response = client.put('/posts/p1', json={'likes': 25, 'platform': 'INSTAGRAM'})
+    assert response.status_code == 200
+    calls = {c.args[1]: c.args[2] for c in mock_apply.call_args_list}
+    assert calls[Platform.TIKTOK] == {'total_likes': -10, 'total_comments': 0, 'total_shares': 0,
+                                      'total_views': 0, 'total_posts': -1}
+    assert calls[Platform.INSTAGRAM]['total_likes'] == 25
+    assert calls[Platform.INSTAGRAM]['total_posts'] == 1
+
+
+@patch('model.metrics.Metrics.apply_post_delta', side_effect=RuntimeError('throttled'))
+@patch('model.posts.Post.delete')
+@patch('model.posts.Post.get_post_by_id')
+def test_delete_post_survives_metrics_failure(mock_get_post, mock_delete, mock_apply, client):
+    from model.posts import Post
+    mock_get_post.return_value = Post.from_raw_data(_raw_post('p1', 'Hello'))
+    response = client.delete('/posts/p1')
+    assert response.status_code == 200
+    mock_apply.assert_called_once()
+    mock_get_post.return_value = None
+    assert client.delete('/posts/p1').status_code == 404
+
+
+def test_bitmap_index_applies_changes_other_writers_log(memory_db):
+    from pynamodb.models import Model
+    from model import index_changelog
+    from model.index_changelog import IndexChangeLog, record_changes
+    from model.influencer import Influencer
+    memory_db.load_models(Influencer, [make_influencer('1', 'Ann', 'Austin'), make_influencer('2', 'Bob', 'Austin')])
+    index = Influencer.bitmap_index()
+    austin = {'location': ['Austin']}
+    assert index.keys(index.match(austin)) == ['1', '2']
+
+    # Another sandbox writes the table (bypassing this process) and logs the ids
+    Model.save(make_influencer('2', 'Bob', 'Denver'))
+    Model.save(make_influencer('3', 'Cy', 'Austin'))
+    Model.delete(Influencer(influencer_id='1'))
+    record_changes(['2', '3', '1'])
+    assert Influencer.bitmap_index().keys(index.match(austin)) == ['1', '2']  # next poll not due yet
+    with patch.object(index_changelog, 'INDEX_REFRESH_SECONDS', 0):
+        index = Influencer.bitmap_index()
+        assert index.keys(index.match(austin)) == ['3']
+        assert index.keys(index.match({'location': ['Denver']})) == ['2']
+
+        # Local writes update the index at once and are logged for the other sandboxes
+        make_influencer('4', 'Di', 'Austin').save()
+        assert sorted(index.keys(index.match(austin))) == ['3', '4']
+        assert [e.influencer_id for e in IndexChangeLog.query('influencers')][-1] == '4'
+
+        # Too far behind the log to catch up: rebuilt from the table
+        Model.save(make_influencer('5', 'Ed', 'Austin'))
+        with patch.object(index_changelog, 'INDEX_CHANGELOG_RETENTION_SECONDS', 0):
+            index = Influencer.bitmap_index()
+    assert sorted(index.keys(index.match(austin))) == ['3', '4', '5']
+
+
+def test_search_by_location_pages_with_cursor_without_loading_the_index(memory_db, client):
+    from model.influencer import Influencer, influencer_bitmap_index
+    memory_db.load_models(Influencer, [make_influencer(str(i), f'N{i}', platforms=['TIKTOK']) for i in range(12)])
+    seen = []
+    token = None
+    for _ in range(3):
+        response = client.get('/searchByLocation', query_string={'location': 'New York', 'limit': 5,
+                                                                 **({'next_token': token} if token else {})})
+        assert response.status_code == 200
+        seen += [r['influencer_id'] for r in response.json['data']]
+        token = response.json.get('next_token')
+        if len(seen) < 12:
+            assert len(response.json['data']) == 5 and token
+    assert sorted(seen) == sorted(str(i) for i in range(12))
+    # A cold sandbox answers from the location GSI instead of scanning to build the index
+    assert not influencer_bitmap_index.loaded
+
+
+@pytest.fixture
+def stream(tmp_path):
+    from utils.change_stream import FileCheckpointStore, LocalStreamSource, change_stream
+    change_stream.set_checkpoint_store(FileCheckpointStore(str(tmp_path / 'checkpoint.json')))
+    yield LocalStreamSource()
+    change_stream.set_checkpoint_store(FileCheckpointStore(str(tmp_path / 'unused.json')))
+
+
+def _logged_ids():
+    from model.index_changelog import IndexChangeLog
+    return [entry.influencer_id for entry in IndexChangeLog.query('influencers')]
+
+
+def test_change_stream_logs_influencer_and_follower_changes(memory_db, stream):
+    from enums.platform import Platform
+    from ih_search_service.app import stream_handler
+    from model.metrics import Metrics
+    stream.emit('INSERT', new=make_influencer('4', 'Dana', 'Austin'))
+    stream.emit('MODIFY', old=make_influencer('3', 'Carla', 'New York'),
+                new=make_influencer('3', 'Carla', 'Austin', category='TECH'))
+    stream.emit('MODIFY', old=make_influencer('2', 'Bob'), new=make_influencer('2', 'Bob'))  # no change
+    stream.emit('REMOVE', old=make_influencer('1', 'Alice', 'Los Angeles, California'))
+    stream.emit('MODIFY', old=Metrics(id='m7', influencer_id='7', platform=Platform.TIKTOK, total_followers=10),
+                new=Metrics(id='m7', influencer_id='7', platform=Platform.TIKTOK, total_followers=11))
+    stream.emit('MODIFY', old=Metrics(id='m8', influencer_id='8', platform=Platform.TIKTOK, total_likes=1),
+                new=Metrics(id='m8', influencer_id='8', platform=Platform.TIKTOK, total_likes=2))
+    event = stream.drain()
+    assert stream_handler(event, None) == {'batchItemFailures': []}
+    assert _logged_ids() == ['4', '3', '1', '7']
+
+    # Redelivery of an already-applied batch is a no-op
+    assert stream_handler(event, None) == {'batchItemFailures': []}
+    assert len(_logged_ids()) == 4
+
+
+def test_change_stream_reports_first_failure_and_resumes(memory_db, stream):
+    from model import influencer
+    from utils.change_stream import change_stream
+    stream.emit('INSERT', new=make_influencer('4', 'Dana', 'Austin'))
+    stream.emit('INSERT', new=make_influencer('5', 'Eve', 'Austin'))
+    event = stream.drain()
+    record_changes = influencer.record_changes
+
+    def flaky_record_changes(ids):
+        if ids == ['5']:
+            raise RuntimeError('boom')
+        record_changes(ids)
+
+    with patch.object(influencer, 'record_changes', side_effect=flaky_record_changes) as mock_record:
+        assert change_stream.process(event) == {'batchItemFailures': [{'itemIdentifier': '2'}]}
+        # Lambda redelivers from the failure: the applied record is skipped, the failed one applied
+        mock_record.side_effect = record_changes
+        assert change_stream.process(event) == {'batchItemFailures': []}
+    assert [c.args[0] for c in mock_record.call_args_list] == [['4'], ['5'], ['5']]
+    assert _logged_ids() == ['4', '5']
+
+
+def _metrics_row(influencer_id, platform, followers, engagement_rate):
+    from enums.platform import Platform
+    return SimpleNamespace(influencer_id=influencer_id, platform=Platform(platform), total_followers=followers,
+                           engagement_rate=engagement_rate, total_likes=1, total_comments=2, total_shares=3,
+                           total_views=4, total_posts=5)
+
+
+def test_search_artifact_round_trip_seeds_bitmap_index(tmp_path):
+    from model.influencer import new_influencer_bitmap_index
+    from model import search_artifact
+    from utils.index_artifact import IndexArtifact
+    path = str(tmp_path / 'search_index.bin')
+    influencers = [
+        make_influencer('1', 'Alice', 'Los Angeles, California', 'Female', 'FASHION', ['INSTAGRAM']),
+        make_influencer('2', 'Bob', 'New York', 'Male', 'FITNESS', ['INSTAGRAM', 'TIKTOK']),
+    ]
+    counts = search_artifact.build_search_artifact(
+        path, influencers, [_metrics_row('2', 'TIKTOK', 1500, 4.5), _metrics_row('gone', 'TIKTOK', 1, 0.1)])
+    assert counts == {'influencers': 2, 'handles': 3, 'metrics': 1}
+
+    artifact = IndexArtifact.open(path)
+    assert list(artifact.strings('ids')) == ['1', '2']
+    assert list(artifact.strings('handles')) == ['alice_instagram', 'bob_instagram', 'bob_tiktok']
+    assert artifact.array('metrics.owner').tolist() == [1]
+    assert artifact.array('metrics.followers').tolist() == [1500]
+    assert artifact.array('metrics.engagement').tolist() == [4.5]
+
+    index = new_influencer_bitmap_index()
+    assert search_artifact.seed_bitmap_index(index, path)
+    assert index.keys(index.match({'platform': ['INSTAGRAM']})) == ['1', '2']
+    assert index.facet_counts(index.all())['gender'] == {'Female': 1, 'Male': 1}
+    # Restored rows are recovered from the bitmaps on the first write
+    index.upsert(make_influencer('2', 'Bob', 'Austin', 'Male', 'FITNESS', ['TIKTOK']))
+    assert index.keys(index.match({'platform': ['INSTAGRAM']})) == ['1']
+    assert index.values('location') == ['Los Angeles, California', 'Austin']
+    # Ids are looked up in the mapped file; only changed keys are held in memory
+    index.remove('1')
+    index.upsert(make_influencer('3', 'Cy', 'Austin'))
+    assert index.keys(index.mask_for_keys(['1', '2', '3'])) == ['3', '2']
+    assert len(index) == 2
+
+
+def test_seeded_bitmap_index_applies_changes_since_the_build(memory_db, tmp_path):
+    from pynamodb.models import Model
+    from model import index_changelog, search_artifact
+    from model.index_changelog import record_changes
+    from model.influencer import Influencer, clear_indexes
+    path = str(tmp_path / 'search_index.bin')
+    memory_db.load_models(Influencer, [make_influencer('1', 'Ann', 'Austin'), make_influencer('2', 'Bob', 'Austin')])
+    search_artifact.build_search_artifact(path, Influencer.scan(), [])
+    Model.save(make_influencer('2', 'Bob', 'Denver'))
+    Model.save(make_influencer('3', 'Cy', 'Austin'))
+    record_changes(['2', '3'])
+
+    austin = {'location': ['Austin']}
+    with patch.object(search_artifact, 'SEARCH_ARTIFACT_PATH', path):
+        with patch.object(Influencer, 'scan', side_effect=AssertionError('scanned')):
+            index = Influencer.bitmap_index()
+        assert index.keys(index.match(austin)) == ['1', '3']
+        clear_indexes()
+        # Too old to catch up from the change log: built by scan instead
+        with patch.object(index_changelog, 'INDEX_CHANGELOG_RETENTION_SECONDS', 0):
+            index = Influencer.bitmap_index()
+    assert sorted(index.keys(index.match(austin))) == ['1', '3']
+    assert list(index._keys) == ['1', '2', '3']
+
+
+def test_search_artifact_rejects_corruption(tmp_path):
+    from utils.index_artifact import ArtifactError, ArtifactWriter, IndexArtifact
+    path = tmp_path / 'broken.bin'
+    writer = ArtifactWriter()
+    writer.add_array('values', 'q', [1, 2, 3])
+    writer.write(str(path))
+    data = bytearray(path.read_bytes())
+    data[-1] ^= 0xFF
+    path.write_bytes(bytes(data))
+    # Sections are checked when first read, the directory when opened
+    artifact = IndexArtifact.open(str(path))
+    with pytest.raises(ArtifactError, match='checksum mismatch in section values'):
+        artifact.array('values')
+    data[-1] ^= 0xFF
+    data[30] ^= 0xFF  # in the directory
+    path.write_bytes(bytes(data))
+    with pytest.raises(ArtifactError, match='directory checksum'):
+        IndexArtifact.open(str(path))
+    path.write_bytes(bytes(data[:10]))
+    with pytest.raises(ArtifactError, match='truncated'):
+        IndexArtifact.open(str(path))
+
+
+class _PagedPosts:
+    """Stands in for a PynamoDB result iterator: the cursor is set once iteration ends."""
+
+    def __init__(self, posts, last_key):
+        self._posts = posts
+        self._last_key = last_key
+        self.last_evaluated_key = None
+
+    def __iter__(self):
+        yield from self._posts
+        self.last_evaluated_key = self._last_key
+
+
+@patch('model.posts.Post.get_posts_by_platform')
+def test_posts_by_platform_streams_ndjson_with_final_cursor(mock_get_posts, client):
+    import json
+    from model.posts import Post
+    posts = _PagedPosts([Post.from_raw_data(_raw_post('p1', 'One')), Post.from_raw_data(_raw_post('p2', 'Two'))],
+                        {'post_id': {'S': 'p2'}})
+    mock_get_posts.return_value = (posts, None)
+    response = client.get('/posts/search/platform?platform=TIKTOK&limit=2',
+                          headers={'Accept': 'application/x-ndjson'})
+    assert response.status_code == 200
+    assert response.mimetype == 'application/x-ndjson'
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert [line['post_id'] for line in lines[:-1]] == ['p1', 'p2']
+    assert lines[-1]['success'] is True and lines[-1]['count'] == 2
+    from utils.pagination import decode_token
+    assert decode_token(lines[-1]['next_token']) == {'type': 'last_key', 'key': {'post_id': {'S': 'p2'}}}
+
+
+def test_ndjson_reports_mid_stream_failure_on_final_line(client):
+    import json
+    from model.posts import Post
+
+    def failing():
+        yield Post.from_raw_data(_raw_post('p1', 'One'))
+        raise RuntimeError('throttled')
+
+    with patch('model.posts.Post.get_all_posts', return_value=(failing(), None)):
+        response = client.get('/posts?stream=1')
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert lines[0]['post_id'] == 'p1'
+    assert lines[-1] == {'success': False, 'count': 1, 'error': 'Failed to stream posts'}
+
+
+@patch('model.posts.Post.get_recent_posts', return_value=([], None))
+@patch('model.metrics.Metrics.influencer_id_idx')
+@patch('model.influencer.Influencer.batch_get')
+def test_search_influencers_streams_in_hydration_chunks(mock_batch_get, mock_metrics_idx, mock_recent_posts,
+                                                        client, facet_index):
+    import json
+    import controllers.influencer_metrics_controller as controller
+    mock_batch_get.side_effect = lambda ids: [
+        make_influencer(i, f'N{i}', 'x', 'Female', 'FASHION', ['TIKTOK']) for i in ids]
+    with patch.object(controller, 'SEARCH_HYDRATION_BATCH', 2):
+        response = client.get('/searchInfluencers?stream=1')
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert [line['id'] for line in lines[:-1]] == ['1', '2', '3']
+    assert lines[-1] == {'success': True, 'count': 3}
+    assert [c.args[0] for c in mock_batch_get.call_args_list] == [['1', '2'], ['3']]
+    # Default JSON stays unchanged for clients that accept anything
+    assert client.get('/searchInfluencers?gender=male', headers={'Accept': '*/*'}).json['data'][0]['id'] == '2'
+
+
+@patch('model.influencer.Influencer.search_by_name')
+def test_columnar_format_and_gzip_negotiation(mock_search_by_name, client):
+    import gzip
+    import json
+    rows = [{'id': str(i), 'name': f'Name {i}', 'bio': 'x' * 40} for i in range(50)]
+    rows[1] = {'id': '1', 'name': 'Name 1'}
+    mock_search_by_name.return_value = [MagicMock(to_dict=lambda row=row: row) for row in rows]
+
+    response = client.get('/searchByName?name=Name&format=columnar', headers={'Accept-Encoding': 'br;q=0, gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in response.headers['Vary']
+    body = json.loads(gzip.decompress(response.get_data()))
+    assert body['format'] == 'columnar'
+    assert body['fields'] == ['id', 'name', 'bio']
+    assert body['data']['id'][:3] == ['0', '1', '2']
+    assert body['data']['bio'][1] is None
+
+    # Below the size threshold, or without Accept-Encoding, bodies go out as-is
+    mock_search_by_name.return_value = [MagicMock(to_dict=lambda: {'id': '1'})]
+    small = client.get('/searchByName?name=Name', headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in small.headers
+    assert small.json['data'] == [{'id': '1'}]
+
+
+@patch('model.influencer.Influencer.search_by_name')
+def test_lambda_handler_returns_plain_json_to_gzip_clients(mock_search_by_name):
+    import json
+    pytest.importorskip('awsgi')
+    from ih_search_service.app import handler
+    rows = [{'id': str(i), 'bio': 'x' * 40} for i in range(50)]
+    mock_search_by_name.return_value = [MagicMock(to_dict=lambda row=row: row) for row in rows]
+    event = {'httpMethod': 'GET', 'path': '/searchByName', 'queryStringParameters': {'name': 'N'}, 'body': None,
+             'headers': {'Accept-Encoding': 'gzip, deflate, br', 'Accept': 'application/msgpack, */*'}}
+    result = handler(event, None)
+    assert result['statusCode'] == '200' and result['isBase64Encoded'] is False
+    assert 'Content-Encoding' not in result['headers']
+    assert result['headers']['Content-Type'] == 'application/json'
+    assert len(json.loads(result['body'])['data']) == 50
+
+
+def test_streamed_ndjson_is_gzip_compressed_per_chunk(client):
+    import json
+    import zlib
+    from model.posts import Post
+    posts = [Post.from_raw_data(_raw_post(f'p{i}', 'T')) for i in range(3)]
+    with patch('model.posts.Post.get_all_posts', return_value=(posts, None)):
+        response = client.get('/posts?stream=1', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    text = zlib.decompress(response.get_data(), 31).decode('utf-8')
+    lines = [json.loads(line) for line in text.splitlines()]
+    assert [line.get('post_id') for line in lines[:-1]] == ['p0', 'p1', 'p2']
+    assert lines[-1]['count'] == 3
+
+
+class _FakeScanConnection:
+    """Serves scan pages of raw items the way DynamoDB would (Limit = items evaluated)."""
+
+    def __init__(self, raw_items, matches=lambda raw: True, capacity_per_item=0.5):
+        self.raw_items = raw_items
+        self.matches = matches
+        self.capacity_per_item = capacity_per_item
+        self.calls = []
+
+    def scan(self, filter_condition=None, limit=None, exclusive_start_key=None, index_name=None,
+             return_consumed_capacity=None):
+        self.calls.append({'limit': limit, 'exclusive_start_key': exclusive_start_key})
+        ids = [r['influencer_id']['S'] for r in self.raw_items]
+        start = ids.index(exclusive_start_key['influencer_id']['S']) + 1 if exclusive_start_key else 0
+        evaluated = self.raw_items[start:start + limit]
+        page = {'Items': [r for r in evaluated if self.matches(r)], 'ScannedCount': len(evaluated),
+                'ConsumedCapacity': {'CapacityUnits': self.capacity_per_item * len(evaluated)}}
+        if start + limit < len(self.raw_items):
+            page['LastEvaluatedKey'] = {'influencer_id': evaluated[-1]['influencer_id']}
+        return page
+
+
+def test_search_by_name_budget_returns_partial_with_exact_continuation(client):
+    from model.influencer import Influencer
+    from utils.pagination import decode_token
+    raw = [make_influencer(f'id-{i:02d}', 'Ann' if i in (3, 14) else 'Bob').serialize() for i in range(20)]
+    connection = _FakeScanConnection(raw, matches=lambda r: r['name']['S'] == 'Ann')
+    with patch.object(Influencer, '_get_connection', return_value=connection):
+        response = client.get('/searchByName?name=Ann&limit=5&max_scanned=10')
+        assert response.status_code == 200
+        assert [r['influencer_id'] for r in response.json['data']] == ['id-03']
+        assert response.json['partial'] is True
+        assert response.json['read_budget']['scanned'] == 10
+        assert response.json['read_budget']['exhausted_by'] == 'scanned'
+        token = response.json['next_token']
+        assert decode_token(token)['key'] == {'influencer_id': {'S': 'id-09'}}
+
+        resumed = client.get(f'/searchByName?name=Ann&limit=5&next_token={token}')
+        assert [r['influencer_id'] for r in resumed.json['data']] == ['id-14']
+        assert 'partial' not in resumed.json and 'next_token' not in resumed.json
+
+
+def test_budgeted_scan_stops_mid_page_at_limit():
+    from model.influencer import Influencer
+    from utils.read_budget import budgeted_scan
+    raw = [make_influencer(f'id-{i}', 'Ann').serialize() for i in range(6)]
+    with patch.object(Influencer, '_get_connection', return_value=_FakeScanConnection(raw)):
+        result = budgeted_scan(Influencer, limit=2)
+    assert [i.influencer_id for i in result.items] == ['id-0', 'id-1']
+    assert result.last_key == {'influencer_id': {'S': 'id-1'}}
+    assert result.partial is False
+
+
+@patch('model.posts.Post.get_recent_posts', return_value=([], None))
+@patch('model.metrics.Metrics.influencer_id_idx')
+@patch('model.influencer.Influencer.batch_get')
+def test_search_influencers_hydration_budget_returns_offset_continuation(mock_batch_get, mock_metrics_idx,
+                                                                         mock_recent_posts, client, facet_index):
+    import controllers.influencer_metrics_controller as controller
+    mock_batch_get.side_effect = lambda ids: [
+        make_influencer(i, f'N{i}', 'x', 'Female', 'FASHION', ['TIKTOK']) for i in ids]
+    with patch.object(controller, 'SEARCH_HYDRATION_BATCH', 2):
+        response = client.get('/searchInfluencers?max_scanned=2')
+        assert [r['id'] for r in response.json['data']] == ['1', '2']
+        assert response.json['partial'] is True
+        resumed = client.get(f"/searchInfluencers?next_token={response.json['next_token']}")
+    assert [r['id'] for r in resumed.json['data']] == ['3']
+    assert 'partial' not in resumed.json
+
+
+def test_adaptive_page_size_follows_observed_selectivity():
+    from model.influencer import Influencer
+    from utils.selectivity import SelectivityTracker, scan_selectivity
+    tracker = SelectivityTracker(decay=0.5)
+    assert tracker.page_size('shape', 10) == 150  # prior: 1 match per 10 scanned
+    for _ in range(5):
+        tracker.observe('shape', matched=1, scanned=500)
+    assert tracker.page_size('shape', 10) == 1000  # selective filter: capped at SCAN_PAGE_MAX
+    tracker.observe('shape', matched=400, scanned=400)
+    assert tracker.page_size('shape', 10) < 50  # estimate decays toward the new data
+
+    # 1 match per 100 items: a fixed Limit=limit needs ~100 round trips, adaptive sizing a few
+    scan_selectivity.reset()
+    raw = [make_influencer(f'id-{i:04d}', 'Ann' if i % 100 == 50 else 'Bob').serialize() for i in range(1000)]
+    connection = _FakeScanConnection(raw, matches=lambda r: r['name']['S'] == 'Ann')
+    with patch.object(Influencer, '_get_connection', return_value=connection):
+        first = Influencer.search_by_name('Ann', limit=5)
+        second = Influencer.search_by_name('Ann', limit=3, exclusive_start_key=first.last_key)
+    assert [i.influencer_id for i in first.items] == [f'id-{i:04d}' for i in (50, 150, 250, 350, 450)]
+    assert [i.influencer_id for i in second.items] == ['id-0550', 'id-0650', 'id-0750']
+    assert first.round_trips <= 4
+    assert second.round_trips == 1
+    assert max(call['limit'] for call in connection.calls) <= 1000
+    scan_selectivity.reset()
+
+
+@pytest.mark.parametrize('body', [
+    {'metrics_ranges': {'karma': {'min': 1}}},
+    {'metrics_ranges': {'followers': {'min': 10, 'max': 1}}},
+    {'metrics_ranges': {'likes': {'min': 'many'}}},
+    {'metrics_ranges': {}},
+    {'metrics_ranges': {'followers': {'min': 1}}, 'platform': 'MYSPACE'},
+])
+def test_search_by_metrics_rejects_invalid_ranges(client, body):
+    response = client.post('/search_by_metrics', json=body)
+    assert response.status_code == 400
+    assert response.json['success'] is False
+
+
+def test_search_by_metrics_drives_index_query_and_joins_influencers(client):
+    from model.influencer import Influencer
+    from model.metrics import MetricsFollowersIndex
+    rows = [_metrics_row('2', 'INSTAGRAM', 1500, 4.5), _metrics_row('1', 'INSTAGRAM', 2000, 9.0),
+            _metrics_row('gone', 'INSTAGRAM', 1800, 5.0)]
+    influencers = {i: SimpleNamespace(to_dict=lambda i=i: {'influencer_id': i}) for i in ('1', '2')}
+    with patch.object(MetricsFollowersIndex, 'query', return_value=iter(rows)) as mock_query, \
+            patch.object(Influencer, 'get_by_ids', return_value=influencers) as mock_get:
+        response = client.post('/search_by_metrics', json={
+            'platform': 'instagram',
+            'metrics_ranges': {'followers': {'min': 1000, 'max': 5000}, 'engagement_rate': [2, 8],
+                               'likes': {'min': 1}},
+        })
+    assert response.status_code == 200
+    # The closed followers range drives the GSI; the rest is one filter expression
+    args, kwargs = mock_query.call_args
+    assert args[0].value == 'INSTAGRAM'
+    assert 'total_followers BETWEEN' in str(args[1])
+    assert 'engagement_rate BETWEEN' in str(kwargs['filter_condition'])
+    assert 'total_likes >=' in str(kwargs['filter_condition'])
+    # Rows outside a range are dropped by the residual check; unknown influencers by the join
+    mock_get.assert_called_once_with(['2', 'gone'])
+    assert response.json['data'] == [{'influencer_id': '2'}]
+
+
+def test_metrics_search_picks_most_selective_range_from_artifact(tmp_path):
+    from enums.platform import Platform
+    from model import search_artifact
+    from model.metrics import _choose_driver, parse_metric_ranges
+    path = str(tmp_path / 'search_index.bin')
+    influencers = [make_influencer(str(i), f'Inf{i}', 'Austin', 'Male', 'FITNESS', ['INSTAGRAM']) for i in range(4)]
+    search_artifact.build_search_artifact(path, influencers, [
+        _metrics_row('0', 'INSTAGRAM', 1000, 1.0), _metrics_row('1', 'INSTAGRAM', 2000, 2.0),
+        _metrics_row('2', 'INSTAGRAM', 3000, 9.0), _metrics_row('3', 'TIKTOK', 4000, 9.5)])
+    ranges = parse_metric_ranges({'followers': {'min': 500, 'max': 5000}, 'engagement_rate': {'min': 5}})
+    with patch.object(search_artifact, 'SEARCH_ARTIFACT_PATH', path):
+        names = ['total_followers', 'engagement_rate']
+        counts = search_artifact.metrics_range_counts(ranges, Platform.INSTAGRAM, names)
+        assert counts == {'total_followers': 3, 'engagement_rate': 1}
+        assert search_artifact.metrics_range_counts(ranges, Platform.TIKTOK, names) == {
+            'total_followers': 1, 'engagement_rate': 1}
+        upper = parse_metric_ranges({'followers': {'max': 2500}, 'engagement_rate': {'min': 1.5, 'max': 9}})
+        assert search_artifact.metrics_range_counts(upper, Platform.INSTAGRAM, names) == {
+            'total_followers': 2, 'engagement_rate': 2}
+        assert _choose_driver(ranges, Platform.INSTAGRAM) == 'engagement_rate'
+    with patch.object(search_artifact, 'SEARCH_ARTIFACT_PATH', str(tmp_path / 'missing.bin')):
+        assert _choose_driver(ranges, Platform.INSTAGRAM) == 'total_followers'
+    # A continuation key resumes on the index that produced it; no platform means a scan
+    assert _choose_driver(ranges, Platform.INSTAGRAM, {'id': {'S': 'm'}, 'engagement_rate': {'N': '6'}}) \
+        == 'engagement_rate'
+    assert _choose_driver(ranges, None) is None
+
+
+def test_search_by_metrics_without_platform_scans_and_dedupes(client):
+    from model.influencer import Influencer
+    from utils.read_budget import ScanResult
+    rows = [_metrics_row('1', 'INSTAGRAM', 1500, 4.5), _metrics_row('1', 'TIKTOK', 2500, 3.0)]
+    influencers = {'1': SimpleNamespace(to_dict=lambda: {'influencer_id': '1'})}
+    with patch('model.metrics.budgeted_scan', return_value=ScanResult(rows, {'id': {'S': 'm2'}})) as mock_scan, \
+            patch.object(Influencer, 'get_by_ids', return_value=influencers):
+        response = client.post('/search_by_metrics?limit=2', json={'metrics_ranges': {'views': {'max': 10}}})
+    assert response.status_code == 200
+    assert response.json['data'] == [{'influencer_id': '1'}]
+    assert 'next_token' in response.json
+    args, kwargs = mock_scan.call_args
+    assert str(args[1]) == "total_views <= {'N': '10'}"
+    assert kwargs['limit'] == 2
+
+
+def test_search_by_filters_requires_a_filter(client):
+    response = client.get('/searchByFilters')
+    assert response.status_code == 400
+    assert response.json['success'] is False
+
+
+def _found(*ids):
+    return {i: SimpleNamespace(to_dict=lambda i=i: {'influencer_id': i}) for i in ids}
+
+
+def test_search_by_filters_intersects_memory_location_with_name_index(client, facet_index):
+    from model.influencer import Influencer, InfluencerLocationIndex, InfluencerNameIndex
+    with patch.object(InfluencerNameIndex, 'query', return_value=[SimpleNamespace(influencer_id='1')]) as mock_name, \
+            patch.object(InfluencerLocationIndex, 'query') as mock_location, \
+            patch.object(Influencer, 'get_by_ids', return_value=_found('1')) as mock_get:
+        response = client.get('/searchByFilters?name=Alice&location=California')
+    assert response.status_code == 200
+    assert response.json['data'] == [{'influencer_id': '1'}]
+    # Location resolved hierarchically from the loaded bitmap index; the name
+    # query is narrowed to the surviving ids and only they are fetched
+    args, kwargs = mock_name.call_args
+    assert args[0] == 'Alice'
+    assert "influencer_id IN" in str(kwargs['filter_condition'])
+    mock_location.assert_not_called()
+    mock_get.assert_called_once_with(['1'])
+
+    with patch.object(InfluencerNameIndex, 'query') as mock_name, \
+            patch.object(Influencer, 'get_by_ids', return_value={}) as mock_get:
+        response = client.get('/searchByFilters?influencer_id=2&name=Alice&location=California')
+    assert response.json['data'] == []
+    mock_name.assert_not_called()
+    mock_get.assert_called_once_with([])
+
+
+def test_search_by_filters_uses_gsis_when_index_cold_and_paginates_ids(client):
+    from model.influencer import Influencer, InfluencerLocationIndex, InfluencerNameIndex
+    with patch.object(InfluencerNameIndex, 'query', return_value=[]), \
+            patch.object(InfluencerLocationIndex, 'query') as mock_location:
+        response = client.get('/searchByFilters?name=Nobody&location=Austin')
+    assert response.json['data'] == []
+    mock_location.assert_not_called()
+
+    hits = [SimpleNamespace(influencer_id=i) for i in ('7', '8', '9')]
+    with patch.object(InfluencerLocationIndex, 'query', return_value=hits) as mock_location, \
+            patch.object(Influencer, 'get_by_ids', side_effect=lambda ids: _found(*ids)) as mock_get:
+        first = client.get('/searchByFilters?location=Austin&limit=2')
+        second = client.get(f"/searchByFilters?location=Austin&limit=2&next_token={first.json['next_token']}")
+    assert mock_location.call_args[0][0] == 'Austin'
+    assert [r['influencer_id'] for r in first.json['data']] == ['7', '8']
+    assert [r['influencer_id'] for r in second.json['data']] == ['9']
+    assert [c.args[0] for c in mock_get.call_args_list] == [['7', '8'], ['9']]
+
+
+def test_prefix_index_ranks_dedupes_and_invalidates():
+    from utils.prefix_index import PrefixIndex
+    index = PrefixIndex()
+    index.rebuild([('1', 'Alice Smith', [('INSTAGRAM', '@alice'), ('TIKTOK', 'alice.tok')]),
+                   ('2', 'Alan Alda', [('INSTAGRAM', 'smithy')]),
+                   ('3', 'Bob', [])],
+                  {'1': {'INSTAGRAM': 100, 'TIKTOK': 900}, '2': {'INSTAGRAM': 5000}})
+    # Most followed first; "Alan Alda" matches twice ("alan", "alda") but is listed once
+    assert [(s['value'], s['followers']) for s in index.complete('Al', 10)] == [
+        ('Alan Alda', 5000), ('Alice Smith', 1000), ('alice.tok', 900), ('@alice', 100)]
+    assert [s['value'] for s in index.complete('@SMI', 10)] == ['smithy', 'Alice Smith']
+    assert index.complete('al', 1) is index.complete(' AL ', 1)  # served from the prefix cache
+    assert index.complete('zz') == [] and index.complete('') == []
+
+    alice = index.complete('alic')
+    index.upsert('3', 'Alba', [('TIKTOK', 'alba')])
+    index.remove('2')
+    assert [s['influencer_id'] for s in index.complete('al', 10)] == ['1', '1', '1', '3', '3']
+    # Writes only drop the cached prefixes of the terms they change
+    assert index.complete('alic') is alice
+    assert index.complete('bob') == []
+    assert [s['value'] for s in index.complete('@SMI', 10)] == ['Alice Smith']
+    index.upsert('3', 'Alba', [('TIKTOK', 'alba')], followers={'TIKTOK': 7000})
+    assert [s['value'] for s in index.complete('a', 2)] == ['alba', 'Alba']
+    assert [s['value'] for s in index.complete('alb', 10)] == ['alba', 'Alba']
+
+
+def test_autocomplete_endpoint_warms_in_background_then_reads_nothing(memory_db, client):
+    import time
+    from enums.platform import Platform
+    from model.influencer import Influencer, influencer_autocomplete
+    from model.metrics import Metrics
+    memory_db.load_models(Influencer, [make_influencer('1', 'Alice', 'Austin', 'Female', 'FASHION', ['INSTAGRAM']),
+                                       make_influencer('2', 'Alvin', 'Austin', 'Male', 'TECH', ['TIKTOK'])])
+    memory_db.load_models(Metrics, [Metrics(id='m2', influencer_id='2', platform=Platform.TIKTOK,
+                                            total_followers=700)])
+    # The first request starts the build and does not wait for it
+    assert client.get('/autocomplete?q=al').json == {'success': True, 'data': [], 'warming': True}
+    for _ in range(500):
+        if influencer_autocomplete.loaded:
+            break
+        time.sleep(0.01)
+    with patch.object(Influencer, 'scan') as mock_scan, patch.object(Metrics, 'scan') as mock_metrics:
+        first = client.get('/autocomplete?q=al&limit=2')
+        second = client.get('/autocomplete?q=ali')
+    mock_scan.assert_not_called()
+    mock_metrics.assert_not_called()
+    assert [(s['value'], s['type']) for s in first.json['data']] == [('Alvin', 'name'), ('alvin_tiktok', 'handle')]
+    assert [s['value'] for s in second.json['data']] == ['Alice', 'alice_instagram']
+    assert client.get('/autocomplete').status_code == 400
+
+
+def test_autocomplete_applies_follower_changes_from_the_change_log(memory_db):
+    from pynamodb.models import Model
+    from enums.platform import Platform
+    from model import index_changelog
+    from model.index_changelog import record_changes
+    from model.influencer import Influencer
+    from model.metrics import Metrics
+    memory_db.load_models(Influencer, [make_influencer('1', 'Alice', platforms=['INSTAGRAM']),
+                                       make_influencer('2', 'Alvin', platforms=['TIKTOK'])])
+    memory_db.load_models(Metrics, [
+        Metrics(id='m1', influencer_id='1', platform=Platform.INSTAGRAM, total_followers=100),
+        Metrics(id='m2', influencer_id='2', platform=Platform.TIKTOK, total_followers=700)])
+    assert [s['value'] for s in Influencer.autocomplete_index().complete('al', 1)] == ['Alvin']
+
+    # Other writers change follower counts and add an influencer
+    Model.save(Metrics(id='m1', influencer_id='1', platform=Platform.INSTAGRAM, total_followers=5000))
+    Model.save(make_influencer('3', 'Alma'))
+    Model.save(Metrics(id='m3', influencer_id='3', platform=Platform.TIKTOK, total_followers=9000))
+    Model.delete(Influencer(influencer_id='2'))
+    record_changes(['1', '3', '2'])
+    with patch.object(index_changelog, 'INDEX_REFRESH_SECONDS', 0):
+        suggestions = Influencer.autocomplete_index().complete('al', 10)
+    assert [(s['value'], s['followers']) for s in suggestions] == [
+        ('Alma', 9000), ('Alice', 5000), ('alice_instagram', 5000)]
+
+
+def test_handle_lookup_items_follow_stream_changes(memory_db, stream):
+    from ih_search_service.app import stream_handler
+    from model.handle import InfluencerHandle
+    old = make_influencer('1', 'Alice', 'Austin', platforms=[('INSTAGRAM', '@Alice')])
+    new = make_influencer('1', 'Alice', 'Austin', platforms=[('INSTAGRAM', 'alice'), ('TIKTOK', 'alice.tt')])
+    stream.emit('MODIFY', old=old, new=new)
+    stream.emit('MODIFY', old=new, new=new)  # handles unchanged: no writes
+    stream.emit('REMOVE', old=new)
+    with patch.object(InfluencerHandle, 'sync') as mock_sync:
+        assert stream_handler(stream.drain(), None) == {'batchItemFailures': []}
+    assert mock_sync.call_count == 2
+    influencer_id, before, after = mock_sync.call_args_list[0].args
+    assert influencer_id == '1'
+    assert set(before) == {'INSTAGRAM#alice'}
+    assert set(after) == {'INSTAGRAM#alice', 'TIKTOK#alice.tt'}
+    assert set(mock_sync.call_args_list[1].args[1]) == set(after) and mock_sync.call_args_list[1].args[2] == {}
+
+
+def test_influencer_writes_diff_handles_against_the_stored_item(memory_db):
+    from model.handle import InfluencerHandle
+    from model.influencer import Influencer
+
+    def lookup_items():
+        return sorted((h.handle_key, h.influencer_id) for h in InfluencerHandle.scan())
+
+    make_influencer('1', 'Alice', platforms=[('INSTAGRAM', 'alice'), ('TIKTOK', 'alice.tt')]).save()
+    # A fresh instance knows nothing of the stored handles; the renamed and dropped ones still go
+    make_influencer('1', 'Alice', platforms=[('INSTAGRAM', 'alice.new')]).save()
+    assert lookup_items() == [('INSTAGRAM#alice.new', '1')]
+    influencer = Influencer(influencer_id='1')
+    influencer.update(actions=[Influencer.platforms.set(
+        make_influencer('1', 'Alice', platforms=[('TIKTOK', 'alice.tok')]).platforms)])
+    assert lookup_items() == [('TIKTOK#alice.tok', '1')]
+    Influencer(influencer_id='1').delete()
+    assert lookup_items() == []
+
+
+def test_handle_sync_writes_added_and_conditionally_deletes_removed():
+    from enums.platform import Platform
+    from model.handle import InfluencerHandle
+    old = {'INSTAGRAM#a': (Platform.INSTAGRAM, 'a'), 'TIKTOK#b': (Platform.TIKTOK, 'b')}
+    new = {'TIKTOK#b': (Platform.TIKTOK, 'b'), 'TIKTOK#c': (Platform.TIKTOK, '@C')}
+    with patch.object(InfluencerHandle, 'batch_write') as mock_batch, \
+            patch.object(InfluencerHandle, 'delete', autospec=True) as mock_delete:
+        InfluencerHandle.sync('1', old, new)
+    saved = [c.args[0] for c in mock_batch.return_value.__enter__.return_value.save.call_args_list]
+    assert [(h.handle_key, h.handle, h.influencer_id) for h in saved] == [('TIKTOK#c', '@C', '1')]
+    (deleted, condition), _ = mock_delete.call_args
+    assert deleted.handle_key == 'INSTAGRAM#a'
+    assert str(condition) == "influencer_id = {'S': '1'}"
+
+
+def test_search_by_handle_endpoints(client):
+    from enums.platform import Platform
+    from model.handle import InfluencerHandle
+    from model.influencer import Influencer
+    owner = SimpleNamespace(influencer_id='7', platform=Platform.TIKTOK)
+    with patch.object(InfluencerHandle, 'resolve', return_value={'TIKTOK#someone': owner}) as mock_resolve, \
+            patch.object(Influencer, 'get_by_ids', return_value=_found('7')):
+        response = client.get('/searchByHandle?handle=@SomeOne')
+        assert response.json['data'] == [{'influencer_id': '7', 'matched_platform': 'TIKTOK'}]
+        assert mock_resolve.call_args.args[0] == [(p, '@SomeOne') for p in Platform]
+
+        response = client.post('/searchByHandle/batch', json={'handles': [
+            {'platform': 'tiktok', 'handle': 'someone'}, {'platform': 'INSTAGRAM', 'handle': 'someone'}]})
+    assert response.status_code == 200
+    assert [r['influencer_id'] for r in response.json['data']] == ['7', None]
+    assert (response.json['resolved'], response.json['not_found']) == (1, 1)
+
+    assert client.get('/searchByHandle?handle=@').status_code == 400
+    assert client.get('/searchByHandle?handle=x&platform=MYSPACE').status_code == 400
+    assert client.post('/searchByHandle/batch', json={'handles': [{'handle': 'x'}]}).status_code == 400
+    with patch('controllers.influencer_metrics_controller.MAX_BATCH_HANDLES', 1):
+        assert client.post('/searchByHandle/batch', json={'handles': [
+            {'platform': 'TIKTOK', 'handle': 'a'}, {'platform': 'TIKTOK', 'handle': 'b'}]}).status_code == 400
+
+
+class _ShardedFollowers:
+    """
+    Serves per-shard index pages the way DynamoDB would: sorted on total_followers,
+    Limit rows evaluated per call before ``keep`` filters them, and the last
+    evaluated row's index key as LastEvaluatedKey.
+    """
+
+    def __init__(self, rows, shard_of=None, keep=None):
+        from utils.sharding import shard_key
+        self.by_shard = {}
+        for m in sorted(rows, key=lambda m: m.total_followers):
+            m.platform_shard = shard_of(m) if shard_of else shard_key(m.platform, m.id, 4)
+            self.by_shard.setdefault(m.platform_shard, []).append(m)
+        self.keep = keep
+        self.calls = []
+
+    def __call__(self, key, range_key_condition=None, filter_condition=None, limit=None, last_evaluated_key=None,
+                 scan_index_forward=True):
+        from model.metrics import Metrics
+        from utils.sharding import _index_item_key
+        self.calls.append((key, limit))
+        rows = self.by_shard.get(key, [])
+        start = [m.id for m in rows].index(last_evaluated_key['id']['S']) + 1 if last_evaluated_key else 0
+        evaluated = rows[start:start + limit] if limit else rows[start:]
+        more = limit and start + limit < len(rows)
+        last_key = _index_item_key(Metrics, Metrics.platform_shard_followers_idx, evaluated[-1]) if more else None
+        return SimpleNamespace(__iter__=None, items=[m for m in evaluated if not self.keep or self.keep(m)],
+                               last_evaluated_key=last_key)
+
+
+def test_scatter_gather_merges_shards_in_range_key_order_and_resumes():
+    from enums.platform import Platform
+    from model.metrics import Metrics, MetricsShardedFollowersIndex
+    from utils.sharding import scatter_gather
+    rows = [Metrics(id=f'm{i}', influencer_id=str(i), platform=Platform.TIKTOK, total_followers=(i * 37) % 100)
+            for i in range(20)]
+    fake = _ShardedFollowers(rows)
+    seen, cursor, pages = [], None, 0
+
+    def query(*args, **kwargs):
+        result = fake(*args, **kwargs)
+        return _IterWithKey(result.items, result.last_evaluated_key)
+
+    with patch.object(MetricsShardedFollowersIndex, 'query', side_effect=query):
+        while True:
+            page = scatter_gather(Metrics, Metrics.platform_shard_followers_idx, Platform.TIKTOK, limit=6,
+                                  exclusive_start_key=cursor, shards=4)
+            seen.extend(page)
+            pages += 1
+            cursor = page.last_evaluated_key
+            if cursor is None:
+                break
+            assert cursor['index'] == 'platform_shard_followers_index'
+            assert set(cursor['shards']) <= {f'TIKTOK#{n}' for n in range(4)}
+    assert [m.total_followers for m in seen] == sorted(m.total_followers for m in rows)
+    assert sorted(m.id for m in seen) == sorted(m.id for m in rows)
+    assert pages == 4
+    assert {key for key, _ in fake.calls} == {f'TIKTOK#{n}' for n in range(4)}
+
+
+def test_scatter_gather_keeps_order_when_a_filter_matches_unevenly():
+    from enums.platform import Platform
+    from model.metrics import Metrics, MetricsShardedFollowersIndex
+    from utils.sharding import scatter_gather
+    # Shard 0 is dense and mostly filtered out; shard 1 is sparse and all kept
+    dense = [Metrics(id=f'd{i}', influencer_id=f'd{i}', platform=Platform.TIKTOK, total_followers=i)
+             for i in range(40)]
+    sparse = [Metrics(id=f's{i}', influencer_id=f's{i}', platform=Platform.TIKTOK, total_followers=i * 10 + 1)
+              for i in range(4)]
+    fake = _ShardedFollowers(dense + sparse, shard_of=lambda m: f'TIKTOK#{0 if m.id[0] == "d" else 1}',
+                             keep=lambda m: m.id[0] == 's' or m.total_followers % 10 == 0)
+
+    def query(*args, **kwargs):
+        result = fake(*args, **kwargs)
+        return _IterWithKey(result.items, result.last_evaluated_key)
+
+    seen, cursor, pages = [], None, []
+    with patch.object(MetricsShardedFollowersIndex, 'query', side_effect=query):
+        while True:
+            page = scatter_gather(Metrics, Metrics.platform_shard_followers_idx, Platform.TIKTOK, limit=3,
+                                  filter_condition=Metrics.total_followers >= 0, exclusive_start_key=cursor, shards=2)
+            pages.append([m.total_followers for m in page])
+            seen.extend(page)
+            cursor = page.last_evaluated_key
+            if cursor is None:
+                break
+    assert len(pages) >= 2
+    assert [m.total_followers for m in seen] == [0, 1, 10, 11, 20, 21, 30, 31]
+
+
+class _IterWithKey(list):
+    def __init__(self, items, last_evaluated_key):
+        super().__init__(items)
+        self.last_evaluated_key = last_evaluated_key
+
+
+def test_platform_shard_written_with_every_item_and_sharded_reads_switch_on():
+    from enums.platform import Platform
+    from model.metrics import Metrics
+    from model.posts import Post
+    from utils.sharding import shard_key
+    metrics = Metrics(id='m1', influencer_id='1', platform=Platform.INSTAGRAM)
+    assert metrics.serialize()['platform_shard'] == {'S': shard_key(Platform.INSTAGRAM, 'm1')}
+    post = Post(post_id='p1', influencer_id='1', platform=Platform.TIKTOK, title='t', url='u')
+    assert post.serialize()['platform_shard']['S'].startswith('TIKTOK#')
+
+    # Without a range key, shards are read one after another until the page is full
+    shards = {'TIKTOK#0': [Post(post_id='a', platform=Platform.TIKTOK)],
+              'TIKTOK#1': [Post(post_id='b', platform=Platform.TIKTOK), Post(post_id='c', platform=Platform.TIKTOK)]}
+    calls = []
+
+    def query(key, *args, limit=None, last_evaluated_key=None, **kwargs):
+        calls.append((key, limit))
+        items = shards.get(key, [])[:limit]
+        more = limit is not None and len(shards.get(key, [])) > limit
+        return _IterWithKey(items, {'post_id': {'S': items[-1].post_id}} if more else None)
+
+    with patch('model.posts.PLATFORM_INDEX_SHARDED', True), \
+            patch('utils.sharding.PLATFORM_INDEX_SHARDS', 2), \
+            patch.object(type(Post.post_platform_shard_index), 'query', side_effect=query):
+        page, last_key = Post.get_posts_by_platform(Platform.TIKTOK, limit=2)
+    assert [p.post_id for p in page] == ['a', 'b']
+    assert calls == [('TIKTOK#0', 2), ('TIKTOK#1', 1)]
+    assert last_key == {'index': 'post_platform_shard_index', 'shards': {'TIKTOK#1': {'post_id': {'S': 'b'}}}}
+
+
+def test_memory_backend_pages_gsi_range_queries_plain_and_sharded(memory_db):
+    from enums.platform import Platform
+    from model.metrics import Metrics
+    for i in range(10):
+        Metrics(id=f'm{i}', influencer_id=str(i), platform=Platform.TIKTOK if i % 2 else Platform.INSTAGRAM,
+                total_followers=i * 100, engagement_rate=i / 10).save()
+
+    def pages():
+        seen, cursor = [], None
+        while True:
+            page = Metrics.query_platform_index('total_followers', Platform.TIKTOK, Metrics.total_followers >= 300,
+                                                limit=2, last_evaluated_key=cursor)
+            seen.extend(m.id for m in page)
+            cursor = page.last_evaluated_key
+            if cursor is None:
+                return seen
+
+    assert pages() == ['m3', 'm5', 'm7', 'm9']
+    with patch('model.metrics.PLATFORM_INDEX_SHARDED', True):
+        assert pages() == ['m3', 'm5', 'm7', 'm9']
+    descending = Metrics.platform_followers_idx.query(Platform.TIKTOK, Metrics.total_followers.between(300, 700),
+                                                      scan_index_forward=False)
+    assert [m.id for m in descending] == ['m7', 'm5', 'm3']
+    assert memory_db.stats['Query']['units'] > 0
+
+
+def test_memory_backend_batches_updates_conditions_and_scans(memory_db):
+    from pynamodb.exceptions import PutError
+    from enums.platform import Platform
+    from model.metrics import Metrics
+    with Metrics.batch_write() as batch:
+        for i in range(30):
+            batch.save(Metrics(id=f'b{i}', influencer_id=str(i), platform=Platform.TIKTOK, total_followers=i))
+    assert Metrics.count() == 30
+    assert sorted(m.id for m in Metrics.batch_get(['b0', 'b3', 'missing'])) == ['b0', 'b3']
+    from utils.batch_get import batch_get_by_keys
+    assert sorted(batch_get_by_keys(Metrics, ['b0', 'b3', 'missing'], consistent_read=True)) == ['b0', 'b3']
+
+    metrics = Metrics.get('b1')
+    metrics.update(actions=[Metrics.total_likes.add(5), Metrics.total_followers_str.set('1')])
+    assert (Metrics.get('b1').total_likes, Metrics.get('b1').total_followers_str) == (5, '1')
+    with pytest.raises(PutError) as e:
+        Metrics(id='b1', influencer_id='x', platform=Platform.TIKTOK).save(Metrics.id.does_not_exist())
+    assert e.value.cause_response_code == 'ConditionalCheckFailedException'
+
+    segments = [list(Metrics.scan(Metrics.total_followers >= 20, segment=s, total_segments=3)) for s in range(3)]
+    assert sorted(m.total_followers for segment in segments for m in segment) == list(range(20, 30))
+    page = Metrics.scan(limit=7)
+    assert len(list(page)) == 7 and page.last_evaluated_key is not None
+
+
+def test_memory_backend_serves_search_by_metrics_end_to_end(memory_db, client):
+    from enums.platform import Platform
+    from model.influencer import Influencer
+    from model.metrics import Metrics
+    memory_db.load_models(Influencer, [make_influencer(str(i), f'Name{i}', platforms=['TIKTOK']) for i in range(5)])
+    memory_db.load_models(Metrics, [Metrics(id=f'm{i}', influencer_id=str(i), platform=Platform.TIKTOK,
+                                            total_followers=1000 * i, engagement_rate=i) for i in range(5)])
+    response = client.post('/search_by_metrics', json={
+        'platform': 'tiktok', 'metrics_ranges': {'followers': {'min': 1500, 'max': 3500}, 'engagement_rate': [3, 9]},
+    })
+    assert response.status_code == 200
+    assert [i['influencer_id'] for i in response.json['data']] == ['3']
+
+
+def test_memory_backend_injects_latency_and_throttling():
+    import time
+    from pynamodb.exceptions import GetError
+    from model.metrics import Metrics
+    from benchmarks.memory_dynamodb import MemoryDynamoDB, create_tables, install, uninstall
+    backend = install(MemoryDynamoDB(throttle_rate=1.0, max_attempts=2, seed=1))
+    try:
+        create_tables(Metrics)
+        with pytest.raises(GetError) as e:
+            Metrics.get('m1')
+        assert e.value.cause_response_code == 'ProvisionedThroughputExceededException'
+        assert backend.stats['GetItem']['calls'] == 2 and backend.stats['GetItem']['throttled'] == 2
+        backend.throttle_rate, backend.latency = 0.0, 0.05
+        start = time.monotonic()
+        with pytest.raises(Metrics.DoesNotExist):
+            Metrics.get('m1')
+        assert time.monotonic() - start >= 0.05
+    finally:
+        uninstall()
+
+
+def test_benchmark_datagen_is_deterministic_and_skewed():
+    from collections import Counter
+    from benchmarks.datagen import generate
+    first, again = generate(rows=3000, seed=5), generate(rows=3000, seed=5)
+    assert first.influencers == again.influencers and first.posts == again.posts
+    assert sum(first.counts().values()) - len(first.handles) == pytest.approx(3000, rel=0.1)
+    followers = sorted((int(m['total_followers']['N']) for m in first.metrics), reverse=True)
+    # Power law: the top 10% of accounts hold most of the audience
+    assert sum(followers[:len(followers) // 10]) > 0.5 * sum(followers)
+    categories = Counter(i['category']['S'] for i in first.influencers).most_common()
+    assert categories[0][1] > 5 * categories[-1][1]
+    totals = Counter(m['total_posts']['N'] for m in first.metrics if 'total_posts' in m)
+    assert sum(int(n) * count for n, count in totals.items()) == len(first.posts)
+
+
+def test_benchmark_run_covers_every_route():
+    from benchmarks.runner import run
+    result = run(rows=600, seed=3, iterations=3, warmup=1, alloc_iterations=1)
+    assert len(result['routes']) == 25
+    for route, stats in result['routes'].items():
+        assert stats['errors'] == 0, route
+        assert stats['p99_ms'] >= stats['p50_ms'] > 0
+    assert result['routes']['GET /searchById']['items_read'] == 1.0
+
+
+def test_benchmark_compare_flags_regressions():
+    from benchmarks.runner import compare
+    base = {'routes': {'GET /a': {'errors': 0, 'p50_ms': 10.0, 'items_read': 20.0},
+                       'GET /b': {'errors': 0, 'p50_ms': 0.1}}}
+    new = {'routes': {'GET /a': {'errors': 2, 'p50_ms': 10.5, 'items_read': 40.0},
+                      'GET /b': {'errors': 0, 'p50_ms': 0.2}}}
+    flagged = {(row['route'], row['metric']) for row in compare(base, new) if row['regression']}
+    # +5% is under the threshold and +0.1 ms under the noise floor
+    assert flagged == {('GET /a', 'errors'), ('GET /a', 'items_read')}
+
+
+def test_tracing_reports_server_timing_and_exports_dynamodb_spans(memory_db, client):
+    from model.influencer import Influencer
+    from utils.tracing import add_exporter, remove_exporter
+    memory_db.load_models(Influencer, [make_influencer(str(i), f'Name{i}', platforms=['TIKTOK']) for i in range(3)])
+    traces = []
+    add_exporter(traces.append)
+    try:
+        with patch('utils.tracing.TRACING_ENABLED', True):
+            response = client.post('/influencers/batch', json={'ids': ['0', '2', 'missing']})
+    finally:
+        remove_exporter(traces.append)
+    assert response.status_code == 200
+    timing = response.headers['Server-Timing']
+    assert 'ddb;dur=' in timing and 'BatchGetItem InfluencerTable x1' in timing and 'total;dur=' in timing
+    (trace,) = traces
+    assert trace.route == 'POST /influencers/batch' and trace.status == 200
+    # The BatchGetItem ran on a fan-out pool thread and still landed in the request's trace
+    (call,) = [s for s in trace.spans if s.name == 'dynamodb']
+    assert call.attrs['op'] == 'BatchGetItem' and call.attrs['items'] == 2 and call.attrs['page'] == 1
+    assert call.attrs['capacity'] > 0
+    assert {'models', 'serialize', 'jsonify'} <= {s.name for s in trace.spans}
+
+
+def test_traced_reads_request_their_consumed_capacity(memory_db):
+    from model.influencer import Influencer
+    from utils import tracing
+    memory_db.load_models(Influencer, [make_influencer('1', 'Ann', platforms=['TIKTOK'])])
+    connection = Influencer._get_connection().connection
+    trace = tracing.Trace('GET /test')
+    token = tracing._current.set(trace)
+    try:
+        # A raw call skips PynamoDB's dispatch, which would add ReturnConsumedCapacity itself
+        response = connection._make_api_call('GetItem', {'TableName': Influencer.Meta.table_name,
+                                                         'Key': {'influencer_id': {'S': '1'}}})
+    finally:
+        tracing._current.reset(token)
+    (call,) = [s for s in trace.spans if s.name == 'dynamodb']
+    assert response['ConsumedCapacity'] and call.attrs['capacity'] > 0
+
+def test_tracing_disabled_is_a_no_op(client):
+    from utils.tracing import NO_SPAN, current_trace, span
+    assert span('serialize') is NO_SPAN and current_trace() is None
+    response = client.get('/searchById')
+    assert 'Server-Timing' not in response.headers
+
+
+def test_metrics_route_exposes_requests_dynamodb_usage_and_in_flight(memory_db, client):
+    from model.influencer import Influencer
+    from utils.service_metrics import registry
+    memory_db.load_models(Influencer, [make_influencer('1', 'Ann', platforms=['TIKTOK'])])
+    registry.clear()
+    client.get('/searchById?influencer_id=1')
+    client.get('/searchById?influencer_id=1')
+    client.get('/searchById')
+    response = client.get('/metrics')
+    assert response.status_code == 200 and response.content_type.startswith('text/plain; version=0.0.4')
+    text = response.get_data(as_text=True)
+    assert 'http_requests_total{route="/searchById",method="GET",status="200"} 2' in text
+    assert 'http_requests_total{route="/searchById",method="GET",status="400"} 1' in text
+    assert 'http_request_duration_seconds_count{route="/searchById",method="GET"} 3' in text
+    assert 'http_request_duration_seconds_bucket{route="/searchById",method="GET",le="+Inf"} 3' in text
+    # Only the scrape itself is in flight
+    assert '\nhttp_requests_in_flight 1\n' in text
+    calls = [line for line in text.splitlines() if line.startswith('dynamodb_calls_total{route="/searchById"')]
+    assert calls and all(line.endswith(' 2') for line in calls)
+    assert 'dynamodb_items_returned_total{route="/searchById"' in text
+
+
+def test_metrics_report_capacity_of_plain_get_and_query_routes(memory_db, client):
+    from enums.platform import Platform
+    from model.influencer import Influencer
+    from model.posts import Post
+    from utils import slow_queries
+    from utils.service_metrics import registry
+    memory_db.load_models(Influencer, [make_influencer('1', 'Ann', platforms=['TIKTOK'])])
+    Post(post_id='p1', influencer_id='1', platform=Platform.TIKTOK, title='t', url='u').save()
+    registry.clear()
+    slow_queries.reset()
+    assert client.get('/searchById?influencer_id=1').status_code == 200
+    response = client.get('/posts/search/influencer?influencer_id=1')
+    assert response.status_code == 200 and len(response.json['data']) == 1
+    text = client.get('/metrics').get_data(as_text=True)
+    for route in ('/searchById', '/posts/search/influencer'):
+        capacity = [float(line.rsplit(' ', 1)[1]) for line in text.splitlines()
+                    if line.startswith(f'dynamodb_consumed_capacity_units_total{{route="{route}"')]
+        assert capacity and sum(capacity) > 0
+        (shape,) = [s for s in slow_queries.snapshot()['fingerprints']
+                    if s['fingerprint'].startswith(f'GET {route}')]
+        assert shape['total_capacity'] > 0
+
+    # A raw call skips PynamoDB's dispatch, which would add ReturnConsumedCapacity itself
+    registry.clear()
+    connection = Influencer._get_connection().connection
+    connection._make_api_call('GetItem', {'TableName': Influencer.Meta.table_name,
+                                          'Key': {'influencer_id': {'S': '1'}}})
+    text = client.get('/metrics').get_data(as_text=True)
+    assert [line for line in text.splitlines() if line.startswith('dynamodb_consumed_capacity_units_total{route="-"')
+            and 'operation="GetItem"' in line and float(line.rsplit(' ', 1)[1]) > 0]
+
+def test_metrics_counters_merge_threads_and_flush_emf_deltas(client):
+    import io
+    import json
+    import threading
+    from utils import service_metrics
+    from utils.service_metrics import Counter, emf_lines
+    counter = Counter('test_total', 'Test.', ('kind',))
+    threads = [threading.Thread(target=lambda: [counter.inc(('a',)) for _ in range(1000)]) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    counter.inc(('b',), 2.5)
+    assert counter.values() == {('a',): 4000, ('b',): 2.5}
+    # Finished threads were folded into the retired cell; totals are unchanged
+    assert counter.values() == {('a',): 4000, ('b',): 2.5}
+
+    emf_lines()
+    client.get('/searchById')
+    client.get('/searchById')
+    out = io.StringIO()
+    # Every invocation flushes by default
+    assert service_metrics.flush_if_due(out) >= 1
+    records = [json.loads(line) for line in out.getvalue().splitlines()]
+    (record,) = [r for r in records if r.get('Route') == 'GET /searchById']
+    assert record['Requests'] == 2 and record['ServerErrors'] == 0 and record['LatencyP50'] > 0
+    assert record['_aws']['CloudWatchMetrics'][0]['Dimensions'] == [['Route']]
+    assert not [r for r in map(json.loads, emf_lines()) if r.get('Route') == 'GET /searchById']
+
+
+def test_slow_query_fingerprint_strips_values_and_paging():
+    from utils.slow_queries import fingerprint
+    assert fingerprint('GET', '/searchInfluencers', {'platform': 'tiktok', 'location': 'Paris', 'limit': '20',
+                                                     'next_token': 'abc'}) == 'GET /searchInfluencers?location&platform'
+    assert fingerprint('GET', '/searchInfluencers', {'location': 'Rome', 'platform': 'youtube'}) == \
+        'GET /searchInfluencers?location&platform'
+    body = {'platform': 'tiktok', 'metrics_ranges': {'followers': {'min': 1}, 'engagement_rate': [3, 9]}}
+    assert fingerprint('POST', '/search_by_metrics', {'limit': '5'}, body) == \
+        'POST /search_by_metrics {metrics_ranges.engagement_rate[],metrics_ranges.followers.min,platform}'
+
+
+def test_slow_queries_record_plan_and_aggregate_per_shape(memory_db, client):
+    from model.influencer import Influencer
+    from utils import slow_queries
+    memory_db.load_models(Influencer, [make_influencer('1', 'Ann', platforms=['TIKTOK'])])
+    slow_queries.reset()
+    client.get('/searchById?influencer_id=1')
+    client.get('/searchById?influencer_id=2')
+    with patch('utils.slow_queries.SLOW_QUERY_MS', 0):
+        client.get('/searchById?influencer_id=1')
+    summary = client.get('/debug/slow-queries').json
+    (shape,) = [s for s in summary['fingerprints'] if s['fingerprint'] == 'GET /searchById?influencer_id']
+    assert shape['count'] == 3 and shape['slow'] == 1 and shape['p99_ms'] >= shape['p50_ms'] > 0
+    (slow,) = summary['slow']
+    assert slow['fingerprint'] == 'GET /searchById?influencer_id' and slow['status'] == 200
+    assert slow['dynamodb_calls'] >= 1 and slow['plan'] and slow['plan'][0].startswith('GetItem ')
+    with patch('utils.slow_queries.SLOW_QUERY_SUMMARY_SECONDS', 0):
+        assert slow_queries.log_summary_if_due()